@@ -0,0 +1,105 @@
+"""
+Frames per second for encoding streamed text deltas.
+
+``legacy`` builds and encodes the whole chunk dict for every delta, as the
+translators did before pre-encoded templates; ``template`` is the current
+translator code. Both produce identical bytes.
+
+    python benchmarks/bench_frames.py [--deltas N] [--repeat N] [--stdlib]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Any, Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatmock import jsoncodec  # noqa: E402
+from chatmock.jsoncodec import dumps  # noqa: E402
+from chatmock.translate import ChatChunkEncoder, OllamaLineEncoder  # noqa: E402
+
+
+MODEL = "gpt-5.4"
+CREATED = 1700000000
+CREATED_AT = "2026-01-01T00:00:00Z"
+
+
+def legacy_chat(deltas: List[str]) -> List[bytes]:
+    return [
+        b"data: "
+        + dumps(
+            {
+                "id": "resp_bench",
+                "object": "chat.completion.chunk",
+                "created": CREATED,
+                "model": MODEL,
+                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+            }
+        )
+        + b"\n\n"
+        for delta in deltas
+    ]
+
+
+def template_chat(deltas: List[str]) -> List[bytes]:
+    encoder = ChatChunkEncoder(MODEL, CREATED)
+    encoder.response_id = "resp_bench"
+    return [encoder._content(delta) for delta in deltas]
+
+
+def legacy_ollama(deltas: List[str]) -> List[bytes]:
+    return [
+        dumps(
+            {
+                "model": MODEL,
+                "created_at": CREATED_AT,
+                "message": {"role": "assistant", "content": delta},
+                "done": False,
+            }
+        )
+        + b"\n"
+        for delta in deltas
+    ]
+
+
+def template_ollama(deltas: List[str]) -> List[bytes]:
+    encoder = OllamaLineEncoder(MODEL, CREATED_AT)
+    return [encoder._line(delta) for delta in deltas]
+
+
+def measure(encode: Callable[[List[str]], Any], deltas: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode(deltas)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deltas", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stdlib", action="store_true", help="encode with the json module even if orjson is installed")
+    args = parser.parse_args()
+    if args.stdlib:
+        jsoncodec.orjson = None
+
+    deltas = [f"token{i} " for i in range(args.deltas)]
+    print(f"{args.deltas} text deltas, JSON backend {'orjson' if jsoncodec.orjson is not None else 'json'}")
+    for label, legacy, template in (
+        ("chat", legacy_chat, template_chat),
+        ("ollama", legacy_ollama, template_ollama),
+    ):
+        assert legacy(deltas[:100]) == template(deltas[:100])
+        before = args.deltas / measure(legacy, deltas, args.repeat)
+        after = args.deltas / measure(template, deltas, args.repeat)
+        print(f"{label:>7}: {before:,.0f} -> {after:,.0f} frames/s ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Time to split an upstream stream whose ``response.completed`` event carries
+a multi-megabyte output array into events.
+
+``legacy`` is the ``buffer += chunk`` / ``buffer.split(b"\\n", 1)`` loop
+``stream_upstream_bytes`` used to run, which copies the rest of the buffer
+for every line and every chunk; ``decoder`` is :class:`chatmock.sse.SSEDecoder`.
+Neither decodes JSON, so only the buffering is compared.
+
+    python benchmarks/bench_large_event.py [--megabytes N ...] [--deltas N] [--chunk-size BYTES]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatmock.sse import SSEDecoder  # noqa: E402
+
+
+def build_stream(deltas: int, megabytes: float) -> bytes:
+    parts = []
+    for i in range(deltas):
+        evt = {"type": "response.output_text.delta", "delta": f"token{i} "}
+        parts.append(b"data: " + json.dumps(evt).encode() + b"\n\n")
+    text = "x" * 4096
+    output = [{"type": "message", "content": [{"type": "output_text", "text": text}]}] * max(int(megabytes * 256), 1)
+    completed = {"type": "response.completed", "response": {"id": "resp_bench", "output": output}}
+    parts.append(b"data: " + json.dumps(completed).encode() + b"\n\n")
+    return b"".join(parts)
+
+
+def legacy(chunks: List[bytes]) -> tuple[int, int]:
+    events = 0
+    held = 0
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            if line.startswith(b"data: "):
+                events += 1
+        held = max(held, len(buffer))
+    return events, held
+
+
+def decoder(chunks: List[bytes]) -> tuple[int, int]:
+    events = 0
+    held = 0
+    dec = SSEDecoder()
+    for chunk in chunks:
+        events += len(dec.feed(chunk))
+        held = max(held, sum(len(piece) for piece in dec._pending))
+    return events, held
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, nargs="+", default=[1.0, 4.0, 8.0])
+    parser.add_argument("--deltas", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=16384)
+    args = parser.parse_args()
+
+    for megabytes in args.megabytes:
+        body = build_stream(args.deltas, megabytes)
+        chunks = [body[i : i + args.chunk_size] for i in range(0, len(body), args.chunk_size)]
+        print(f"{len(body) / 1e6:.1f} MB in {len(chunks)} chunks of {args.chunk_size} bytes")
+        results = {}
+        for name, run in (("legacy", legacy), ("decoder", decoder)):
+            start = time.perf_counter()
+            events, held = run(chunks)
+            results[name] = time.perf_counter() - start
+            print(f"{name:>9}: {results[name] * 1000:8.1f} ms, {events} events, at most {held / 1e6:.1f} MB held")
+        print(f"  speedup: {results['legacy'] / results['decoder']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Bytes sent and relay throughput for a reasoning-heavy upstream stream with
+and without lean passthrough (``--lean-stream``).
+
+Every delta carries upstream's random ``obfuscation`` padding; the stream
+is split into network-sized chunks and relayed through
+``stream_upstream_bytes`` as ``/v1/responses`` does.
+
+    python benchmarks/bench_lean.py [--deltas N] [--reasoning-share 0.5] [--chunk-size BYTES] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatmock.lean import LeanStreamSettings  # noqa: E402
+from chatmock.responses_api import stream_upstream_bytes  # noqa: E402
+from chatmock.session import SESSION_EVENT_TYPES  # noqa: E402
+
+
+class _Upstream:
+    def __init__(self, chunks) -> None:
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size=None):
+        return iter(self.chunks)
+
+    def close(self) -> None:
+        pass
+
+
+def build_stream(deltas: int, reasoning_share: float) -> bytes:
+    rng = random.Random(0)
+    parts = [b'event: response.created\ndata: {"type":"response.created","response":{"id":"resp_bench"}}\n\n']
+    for i in range(deltas):
+        kind = "response.reasoning_summary_text.delta" if rng.random() < reasoning_share else "response.output_text.delta"
+        pad = "".join(rng.choices(string.ascii_letters, k=rng.randint(1, 16)))
+        evt = {"type": kind, "item_id": "msg_bench", "output_index": 0, "content_index": 0, "delta": f"tok{i} ", "obfuscation": pad}
+        parts.append(b"event: " + kind.encode() + b"\ndata: " + json.dumps(evt, separators=(",", ":")).encode() + b"\n\n")
+    parts.append(b'event: response.completed\ndata: {"type":"response.completed","response":{"id":"resp_bench"}}\n\n')
+    return b"".join(parts)
+
+
+def relay(chunks, lean: LeanStreamSettings) -> int:
+    sent = 0
+    for out in stream_upstream_bytes(_Upstream(chunks), on_event=lambda evt: None, event_types=SESSION_EVENT_TYPES, lean=lean):
+        sent += len(out)
+    return sent
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deltas", type=int, default=20000)
+    parser.add_argument("--reasoning-share", type=float, default=0.5)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    body = build_stream(args.deltas, args.reasoning_share)
+    chunks = [body[i : i + args.chunk_size] for i in range(0, len(body), args.chunk_size)]
+    print(f"{len(body) / 1e6:.2f} MB upstream in {len(chunks)} chunks, {args.reasoning_share:.0%} reasoning deltas")
+    sizes = {}
+    for name, lean in (("passthrough", LeanStreamSettings()), ("lean", LeanStreamSettings(enabled=True))):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            sizes[name] = relay(chunks, lean)
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:>12}: {sizes[name] / 1e6:6.2f} MB sent, {best * 1000:7.1f} ms ({len(body) / best / 1e6:6.0f} MB/s upstream)")
+    print(f"  bytes saved: {1 - sizes['lean'] / sizes['passthrough']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
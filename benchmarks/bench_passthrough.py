@@ -0,0 +1,71 @@
+"""
+Events per second relayed by ``stream_upstream_bytes`` for ``/v1/responses``.
+
+``decode-all`` parses every upstream event for the session tracker, as the
+passthrough did before type sniffing; ``sniffed`` skips runs of events that
+cannot hold a type ``note_responses_stream_event`` reacts to and only parses
+those types.
+
+    python benchmarks/bench_passthrough.py [--events N] [--chunk-size BYTES] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Any, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_sse import build_stream  # noqa: E402
+from chatmock.jsoncodec import BACKEND  # noqa: E402
+from chatmock.responses_api import stream_upstream_bytes  # noqa: E402
+from chatmock.session import SESSION_EVENT_TYPES  # noqa: E402
+
+
+class _Chunks:
+    def __init__(self, chunks: List[bytes]) -> None:
+        self._chunks = chunks
+
+    def iter_content(self, chunk_size: Any = None) -> Iterator[bytes]:
+        return iter(self._chunks)
+
+    def close(self) -> None:
+        pass
+
+
+def measure(chunks: List[bytes], event_types: Any, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    seen: List[Any] = []
+    for _ in range(repeat):
+        seen = []
+        start = time.perf_counter()
+        for _chunk in stream_upstream_bytes(_Chunks(chunks), on_event=seen.append, event_types=event_types):
+            pass
+        best = min(best, time.perf_counter() - start)
+    return best, len(seen)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=1400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    body = build_stream(args.events)
+    chunks = [body[i : i + args.chunk_size] for i in range(0, len(body), args.chunk_size)]
+    total = args.events + 2
+    print(f"{total} events in {len(chunks)} chunks of {args.chunk_size} bytes, JSON backend {BACKEND}")
+    results = {}
+    for name, event_types in (("decode-all", None), ("sniffed", SESSION_EVENT_TYPES)):
+        elapsed, decoded = measure(chunks, event_types, args.repeat)
+        results[name] = total / elapsed
+        print(f"{name:>10}: {elapsed * 1000:.1f} ms = {results[name]:,.0f} events/s ({decoded} decoded)")
+    print(f"speedup: {results['sniffed'] / results['decode-all']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Session-tracking lock contention with many concurrent streams.
+
+Each thread plays one agent session: a request carrying the whole history,
+then ``response.created``, a run of ``response.output_item.done`` events and
+``response.completed``, for a number of turns. The same workload is run with
+the session table in one shard (a single lock) and in several.
+
+Throughput alone says little on one core, where every configuration is bound
+by the same CPU. So the shard locks are also instrumented, and the benchmark
+reports how long each critical section holds its lock, and how often and for
+how long a thread had to wait for a lock another stream held. Hashing
+happens outside the locks, so hold times stay at a few microseconds however
+large the items are. On one core a thread is rarely descheduled inside such
+a short section, so even a single shard sees almost no contention. Shards
+pay off when several cores run streams at once and the hold time times the
+call rate approaches one.
+
+    python benchmarks/bench_session_contention.py [--threads N ...] [--shards N ...] [--turns N] [--items N] [--item-bytes BYTES]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatmock import session  # noqa: E402
+from chatmock.session import (  # noqa: E402
+    configure_session_store,
+    note_responses_stream_event,
+    prepare_responses_request_for_session,
+)
+from chatmock.session_store import default_session_store_settings  # noqa: E402
+
+
+class TimedLock:
+    """A ``threading.Lock`` that records contention and hold times."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entered = 0.0
+        self.acquisitions = 0
+        self.contended = 0
+        self.waited = 0.0
+        self.held = 0.0
+
+    def __enter__(self) -> "TimedLock":
+        if not self._lock.acquire(blocking=False):
+            began = time.perf_counter()
+            self._lock.acquire()
+            self.waited += time.perf_counter() - began
+            self.contended += 1
+        self.acquisitions += 1
+        self._entered = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.held += time.perf_counter() - self._entered
+        self._lock.release()
+
+
+def play(session_id: str, turns: int, items: int, text: str, start: threading.Barrier) -> None:
+    history: List[Dict[str, Any]] = []
+    start.wait()
+    for turn in range(turns):
+        history.append({"type": "message", "role": "user", "content": [{"type": "input_text", "text": f"{turn} {text}"}]})
+        prepare_responses_request_for_session(session_id, {"model": "gpt-5.4", "input": list(history)})
+        note_responses_stream_event(session_id, {"type": "response.created", "response": {"id": f"resp_{turn}"}})
+        for i in range(items):
+            item = {"type": "function_call", "call_id": f"call_{turn}_{i}", "name": "shell", "arguments": text}
+            note_responses_stream_event(session_id, {"type": "response.output_item.done", "item": item})
+            history.append(item)
+        note_responses_stream_event(session_id, {"type": "response.completed", "response": {"id": f"resp_{turn}"}})
+
+
+def run(threads: int, shards: int, args: argparse.Namespace) -> Tuple[float, List[TimedLock]]:
+    configure_session_store(default_session_store_settings(), shards=shards)
+    locks = []
+    for shard in session._SHARDS:
+        shard.lock = TimedLock()
+        locks.append(shard.lock)
+    text = "x" * args.item_bytes
+    start = threading.Barrier(threads + 1)
+    workers = [
+        threading.Thread(target=play, args=(f"session-{i}", args.turns, args.items, text, start)) for i in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    began = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+    return threads * args.turns * (args.items + 3) / elapsed, locks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--item-bytes", type=int, default=4000)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU(s), {args.item_bytes}-byte items")
+    for threads in args.threads:
+        for shards in args.shards:
+            rate, locks = run(threads, shards, args)
+            acquisitions = sum(lock.acquisitions for lock in locks)
+            contended = sum(lock.contended for lock in locks)
+            waited = sum(lock.waited for lock in locks)
+            held = sum(lock.held for lock in locks)
+            print(
+                f"{threads:>3} streams, {shards:>2} shard(s): {rate:8.0f} calls/s, "
+                f"hold {held / acquisitions * 1e6:6.1f} us/section, "
+                f"contended {contended / acquisitions:6.2%}, "
+                f"waited {waited * 1e3:8.1f} ms in total"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Per-turn cost of persisting session state to SQLite (``--session-db``).
+
+``sync`` commits every write as it happens, which is what persisting from
+the request path would cost. ``write-behind`` is
+:class:`chatmock.session_persist.SessionPersistence`: the request path only
+records the write, and a background thread commits the batch every
+``--flush-interval`` seconds. Each turn writes one fingerprint row.
+
+    python benchmarks/bench_session_persist.py [--turns N] [--sessions N] [--flush-interval SECONDS]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatmock.session_persist import (  # noqa: E402
+    _UPSERT_FINGERPRINT,
+    SessionPersistence,
+    _connect,
+)
+
+
+def sync(path: str, turns: int, sessions: int) -> float:
+    conn = _connect(path)
+    start = time.perf_counter()
+    for turn in range(turns):
+        sid = f"session-{turn % sessions}"
+        with conn:
+            conn.execute(_UPSERT_FINGERPRINT, (f"fp-{turn % sessions}", sid, time.time()))
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def write_behind(path: str, turns: int, sessions: int, flush_interval: float) -> float:
+    store = SessionPersistence(path, flush_interval=flush_interval)
+    start = time.perf_counter()
+    for turn in range(turns):
+        sid = f"session-{turn % sessions}"
+        store.save_fingerprint(f"fp-{turn % sessions}", sid)
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "sync": sync(os.path.join(tmp, "sync.db"), args.turns, args.sessions),
+            "write-behind": write_behind(os.path.join(tmp, "behind.db"), args.turns, args.sessions, args.flush_interval),
+        }
+    for name, elapsed in results.items():
+        print(f"{name:>12}: {elapsed * 1e6 / args.turns:8.1f} us per turn on the request path")
+    print(f"  speedup: {results['sync'] / results['write-behind']:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
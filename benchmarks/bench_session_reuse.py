@@ -0,0 +1,91 @@
+"""
+Per-turn cost of recognising a ``previous_response_id`` follow-up in a long
+agent conversation.
+
+``legacy`` is the deep-copy-and-compare routine ``session.py`` used to run:
+two deep copies of the request, deep copies of the stored request and reply
+to rebuild the baseline, and an item-by-item comparison. ``hashed`` is the
+current ``prepare_responses_request_for_session`` plus the completion that
+records the turn, which hashes each input item once and stores no payloads.
+
+    python benchmarks/bench_session_reuse.py [--turns N] [--item-bytes BYTES]
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatmock.session import (  # noqa: E402
+    note_responses_stream_event,
+    prepare_responses_request_for_session,
+    reset_session_state,
+)
+
+
+def _without_input(payload: Dict[str, Any]) -> Dict[str, Any]:
+    clone = copy.deepcopy(payload)
+    clone["input"] = []
+    clone.pop("previous_response_id", None)
+    return clone
+
+
+class Legacy:
+    def __init__(self) -> None:
+        self.last_request: Dict[str, Any] | None = None
+        self.last_items: List[Dict[str, Any]] = []
+
+    def turn(self, payload: Dict[str, Any], reply: Dict[str, Any]) -> int:
+        full = copy.deepcopy(payload)
+        outbound = copy.deepcopy(payload)
+        request_input = copy.deepcopy(full["input"])
+        sent = len(request_input)
+        if self.last_request is not None and _without_input(self.last_request) == _without_input(full):
+            baseline = copy.deepcopy(self.last_request["input"]) + copy.deepcopy(self.last_items)
+            if request_input[: len(baseline)] == baseline:
+                outbound["input"] = copy.deepcopy(request_input[len(baseline) :])
+                sent = len(outbound["input"])
+        self.last_request = copy.deepcopy(full)
+        self.last_items = [copy.deepcopy(reply)]
+        return sent
+
+
+def hashed_turn(payload: Dict[str, Any], reply: Dict[str, Any], turn: int) -> int:
+    prepared = prepare_responses_request_for_session("bench", payload)
+    note_responses_stream_event("bench", {"type": "response.completed", "response": {"id": f"resp_{turn}", "output": [reply]}})
+    return len(prepared.payload["input"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--item-bytes", type=int, default=2000)
+    args = parser.parse_args()
+
+    text = "x" * args.item_bytes
+    results = {}
+    for name in ("legacy", "hashed"):
+        reset_session_state()
+        legacy = Legacy()
+        history: List[Dict[str, Any]] = []
+        sent = 0
+        start = time.perf_counter()
+        for turn in range(args.turns):
+            history.append({"type": "message", "role": "user", "content": [{"type": "input_text", "text": f"{turn} {text}"}]})
+            payload = {"model": "gpt-5.4", "instructions": "agent", "tools": [], "input": list(history)}
+            reply = {"type": "function_call", "call_id": f"call_{turn}", "name": "shell", "arguments": text}
+            sent += legacy.turn(payload, reply) if name == "legacy" else hashed_turn(payload, reply, turn)
+            history.append(reply)
+        results[name] = time.perf_counter() - start
+        print(f"{name:>7}: {results[name] * 1000:8.1f} ms for {args.turns} turns ({sent} items sent upstream)")
+    print(f"  speedup: {results['legacy'] / results['hashed']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Cost of tracking new sessions once the session table is full.
+
+``legacy`` is the dict plus insertion-order list ``session.py`` used to keep,
+evicting with ``list.pop(0)``; ``lru`` is :class:`chatmock.session_store.LRUStore`.
+Both run under no lock here, so only the bookkeeping is compared.
+
+    python benchmarks/bench_session_store.py [--entries N ...] [--inserts N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatmock.session_store import LRUStore, SessionStoreSettings  # noqa: E402
+
+
+def legacy(keys: List[str], max_entries: int) -> int:
+    table: Dict[str, int] = {}
+    order: List[str] = []
+    for i, key in enumerate(keys):
+        if key in table:
+            continue
+        table[key] = i
+        order.append(key)
+        if len(order) > max_entries:
+            table.pop(order.pop(0), None)
+    return len(table)
+
+
+def lru(keys: List[str], max_entries: int) -> int:
+    store: LRUStore[str, int] = LRUStore(SessionStoreSettings(max_entries=max_entries, ttl_seconds=3600, max_bytes=0))
+    for i, key in enumerate(keys):
+        if store.get(key) is None:
+            store.put(key, i, size=1)
+    return len(store)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--inserts", type=int, default=200000)
+    args = parser.parse_args()
+
+    keys = [f"session-{i}" for i in range(args.inserts)]
+    for entries in args.entries:
+        print(f"{args.inserts} new sessions into a table of {entries}")
+        results = {}
+        for name, run in (("legacy", legacy), ("lru", lru)):
+            start = time.perf_counter()
+            run(keys, entries)
+            results[name] = time.perf_counter() - start
+            print(f"{name:>8}: {results[name] * 1e6 / args.inserts:6.2f} us per insert")
+        print(f"  speedup: {results['legacy'] / results['lru']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Events per second for parsing an upstream Responses SSE stream.
+
+``legacy`` is the per-line loop the stream consumers used before
+``chatmock.sse`` (``iter_lines`` + decode + ``startswith`` + ``json.loads``
+on ``str``); ``decoder`` is :func:`chatmock.sse.iter_sse_json` over the same
+network-sized chunks.
+
+    python benchmarks/bench_sse.py [--events N] [--chunk-size BYTES] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatmock.jsoncodec import BACKEND  # noqa: E402
+from chatmock.sse import iter_sse_json  # noqa: E402
+
+
+def build_stream(events: int) -> bytes:
+    parts = [
+        b'event: response.created\ndata: {"type": "response.created", "response": {"id": "resp_bench"}}\n\n'
+    ]
+    for i in range(events):
+        evt = {"type": "response.output_text.delta", "item_id": "msg_bench", "output_index": 0, "delta": f"token{i} "}
+        parts.append(b"event: response.output_text.delta\ndata: " + json.dumps(evt).encode() + b"\n\n")
+    completed = {
+        "type": "response.completed",
+        "response": {"id": "resp_bench", "output": [{"type": "message", "content": [{"type": "output_text", "text": "x" * 20000}]}]},
+    }
+    parts.append(b"event: response.completed\ndata: " + json.dumps(completed).encode() + b"\n\n")
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts)
+
+
+class _Chunks:
+    """Replays fixed chunks through the same ``iter_lines`` requests uses."""
+
+    def __init__(self, chunks: List[bytes]) -> None:
+        self._chunks = chunks
+
+    def iter_content(self, chunk_size: Any = None, decode_unicode: bool = False) -> Iterator[bytes]:
+        return iter(self._chunks)
+
+    iter_lines = requests.Response.iter_lines
+
+
+def legacy(upstream: _Chunks) -> Iterator[Dict[str, Any]]:
+    for raw in upstream.iter_lines(decode_unicode=False):
+        if not raw:
+            continue
+        line = raw.decode("utf-8", errors="ignore")
+        if not line.startswith("data: "):
+            continue
+        data = line[len("data: ") :].strip()
+        if not data or data == "[DONE]":
+            if data == "[DONE]":
+                break
+            continue
+        try:
+            evt = json.loads(data)
+        except Exception:
+            continue
+        if isinstance(evt, dict):
+            yield evt
+
+
+def decoder(upstream: _Chunks) -> Iterator[Dict[str, Any]]:
+    return iter_sse_json(upstream.iter_content(chunk_size=None))
+
+
+def measure(parse: Any, chunks: List[bytes], repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in parse(_Chunks(chunks)))
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=1400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    body = build_stream(args.events)
+    chunks = [body[i : i + args.chunk_size] for i in range(0, len(body), args.chunk_size)]
+    print(f"{len(body) / 1e6:.1f} MB in {len(chunks)} chunks of {args.chunk_size} bytes, JSON backend {BACKEND}")
+    results = {}
+    for name, parse in (("legacy", legacy), ("decoder", decoder)):
+        elapsed, count = measure(parse, chunks, args.repeat)
+        results[name] = count / elapsed
+        print(f"{name:>8}: {count} events in {elapsed * 1000:.1f} ms = {results[name]:,.0f} events/s")
+    print(f"speedup: {results['decoder'] / results['legacy']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Tuple
+
+from .limits import RateLimitSnapshot, parse_rate_limit_headers
+from .utils import AuthFileCache, TokenRefresher, get_auth_cache, get_home_dir, get_token_refresher
+
+
+ACCOUNTS_DIRNAME = "accounts"
+PRIMARY_ACCOUNT_NAME = "default"
+DEFAULT_COOLDOWN_SECONDS = 60.0
+MAX_SESSION_AFFINITY_ENTRIES = 10000
+
+
+class UpstreamAccount:
+    """One set of ChatGPT credentials plus the usage last reported for it."""
+
+    def __init__(self, name: str, home: str, cache: AuthFileCache, refresher: TokenRefresher) -> None:
+        self.name = name
+        self.home = home
+        self.cache = cache
+        self.refresher = refresher
+        self.rate_limits: RateLimitSnapshot | None = None
+        self.rate_limits_at: float | None = None
+        self.cooldown_until = 0.0
+
+    def __repr__(self) -> str:
+        return f"UpstreamAccount({self.name!r})"
+
+    @property
+    def account_id(self) -> str | None:
+        return self.cache.get().account_id
+
+    @property
+    def has_credentials(self) -> bool:
+        entry = self.cache.get()
+        return bool(entry.access_token or entry.refresh_token)
+
+    def used_percent(self, now: float) -> float:
+        """Highest used percentage across the windows that have not reset yet."""
+        snapshot = self.rate_limits
+        if snapshot is None or self.rate_limits_at is None:
+            return 0.0
+        elapsed = now - self.rate_limits_at
+        used = 0.0
+        for window in (snapshot.primary, snapshot.secondary):
+            if window is None:
+                continue
+            if window.resets_in_seconds is not None and elapsed >= window.resets_in_seconds:
+                continue
+            used = max(used, window.used_percent)
+        return used
+
+    def cooling_down(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def blocked_for(self, now: float) -> float:
+        """Seconds until this account can take traffic again; 0 when it can right now."""
+        wait = max(self.cooldown_until - now, 0.0)
+        snapshot = self.rate_limits
+        if snapshot is None or self.rate_limits_at is None:
+            return wait
+        elapsed = now - self.rate_limits_at
+        for window in (snapshot.primary, snapshot.secondary):
+            if window is None or window.used_percent < 100 or window.resets_in_seconds is None:
+                continue
+            wait = max(wait, window.resets_in_seconds - elapsed)
+        return wait
+
+
+def _cooldown_seconds(headers: Mapping[str, Any], snapshot: RateLimitSnapshot | None) -> float:
+    try:
+        retry_after = float(headers.get("Retry-After"))
+        if retry_after > 0:
+            return retry_after
+    except (TypeError, ValueError):
+        pass
+    resets: List[float] = []
+    if snapshot is not None:
+        for window in (snapshot.primary, snapshot.secondary):
+            if window is not None and window.used_percent >= 100 and window.resets_in_seconds is not None:
+                resets.append(float(window.resets_in_seconds))
+    return max(resets) if resets else DEFAULT_COOLDOWN_SECONDS
+
+
+class AccountPool:
+    """
+    Picks an upstream account per request.
+
+    A session stays on the account it first used so upstream prompt caching
+    keeps hitting; new sessions go to the account with the most headroom in its
+    5-hour and weekly windows. Accounts that answered 429 sit out until their
+    window resets.
+    """
+
+    def __init__(self, accounts: Iterable[UpstreamAccount]) -> None:
+        self._accounts: Tuple[UpstreamAccount, ...] = tuple(accounts)
+        self._lock = threading.Lock()
+        self._affinity: "OrderedDict[str, str]" = OrderedDict()
+
+    def accounts(self) -> Tuple[UpstreamAccount, ...]:
+        return self._accounts
+
+    def get(self, name: str) -> UpstreamAccount | None:
+        for account in self._accounts:
+            if account.name == name:
+                return account
+        return None
+
+    def select(
+        self,
+        session_id: str | None = None,
+        *,
+        exclude: Iterable[str] = (),
+        prefer: Callable[[UpstreamAccount], bool | None] | None = None,
+    ) -> UpstreamAccount | None:
+        """
+        Account to use for ``session_id``, or ``None`` when nothing usable is left.
+
+        ``prefer`` narrows the choice to accounts it does not reject (for example
+        the ones whose catalog lists the requested model) when any remain.
+        When failing over (``exclude`` is non-empty), accounts that are still
+        cooling down or out of quota are never returned.
+        """
+        excluded = set(exclude)
+        now = time.monotonic()
+        with self._lock:
+            candidates = [a for a in self._accounts if a.name not in excluded and a.has_credentials]
+            if not candidates:
+                return None
+            ready = [a for a in candidates if a.blocked_for(now) <= 0]
+            if not ready:
+                if excluded:
+                    return None
+                return min(candidates, key=lambda a: a.blocked_for(now))
+            if prefer is not None:
+                preferred = [a for a in ready if prefer(a) is not False]
+                if preferred:
+                    ready = preferred
+
+            pinned = self._affinity.get(session_id) if session_id else None
+            choice = next((a for a in ready if a.name == pinned), None)
+            if choice is None:
+                choice = min(ready, key=lambda a: a.used_percent(now))
+            if session_id:
+                self._affinity[session_id] = choice.name
+                self._affinity.move_to_end(session_id)
+                while len(self._affinity) > MAX_SESSION_AFFINITY_ENTRIES:
+                    self._affinity.popitem(last=False)
+            return choice
+
+    def retry_after(self) -> float | None:
+        """Seconds until some account has quota again, or ``None`` while any account can serve now."""
+        now = time.monotonic()
+        with self._lock:
+            waits = [a.blocked_for(now) for a in self._accounts if a.has_credentials]
+        if not waits or min(waits) <= 0:
+            return None
+        return min(waits)
+
+    def record_response(self, account: UpstreamAccount, headers: Any, status_code: Any) -> None:
+        """Store the usage headers from an upstream reply; a 429 benches the account."""
+        try:
+            snapshot = parse_rate_limit_headers(headers) if headers is not None else None
+        except Exception:
+            snapshot = None
+        now = time.monotonic()
+        with self._lock:
+            if snapshot is not None:
+                account.rate_limits = snapshot
+                account.rate_limits_at = now
+            if status_code == 429:
+                account.cooldown_until = now + _cooldown_seconds(headers or {}, snapshot)
+
+
+def _secondary_account(name: str, home: str) -> UpstreamAccount:
+    auth_path = os.path.join(home, "auth.json")
+    cache = AuthFileCache(candidates=lambda: [auth_path])
+    refresher = TokenRefresher(cache, lock_path=lambda: auth_path + ".lock", auth_path=auth_path)
+    return UpstreamAccount(name, home, cache, refresher)
+
+
+def account_home(name: str, home: str | None = None) -> str:
+    return os.path.join(home or get_home_dir(), ACCOUNTS_DIRNAME, name)
+
+
+def load_account_pool(home: str | None = None) -> AccountPool:
+    """The primary auth.json plus every ``accounts/<name>/auth.json`` under the home dir."""
+    home = home or get_home_dir()
+    accounts = [UpstreamAccount(PRIMARY_ACCOUNT_NAME, home, get_auth_cache(), get_token_refresher())]
+    root = os.path.join(home, ACCOUNTS_DIRNAME)
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        names = []
+    for name in names:
+        if name == PRIMARY_ACCOUNT_NAME or not os.path.isfile(os.path.join(root, name, "auth.json")):
+            continue
+        accounts.append(_secondary_account(name, os.path.join(root, name)))
+    return AccountPool(accounts)
+
+
+_POOLS_LOCK = threading.Lock()
+_POOLS: Dict[str, AccountPool] = {}
+
+
+def get_account_pool() -> AccountPool:
+    home = get_home_dir()
+    pool = _POOLS.get(home)
+    if pool is not None:
+        return pool
+    with _POOLS_LOCK:
+        if home not in _POOLS:
+            _POOLS[home] = load_account_pool(home)
+        return _POOLS[home]
+
+
+def start_account_refreshers() -> int:
+    started = 0
+    for account in get_account_pool().accounts():
+        if account.refresher.start():
+            started += 1
+    return started
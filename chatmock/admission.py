@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import math
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict
+
+from flask import Response, current_app, jsonify, make_response
+
+from .accounts import get_account_pool
+from .config import float_env, int_env
+from .http import build_cors_headers
+
+
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 30.0
+QUEUE_FULL_RETRY_AFTER_SECONDS = 1
+
+
+@dataclass(frozen=True)
+class AdmissionRejected(Exception):
+    message: str
+    status_code: int = 429
+    retry_after: int = 1
+
+    def __str__(self) -> str:
+        return self.message
+
+
+class _Waiter:
+    __slots__ = ("wake", "granted")
+
+    def __init__(self, wake: Any) -> None:
+        self.wake = wake
+        self.granted = False
+
+
+class AdmissionTicket:
+    """One admitted request; ``release`` is idempotent."""
+
+    def __init__(self, controller: "AdmissionController | None") -> None:
+        self._controller = controller
+
+    def release(self) -> None:
+        controller, self._controller = self._controller, None
+        if controller is not None:
+            controller._release()
+
+
+class AdmissionController:
+    """
+    Gatekeeper in front of upstream calls.
+
+    Requests fail fast with 429 while every pooled account is out of quota,
+    using the reset time from the last rate-limit headers as ``Retry-After``.
+    Otherwise at most ``max_concurrent`` upstream streams run at once (0 means
+    unlimited) and the rest wait in FIFO order for up to ``queue_timeout``
+    seconds before being turned away with 503.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrent: int = 0,
+        queue_timeout: float = DEFAULT_QUEUE_TIMEOUT_SECONDS,
+        retry_after: Callable[[], float | None] | None = None,
+    ) -> None:
+        self.max_concurrent = max(int(max_concurrent), 0)
+        self.queue_timeout = max(float(queue_timeout), 0.0)
+        self._retry_after = retry_after or (lambda: get_account_pool().retry_after())
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: Deque[_Waiter] = deque()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def check_quota(self) -> None:
+        wait = self._retry_after()
+        if wait is not None and wait > 0:
+            seconds = max(int(math.ceil(wait)), 1)
+            raise AdmissionRejected(
+                f"ChatGPT usage limit reached; try again in {seconds} seconds.",
+                status_code=429,
+                retry_after=seconds,
+            )
+
+    def acquire(self) -> AdmissionTicket:
+        self.check_quota()
+        event = threading.Event()
+        waiter = self._try_enter(event)
+        if isinstance(waiter, AdmissionTicket):
+            return waiter
+        event.wait(self.queue_timeout)
+        return self._finish_wait(waiter)
+
+    async def acquire_async(self) -> AdmissionTicket:
+        self.check_quota()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def _wake() -> None:
+            if not future.done():
+                future.set_result(None)
+
+        waiter = self._try_enter(_AsyncWake(loop, _wake))
+        if isinstance(waiter, AdmissionTicket):
+            return waiter
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        return self._finish_wait(waiter)
+
+    def _try_enter(self, wake: Any) -> "AdmissionTicket | _Waiter":
+        if not self.max_concurrent:
+            return AdmissionTicket(None)
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                return AdmissionTicket(self)
+            waiter = _Waiter(wake)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _finish_wait(self, waiter: _Waiter) -> AdmissionTicket:
+        with self._lock:
+            if waiter.granted:
+                return AdmissionTicket(self)
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+        raise AdmissionRejected(
+            "Too many concurrent requests; timed out waiting for an upstream slot.",
+            status_code=503,
+            retry_after=QUEUE_FULL_RETRY_AFTER_SECONDS,
+        )
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            granted = waiter.granted
+            if not granted:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        if granted:
+            self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the oldest waiter.
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake.set()
+            else:
+                self._active = max(self._active - 1, 0)
+
+
+class _AsyncWake:
+    """Thread-safe ``set`` for a waiter parked on an event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, wake: Callable[[], None]) -> None:
+        self._loop = loop
+        self._wake = wake
+
+    def set(self) -> None:
+        self._loop.call_soon_threadsafe(self._wake)
+
+
+def default_max_concurrent_streams() -> int:
+    return max(int_env("CHATGPT_LOCAL_MAX_CONCURRENT_STREAMS", 0), 0)
+
+
+def default_queue_timeout() -> float:
+    return max(float_env("CHATGPT_LOCAL_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT_SECONDS), 0.0)
+
+
+def admission_error_body(exc: AdmissionRejected, error_style: str = "openai") -> Dict[str, Any]:
+    if error_style == "ollama":
+        return {"error": exc.message}
+    code = "rate_limit_exceeded" if exc.status_code == 429 else "server_overloaded"
+    return {"error": {"message": exc.message, "type": "rate_limit_error", "code": code}}
+
+
+def current_admission_controller() -> AdmissionController | None:
+    try:
+        controller = current_app.extensions.get("chatmock_admission")
+    except RuntimeError:
+        return None
+    return controller if isinstance(controller, AdmissionController) else None
+
+
+def admission_controlled(error_style: str = "openai"):
+    """Hold an admission slot for the whole (possibly streamed) response of a Flask view."""
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            controller = current_admission_controller()
+            if controller is None:
+                return view(*args, **kwargs)
+            try:
+                ticket = controller.acquire()
+            except AdmissionRejected as exc:
+                resp = make_response(jsonify(admission_error_body(exc, error_style)), exc.status_code)
+                for k, v in build_cors_headers().items():
+                    resp.headers.setdefault(k, v)
+                resp.headers["Retry-After"] = str(exc.retry_after)
+                return resp
+            try:
+                response: Response = make_response(view(*args, **kwargs))
+            except BaseException:
+                ticket.release()
+                raise
+            response.call_on_close(ticket.release)
+            return response
+
+        return wrapper
+
+    return decorator
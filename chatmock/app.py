@@ -5,10 +5,20 @@ import os
 from flask import Flask, jsonify
 from flask_sock import Sock
 
+from .admission import AdmissionController, default_max_concurrent_streams, default_queue_timeout
+from .coalesce import default_coalesce_settings
 from .http import build_cors_headers
+from .http_pool import get_upstream_session
+from .lean import default_lean_settings
+from .metrics import snapshot as metrics_snapshot
 from .model_catalog import DEFAULT_REFRESH_INTERVAL_SECONDS, ModelCatalog
 from .routes_openai import openai_bp
 from .routes_ollama import ollama_bp
+from .session import configure_session_store, session_store_stats
+from .session_store import default_session_store_settings
+from .state_backend import configure_state_backend, state_backend_stats
+from .timeouts import default_upstream_timeouts
+from .translate import default_max_output_bytes
 from .websocket_routes import register_websocket_routes
 
 
@@ -24,6 +34,24 @@ def create_app(
     default_web_search: bool = False,
     model_sync: bool | None = None,
     model_refresh_interval: float | None = None,
+    max_concurrent_streams: int | None = None,
+    queue_timeout: float | None = None,
+    upstream_connect_timeout: float | None = None,
+    upstream_first_event_timeout: float | None = None,
+    upstream_idle_timeout: float | None = None,
+    upstream_stall_retries: int | None = None,
+    stream_coalesce_window_ms: float | None = None,
+    stream_coalesce_max_bytes: int | None = None,
+    max_output_bytes: int | None = None,
+    lean_stream: bool | None = None,
+    lean_drop_events: str | None = None,
+    session_max_entries: int | None = None,
+    session_ttl: float | None = None,
+    session_max_bytes: int | None = None,
+    session_db: str | None = None,
+    session_flush_interval: float | None = None,
+    state_backend: str | None = None,
+    state_share_tokens: bool | None = None,
 ) -> Flask:
     app = Flask(__name__)
     if model_sync is None:
@@ -40,6 +68,14 @@ def create_app(
             )
         except (TypeError, ValueError):
             model_refresh_interval = DEFAULT_REFRESH_INTERVAL_SECONDS
+    if max_concurrent_streams is None:
+        max_concurrent_streams = default_max_concurrent_streams()
+    if queue_timeout is None:
+        queue_timeout = default_queue_timeout()
+    if max_output_bytes is None:
+        max_output_bytes = default_max_output_bytes()
+    if state_backend is None:
+        state_backend = os.getenv("CHATGPT_LOCAL_STATE_BACKEND") or ""
 
     app.config.update(
         VERBOSE=bool(verbose),
@@ -53,10 +89,40 @@ def create_app(
         DEFAULT_WEB_SEARCH=bool(default_web_search),
         MODEL_SYNC=bool(model_sync),
         MODEL_REFRESH_INTERVAL=float(model_refresh_interval),
+        MAX_CONCURRENT_STREAMS=int(max_concurrent_streams),
+        QUEUE_TIMEOUT=float(queue_timeout),
+        UPSTREAM_TIMEOUTS=default_upstream_timeouts(
+            connect=upstream_connect_timeout,
+            first_event=upstream_first_event_timeout,
+            idle=upstream_idle_timeout,
+            stall_retries=upstream_stall_retries,
+        ),
+        STREAM_COALESCE=default_coalesce_settings(
+            window_ms=stream_coalesce_window_ms,
+            max_bytes=stream_coalesce_max_bytes,
+        ),
+        MAX_OUTPUT_BYTES=max(int(max_output_bytes), 0),
+        STREAM_LEAN=default_lean_settings(enabled=lean_stream, drop_events=lean_drop_events),
+        SESSION_STORE=default_session_store_settings(
+            max_entries=session_max_entries,
+            ttl_seconds=session_ttl,
+            max_bytes=session_max_bytes,
+            db_path=session_db,
+            flush_interval=session_flush_interval,
+        ),
+        STATE_BACKEND=state_backend.strip(),
     )
+    configure_state_backend(app.config["STATE_BACKEND"], share_tokens=state_share_tokens)
+    configure_session_store(app.config["SESSION_STORE"])
     app.extensions["chatmock_model_catalog"] = ModelCatalog(
         enabled=bool(model_sync),
         refresh_interval_seconds=float(model_refresh_interval),
+        session=get_upstream_session(),
+    )
+
+    app.extensions["chatmock_admission"] = AdmissionController(
+        max_concurrent=int(max_concurrent_streams),
+        queue_timeout=float(queue_timeout),
     )
 
     @app.get("/")
@@ -64,6 +130,10 @@ def create_app(
     def health():
         return jsonify({"status": "ok"})
 
+    @app.get("/stats")
+    def stats():
+        return jsonify({**metrics_snapshot(), **session_store_stats(), **state_backend_stats()})
+
     @app.after_request
     def _cors(resp):
         for k, v in build_cors_headers().items():
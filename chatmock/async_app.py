@@ -0,0 +1,1169 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import datetime
+import functools
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Tuple
+
+import aiohttp
+from aiohttp import web
+from flask import Flask
+
+from .accounts import UpstreamAccount, get_account_pool
+from .admission import AdmissionController, AdmissionRejected, AdmissionTicket, admission_error_body
+from .app import create_app
+from .chat_api import (
+    ChatCompletionAccumulator,
+    ChatRequestError,
+    NormalizedChatRequest,
+    build_chat_completion,
+    build_ollama_chat_response,
+    build_text_completion,
+    normalize_chat_completions_payload,
+    normalize_completions_payload,
+    normalize_ollama_chat_payload,
+    upstream_error_message,
+)
+from .coalesce import atranslate_batches, current_coalesce_settings
+from .config import CHATGPT_RESPONSES_URL
+from .http import build_cors_headers
+from .jsoncodec import dumps, dumps_text, loads
+from .lean import LeanStreamFilter, current_lean_settings
+from .limits import record_rate_limits_from_response
+from .metrics import record_stream_end, snapshot as metrics_snapshot
+from .responses_api import (
+    ResponsesRequestError,
+    ResponsesStreamAggregator,
+    encode_stall_error_event,
+    extract_client_session_id,
+    interrupted_error_event,
+    normalize_responses_payload,
+    stall_error_event,
+)
+from .routes_ollama import OLLAMA_SHOW_RESPONSE, ollama_tags_payload, ollama_version_payload
+from .routes_openai import openai_models_payload
+from .session import (
+    SESSION_EVENT_TYPES,
+    clear_responses_reuse_state,
+    ensure_session_id,
+    note_responses_final_response,
+    note_responses_stream_event,
+    prepare_responses_request_for_session,
+    rejects_previous_response,
+    session_store_stats,
+)
+from .sse import SSEEventFilter, aiter_sse_json, aiter_sse_json_batches, wants_event
+from .state_backend import state_backend_stats
+from .timeouts import (
+    DEFAULT_CONNECT_TIMEOUT_SECONDS,
+    UpstreamStalled,
+    UpstreamTimeouts,
+    current_upstream_timeouts,
+    stalled,
+)
+from .translate import (
+    ChatCompletionStreamTranslator,
+    OllamaChatStreamTranslator,
+    OutputTooLarge,
+    TextCompletionStreamTranslator,
+    interrupted_stream_chunks,
+    stalled_stream_chunks,
+)
+from .upstream import (
+    MISSING_CREDENTIALS_MESSAGE,
+    account_model_preference,
+    build_responses_payload,
+    build_upstream_headers,
+    build_upstream_websocket_url,
+    prepare_outbound_payload,
+    resolve_upstream_session_id,
+)
+from .utils import get_effective_chatgpt_auth
+from .websocket_routes import build_websocket_ssl_context, error_event, is_terminal_event
+
+
+FLASK_APP_KEY = web.AppKey("chatmock_flask_app", Flask)
+CLIENT_SESSION_KEY = web.AppKey("chatmock_client_session", aiohttp.ClientSession)
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "Connection": "keep-alive"}
+
+
+def _log_json(prefix: str, payload: Any) -> None:
+    try:
+        print(f"{prefix}\n{json.dumps(payload, indent=2, ensure_ascii=False)}")
+    except Exception:
+        try:
+            print(f"{prefix}\n{payload}")
+        except Exception:
+            pass
+
+
+def _config(request: web.Request) -> Dict[str, Any]:
+    return request.app[FLASK_APP_KEY].config
+
+
+def _json_response(request: web.Request, body: Any, status: int = 200) -> web.Response:
+    resp = web.json_response(body, status=status)
+    resp.headers.update(build_cors_headers(request.headers))
+    return resp
+
+
+def _admission_controlled(error_style: str = "openai"):
+    """Async counterpart of ``admission.admission_controlled``; the slot is held until the handler returns."""
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request: web.Request) -> web.StreamResponse:
+            controller = request.app[FLASK_APP_KEY].extensions.get("chatmock_admission")
+            if not isinstance(controller, AdmissionController):
+                return await handler(request)
+            try:
+                ticket = await controller.acquire_async()
+            except AdmissionRejected as exc:
+                resp = _json_response(request, admission_error_body(exc, error_style), exc.status_code)
+                resp.headers["Retry-After"] = str(exc.retry_after)
+                return resp
+            try:
+                return await handler(request)
+            finally:
+                ticket.release()
+
+        return wrapper
+
+    return decorator
+
+
+def _stalled_response(request: web.Request, exc: UpstreamStalled | OutputTooLarge, error_style: str = "openai") -> web.Response:
+    body: Dict[str, Any] = {"error": str(exc)} if error_style == "ollama" else {"error": exc.error_payload()}
+    return _json_response(request, body, exc.status_code)
+
+
+class _GuardedAsyncUpstream:
+    """Async counterpart of ``timeouts.GuardedUpstream`` around an ``aiohttp.ClientResponse``."""
+
+    def __init__(
+        self,
+        upstream: aiohttp.ClientResponse,
+        chunks: AsyncIterator[bytes],
+        first_chunk: bytes,
+        idle: float | None,
+    ) -> None:
+        self.upstream = upstream
+        self.content = self
+        self.bytes_read = len(first_chunk)
+        self._chunks = chunks
+        self._first_chunk = first_chunk
+        self._idle = idle
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.upstream, name)
+
+    async def iter_any(self) -> AsyncIterator[bytes]:
+        first, self._first_chunk = self._first_chunk, b""
+        if first:
+            yield first
+        while True:
+            try:
+                chunk = await asyncio.wait_for(self._chunks.__anext__(), self._idle)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError as exc:
+                raise stalled("idle", self._idle) from exc
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+async def _await_first_chunk(upstream: aiohttp.ClientResponse, timeouts: UpstreamTimeouts) -> _GuardedAsyncUpstream:
+    chunks = upstream.content.iter_any().__aiter__()
+    try:
+        first_chunk = await asyncio.wait_for(chunks.__anext__(), timeouts.first_event_limit)
+    except StopAsyncIteration:
+        first_chunk = b""
+    except BaseException as exc:
+        upstream.release()
+        if isinstance(exc, asyncio.TimeoutError) and not isinstance(exc, aiohttp.ClientError):
+            raise stalled("first_event", timeouts.first_event_limit) from exc
+        raise
+    return _GuardedAsyncUpstream(upstream, chunks, first_chunk, timeouts.idle_limit)
+
+
+async def _read_json_body(request: web.Request) -> Tuple[bytes, Any]:
+    raw = await request.read()
+    return raw, (loads(raw) if raw else {})
+
+
+async def _post_for_account(
+    request: web.Request,
+    account: UpstreamAccount | None,
+    body: bytes,
+    session_id: str,
+    stream: bool,
+    timeouts: UpstreamTimeouts,
+) -> Tuple[aiohttp.ClientResponse | None, web.Response | None]:
+    # Near expiry this refreshes the token, which may wait on the token
+    # endpoint or on another node's refresh lease; keep it off the loop.
+    access_token, account_id = await asyncio.to_thread(get_effective_chatgpt_auth, account=account)
+    if not access_token or not account_id:
+        return None, _json_response(request, {"error": {"message": MISSING_CREDENTIALS_MESSAGE}}, 401)
+
+    accept = "text/event-stream" if stream else "application/json"
+    client = request.app[CLIENT_SESSION_KEY]
+    # Reads are bounded per chunk by ``_GuardedAsyncUpstream``; aiohttp's own
+    # ``sock_read`` would cut off legitimately quiet streams at the same limit.
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeouts.connect_limit)
+
+    async def _post(token: str, acct: str) -> aiohttp.ClientResponse:
+        try:
+            return await asyncio.wait_for(
+                client.post(
+                    CHATGPT_RESPONSES_URL,
+                    data=body,
+                    headers=build_upstream_headers(token, acct, session_id, accept=accept),
+                    timeout=client_timeout,
+                ),
+                timeouts.first_event_limit,
+            )
+        except aiohttp.ClientError:
+            raise
+        except asyncio.TimeoutError as exc:
+            raise stalled("first_event", timeouts.first_event_limit) from exc
+
+    try:
+        upstream = await _post(access_token, account_id)
+    except aiohttp.ClientError as e:
+        return None, _json_response(request, {"error": {"message": f"Upstream ChatGPT request failed: {e}"}}, 502)
+
+    if upstream.status == 401:
+        # A forced refresh may block on the token endpoint; keep it off the loop.
+        refreshed_access_token, refreshed_account_id = await asyncio.to_thread(
+            get_effective_chatgpt_auth,
+            force_refresh=True,
+            rejected_access_token=access_token,
+            account=account,
+        )
+        if refreshed_access_token and refreshed_account_id and refreshed_access_token != access_token:
+            upstream.release()
+            try:
+                upstream = await _post(refreshed_access_token, refreshed_account_id)
+            except aiohttp.ClientError as e:
+                return None, _json_response(
+                    request,
+                    {"error": {"message": f"Upstream ChatGPT request failed after token refresh: {e}"}},
+                    502,
+                )
+    return upstream, None
+
+
+async def start_async_upstream_raw_request(
+    request: web.Request,
+    responses_payload: Dict[str, Any],
+    *,
+    session_id: str | None = None,
+    stream: bool = True,
+) -> Tuple[aiohttp.ClientResponse | None, web.Response | None]:
+    """Async counterpart of ``upstream.start_upstream_raw_request``."""
+    effective_session_id = resolve_upstream_session_id(session_id, responses_payload)
+    verbose = bool(_config(request).get("VERBOSE"))
+    if verbose:
+        _log_json("OUTBOUND >> ChatGPT Responses API payload", responses_payload)
+    body = dumps(prepare_outbound_payload(responses_payload))
+
+    timeouts = current_upstream_timeouts()
+    pool = get_account_pool()
+    prefer = account_model_preference(responses_payload.get("model"))
+    account = pool.select(effective_session_id, prefer=prefer)
+    tried: list[str] = []
+    stalls = 0
+    while True:
+        try:
+            upstream, error_resp = await _post_for_account(
+                request, account, body, effective_session_id, stream, timeouts
+            )
+            if upstream is None:
+                return None, error_resp
+            if account is not None:
+                pool.record_response(account, upstream.headers, upstream.status)
+            if account is not None and upstream.status == 429:
+                tried.append(account.name)
+                next_account = pool.select(effective_session_id, exclude=tried, prefer=prefer)
+                if next_account is None:
+                    return upstream, None
+                if verbose:
+                    print(f"[accounts] {account.name} is rate limited; retrying on {next_account.name}")
+                upstream.release()
+                account = next_account
+                continue
+            if stream and upstream.status < 400:
+                upstream = await _await_first_chunk(upstream, timeouts)
+            return upstream, None
+        except UpstreamStalled as exc:
+            stalls += 1
+            if stalls > timeouts.stall_retries:
+                return None, _stalled_response(request, exc)
+            if verbose:
+                print(f"[upstream] {exc} Retrying ({stalls}/{timeouts.stall_retries}).")
+        except aiohttp.ClientError as e:
+            return None, _json_response(request, {"error": {"message": f"Upstream ChatGPT stream failed: {e}"}}, 502)
+
+
+async def _start_chat_upstream(
+    request: web.Request,
+    chat: NormalizedChatRequest,
+    *,
+    fallback: bool = False,
+) -> Tuple[aiohttp.ClientResponse | None, web.Response | None]:
+    # With a state backend this may wait on the network; keep it off the loop.
+    session_id = await asyncio.to_thread(
+        ensure_session_id, None, chat.input_items, extract_client_session_id(request.headers)
+    )
+    responses_payload = build_responses_payload(
+        chat.model,
+        chat.input_items,
+        session_id=session_id,
+        **chat.upstream_kwargs(fallback=fallback),
+    )
+    return await start_async_upstream_raw_request(request, responses_payload, session_id=session_id)
+
+
+async def _read_upstream_error(upstream: aiohttp.ClientResponse) -> str:
+    try:
+        content = await upstream.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        content = b""
+    finally:
+        upstream.release()
+    return upstream_error_message(content, content.decode("utf-8", errors="ignore"))
+
+
+def iter_upstream_events(
+    upstream: aiohttp.ClientResponse,
+    *,
+    vlog=None,
+    stop_at_done: bool = True,
+) -> AsyncIterator[Dict[str, Any] | None]:
+    """Parsed SSE ``data:`` events; yields ``None`` for ``[DONE]`` unless it ends the stream."""
+    return aiter_sse_json(upstream.content.iter_any(), vlog=vlog, stop_at_done=stop_at_done)
+
+
+def translate_upstream(
+    upstream: aiohttp.ClientResponse,
+    translator: Any,
+    *,
+    vlog=None,
+    stop_at_done: bool = True,
+) -> AsyncIterator[bytes]:
+    """Frames ``translator`` produces for the upstream stream, with held text flushed when upstream goes quiet."""
+    batches = aiter_sse_json_batches(upstream.content.iter_any(), vlog=vlog, stop_at_done=stop_at_done)
+    return atranslate_batches(batches, translator)
+
+
+async def _stream_out(
+    request: web.Request,
+    chunks: AsyncIterator[bytes | str],
+    *,
+    status: int,
+    content_type: str,
+    label: str,
+    upstream: Any = None,
+    extra_headers: Dict[str, str] | None = None,
+) -> web.StreamResponse:
+    verbose = bool(_config(request).get("VERBOSE"))
+    resp = web.StreamResponse(status=status, headers=extra_headers)
+    resp.content_type = content_type
+    resp.headers.update(build_cors_headers(request.headers))
+    await resp.prepare(request)
+    # Only a client hang-up counts as a cancellation, not a failing body.
+    cancelled = False
+    try:
+        async with contextlib.aclosing(chunks):
+            try:
+                async for chunk in chunks:
+                    data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                    if verbose:
+                        print(f"{label}\n{data.decode('utf-8', errors='replace')}")
+                    await resp.write(data)
+            except ConnectionResetError:
+                # Client went away; closing the generator releases the upstream.
+                cancelled = True
+                return resp
+        await resp.write_eof()
+    except asyncio.CancelledError:
+        # A hang-up while upstream is silent cancels this task (the server
+        # runs with ``handler_cancellation``).
+        cancelled = True
+        raise
+    finally:
+        record_stream_end(cancelled=cancelled, upstream_bytes=getattr(upstream, "bytes_read", 0))
+    return resp
+
+
+async def _chat_upstream_or_error(
+    request: web.Request,
+    chat: NormalizedChatRequest,
+    label: str,
+    *,
+    error_style: str = "openai",
+) -> Tuple[aiohttp.ClientResponse | None, web.Response | None]:
+    verbose = bool(_config(request).get("VERBOSE"))
+    upstream, error_resp = await _start_chat_upstream(request, chat)
+    if error_resp is not None:
+        return None, error_resp
+
+    await asyncio.to_thread(record_rate_limits_from_response, upstream)
+    if upstream.status < 400:
+        return upstream, None
+
+    status = upstream.status
+    upstream_message = await _read_upstream_error(upstream)
+    if chat.fallback_tools is not None:
+        if verbose:
+            print("[Passthrough] Upstream rejected tools; retrying without extra tools (args redacted)")
+        upstream2, err2 = await _start_chat_upstream(request, chat, fallback=True)
+        await asyncio.to_thread(record_rate_limits_from_response, upstream2)
+        if err2 is None and upstream2 is not None and upstream2.status < 400:
+            return upstream2, None
+        if upstream2 is not None:
+            status = upstream2.status
+            upstream2.release()
+        err: Dict[str, Any] = {"error": {"message": upstream_message, "code": "RESPONSES_TOOLS_REJECTED"}}
+    elif error_style == "ollama":
+        err = {"error": upstream_message}
+    else:
+        err = {"error": {"message": upstream_message}}
+    if verbose:
+        _log_json(label, err)
+    return None, _json_response(request, err, status)
+
+
+def _chat_request_error(request: web.Request, label: str, exc: ChatRequestError, *, error_style: str = "openai"):
+    if error_style == "ollama":
+        err: Dict[str, Any] = {"error": str(exc)}
+    else:
+        err = {"error": {"message": str(exc)}}
+        if exc.code:
+            err["error"]["code"] = exc.code
+    if bool(_config(request).get("VERBOSE")):
+        _log_json(label, err)
+    return _json_response(request, err, exc.status_code)
+
+
+async def _accumulate(upstream: aiohttp.ClientResponse, acc) -> None:
+    try:
+        async for evt in iter_upstream_events(upstream):
+            if acc.feed(evt):
+                break
+    finally:
+        upstream.release()
+
+
+async def health(request: web.Request) -> web.StreamResponse:
+    return _json_response(request, {"status": "ok"})
+
+
+async def stats(request: web.Request) -> web.StreamResponse:
+    return _json_response(request, {**metrics_snapshot(), **session_store_stats(), **state_backend_stats()})
+
+
+async def preflight(request: web.Request) -> web.StreamResponse:
+    resp = web.Response(status=200)
+    resp.headers.update(build_cors_headers(request.headers))
+    return resp
+
+
+async def list_models(request: web.Request) -> web.StreamResponse:
+    return _json_response(request, openai_models_payload(bool(_config(request).get("EXPOSE_REASONING_MODELS"))))
+
+
+async def ollama_version(request: web.Request) -> web.StreamResponse:
+    return _json_response(request, ollama_version_payload(_config(request)))
+
+
+async def ollama_tags(request: web.Request) -> web.StreamResponse:
+    return _json_response(request, ollama_tags_payload(bool(_config(request).get("EXPOSE_REASONING_MODELS"))))
+
+
+async def ollama_show(request: web.Request) -> web.StreamResponse:
+    try:
+        _, payload = await _read_json_body(request)
+    except ValueError:
+        payload = {}
+    model = payload.get("model") if isinstance(payload, dict) else None
+    if not isinstance(model, str) or not model.strip():
+        return _json_response(request, {"error": "Model not found"}, 400)
+    return _json_response(request, OLLAMA_SHOW_RESPONSE)
+
+
+@_admission_controlled()
+async def chat_completions(request: web.Request) -> web.StreamResponse:
+    config = _config(request)
+    verbose = bool(config.get("VERBOSE"))
+    label = "OUT POST /v1/chat/completions"
+    try:
+        raw, payload = await _read_json_body(request)
+    except ValueError:
+        return _json_response(request, {"error": {"message": "Invalid JSON body"}}, 400)
+    if verbose:
+        print("IN POST /v1/chat/completions\n" + raw.decode("utf-8", errors="replace"))
+    try:
+        chat = normalize_chat_completions_payload(payload, config=config)
+    except ChatRequestError as exc:
+        return _chat_request_error(request, label, exc)
+
+    upstream, error_resp = await _chat_upstream_or_error(request, chat, label)
+    if error_resp is not None:
+        return error_resp
+
+    created = int(time.time())
+    model_out = chat.requested_model or chat.model
+    reasoning_compat = config.get("REASONING_COMPAT", "think-tags")
+    if chat.stream:
+        vlog = print if bool(config.get("VERBOSE_OBFUSCATION")) else None
+        translator = ChatCompletionStreamTranslator(
+            model_out,
+            created,
+            reasoning_compat=reasoning_compat,
+            include_usage=chat.include_usage,
+            vlog=vlog,
+            coalesce=current_coalesce_settings(),
+        )
+
+        async def _chunks() -> AsyncIterator[bytes]:
+            try:
+                async for chunk in translate_upstream(upstream, translator, vlog=vlog):
+                    yield chunk
+            except UpstreamStalled as e:
+                if vlog:
+                    vlog(f"Stream stalled: {e}")
+                for chunk in translator.flush() + stalled_stream_chunks(e):
+                    yield chunk
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if vlog:
+                    vlog(f"Stream interrupted: {e}")
+                for chunk in translator.flush() + interrupted_stream_chunks(e):
+                    yield chunk
+            finally:
+                upstream.release()
+
+        return await _stream_out(
+            request,
+            _chunks(),
+            status=upstream.status,
+            content_type="text/event-stream",
+            label="STREAM OUT /v1/chat/completions",
+            upstream=upstream,
+            extra_headers=SSE_HEADERS,
+        )
+
+    acc = ChatCompletionAccumulator(max_output_bytes=config.get("MAX_OUTPUT_BYTES", 0))
+    try:
+        await _accumulate(upstream, acc)
+    except (UpstreamStalled, OutputTooLarge) as exc:
+        return _stalled_response(request, exc)
+    if acc.error_message:
+        return _json_response(request, {"error": {"message": acc.error_message}}, 502)
+    completion = build_chat_completion(acc, model_out, created, reasoning_compat)
+    if verbose:
+        _log_json(label, completion)
+    return _json_response(request, completion, upstream.status)
+
+
+@_admission_controlled()
+async def completions(request: web.Request) -> web.StreamResponse:
+    config = _config(request)
+    verbose = bool(config.get("VERBOSE"))
+    label = "OUT POST /v1/completions"
+    try:
+        raw, payload = await _read_json_body(request)
+    except ValueError:
+        return _json_response(request, {"error": {"message": "Invalid JSON body"}}, 400)
+    if verbose:
+        print("IN POST /v1/completions\n" + raw.decode("utf-8", errors="replace"))
+    try:
+        completion_req = normalize_completions_payload(payload, config=config)
+    except ChatRequestError as exc:
+        return _chat_request_error(request, label, exc)
+
+    upstream, error_resp = await _chat_upstream_or_error(request, completion_req, label)
+    if error_resp is not None:
+        return error_resp
+
+    created = int(time.time())
+    model_out = completion_req.requested_model or completion_req.model
+    if completion_req.stream:
+        vlog = print if bool(config.get("VERBOSE_OBFUSCATION")) else None
+        translator = TextCompletionStreamTranslator(
+            model_out,
+            created,
+            include_usage=completion_req.include_usage,
+            coalesce=current_coalesce_settings(),
+        )
+
+        async def _chunks() -> AsyncIterator[bytes]:
+            try:
+                async for chunk in translate_upstream(upstream, translator, vlog=vlog, stop_at_done=False):
+                    yield chunk
+            except UpstreamStalled as e:
+                for chunk in translator.flush() + stalled_stream_chunks(e):
+                    yield chunk
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if vlog:
+                    vlog(f"Stream interrupted: {e}")
+                for chunk in translator.flush() + interrupted_stream_chunks(e):
+                    yield chunk
+            finally:
+                upstream.release()
+
+        return await _stream_out(
+            request,
+            _chunks(),
+            status=upstream.status,
+            content_type="text/event-stream",
+            label="STREAM OUT /v1/completions",
+            upstream=upstream,
+            extra_headers=SSE_HEADERS,
+        )
+
+    acc = ChatCompletionAccumulator(response_id="cmpl", max_output_bytes=config.get("MAX_OUTPUT_BYTES", 0))
+    try:
+        await _accumulate(upstream, acc)
+    except (UpstreamStalled, OutputTooLarge) as exc:
+        return _stalled_response(request, exc)
+    completion = build_text_completion(acc, model_out, created)
+    if verbose:
+        _log_json(label, completion)
+    return _json_response(request, completion, upstream.status)
+
+
+@_admission_controlled("ollama")
+async def ollama_chat(request: web.Request) -> web.StreamResponse:
+    config = _config(request)
+    verbose = bool(config.get("VERBOSE"))
+    label = "OUT POST /api/chat"
+    try:
+        raw, payload = await _read_json_body(request)
+    except ValueError:
+        return _json_response(request, {"error": "Invalid JSON body"}, 400)
+    if verbose:
+        print("IN POST /api/chat\n" + raw.decode("utf-8", errors="replace"))
+    try:
+        chat = normalize_ollama_chat_payload(payload, config=config)
+    except ChatRequestError as exc:
+        return _chat_request_error(request, label, exc, error_style="ollama")
+
+    upstream, error_resp = await _chat_upstream_or_error(request, chat, label, error_style="ollama")
+    if error_resp is not None:
+        return error_resp
+
+    created_at = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    model = chat.requested_model
+    model_out = model if isinstance(model, str) and model.strip() else chat.model
+    reasoning_compat = config.get("REASONING_COMPAT", "think-tags")
+    if chat.stream:
+        translator = OllamaChatStreamTranslator(
+            model_out,
+            created_at,
+            reasoning_compat=reasoning_compat,
+            coalesce=current_coalesce_settings(),
+        )
+
+        async def _lines() -> AsyncIterator[bytes]:
+            try:
+                async for line in translate_upstream(upstream, translator):
+                    yield line
+            except UpstreamStalled as e:
+                for line in translator.flush():
+                    yield line
+                yield dumps({"error": str(e)}) + b"\n"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                for line in translator.flush():
+                    yield line
+                yield dumps({"error": f"Upstream stream interrupted: {e}"}) + b"\n"
+            finally:
+                upstream.release()
+            for line in translator.close():
+                yield line
+
+        return await _stream_out(
+            request,
+            _lines(),
+            status=200,
+            content_type="application/x-ndjson",
+            label="STREAM OUT /api/chat",
+            upstream=upstream,
+        )
+
+    acc = ChatCompletionAccumulator(max_output_bytes=config.get("MAX_OUTPUT_BYTES", 0))
+    try:
+        await _accumulate(upstream, acc)
+    except (UpstreamStalled, OutputTooLarge) as exc:
+        return _stalled_response(request, exc, "ollama")
+    out_json = build_ollama_chat_response(acc, chat.model, created_at, reasoning_compat)
+    if verbose:
+        _log_json(label, out_json)
+    return _json_response(request, out_json)
+
+
+@_admission_controlled()
+async def responses_create(request: web.Request) -> web.StreamResponse:
+    config = _config(request)
+    verbose = bool(config.get("VERBOSE"))
+    label = "OUT POST /v1/responses"
+    try:
+        raw, payload = await _read_json_body(request)
+    except ValueError:
+        return _json_response(request, {"error": {"message": "Invalid JSON body"}}, 400)
+    if verbose:
+        print("IN POST /v1/responses\n" + raw.decode("utf-8", errors="replace"))
+    if not isinstance(payload, dict):
+        return _json_response(request, {"error": {"message": "Request body must be a JSON object"}}, 400)
+
+    try:
+        normalized = await asyncio.to_thread(
+            normalize_responses_payload,
+            payload,
+            config=config,
+            client_session_id=extract_client_session_id(request.headers),
+        )
+    except ResponsesRequestError as exc:
+        err: Dict[str, Any] = {"error": {"message": str(exc)}}
+        if exc.code:
+            err["error"]["code"] = exc.code
+        if verbose:
+            _log_json(label, err)
+        return _json_response(request, err, exc.status_code)
+
+    if normalized.service_tier_resolution.warning_message and verbose:
+        print(f"[FastMode] {normalized.service_tier_resolution.warning_message}")
+
+    session_id = normalized.session_id
+    prepared = await asyncio.to_thread(
+        prepare_responses_request_for_session, session_id, normalized.payload, allow_previous_response_id=False
+    )
+    stream_req = bool(prepared.payload.get("stream", False))
+    upstream_payload = dict(prepared.payload)
+    upstream_payload["stream"] = True
+    upstream, error_resp = await start_async_upstream_raw_request(
+        request,
+        upstream_payload,
+        session_id=session_id,
+        stream=True,
+    )
+    if error_resp is not None:
+        clear_responses_reuse_state(session_id)
+        return error_resp
+
+    await asyncio.to_thread(record_rate_limits_from_response, upstream)
+
+    if upstream.status >= 400:
+        try:
+            err_body = loads(await upstream.read() or b"null")
+        except (ValueError, aiohttp.ClientError, asyncio.TimeoutError):
+            err_body = None
+        finally:
+            upstream.release()
+        if not isinstance(err_body, dict):
+            err_body = {"error": {"message": "Upstream error"}}
+        clear_responses_reuse_state(session_id)
+        if verbose:
+            _log_json(label, err_body)
+        return _json_response(request, err_body, upstream.status)
+
+    def _on_event(evt: Dict[str, Any]) -> None:
+        note_responses_stream_event(session_id, evt)
+
+    if stream_req:
+        lean = current_lean_settings().for_request(normalized.lean_stream)
+
+        async def _chunks() -> AsyncIterator[bytes]:
+            picker = SSEEventFilter(SESSION_EVENT_TYPES)
+            trim = LeanStreamFilter(lean) if lean.enabled else None
+            try:
+                async for chunk in upstream.content.iter_any():
+                    for evt in picker.feed(chunk):
+                        try:
+                            _on_event(evt)
+                        except Exception:
+                            pass
+                    if trim is not None:
+                        chunk = trim.feed(chunk)
+                        if not chunk:
+                            continue
+                    yield chunk
+                if trim is not None:
+                    tail = trim.close()
+                    if tail:
+                        yield tail
+            except UpstreamStalled as e:
+                evt = stall_error_event(e)
+                _on_event(evt)
+                yield encode_stall_error_event(evt)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                evt = interrupted_error_event(e)
+                _on_event(evt)
+                yield encode_stall_error_event(evt)
+            finally:
+                upstream.release()
+
+        return await _stream_out(
+            request,
+            _chunks(),
+            status=upstream.status,
+            content_type="text/event-stream",
+            label="STREAM OUT /v1/responses",
+            upstream=upstream,
+            extra_headers=SSE_HEADERS,
+        )
+
+    if "application/json" in upstream.headers.get("Content-Type", "").lower():
+        try:
+            body = loads(await upstream.read())
+        except (ValueError, aiohttp.ClientError, asyncio.TimeoutError):
+            body = None
+        finally:
+            upstream.release()
+        if isinstance(body, dict):
+            note_responses_final_response(session_id, body)
+            if verbose:
+                _log_json(label, body)
+            return _json_response(request, body, upstream.status)
+
+    aggregator = ResponsesStreamAggregator(on_event=_on_event)
+    try:
+        await _accumulate(upstream, aggregator)
+    except UpstreamStalled as exc:
+        clear_responses_reuse_state(session_id)
+        return _stalled_response(request, exc)
+    if aggregator.error is not None:
+        clear_responses_reuse_state(session_id)
+        if verbose:
+            _log_json(label, aggregator.error)
+        return _json_response(request, aggregator.error, 502)
+    if aggregator.response is None:
+        clear_responses_reuse_state(session_id)
+        err = {"error": {"message": "Upstream response stream did not contain a completed response object"}}
+        if verbose:
+            _log_json(label, err)
+        return _json_response(request, err, 502)
+    if verbose:
+        _log_json(label, aggregator.response)
+    return _json_response(request, aggregator.response, upstream.status)
+
+
+async def connect_upstream_websocket(
+    client: aiohttp.ClientSession,
+    url: str,
+    headers: Dict[str, str],
+    *,
+    open_timeout: float | None = DEFAULT_CONNECT_TIMEOUT_SECONDS,
+):
+    return await asyncio.wait_for(
+        client.ws_connect(url, headers=headers, ssl=build_websocket_ssl_context()),
+        open_timeout,
+    )
+
+
+async def responses_websocket(request: web.Request) -> web.StreamResponse:
+    config = _config(request)
+    verbose = bool(config.get("VERBOSE"))
+    timeouts = current_upstream_timeouts()
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    upstream_ws = None
+    upstream_headers: Dict[str, str] = {}
+    upstream_session_id: str | None = None
+    # See the threaded handler: identifies the upstream socket to the session store.
+    upstream_token: object | None = None
+    active_session_id: str | None = None
+    turn_payload: Dict[str, Any] | None = None
+    outbound_text = ""
+    trim: LeanStreamFilter | None = None
+    # Each response.create holds an admission slot until its terminal event.
+    admission = request.app[FLASK_APP_KEY].extensions.get("chatmock_admission")
+    ticket: AdmissionTicket | None = None
+
+    async def _send_error(message: str, *, status_code: int = 400, code: str | None = None) -> None:
+        evt = error_event(message, status_code=status_code, code=code)
+        if verbose:
+            _log_json("STREAM OUT WS /v1/responses (error)", evt)
+        try:
+            await ws.send_str(dumps_text(evt))
+        except Exception:
+            pass
+
+    async def _close_upstream() -> None:
+        if upstream_ws is not None:
+            try:
+                await upstream_ws.close()
+            except Exception:
+                pass
+
+    async def _reconnect_and_resend() -> bool:
+        """Send this turn again on a new upstream socket, in full; ``False`` after reporting a failure."""
+        nonlocal upstream_ws, upstream_token, outbound_text
+        text = outbound_text
+        token = object()
+        if turn_payload is not None and active_session_id:
+            prepared = await asyncio.to_thread(
+                prepare_responses_request_for_session,
+                active_session_id,
+                turn_payload,
+                allow_previous_response_id=False,
+                connection=token,
+            )
+            text = dumps_text(prepared.payload)
+        try:
+            upstream_ws = await connect_upstream_websocket(
+                request.app[CLIENT_SESSION_KEY],
+                build_upstream_websocket_url(),
+                upstream_headers,
+                open_timeout=timeouts.connect_limit,
+            )
+            await upstream_ws.send_str(text)
+        except Exception as reconnect_exc:
+            upstream_ws = None
+            if active_session_id:
+                clear_responses_reuse_state(active_session_id)
+            await _send_error(f"Upstream websocket connection failed: {reconnect_exc}", status_code=502)
+            return False
+        upstream_token = token
+        outbound_text = text
+        return True
+
+    try:
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                incoming_text = msg.data
+            elif msg.type == aiohttp.WSMsgType.BINARY:
+                incoming_text = msg.data.decode("utf-8", errors="ignore")
+            else:
+                break
+            if verbose:
+                print("IN WS /v1/responses\n" + incoming_text)
+
+            try:
+                payload = loads(incoming_text)
+            except ValueError:
+                await _send_error("Websocket frames must be valid JSON objects.", status_code=400)
+                break
+            if not isinstance(payload, dict):
+                await _send_error("Websocket frames must be JSON objects.", status_code=400)
+                break
+
+            client_session_id = extract_client_session_id(request.headers)
+            outbound_text = incoming_text
+            outbound_payload = payload
+            session_id = upstream_session_id
+            connection = upstream_token
+            turn_payload = None
+            reused = False
+
+            if payload.get("type") == "response.create":
+                try:
+                    normalized = await asyncio.to_thread(
+                        normalize_responses_payload,
+                        payload,
+                        config=config,
+                        client_session_id=client_session_id,
+                    )
+                except ResponsesRequestError as exc:
+                    await _send_error(str(exc), status_code=exc.status_code, code=exc.code)
+                    continue
+                if isinstance(admission, AdmissionController):
+                    try:
+                        ticket = await admission.acquire_async()
+                    except AdmissionRejected as exc:
+                        error = admission_error_body(exc)["error"]
+                        await _send_error(error["message"], status_code=exc.status_code, code=error["code"])
+                        continue
+
+                if normalized.service_tier_resolution.warning_message and verbose:
+                    print(f"[FastMode] {normalized.service_tier_resolution.warning_message}")
+                if upstream_ws is None or normalized.session_id != upstream_session_id:
+                    connection = object()
+                prepared = await asyncio.to_thread(
+                    prepare_responses_request_for_session,
+                    normalized.session_id,
+                    normalized.payload,
+                    allow_previous_response_id=True,
+                    connection=connection,
+                )
+                turn_payload = normalized.payload
+                reused = prepared.reused
+                outbound_payload = prepared.payload
+                outbound_text = dumps_text(outbound_payload)
+                session_id = normalized.session_id
+                active_session_id = normalized.session_id
+                lean = current_lean_settings().for_request(normalized.lean_stream)
+                trim = LeanStreamFilter(lean) if lean.enabled else None
+                if verbose:
+                    _log_json("OUTBOUND >> ChatGPT Responses WS payload", prepared.payload)
+            elif upstream_ws is None:
+                await _send_error("The first websocket message must be a response.create request.", status_code=400)
+                break
+
+            if upstream_ws is None or (session_id and session_id != upstream_session_id):
+                account = get_account_pool().select(
+                    session_id or client_session_id,
+                    prefer=account_model_preference(payload.get("model")),
+                )
+                access_token, account_id = await asyncio.to_thread(get_effective_chatgpt_auth, account=account)
+                if not access_token or not account_id:
+                    if session_id:
+                        clear_responses_reuse_state(session_id)
+                    await _send_error(MISSING_CREDENTIALS_MESSAGE, status_code=401)
+                    break
+
+                await _close_upstream()
+                effective_session_id = session_id or client_session_id or ""
+                upstream_headers = build_upstream_headers(
+                    access_token,
+                    account_id,
+                    effective_session_id,
+                    accept="application/json",
+                )
+                try:
+                    upstream_ws = await connect_upstream_websocket(
+                        request.app[CLIENT_SESSION_KEY],
+                        build_upstream_websocket_url(),
+                        upstream_headers,
+                        open_timeout=timeouts.connect_limit,
+                    )
+                except Exception as exc:
+                    upstream_ws = None
+                    if session_id:
+                        clear_responses_reuse_state(session_id)
+                    await _send_error(f"Upstream websocket connection failed: {exc}", status_code=502)
+                    break
+                upstream_session_id = effective_session_id
+                upstream_token = connection
+
+            await upstream_ws.send_str(outbound_text)
+            # See the threaded handler: chained responses cannot move sockets.
+            retries_left = 0 if outbound_payload.get("previous_response_id") else timeouts.stall_retries
+            forwarded = False
+
+            while True:
+                limit = timeouts.idle_limit if forwarded else timeouts.first_event_limit
+                try:
+                    upstream_msg = await upstream_ws.receive(timeout=limit)
+                except asyncio.TimeoutError:
+                    exc = stalled("idle" if forwarded else "first_event", limit)
+                    await _close_upstream()
+                    upstream_ws = None
+                    if not forwarded and retries_left > 0:
+                        retries_left -= 1
+                        if verbose:
+                            print(f"[upstream] {exc} Reconnecting websocket.")
+                        if not await _reconnect_and_resend():
+                            return ws
+                        continue
+                    if active_session_id:
+                        clear_responses_reuse_state(active_session_id)
+                    await _send_error(str(exc), status_code=504, code="upstream_timeout")
+                    return ws
+                if upstream_msg.type == aiohttp.WSMsgType.TEXT:
+                    upstream_message = upstream_msg.data
+                elif upstream_msg.type == aiohttp.WSMsgType.BINARY:
+                    upstream_message = upstream_msg.data.decode("utf-8", errors="ignore")
+                else:
+                    if active_session_id:
+                        clear_responses_reuse_state(active_session_id)
+                    await _send_error("Upstream websocket closed unexpectedly.", status_code=502)
+                    return ws
+                if verbose:
+                    print("STREAM OUT WS /v1/responses\n" + upstream_message)
+                parsed = None
+                if wants_event(upstream_message, SESSION_EVENT_TYPES):
+                    try:
+                        parsed = loads(upstream_message)
+                    except ValueError:
+                        parsed = None
+                if reused and not forwarded and rejects_previous_response(parsed):
+                    # Upstream no longer has the response this turn continued
+                    # from; send the whole conversation once.
+                    reused = False
+                    await _close_upstream()
+                    upstream_ws = None
+                    if verbose:
+                        print("[upstream] previous_response_id rejected. Resending the full input.")
+                    if not await _reconnect_and_resend():
+                        return ws
+                    continue
+
+                outgoing = upstream_message if trim is None else trim.message(upstream_message)
+                if outgoing is not None:
+                    await ws.send_str(outgoing)
+                forwarded = True
+
+                if isinstance(parsed, dict) and active_session_id:
+                    note_responses_stream_event(active_session_id, parsed)
+                if is_terminal_event(parsed):
+                    if isinstance(parsed, dict) and parsed.get("type") in ("response.failed", "error"):
+                        await _close_upstream()
+                        upstream_ws = None
+                        upstream_session_id = None
+                    break
+            if ticket is not None:
+                ticket.release()
+    finally:
+        if ticket is not None:
+            ticket.release()
+        await _close_upstream()
+        await ws.close()
+    return ws
+
+
+@web.middleware
+async def _flask_app_context(request: web.Request, handler):
+    # Model resolution and the catalog look up the Flask app through
+    # ``current_app``; each handler runs in its own task, so the pushed
+    # context is scoped to this request.
+    with request.app[FLASK_APP_KEY].app_context():
+        return await handler(request)
+
+
+async def _client_session_ctx(app: web.Application):
+    app[CLIENT_SESSION_KEY] = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=0, ttl_dns_cache=300),
+        cookie_jar=aiohttp.DummyCookieJar(),
+    )
+    yield
+    await app[CLIENT_SESSION_KEY].close()
+
+
+def create_async_app(**app_kwargs: Any) -> web.Application:
+    """aiohttp application serving the same routes as ``create_app``.
+
+    Accepts the same keyword arguments as ``create_app``; the Flask app it
+    builds supplies the config and model catalog shared by both engines.
+    """
+    flask_app = create_app(**app_kwargs)
+    # Flask applies no body limit; image-bearing chat requests easily exceed
+    # aiohttp's 1 MiB default.
+    app = web.Application(middlewares=[_flask_app_context], client_max_size=0)
+    app[FLASK_APP_KEY] = flask_app
+    app.cleanup_ctx.append(_client_session_ctx)
+
+    app.router.add_get("/", health)
+    app.router.add_get("/health", health)
+    app.router.add_get("/stats", stats)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/completions", completions)
+    app.router.add_post("/v1/responses", responses_create)
+    app.router.add_get("/v1/responses", responses_websocket)
+    app.router.add_get("/v1/models", list_models)
+    app.router.add_post("/api/chat", ollama_chat)
+    app.router.add_get("/api/version", ollama_version)
+    app.router.add_get("/api/tags", ollama_tags)
+    app.router.add_post("/api/show", ollama_show)
+    app.router.add_route("OPTIONS", "/{tail:.*}", preflight)
+    return app
+
+
+def run_async_server(host: str, port: int, **app_kwargs: Any) -> None:
+    # Cancel handlers as soon as their client disconnects so abandoned
+    # streams release their upstream connection immediately.
+    web.run_app(create_async_app(**app_kwargs), host=host, port=port, handler_cancellation=True)
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from .fast_mode import resolve_service_tier
+from .model_registry import normalize_model_name
+from .reasoning import (
+    allowed_efforts_for_model,
+    apply_reasoning_to_message,
+    build_reasoning_param,
+    extract_reasoning_from_model_name,
+)
+from .transform import convert_ollama_messages, normalize_ollama_tools
+from .translate import OLLAMA_FAKE_EVAL, ChatCompletionAccumulator
+from .utils import convert_chat_messages_to_responses_input, convert_tools_chat_to_responses
+
+
+MAX_RESPONSES_TOOLS_BYTES = 32768
+
+
+@dataclass(frozen=True)
+class ChatRequestError(Exception):
+    message: str
+    status_code: int = 400
+    code: str | None = None
+
+    def __str__(self) -> str:
+        return self.message
+
+
+@dataclass(frozen=True)
+class NormalizedChatRequest:
+    requested_model: str | None
+    model: str
+    input_items: List[Dict[str, Any]]
+    stream: bool
+    include_usage: bool = False
+    tools: List[Dict[str, Any]] | None = None
+    tool_choice: Any = "auto"
+    parallel_tool_calls: bool = False
+    reasoning_param: Dict[str, Any] | None = None
+    service_tier: str | None = None
+    service_tier_warning: str | None = None
+    # Tools and tool_choice to retry with when upstream rejects the
+    # passthrough ``responses_tools``; ``None`` when none were added.
+    fallback_tools: List[Dict[str, Any]] | None = None
+    fallback_tool_choice: Any = "auto"
+
+    def upstream_kwargs(self, *, fallback: bool = False) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {
+            "reasoning_param": self.reasoning_param,
+            "service_tier": self.service_tier,
+        }
+        if self.tools is not None:
+            kwargs["tools"] = self.fallback_tools if fallback else self.tools
+            kwargs["tool_choice"] = self.fallback_tool_choice if fallback else self.tool_choice
+            kwargs["parallel_tool_calls"] = self.parallel_tool_calls
+        return kwargs
+
+
+def _move_system_message_to_user(messages: List[Any]) -> None:
+    sys_idx = next((i for i, m in enumerate(messages) if isinstance(m, dict) and m.get("role") == "system"), None)
+    if isinstance(sys_idx, int):
+        sys_msg = messages.pop(sys_idx)
+        content = sys_msg.get("content") if isinstance(sys_msg, dict) else ""
+        messages.insert(0, {"role": "user", "content": content})
+
+
+def _passthrough_responses_tools(
+    payload: Dict[str, Any],
+    *,
+    config: Dict[str, Any],
+    unsupported_code: str | None,
+    too_large_code: str | None,
+) -> List[Dict[str, Any]]:
+    responses_tools_payload = payload.get("responses_tools") if isinstance(payload.get("responses_tools"), list) else []
+    extra_tools: List[Dict[str, Any]] = []
+    for tool in responses_tools_payload:
+        if not (isinstance(tool, dict) and isinstance(tool.get("type"), str)):
+            continue
+        if tool.get("type") not in ("web_search", "web_search_preview"):
+            raise ChatRequestError(
+                "Only web_search/web_search_preview are supported in responses_tools",
+                code=unsupported_code,
+            )
+        extra_tools.append(tool)
+
+    if not extra_tools and bool(config.get("DEFAULT_WEB_SEARCH")):
+        responses_tool_choice = payload.get("responses_tool_choice")
+        if not (isinstance(responses_tool_choice, str) and responses_tool_choice == "none"):
+            extra_tools = [{"type": "web_search"}]
+
+    if extra_tools:
+        try:
+            size = len(json.dumps(extra_tools))
+        except Exception:
+            size = 0
+        if size > MAX_RESPONSES_TOOLS_BYTES:
+            raise ChatRequestError("responses_tools too large", code=too_large_code)
+    return extra_tools
+
+
+def _resolve_service_tier(model: str, payload: Dict[str, Any], config: Dict[str, Any]):
+    resolution = resolve_service_tier(
+        model,
+        request_fast_mode=payload.get("fast_mode"),
+        request_service_tier=payload.get("service_tier"),
+        server_fast_mode=bool(config.get("FAST_MODE")),
+    )
+    if resolution.error_message:
+        raise ChatRequestError(resolution.error_message)
+    return resolution
+
+
+def _include_usage(payload: Dict[str, Any]) -> bool:
+    stream_options = payload.get("stream_options") if isinstance(payload.get("stream_options"), dict) else {}
+    return bool(stream_options.get("include_usage", False))
+
+
+def normalize_chat_completions_payload(
+    payload: Dict[str, Any],
+    *,
+    config: Dict[str, Any],
+) -> NormalizedChatRequest:
+    if not isinstance(payload, dict):
+        raise ChatRequestError("Request body must be a JSON object")
+    requested_model = payload.get("model")
+    model = normalize_model_name(requested_model, config.get("DEBUG_MODEL"))
+    messages = payload.get("messages")
+    if messages is None and isinstance(payload.get("prompt"), str):
+        messages = [{"role": "user", "content": payload.get("prompt") or ""}]
+    if messages is None and isinstance(payload.get("input"), str):
+        messages = [{"role": "user", "content": payload.get("input") or ""}]
+    if messages is None:
+        messages = []
+    if not isinstance(messages, list):
+        raise ChatRequestError("Request must include messages: []")
+    _move_system_message_to_user(messages)
+
+    tools_responses = convert_tools_chat_to_responses(payload.get("tools"))
+    tool_choice = payload.get("tool_choice", "auto")
+    extra_tools = _passthrough_responses_tools(
+        payload,
+        config=config,
+        unsupported_code="RESPONSES_TOOL_UNSUPPORTED",
+        too_large_code="RESPONSES_TOOLS_TOO_LARGE",
+    )
+    fallback_tools = None
+    if extra_tools:
+        fallback_tools = convert_tools_chat_to_responses(payload.get("tools"))
+        tools_responses = (tools_responses or []) + extra_tools
+
+    responses_tool_choice = payload.get("responses_tool_choice")
+    if isinstance(responses_tool_choice, str) and responses_tool_choice in ("auto", "none"):
+        tool_choice = responses_tool_choice
+
+    input_items = convert_chat_messages_to_responses_input(messages)
+    if not input_items and isinstance(payload.get("prompt"), str) and payload.get("prompt").strip():
+        input_items = [
+            {"type": "message", "role": "user", "content": [{"type": "input_text", "text": payload.get("prompt")}]}
+        ]
+
+    model_reasoning = extract_reasoning_from_model_name(requested_model)
+    reasoning_overrides = payload.get("reasoning") if isinstance(payload.get("reasoning"), dict) else model_reasoning
+    reasoning_param = build_reasoning_param(
+        config.get("REASONING_EFFORT", "medium"),
+        config.get("REASONING_SUMMARY", "auto"),
+        reasoning_overrides,
+        allowed_efforts=allowed_efforts_for_model(model),
+    )
+    resolution = _resolve_service_tier(model, payload, config)
+
+    return NormalizedChatRequest(
+        requested_model=requested_model,
+        model=model,
+        input_items=input_items,
+        stream=bool(payload.get("stream")),
+        include_usage=_include_usage(payload),
+        tools=tools_responses,
+        tool_choice=tool_choice,
+        parallel_tool_calls=bool(payload.get("parallel_tool_calls", False)),
+        reasoning_param=reasoning_param,
+        service_tier=resolution.service_tier,
+        service_tier_warning=resolution.warning_message,
+        fallback_tools=fallback_tools,
+        fallback_tool_choice=payload.get("tool_choice", "auto"),
+    )
+
+
+def normalize_completions_payload(
+    payload: Dict[str, Any],
+    *,
+    config: Dict[str, Any],
+) -> NormalizedChatRequest:
+    if not isinstance(payload, dict):
+        raise ChatRequestError("Request body must be a JSON object")
+    requested_model = payload.get("model")
+    model = normalize_model_name(requested_model, config.get("DEBUG_MODEL"))
+    prompt = payload.get("prompt")
+    if isinstance(prompt, list):
+        prompt = "".join([p if isinstance(p, str) else "" for p in prompt])
+    if not isinstance(prompt, str):
+        prompt = payload.get("suffix") or ""
+
+    messages = [{"role": "user", "content": prompt or ""}]
+    input_items = convert_chat_messages_to_responses_input(messages)
+
+    model_reasoning = extract_reasoning_from_model_name(requested_model)
+    reasoning_overrides = payload.get("reasoning") if isinstance(payload.get("reasoning"), dict) else model_reasoning
+    reasoning_param = build_reasoning_param(
+        config.get("REASONING_EFFORT", "medium"),
+        config.get("REASONING_SUMMARY", "auto"),
+        reasoning_overrides,
+        allowed_efforts=allowed_efforts_for_model(model),
+    )
+    resolution = _resolve_service_tier(model, payload, config)
+
+    return NormalizedChatRequest(
+        requested_model=requested_model,
+        model=model,
+        input_items=input_items,
+        stream=bool(payload.get("stream", False)),
+        include_usage=_include_usage(payload),
+        reasoning_param=reasoning_param,
+        service_tier=resolution.service_tier,
+        service_tier_warning=resolution.warning_message,
+    )
+
+
+def normalize_ollama_chat_payload(
+    payload: Dict[str, Any],
+    *,
+    config: Dict[str, Any],
+) -> NormalizedChatRequest:
+    if not isinstance(payload, dict):
+        raise ChatRequestError("Invalid request format")
+    model = payload.get("model")
+    messages = convert_ollama_messages(
+        payload.get("messages"), payload.get("images") if isinstance(payload.get("images"), list) else None
+    )
+    _move_system_message_to_user(messages)
+    stream_req = payload.get("stream")
+    if stream_req is None:
+        stream_req = True
+    tools_req = payload.get("tools") if isinstance(payload.get("tools"), list) else []
+    tools_responses = convert_tools_chat_to_responses(normalize_ollama_tools(tools_req))
+    tool_choice = payload.get("tool_choice", "auto")
+
+    # Passthrough Responses API tools (web_search) via ChatMock extension fields
+    extra_tools = _passthrough_responses_tools(payload, config=config, unsupported_code=None, too_large_code=None)
+    fallback_tools = None
+    if extra_tools:
+        fallback_tools = convert_tools_chat_to_responses(normalize_ollama_tools(tools_req))
+        tools_responses = (tools_responses or []) + extra_tools
+
+    rtc = payload.get("responses_tool_choice")
+    if isinstance(rtc, str) and rtc in ("auto", "none"):
+        tool_choice = rtc
+
+    if not isinstance(model, str) or not messages:
+        raise ChatRequestError("Invalid request format")
+
+    input_items = convert_chat_messages_to_responses_input(messages)
+    normalized_model = normalize_model_name(model, config.get("DEBUG_MODEL"))
+    resolution = _resolve_service_tier(normalized_model, payload, config)
+    reasoning_param = build_reasoning_param(
+        config.get("REASONING_EFFORT", "medium"),
+        config.get("REASONING_SUMMARY", "auto"),
+        extract_reasoning_from_model_name(model),
+        allowed_efforts=allowed_efforts_for_model(model),
+    )
+
+    return NormalizedChatRequest(
+        requested_model=model,
+        model=normalized_model,
+        input_items=input_items,
+        stream=bool(stream_req),
+        tools=tools_responses,
+        tool_choice=tool_choice,
+        parallel_tool_calls=bool(payload.get("parallel_tool_calls", False)),
+        reasoning_param=reasoning_param,
+        service_tier=resolution.service_tier,
+        service_tier_warning=resolution.warning_message,
+        fallback_tools=fallback_tools,
+        fallback_tool_choice=payload.get("tool_choice", "auto"),
+    )
+
+
+def upstream_error_message(content: bytes | None, text: str | None) -> str:
+    try:
+        err_body = json.loads(content.decode("utf-8", errors="ignore")) if content else {"raw": text}
+    except Exception:
+        err_body = {"raw": text}
+    if not isinstance(err_body, dict):
+        return "Upstream error"
+    return (err_body.get("error", {}) or {}).get("message", "Upstream error")
+
+
+def build_chat_completion(
+    acc: ChatCompletionAccumulator,
+    model: str,
+    created: int,
+    reasoning_compat: str,
+) -> Dict[str, Any]:
+    message: Dict[str, Any] = {"role": "assistant", "content": acc.full_text if acc.full_text else None}
+    if acc.tool_calls:
+        message["tool_calls"] = acc.tool_calls
+    message = apply_reasoning_to_message(
+        message, acc.reasoning_summary_text, acc.reasoning_full_text, reasoning_compat
+    )
+    return {
+        "id": acc.response_id or "chatcmpl",
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if acc.tool_calls else "stop",
+            }
+        ],
+        **({"usage": acc.usage} if acc.usage else {}),
+    }
+
+
+def build_text_completion(acc: ChatCompletionAccumulator, model: str, created: int) -> Dict[str, Any]:
+    return {
+        "id": acc.response_id or "cmpl",
+        "object": "text_completion",
+        "created": created,
+        "model": model,
+        "choices": [
+            {"index": 0, "text": acc.full_text, "finish_reason": "stop", "logprobs": None}
+        ],
+        **({"usage": acc.usage} if acc.usage else {}),
+    }
+
+
+def build_ollama_chat_response(
+    acc: ChatCompletionAccumulator,
+    model: str,
+    created_at: str,
+    reasoning_compat: str,
+) -> Dict[str, Any]:
+    full_text = acc.full_text
+    if (reasoning_compat or "think-tags").strip().lower() == "think-tags":
+        rtxt_parts = []
+        if isinstance(acc.reasoning_summary_text, str) and acc.reasoning_summary_text.strip():
+            rtxt_parts.append(acc.reasoning_summary_text)
+        if isinstance(acc.reasoning_full_text, str) and acc.reasoning_full_text.strip():
+            rtxt_parts.append(acc.reasoning_full_text)
+        rtxt = "\n\n".join([p for p in rtxt_parts if p])
+        if rtxt:
+            full_text = f"<think>{rtxt}</think>" + (full_text or "")
+
+    out_json = {
+        "model": model,
+        "created_at": created_at,
+        "message": {
+            "role": "assistant",
+            "content": full_text,
+            **({"tool_calls": acc.tool_calls} if acc.tool_calls else {}),
+        },
+        "done": True,
+        "done_reason": "stop",
+    }
+    out_json.update(OLLAMA_FAKE_EVAL)
+    return out_json
@@ -8,11 +8,31 @@ import sys
 import webbrowser
 from datetime import datetime
 
+from .accounts import PRIMARY_ACCOUNT_NAME, account_home, get_account_pool, start_account_refreshers
+from .admission import default_max_concurrent_streams, default_queue_timeout
 from .app import create_app
-from .config import CLIENT_ID_DEFAULT
+from .coalesce import default_coalesce_settings
+from .config import CLIENT_ID_DEFAULT, float_env, int_env
+from .http_pool import (
+    configure_upstream_pool,
+    default_keepalive_interval,
+    default_pool_size,
+    default_warm_connections,
+    start_upstream_keepalive,
+)
+from .lean import default_lean_settings
 from .limits import RateLimitWindow, compute_reset_at, load_rate_limit_snapshot
 from .oauth import OAuthHTTPServer, OAuthHandler, REQUIRED_PORT, URL_BASE, run_device_code_login
-from .utils import eprint, get_home_dir, load_chatgpt_tokens, parse_jwt_claims, read_auth_file
+from .session_store import default_session_store_settings
+from .timeouts import default_upstream_timeouts
+from .translate import default_max_output_bytes
+from .utils import (
+    eprint,
+    get_home_dir,
+    load_chatgpt_tokens,
+    parse_jwt_claims,
+    read_auth_file,
+)
 
 
 _STATUS_LIMIT_BAR_SEGMENTS = 30
@@ -21,13 +41,6 @@ _STATUS_LIMIT_BAR_EMPTY = "░"
 _STATUS_LIMIT_BAR_PARTIAL = "▓"
 
 
-def _float_env(name: str, default: float) -> float:
-    try:
-        return float(os.getenv(name, str(default)))
-    except (TypeError, ValueError):
-        return default
-
-
 def _clamp_percent(value: float) -> float:
     try:
         percent = float(value)
@@ -193,7 +206,14 @@ def _print_usage_limits_block() -> None:
 
     print()
 
-def cmd_login(no_browser: bool, verbose: bool, headless: bool = False) -> int:
+def cmd_login(no_browser: bool, verbose: bool, headless: bool = False, account: str | None = None) -> int:
+    if account and account != PRIMARY_ACCOUNT_NAME:
+        if account in (".", "..") or os.sep in account or (os.altsep and os.altsep in account):
+            eprint(f"ERROR: invalid account name: {account!r}")
+            return 1
+        # Extra accounts live in their own home dir so every login/refresh
+        # helper writes that account's auth.json.
+        os.environ["CHATGPT_LOCAL_HOME"] = account_home(account)
     home_dir = get_home_dir()
     client_id = CLIENT_ID_DEFAULT
     if not client_id:
@@ -242,8 +262,34 @@ def cmd_serve(
     default_web_search: bool,
     model_sync: bool = True,
     model_refresh_interval: float = 3600,
+    upstream_pool_size: int | None = None,
+    upstream_keepalive_interval: float | None = None,
+    upstream_warm_connections: int | None = None,
+    engine: str = "threaded",
+    workers: int = 0,
+    threads: int = 32,
+    keepalive: int = 75,
+    max_concurrent_streams: int = 0,
+    queue_timeout: float = 30.0,
+    upstream_connect_timeout: float | None = None,
+    upstream_first_event_timeout: float | None = None,
+    upstream_idle_timeout: float | None = None,
+    upstream_stall_retries: int | None = None,
+    stream_coalesce_window_ms: float | None = None,
+    stream_coalesce_max_bytes: int | None = None,
+    max_output_bytes: int | None = None,
+    lean_stream: bool | None = None,
+    lean_drop_events: str | None = None,
+    session_max_entries: int | None = None,
+    session_ttl: float | None = None,
+    session_max_bytes: int | None = None,
+    session_db: str | None = None,
+    session_flush_interval: float | None = None,
+    state_backend: str | None = None,
+    state_share_tokens: bool | None = None,
 ) -> int:
-    app = create_app(
+    configure_upstream_pool(pool_size=upstream_pool_size)
+    app_kwargs = dict(
         verbose=verbose,
         verbose_obfuscation=verbose_obfuscation,
         reasoning_effort=reasoning_effort,
@@ -255,7 +301,69 @@ def cmd_serve(
         default_web_search=default_web_search,
         model_sync=model_sync,
         model_refresh_interval=model_refresh_interval,
+        max_concurrent_streams=max_concurrent_streams,
+        queue_timeout=queue_timeout,
+        upstream_connect_timeout=upstream_connect_timeout,
+        upstream_first_event_timeout=upstream_first_event_timeout,
+        upstream_idle_timeout=upstream_idle_timeout,
+        upstream_stall_retries=upstream_stall_retries,
+        stream_coalesce_window_ms=stream_coalesce_window_ms,
+        stream_coalesce_max_bytes=stream_coalesce_max_bytes,
+        max_output_bytes=max_output_bytes,
+        lean_stream=lean_stream,
+        lean_drop_events=lean_drop_events,
+        session_max_entries=session_max_entries,
+        session_ttl=session_ttl,
+        session_max_bytes=session_max_bytes,
+        session_db=session_db,
+        session_flush_interval=session_flush_interval,
+        state_backend=state_backend,
+        state_share_tokens=state_share_tokens,
     )
+    if engine == "async" and workers > 0:
+        eprint("ERROR: --workers is only supported with the threaded engine.")
+        return 1
+    if engine == "async":
+        try:
+            from .async_app import run_async_server
+        except ImportError:
+            eprint("ERROR: the async engine requires aiohttp. Install it with: pip install 'chatmock[async]'")
+            return 1
+        start_account_refreshers()
+        run_async_server(host, port, **app_kwargs)
+        return 0
+
+    if workers > 0:
+        try:
+            from .wsgi_server import run_wsgi_server
+        except ImportError:
+            eprint("ERROR: --workers requires gunicorn. Install it with: pip install 'chatmock[server]'")
+            return 1
+
+        def _start_worker_background_tasks() -> None:
+            start_upstream_keepalive(
+                interval=upstream_keepalive_interval,
+                warm_connections=upstream_warm_connections,
+            )
+            start_account_refreshers()
+
+        run_wsgi_server(
+            host,
+            port,
+            workers=workers,
+            threads=threads,
+            keepalive=keepalive,
+            on_worker_start=_start_worker_background_tasks,
+            **app_kwargs,
+        )
+        return 0
+
+    app = create_app(**app_kwargs)
+    start_upstream_keepalive(
+        interval=upstream_keepalive_interval,
+        warm_connections=upstream_warm_connections,
+    )
+    start_account_refreshers()
 
     app.run(host=host, use_reloader=False, port=port, threaded=True)
     return 0
@@ -269,6 +377,11 @@ def main() -> None:
     p_login.add_argument("--no-browser", action="store_true", help="Do not open the browser automatically")
     p_login.add_argument("--headless", action="store_true", help="Use device-code login instead of localhost browser callback")
     p_login.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    p_login.add_argument(
+        "--account",
+        metavar="NAME",
+        help="Store the login as an extra pooled account under <home>/accounts/NAME instead of the primary auth.json",
+    )
 
     p_serve = sub.add_parser("serve", help="Run local OpenAI-compatible server")
     p_serve.add_argument("--host", default="127.0.0.1")
@@ -340,10 +453,208 @@ def main() -> None:
     p_serve.add_argument(
         "--model-refresh-interval",
         type=float,
-        default=_float_env("CHATGPT_LOCAL_MODEL_REFRESH_INTERVAL", 3600),
+        default=float_env("CHATGPT_LOCAL_MODEL_REFRESH_INTERVAL", 3600),
         metavar="SECONDS",
         help="Refresh the ChatGPT model catalog after this many seconds (default: 3600).",
     )
+    p_serve.add_argument(
+        "--upstream-pool-size",
+        type=int,
+        default=default_pool_size(),
+        metavar="N",
+        help="Maximum number of keep-alive connections kept open to ChatGPT (default: 16).",
+    )
+    p_serve.add_argument(
+        "--upstream-keepalive-interval",
+        type=float,
+        default=default_keepalive_interval(),
+        metavar="SECONDS",
+        help="Re-warm idle upstream connections every this many seconds; 0 warms once at startup (default: 60).",
+    )
+    p_serve.add_argument(
+        "--upstream-warm-connections",
+        type=int,
+        default=default_warm_connections(),
+        metavar="N",
+        help="Connections to open to ChatGPT at startup and on each keep-alive tick; 0 disables warmup (default: 2).",
+    )
+    p_serve.add_argument(
+        "--engine",
+        choices=["threaded", "async"],
+        default=(os.getenv("CHATGPT_LOCAL_ENGINE") or "threaded").strip().lower(),
+        help=(
+            "Serving engine: 'threaded' (one thread per request) or 'async' (asyncio, suited to many "
+            "concurrent streams; requires the 'async' extra). Default: threaded."
+        ),
+    )
+    p_serve.add_argument(
+        "--max-concurrent-streams",
+        type=int,
+        default=default_max_concurrent_streams(),
+        metavar="N",
+        help=(
+            "Maximum upstream requests in flight per process; extra requests queue until a slot frees up. "
+            "0 means unlimited (default: 0)."
+        ),
+    )
+    p_serve.add_argument(
+        "--queue-timeout",
+        type=float,
+        default=default_queue_timeout(),
+        metavar="SECONDS",
+        help="How long a queued request waits for a slot before failing with 503 (default: 30).",
+    )
+    upstream_timeouts = default_upstream_timeouts()
+    p_serve.add_argument(
+        "--upstream-connect-timeout",
+        type=float,
+        default=upstream_timeouts.connect,
+        metavar="SECONDS",
+        help="Time allowed to connect to ChatGPT; 0 disables the limit (default: 15).",
+    )
+    p_serve.add_argument(
+        "--upstream-first-event-timeout",
+        type=float,
+        default=upstream_timeouts.first_event,
+        metavar="SECONDS",
+        help="Time allowed for ChatGPT to start answering a request; 0 disables the limit (default: 90).",
+    )
+    p_serve.add_argument(
+        "--upstream-idle-timeout",
+        type=float,
+        default=upstream_timeouts.idle,
+        metavar="SECONDS",
+        help="Silence allowed between upstream events before a stream counts as stalled; 0 disables (default: 300).",
+    )
+    p_serve.add_argument(
+        "--upstream-stall-retries",
+        type=int,
+        default=upstream_timeouts.stall_retries,
+        metavar="N",
+        help="Times a request that stalled before sending any output is retried (default: 1).",
+    )
+    coalesce = default_coalesce_settings()
+    p_serve.add_argument(
+        "--coalesce-window-ms",
+        type=float,
+        default=coalesce.window_ms,
+        metavar="MS",
+        help=(
+            "Merge streamed text deltas that arrive within this many milliseconds into one chunk "
+            "(15-50 suits most clients); 0 sends every delta as it arrives (default: 0)."
+        ),
+    )
+    p_serve.add_argument(
+        "--coalesce-max-bytes",
+        type=int,
+        default=coalesce.max_bytes,
+        metavar="BYTES",
+        help="Send merged text early once this much is pending (default: 4096).",
+    )
+    p_serve.add_argument(
+        "--max-output-bytes",
+        type=int,
+        default=default_max_output_bytes(),
+        metavar="BYTES",
+        help="Largest non-streaming reply collected before failing with 502; 0 disables the cap (default: 67108864).",
+    )
+    lean = default_lean_settings()
+    p_serve.add_argument(
+        "--lean-stream",
+        action=argparse.BooleanOptionalAction,
+        default=lean.enabled,
+        help=(
+            "Trim /v1/responses streams: strip obfuscation padding and drop the --lean-drop-events types. "
+            "Requests can override this with \"lean_stream\" (off by default)."
+        ),
+    )
+    p_serve.add_argument(
+        "--lean-drop-events",
+        default=",".join(sorted(lean.drop_events)),
+        metavar="TYPES",
+        help="Comma-separated event types left out of lean streams (default: the reasoning text deltas).",
+    )
+    sessions = default_session_store_settings()
+    p_serve.add_argument(
+        "--session-max-entries",
+        type=int,
+        default=sessions.max_entries,
+        metavar="N",
+        help="Conversations remembered for previous_response_id reuse; 0 for no limit (default: 10000).",
+    )
+    p_serve.add_argument(
+        "--session-ttl",
+        type=float,
+        default=sessions.ttl_seconds,
+        metavar="SECONDS",
+        help="Forget a conversation after it has been idle this long; 0 keeps it until evicted (default: 3600).",
+    )
+    p_serve.add_argument(
+        "--session-max-bytes",
+        type=int,
+        default=sessions.max_bytes,
+        metavar="BYTES",
+        help="Memory budget for remembered conversation state; 0 for no limit (default: 268435456).",
+    )
+    p_serve.add_argument(
+        "--session-db",
+        default=sessions.db_path or "",
+        metavar="PATH",
+        help=(
+            "SQLite file that session ids are saved to and reloaded from, "
+            "so prompt-cache keys survive restarts (default: off)."
+        ),
+    )
+    p_serve.add_argument(
+        "--session-flush-interval",
+        type=float,
+        default=sessions.flush_interval,
+        metavar="SECONDS",
+        help="How often pending session state is written to --session-db (default: 1).",
+    )
+    p_serve.add_argument(
+        "--state-backend",
+        default=os.getenv("CHATGPT_LOCAL_STATE_BACKEND") or "",
+        metavar="URL",
+        help=(
+            "Key-value store shared by several ChatMock nodes for session ids, "
+            "rate-limit snapshots and token-refresh leadership: memory://, file:///path/state.db or "
+            "redis://host:6379/0 (default: off, state is per node)."
+        ),
+    )
+    p_serve.add_argument(
+        "--state-share-tokens",
+        action=argparse.BooleanOptionalAction,
+        default=(os.getenv("CHATGPT_LOCAL_STATE_SHARE_TOKENS") or "").strip().lower() in ("1", "true", "yes", "on"),
+        help=(
+            "Publish refreshed ChatGPT tokens to --state-backend, in plain text, so one node refreshes "
+            "and the others adopt the result (off by default; without it each node refreshes on its own)."
+        ),
+    )
+    p_serve.add_argument(
+        "--workers",
+        type=int,
+        default=max(int_env("CHATGPT_LOCAL_WORKERS", 0), 0),
+        metavar="N",
+        help=(
+            "Serve with N pre-forked gunicorn worker processes sharing one socket (threaded engine; requires "
+            "the 'server' extra). 0 uses the single-process development server (default: 0)."
+        ),
+    )
+    p_serve.add_argument(
+        "--threads",
+        type=int,
+        default=max(int_env("CHATGPT_LOCAL_THREADS", 32), 1),
+        metavar="M",
+        help="Request threads per worker when --workers is set; bounds concurrent streams per worker (default: 32).",
+    )
+    p_serve.add_argument(
+        "--keepalive",
+        type=int,
+        default=max(int_env("CHATGPT_LOCAL_KEEPALIVE", 75), 0),
+        metavar="SECONDS",
+        help="Keep idle client connections open this long between requests when --workers is set (default: 75).",
+    )
 
     p_info = sub.add_parser("info", help="Print current stored tokens and derived account id")
     p_info.add_argument("--json", action="store_true", help="Output raw auth.json contents")
@@ -351,7 +662,14 @@ def main() -> None:
     args = parser.parse_args()
 
     if args.command == "login":
-        sys.exit(cmd_login(no_browser=args.no_browser, verbose=args.verbose, headless=args.headless))
+        sys.exit(
+            cmd_login(
+                no_browser=args.no_browser,
+                verbose=args.verbose,
+                headless=args.headless,
+                account=args.account,
+            )
+        )
     elif args.command == "serve":
         sys.exit(
             cmd_serve(
@@ -368,6 +686,31 @@ def main() -> None:
                 default_web_search=args.enable_web_search,
                 model_sync=args.model_sync,
                 model_refresh_interval=args.model_refresh_interval,
+                upstream_pool_size=args.upstream_pool_size,
+                upstream_keepalive_interval=args.upstream_keepalive_interval,
+                upstream_warm_connections=args.upstream_warm_connections,
+                engine=args.engine,
+                workers=args.workers,
+                threads=args.threads,
+                keepalive=args.keepalive,
+                max_concurrent_streams=args.max_concurrent_streams,
+                queue_timeout=args.queue_timeout,
+                upstream_connect_timeout=args.upstream_connect_timeout,
+                upstream_first_event_timeout=args.upstream_first_event_timeout,
+                upstream_idle_timeout=args.upstream_idle_timeout,
+                upstream_stall_retries=args.upstream_stall_retries,
+                stream_coalesce_window_ms=args.coalesce_window_ms,
+                stream_coalesce_max_bytes=args.coalesce_max_bytes,
+                max_output_bytes=args.max_output_bytes,
+                lean_stream=args.lean_stream,
+                lean_drop_events=args.lean_drop_events,
+                session_max_entries=args.session_max_entries,
+                session_ttl=args.session_ttl,
+                session_max_bytes=args.session_max_bytes,
+                session_db=args.session_db,
+                session_flush_interval=args.session_flush_interval,
+                state_backend=args.state_backend,
+                state_share_tokens=args.state_share_tokens,
             )
         )
     elif args.command == "info":
@@ -404,6 +747,9 @@ def main() -> None:
         print(f"  • Plan: {plan}")
         if account_id:
             print(f"  • Account ID: {account_id}")
+        pooled = [account.name for account in get_account_pool().accounts() if account.name != PRIMARY_ACCOUNT_NAME]
+        if pooled:
+            print(f"  • Pooled accounts: {', '.join(pooled)}")
         print("")
         _print_usage_limits_block()
         sys.exit(0)
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import select
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, List
+
+from flask import current_app
+
+from .config import float_env, int_env
+
+
+DEFAULT_COALESCE_WINDOW_MS = 0.0
+DEFAULT_COALESCE_MAX_BYTES = 4096
+
+
+@dataclass(frozen=True)
+class CoalesceSettings:
+    """
+    Merging of small streamed text deltas into fewer frames; off when
+    ``window_ms`` is ``0``.
+
+    Consecutive deltas of the same kind are held for at most ``window_ms``
+    or until ``max_bytes`` of text is pending, then sent as one frame.
+    Anything else (tool calls, think-tag boundaries, completion) sends the
+    pending text first. Text is also sent as soon as upstream goes quiet,
+    so holding it never adds more than the window to what the client sees.
+    """
+
+    window_ms: float = DEFAULT_COALESCE_WINDOW_MS
+    max_bytes: int = DEFAULT_COALESCE_MAX_BYTES
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0
+
+
+def default_coalesce_settings(
+    *,
+    window_ms: float | None = None,
+    max_bytes: int | None = None,
+) -> CoalesceSettings:
+    """Settings from the arguments given, falling back to the environment and then the defaults."""
+    if window_ms is None:
+        window_ms = float_env("CHATGPT_LOCAL_COALESCE_WINDOW_MS", DEFAULT_COALESCE_WINDOW_MS)
+    if max_bytes is None:
+        max_bytes = int_env("CHATGPT_LOCAL_COALESCE_MAX_BYTES", DEFAULT_COALESCE_MAX_BYTES)
+    return CoalesceSettings(window_ms=max(float(window_ms), 0.0), max_bytes=max(int(max_bytes), 1))
+
+
+def current_coalesce_settings() -> CoalesceSettings:
+    try:
+        settings = current_app.config.get("STREAM_COALESCE")
+    except RuntimeError:
+        settings = None
+    return settings if isinstance(settings, CoalesceSettings) else default_coalesce_settings()
+
+
+class PendingDelta:
+    """A mergeable piece of streamed text; ``render`` turns merged text into one frame."""
+
+    __slots__ = ("key", "text", "render")
+
+    def __init__(self, key: str, text: str, render: Callable[[str], bytes]) -> None:
+        self.key = key
+        self.text = text
+        self.render = render
+
+
+class DeltaCoalescer:
+    __slots__ = ("_window", "_max_bytes", "_key", "_render", "_parts", "_size", "_started")
+
+    def __init__(self, settings: CoalesceSettings) -> None:
+        self._window = settings.window_ms / 1000.0
+        self._max_bytes = settings.max_bytes
+        self._key: str | None = None
+        self._render: Callable[[str], bytes] | None = None
+        self._parts: List[str] = []
+        self._size = 0
+        self._started = 0.0
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._parts)
+
+    def delay(self) -> float | None:
+        """Seconds until pending text must go out, or ``None`` when nothing is held."""
+        if not self._parts:
+            return None
+        return max(self._started + self._window - time.monotonic(), 0.0)
+
+    def flush(self) -> List[bytes]:
+        if not self._parts:
+            return []
+        parts = self._parts
+        text = parts[0] if len(parts) == 1 else "".join(parts)
+        frame = self._render(text)
+        self._parts = []
+        self._size = 0
+        self._key = None
+        self._render = None
+        return [frame]
+
+    def merge(self, items: List[Any]) -> List[bytes]:
+        """Frames ready to send for ``items``, a mix of frames and :class:`PendingDelta`."""
+        out: List[bytes] = []
+        for item in items:
+            if not isinstance(item, PendingDelta):
+                if self._parts:
+                    out.extend(self.flush())
+                out.append(item)
+                continue
+            if self._parts and item.key != self._key:
+                out.extend(self.flush())
+            if not self._parts:
+                self._key = item.key
+                self._render = item.render
+                self._started = time.monotonic()
+            text = item.text
+            self._parts.append(text)
+            self._size += len(text) if text.isascii() else len(text.encode("utf-8"))
+            if self._size >= self._max_bytes or time.monotonic() - self._started >= self._window:
+                out.extend(self.flush())
+        return out
+
+
+def wait_readable(upstream: Any, timeout: float) -> bool:
+    """
+    Whether more upstream data arrives within ``timeout`` seconds.
+
+    Only a real socket can be watched; for anything else this answers
+    ``False`` so held text is sent straight away.
+    """
+    sock = getattr(upstream, "socket", None)
+    if sock is None:
+        return False
+    pending = getattr(sock, "pending", None)
+    if pending is not None and pending() > 0:
+        # TLS records already decrypted into the SSL object never show up in select.
+        return True
+    try:
+        readable, _, _ = select.select([sock], [], [], timeout)
+    except (OSError, ValueError):
+        return False
+    return bool(readable)
+
+
+def translate_batches(
+    batches: Iterable[List[Any]],
+    translator: Any,
+    upstream: Any,
+) -> Iterator[bytes]:
+    """
+    Drive ``translator`` with event batches (one per network read) and
+    send held text whenever upstream has nothing more within the window.
+
+    ``None`` in a batch stands for a ``[DONE]`` marker.
+    """
+    for batch in batches:
+        for evt in batch:
+            yield from translator.feed_done_marker() if evt is None else translator.feed(evt)
+            if translator.finished:
+                return
+        delay = translator.flush_delay()
+        if delay is not None and not wait_readable(upstream, delay):
+            yield from translator.flush()
+    yield from translator.flush()
+
+
+async def atranslate_batches(
+    batches: AsyncIterable[List[Any]],
+    translator: Any,
+) -> AsyncIterator[bytes]:
+    """Async counterpart of :func:`translate_batches`."""
+    if not translator.coalescing:
+        async for batch in batches:
+            for evt in batch:
+                for frame in translator.feed_done_marker() if evt is None else translator.feed(evt):
+                    yield frame
+                if translator.finished:
+                    return
+        return
+    iterator = batches.__aiter__()
+    pending: asyncio.Future | None = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            delay = translator.flush_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait({pending}, timeout=delay)
+                if not done:
+                    for frame in translator.flush():
+                        yield frame
+                    continue
+            try:
+                batch = await pending
+            except StopAsyncIteration:
+                break
+            finally:
+                if pending.done():
+                    pending = None
+            for evt in batch:
+                for frame in translator.feed_done_marker() if evt is None else translator.feed(evt):
+                    yield frame
+                if translator.finished:
+                    return
+        for frame in translator.flush():
+            yield frame
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
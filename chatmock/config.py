@@ -3,6 +3,22 @@ from __future__ import annotations
 import os
 
 
+def int_env(name: str, default: int) -> int:
+    """``int`` value of environment variable ``name``, or ``default`` when unset or invalid."""
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def float_env(name: str, default: float) -> float:
+    """``float`` value of environment variable ``name``, or ``default`` when unset or invalid."""
+    try:
+        return float(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
 CLIENT_ID_DEFAULT = os.getenv("CHATGPT_LOCAL_CLIENT_ID") or "app_EMoamEEZ73f0CkXaXp7hrann"
 OAUTH_ISSUER_DEFAULT = os.getenv("CHATGPT_LOCAL_ISSUER") or "https://auth.openai.com"
 OAUTH_TOKEN_URL = f"{OAUTH_ISSUER_DEFAULT}/oauth/token"
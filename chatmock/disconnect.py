@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import select
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List
+
+from flask import request
+
+from .metrics import record_stream_end
+
+
+DISCONNECT_POLL_INTERVAL_SECONDS = 0.25
+
+
+class _Watch:
+    __slots__ = ("sock", "upstream", "cancelled", "stopped")
+
+    def __init__(self, sock: socket.socket | None, upstream: Any) -> None:
+        self.sock = sock
+        self.upstream = upstream
+        # ``cancelled`` only once the client is known to have hung up.
+        self.cancelled = False
+        self.stopped = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        self.stop()
+
+    def stop(self) -> None:
+        if self.stopped:
+            return
+        self.stopped = True
+        cancel = getattr(self.upstream, "cancel", None)
+        try:
+            if callable(cancel):
+                cancel()
+            else:
+                self.upstream.close()
+        except Exception:
+            pass
+
+
+_WATCH_LOCK = threading.Lock()
+_WATCHES: List[_Watch] = []
+_WATCHER: threading.Thread | None = None
+
+
+def client_socket(environ: Dict[str, Any]) -> socket.socket | None:
+    """The client connection behind a WSGI request, when the server exposes it."""
+    for key in ("gunicorn.socket", "werkzeug.socket"):
+        sock = environ.get(key)
+        if isinstance(sock, socket.socket):
+            return sock
+    return None
+
+
+def peer_closed(sock: socket.socket) -> bool | None:
+    """
+    ``True`` once the client has hung up, ``False`` while it is connected and
+    ``None`` when that cannot be told without consuming its data (for example
+    a pipelined request already waiting in the buffer).
+    """
+    try:
+        if hasattr(socket, "MSG_DONTWAIT"):
+            data = sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+        else:
+            readable, _, _ = select.select([sock], [], [], 0)
+            if not readable:
+                return False
+            data = sock.recv(1, socket.MSG_PEEK)
+    except (BlockingIOError, InterruptedError):
+        return False
+    except ValueError:
+        return None
+    except OSError:
+        return True
+    return None if data else True
+
+
+def _watch_loop() -> None:
+    while True:
+        time.sleep(DISCONNECT_POLL_INTERVAL_SECONDS)
+        with _WATCH_LOCK:
+            watches = list(_WATCHES)
+        for watch in watches:
+            if watch.sock is None:
+                continue
+            state = peer_closed(watch.sock)
+            if state is False:
+                continue
+            if state:
+                watch.cancel()
+            _unwatch(watch)
+
+
+def _watch(watch: _Watch) -> None:
+    global _WATCHER
+    with _WATCH_LOCK:
+        _WATCHES.append(watch)
+        if _WATCHER is None:
+            _WATCHER = threading.Thread(
+                target=_watch_loop,
+                name="chatmock-disconnect-watch",
+                daemon=True,
+            )
+            _WATCHER.start()
+
+
+def _unwatch(watch: _Watch) -> None:
+    with _WATCH_LOCK:
+        try:
+            _WATCHES.remove(watch)
+        except ValueError:
+            pass
+
+
+def _watched(body: Iterable[Any], sock: socket.socket | None, upstream: Any) -> Iterator[Any]:
+    watch = _Watch(sock, upstream)
+    if sock is not None:
+        _watch(watch)
+    finished = False
+    try:
+        yield from body
+        finished = True
+    except GeneratorExit:
+        # The server stopped iterating, usually because a write to the client
+        # failed; only a closed client socket makes that a cancellation.
+        if sock is not None and peer_closed(sock) is True:
+            watch.cancelled = True
+        raise
+    finally:
+        _unwatch(watch)
+        if not finished:
+            # The body failed or was abandoned; make sure upstream stops too.
+            watch.stop()
+        bytes_read = getattr(upstream, "bytes_read", 0)
+        record_stream_end(
+            cancelled=watch.cancelled,
+            upstream_bytes=bytes_read if isinstance(bytes_read, int) else 0,
+        )
+
+
+def abort_on_disconnect(body: Iterable[Any], upstream: Any, environ: Dict[str, Any] | None = None) -> Iterator[Any]:
+    """
+    Stream ``body`` and tear ``upstream`` down as soon as the client hangs up.
+
+    A background thread polls the client socket, so a disconnect during a
+    long silent phase (reasoning, tool planning) is noticed without waiting
+    for the next write. Must be called inside the request; the returned
+    iterator may run outside it.
+    """
+    if environ is None:
+        environ = request.environ
+    return _watched(body, client_socket(environ), upstream)
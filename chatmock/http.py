@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+from typing import Any
+
 from flask import Response, jsonify, request
 
 
-def build_cors_headers() -> dict:
-    origin = request.headers.get("Origin", "*")
-    req_headers = request.headers.get("Access-Control-Request-Headers")
+def build_cors_headers(headers: Any | None = None) -> dict:
+    if headers is None:
+        headers = request.headers
+    origin = headers.get("Origin", "*")
+    req_headers = headers.get("Access-Control-Request-Headers")
     allow_headers = req_headers if req_headers else "Authorization, Content-Type, Accept"
     return {
         "Access-Control-Allow-Origin": origin,
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import http.cookiejar
+import threading
+from typing import List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import CHATGPT_CODEX_BASE_URL, float_env, int_env
+
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_KEEPALIVE_INTERVAL_SECONDS = 60.0
+DEFAULT_WARM_CONNECTIONS = 2
+WARMUP_TIMEOUT_SECONDS = 10
+# Per-host pools the adapter keeps. Upstream traffic goes to one host
+# (plus the OAuth host on refresh), so a few cover it; the pool size
+# above is the per-host connection cap that matters.
+HOST_POOLS = 4
+
+_LOCK = threading.Lock()
+_SESSION: requests.Session | None = None
+_POOL_SIZE = DEFAULT_POOL_SIZE
+_KEEPALIVE_THREAD: threading.Thread | None = None
+_KEEPALIVE_STOP = threading.Event()
+
+
+def default_pool_size() -> int:
+    return max(int_env("CHATGPT_LOCAL_UPSTREAM_POOL_SIZE", DEFAULT_POOL_SIZE), 1)
+
+
+def default_keepalive_interval() -> float:
+    return max(float_env("CHATGPT_LOCAL_UPSTREAM_KEEPALIVE_INTERVAL", DEFAULT_KEEPALIVE_INTERVAL_SECONDS), 0.0)
+
+
+def default_warm_connections() -> int:
+    return max(int_env("CHATGPT_LOCAL_UPSTREAM_WARM_CONNECTIONS", DEFAULT_WARM_CONNECTIONS), 0)
+
+
+def _mount_adapter(session: requests.Session, pool_size: int) -> None:
+    old = session.adapters.get("https://")
+    adapter = HTTPAdapter(pool_connections=HOST_POOLS, pool_maxsize=pool_size, pool_block=False)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if old is not None:
+        # Idle connections close now; ones held by in-flight streams close
+        # when those streams return them.
+        old.close()
+
+
+def _new_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    # Upstream calls are independent requests; never carry cookies from one
+    # stream into another.
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    _mount_adapter(session, pool_size)
+    return session
+
+
+def configure_upstream_pool(*, pool_size: int | None = None) -> None:
+    global _POOL_SIZE
+    with _LOCK:
+        _POOL_SIZE = max(int(pool_size), 1) if pool_size is not None else default_pool_size()
+        if _SESSION is not None:
+            _mount_adapter(_SESSION, _POOL_SIZE)
+
+
+def get_upstream_session() -> requests.Session:
+    """Process-wide keep-alive session shared by every upstream ChatGPT call."""
+    global _SESSION
+    session = _SESSION
+    if session is not None:
+        return session
+    with _LOCK:
+        if _SESSION is None:
+            _SESSION = _new_session(_POOL_SIZE)
+        return _SESSION
+
+
+def warm_upstream_connections(count: int) -> int:
+    """Open up to ``count`` concurrent connections so the pool starts warm."""
+    count = min(count, _POOL_SIZE)
+    if count <= 0:
+        return 0
+    session = get_upstream_session()
+    opened: List[bool] = []
+
+    def _open() -> None:
+        try:
+            response = session.head(
+                CHATGPT_CODEX_BASE_URL,
+                timeout=WARMUP_TIMEOUT_SECONDS,
+                allow_redirects=False,
+            )
+            response.close()
+            opened.append(True)
+        except requests.RequestException:
+            pass
+
+    threads = [
+        threading.Thread(target=_open, name="chatmock-upstream-warmup", daemon=True)
+        for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(WARMUP_TIMEOUT_SECONDS + 1)
+    return len(opened)
+
+
+def _keepalive_worker(interval: float, warm_connections: int) -> None:
+    while True:
+        warm_upstream_connections(warm_connections)
+        if interval <= 0 or _KEEPALIVE_STOP.wait(interval):
+            return
+
+
+def start_upstream_keepalive(*, interval: float | None = None, warm_connections: int | None = None) -> bool:
+    """Warm the pool in the background and re-warm it every ``interval`` seconds."""
+    global _KEEPALIVE_THREAD
+    interval = default_keepalive_interval() if interval is None else max(float(interval), 0.0)
+    warm_connections = default_warm_connections() if warm_connections is None else max(int(warm_connections), 0)
+    if warm_connections <= 0:
+        return False
+    with _LOCK:
+        if _KEEPALIVE_THREAD is not None and _KEEPALIVE_THREAD.is_alive():
+            return False
+        _KEEPALIVE_STOP.clear()
+        _KEEPALIVE_THREAD = threading.Thread(
+            target=_keepalive_worker,
+            args=(interval, warm_connections),
+            name="chatmock-upstream-keepalive",
+            daemon=True,
+        )
+        _KEEPALIVE_THREAD.start()
+    return True
+
+
+def stop_upstream_keepalive() -> None:
+    _KEEPALIVE_STOP.set()
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+import json.scanner
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional
+    orjson = None
+
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+# Compact, UTF-8 output so both backends produce the same bytes.
+_encode_compact = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+# Calling the scanner directly skips the encoding sniffing and whitespace
+# regexes ``json.loads`` wraps around every document.
+_scan_once = json.scanner.make_scanner(json.JSONDecoder())
+
+
+def _stdlib_loads(data: bytes | bytearray | memoryview | str) -> Any:
+    if not isinstance(data, str):
+        data = bytes(data).decode("utf-8")
+    try:
+        obj, end = _scan_once(data, 0)
+    except StopIteration:
+        return json.loads(data)
+    if end != len(data):
+        return json.loads(data)
+    return obj
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    try:
+        return _encode_compact(obj).encode("utf-8")
+    except UnicodeEncodeError:
+        # Lone surrogates cannot be written as UTF-8; escape them instead.
+        return json.dumps(obj, separators=(",", ":")).encode("ascii")
+
+
+def loads(data: bytes | bytearray | memoryview | str) -> Any:
+    """Parse a JSON document from bytes or text; raises ``ValueError`` when it is invalid."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects a few inputs the stdlib accepts (NaN/Infinity literals).
+            pass
+    return _stdlib_loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON for ``obj``."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return _stdlib_dumps(obj)
+
+
+def dumps_canonical(obj: Any) -> bytes:
+    """
+    Compact JSON with object keys sorted, so equal documents encode to the
+    same bytes. Always the standard library encoder: orjson writes some
+    floats differently (``1e16`` for ``1e+16``), and hashes of these bytes
+    must not depend on which backend a process has installed.
+    """
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8", errors="surrogatepass")
+
+
+def dumps_text(obj: Any) -> str:
+    """:func:`dumps` as ``str``, for text-only sinks such as websocket text frames."""
+    return dumps(obj).decode("utf-8")
+
+
+# Placeholder a template document carries where the variable value goes; the
+# NULs make it impossible to collide with real model names or ids.
+_SLOT = "\x00slot\x00"
+
+
+class JSONTemplate:
+    """
+    A JSON document pre-encoded around one variable value.
+
+    ``doc`` is encoded once with :data:`JSONTemplate.SLOT` in place of the
+    value; :meth:`render` then only encodes the value and joins three byte
+    strings, producing exactly what ``prefix + dumps(doc) + suffix`` would.
+    """
+
+    SLOT = _SLOT
+    __slots__ = ("_head", "_tail")
+
+    def __init__(self, doc: Any, *, prefix: bytes = b"", suffix: bytes = b"") -> None:
+        head, slot, tail = dumps(doc).partition(dumps(_SLOT))
+        if not slot:
+            raise ValueError("template document has no JSONTemplate.SLOT")
+        self._head = prefix + head
+        self._tail = tail + suffix
+
+    def render(self, value: Any) -> bytes:
+        return b"".join((self._head, dumps(value), self._tail))
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass, replace
+from typing import Any, FrozenSet, Iterable, List
+
+from flask import current_app
+
+from .jsoncodec import dumps, dumps_text, loads
+from .session import SESSION_EVENT_TYPES
+from .sse import SSEDecoder, _last_boundary, sniff_event_type
+
+
+DEFAULT_LEAN_DROP_EVENTS = frozenset({"response.reasoning_summary_text.delta", "response.reasoning_text.delta"})
+
+# Upstream pads delta events with a random ``obfuscation`` string. A
+# ``,"`` pair is always structural (a quote inside a JSON string is escaped),
+# so the padding can be cut out of the raw bytes; anything the pattern
+# misses is handled by decoding the event.
+_OBFUSCATION_BYTES = re.compile(rb',\s*"obfuscation"\s*:\s*"[^"\\]*"')
+_OBFUSCATION_TEXT = re.compile(r',\s*"obfuscation"\s*:\s*"[^"\\]*"')
+
+
+@dataclass(frozen=True)
+class LeanStreamSettings:
+    """
+    Trimming of ``/v1/responses`` passthrough streams; off unless ``enabled``.
+
+    Obfuscation padding is removed from every event and ``drop_events``
+    are not sent at all. The events session tracking and stream
+    termination depend on are never dropped.
+    """
+
+    enabled: bool = False
+    drop_events: FrozenSet[str] = DEFAULT_LEAN_DROP_EVENTS
+
+    def for_request(self, lean_stream: bool | None) -> "LeanStreamSettings":
+        """These settings with a request's own ``lean_stream`` choice applied."""
+        return self if lean_stream is None else replace(self, enabled=bool(lean_stream))
+
+
+def parse_event_types(value: Any) -> FrozenSet[str]:
+    """Event types from a comma-separated string or an iterable of strings."""
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, Iterable):
+        return frozenset()
+    return frozenset(item.strip() for item in value if isinstance(item, str) and item.strip())
+
+
+def default_lean_settings(
+    *,
+    enabled: bool | None = None,
+    drop_events: Any = None,
+) -> LeanStreamSettings:
+    """Settings from the arguments given, falling back to the environment and then the defaults."""
+    if enabled is None:
+        enabled = (os.getenv("CHATGPT_LOCAL_LEAN_STREAM") or "").strip().lower() in ("1", "true", "yes", "on")
+    if drop_events is None:
+        env = os.getenv("CHATGPT_LOCAL_LEAN_DROP_EVENTS")
+        drop_events = DEFAULT_LEAN_DROP_EVENTS if env is None else env
+    return LeanStreamSettings(enabled=bool(enabled), drop_events=parse_event_types(drop_events))
+
+
+def current_lean_settings() -> LeanStreamSettings:
+    try:
+        settings = current_app.config.get("STREAM_LEAN")
+    except RuntimeError:
+        settings = None
+    return settings if isinstance(settings, LeanStreamSettings) else default_lean_settings()
+
+
+def strip_obfuscation(data: bytes) -> bytes:
+    if b'"obfuscation"' not in data:
+        return data
+    data = _OBFUSCATION_BYTES.sub(b"", data)
+    if b'"obfuscation"' in data:
+        try:
+            evt = loads(data)
+        except ValueError:
+            return data
+        if isinstance(evt, dict) and evt.pop("obfuscation", None) is not None:
+            return dumps(evt)
+    return data
+
+
+def strip_obfuscation_run(run: bytes) -> bytes:
+    """:func:`strip_obfuscation` over a run of complete SSE events at once."""
+    if b'"obfuscation"' not in run:
+        return run
+    run = _OBFUSCATION_BYTES.sub(b"", run)
+    if b'"obfuscation"' not in run:
+        return run
+    decoder = SSEDecoder()
+    out: List[bytes] = []
+    for name, data in decoder.feed(run) + decoder.close():
+        data = strip_obfuscation(data).replace(b"\n", b"\ndata: ")
+        head = b"event: " + name + b"\n" if name is not None else b""
+        out.append(head + b"data: " + data + b"\n\n")
+    return b"".join(out)
+
+
+def _strip_obfuscation_text(text: str) -> str:
+    if '"obfuscation"' not in text:
+        return text
+    text = _OBFUSCATION_TEXT.sub("", text)
+    if '"obfuscation"' in text:
+        try:
+            evt = loads(text)
+        except ValueError:
+            return text
+        if isinstance(evt, dict) and evt.pop("obfuscation", None) is not None:
+            return dumps_text(evt)
+    return text
+
+
+class LeanStreamFilter:
+    """
+    Rewrites a raw Responses SSE stream with :class:`LeanStreamSettings`
+    applied.
+
+    Chunks are cut at the last event boundary, as in
+    :class:`~chatmock.sse.SSEEventFilter`, and each run of complete events
+    becomes one output chunk. A run that holds none of the dropped type
+    names only has its padding cut out; otherwise it is split into events
+    and re-framed as ``event:``/``data:`` pairs, without the ``id:``,
+    ``retry:`` and comment lines.
+    """
+
+    __slots__ = ("_drop", "_markers", "_parts", "_tail", "_decoder")
+
+    def __init__(self, settings: LeanStreamSettings) -> None:
+        self._drop = settings.drop_events - SESSION_EVENT_TYPES
+        self._markers = tuple(b'"' + kind.encode("utf-8") + b'"' for kind in sorted(self._drop))
+        self._parts: List[bytes] = []
+        self._tail = b""
+        self._decoder = SSEDecoder()
+
+    def _keep(self, name: bytes | None, data: bytes) -> bool:
+        kind = sniff_event_type(data)
+        if kind is None and name is not None:
+            kind = name.decode("utf-8", errors="replace")
+        return kind not in self._drop
+
+    def _frame(self, events: List[Any]) -> bytes:
+        out: List[bytes] = []
+        for name, data in events:
+            if not self._keep(name, data):
+                continue
+            if b"\n" in data:
+                data = data.replace(b"\n", b"\ndata: ")
+            if name is not None:
+                out.append(b"event: " + name + b"\ndata: " + data + b"\n\n")
+            else:
+                out.append(b"data: " + data + b"\n\n")
+        return strip_obfuscation_run(b"".join(out))
+
+    def _trim(self, run: bytes) -> bytes:
+        for marker in self._markers:
+            if marker in run:
+                return self._frame(self._decoder.feed(run))
+        return strip_obfuscation_run(run)
+
+    def feed(self, chunk: bytes) -> bytes:
+        if not isinstance(chunk, bytes):
+            chunk = bytes(chunk)
+        parts = self._parts
+        head = self._tail
+        cut = _last_boundary(head + chunk if head else chunk)
+        if cut < 0:
+            parts.append(chunk)
+            self._tail = (head + chunk)[-3:]
+            return b""
+        cut -= len(head)
+        if parts:
+            parts.append(chunk[:cut])
+            run = b"".join(parts)
+        else:
+            run = chunk[:cut] if cut < len(chunk) else chunk
+        rest = chunk[cut:]
+        self._parts = [rest] if rest else []
+        self._tail = rest[-3:]
+        return self._trim(run)
+
+    def close(self) -> bytes:
+        """An event the stream ended without terminating."""
+        run = b"".join(self._parts)
+        self._parts = []
+        self._tail = b""
+        if not run.strip():
+            return b""
+        return self._frame(self._decoder.feed(run) + self._decoder.close())
+
+    def message(self, message: str | bytes) -> str | bytes | None:
+        """A websocket event message to send on, or ``None`` to drop it."""
+        if self._drop and sniff_event_type(message) in self._drop:
+            return None
+        if isinstance(message, str):
+            return _strip_obfuscation_text(message)
+        return strip_obfuscation(message)
@@ -6,6 +6,7 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Any, Mapping, Optional
 
+from .state_backend import KEY_PREFIX, StateBackendError, get_state_backend
 from .utils import get_home_dir
 
 _PRIMARY_USED = "x-codex-primary-used-percent"
@@ -95,26 +96,38 @@ def _limits_path() -> str:
     return os.path.join(home, _LIMITS_FILENAME)
 
 
+# Key the latest snapshot is shared under when a state backend is configured.
+RATE_LIMITS_KEY = "rate-limits"
+
+
+def _snapshot_payload(snapshot: RateLimitSnapshot, captured: datetime) -> dict[str, Any]:
+    payload: dict[str, Any] = {
+        "captured_at": captured.isoformat(),
+    }
+    if snapshot.primary:
+        payload["primary"] = {
+            "used_percent": snapshot.primary.used_percent,
+            "window_minutes": snapshot.primary.window_minutes,
+            "resets_in_seconds": snapshot.primary.resets_in_seconds,
+        }
+    if snapshot.secondary:
+        payload["secondary"] = {
+            "used_percent": snapshot.secondary.used_percent,
+            "window_minutes": snapshot.secondary.window_minutes,
+            "resets_in_seconds": snapshot.secondary.resets_in_seconds,
+        }
+    return payload
+
+
 def store_rate_limit_snapshot(snapshot: RateLimitSnapshot, captured_at: Optional[datetime] = None) -> None:
     captured = captured_at or datetime.now(timezone.utc)
+    payload = _snapshot_payload(snapshot, captured)
+    backend = get_state_backend()
+    if backend is not None:
+        backend.set_later(KEY_PREFIX + RATE_LIMITS_KEY, json.dumps(payload).encode("utf-8"))
     try:
         home = get_home_dir()
         os.makedirs(home, exist_ok=True)
-        payload: dict[str, Any] = {
-            "captured_at": captured.isoformat(),
-        }
-        if snapshot.primary:
-            payload["primary"] = {
-                "used_percent": snapshot.primary.used_percent,
-                "window_minutes": snapshot.primary.window_minutes,
-                "resets_in_seconds": snapshot.primary.resets_in_seconds,
-            }
-        if snapshot.secondary:
-            payload["secondary"] = {
-                "used_percent": snapshot.secondary.used_percent,
-                "window_minutes": snapshot.secondary.window_minutes,
-                "resets_in_seconds": snapshot.secondary.resets_in_seconds,
-            }
         with open(_limits_path(), "w", encoding="utf-8") as fp:
             if hasattr(os, "fchmod"):
                 try:
@@ -127,15 +140,9 @@ def store_rate_limit_snapshot(snapshot: RateLimitSnapshot, captured_at: Optional
         pass
 
 
-def load_rate_limit_snapshot() -> Optional[StoredRateLimitSnapshot]:
-    try:
-        with open(_limits_path(), "r", encoding="utf-8") as fp:
-            raw = json.load(fp)
-    except FileNotFoundError:
-        return None
-    except Exception:
+def _snapshot_from_raw(raw: Any) -> Optional[StoredRateLimitSnapshot]:
+    if not isinstance(raw, dict):
         return None
-
     captured_raw = raw.get("captured_at")
     captured_at = _parse_datetime(captured_raw)
     if captured_at is None:
@@ -150,6 +157,31 @@ def load_rate_limit_snapshot() -> Optional[StoredRateLimitSnapshot]:
     return StoredRateLimitSnapshot(captured_at=captured_at, snapshot=snapshot)
 
 
+def _load_shared_snapshot() -> Optional[StoredRateLimitSnapshot]:
+    backend = get_state_backend()
+    if backend is None:
+        return None
+    try:
+        data = backend.get(KEY_PREFIX + RATE_LIMITS_KEY)
+        return _snapshot_from_raw(json.loads(data)) if data is not None else None
+    except (StateBackendError, ValueError):
+        return None
+
+
+def load_rate_limit_snapshot() -> Optional[StoredRateLimitSnapshot]:
+    """The latest snapshot saved by this host or, with a shared state backend, by any node."""
+    stored: Optional[StoredRateLimitSnapshot] = None
+    try:
+        with open(_limits_path(), "r", encoding="utf-8") as fp:
+            stored = _snapshot_from_raw(json.load(fp))
+    except (OSError, ValueError):
+        pass
+    shared = _load_shared_snapshot()
+    if shared is not None and (stored is None or shared.captured_at > stored.captured_at):
+        return shared
+    return stored
+
+
 def _parse_datetime(value: Any) -> Optional[datetime]:
     if not isinstance(value, str):
         return None
@@ -0,0 +1,7 @@
+from __future__ import annotations
+
+import sys
+
+
+def eprint(*args, **kwargs) -> None:
+    print(*args, file=sys.stderr, **kwargs)
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict
+
+
+STREAMS_COMPLETED = "streams_completed"
+STREAMS_CANCELLED = "streams_cancelled"
+CANCELLED_UPSTREAM_BYTES = "cancelled_upstream_bytes"
+
+_LOCK = threading.Lock()
+_COUNTERS: Dict[str, int] = {}
+
+
+def snapshot() -> Dict[str, int]:
+    with _LOCK:
+        counters = dict(_COUNTERS)
+    for name in (STREAMS_COMPLETED, STREAMS_CANCELLED, CANCELLED_UPSTREAM_BYTES):
+        counters.setdefault(name, 0)
+    return counters
+
+
+def reset() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
+
+
+def record_stream_end(*, cancelled: bool, upstream_bytes: int = 0) -> None:
+    """Count a finished client stream; ``upstream_bytes`` is what upstream had sent when it was abandoned."""
+    with _LOCK:
+        if cancelled:
+            _COUNTERS[STREAMS_CANCELLED] = _COUNTERS.get(STREAMS_CANCELLED, 0) + 1
+            _COUNTERS[CANCELLED_UPSTREAM_BYTES] = _COUNTERS.get(CANCELLED_UPSTREAM_BYTES, 0) + upstream_bytes
+        else:
+            _COUNTERS[STREAMS_COMPLETED] = _COUNTERS.get(STREAMS_COMPLETED, 0) + 1
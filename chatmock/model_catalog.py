@@ -7,16 +7,15 @@ import threading
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterable
 
 import requests
 
+from .accounts import PRIMARY_ACCOUNT_NAME, UpstreamAccount, get_account_pool
 from .config import CHATGPT_CODEX_BASE_URL, ORIGINATOR
 from .utils import (
     get_codex_user_agent,
     get_effective_chatgpt_auth,
-    get_home_dir,
-    read_auth_file,
     resolve_installation_id,
 )
 
@@ -55,15 +54,6 @@ def _parse_timestamp(value: Any) -> datetime.datetime | None:
     return parsed.astimezone(datetime.timezone.utc)
 
 
-def _account_id_from_auth_file() -> str | None:
-    auth = read_auth_file() or {}
-    tokens = auth.get("tokens")
-    if not isinstance(tokens, dict):
-        return None
-    account_id = tokens.get("account_id")
-    return account_id.strip() if isinstance(account_id, str) and account_id.strip() else None
-
-
 def _parse_models(value: Any) -> tuple[CatalogModel, ...]:
     if not isinstance(value, list):
         return ()
@@ -106,20 +96,22 @@ def _parse_models(value: Any) -> tuple[CatalogModel, ...]:
     return tuple(models)
 
 
-class ModelCatalog:
-    """Account-scoped model metadata with stale-while-revalidate refresh."""
+class AccountModelCatalog:
+    """One account's model metadata with stale-while-revalidate refresh."""
 
     def __init__(
         self,
+        account: UpstreamAccount,
         *,
         enabled: bool = True,
         refresh_interval_seconds: float = DEFAULT_REFRESH_INTERVAL_SECONDS,
         cache_path: str | os.PathLike[str] | None = None,
         session: requests.Session | None = None,
     ) -> None:
+        self.account = account
         self.enabled = bool(enabled)
         self.refresh_interval_seconds = max(float(refresh_interval_seconds), 0.0)
-        self.cache_path = Path(cache_path) if cache_path else Path(get_home_dir()) / MODEL_CACHE_FILE
+        self.cache_path = Path(cache_path) if cache_path else Path(account.home) / MODEL_CACHE_FILE
         self._session = session or requests.Session()
         self._lock = threading.Lock()
         self._models: tuple[CatalogModel, ...] = ()
@@ -133,45 +125,30 @@ class ModelCatalog:
         if self.enabled:
             self._load_cache()
 
-    def models(self, *, wait_for_refresh: bool = False) -> tuple[CatalogModel, ...]:
-        self.refresh_if_due(wait_for_refresh=wait_for_refresh)
+    def models(self) -> tuple[CatalogModel, ...]:
         with self._lock:
             return self._models
 
-    def visible_models(self, *, wait_for_refresh: bool = False) -> tuple[CatalogModel, ...]:
-        models = self.models(wait_for_refresh=wait_for_refresh)
-        return tuple(
-            sorted(
-                (model for model in models if model.visibility == "list"),
-                key=lambda model: model.priority,
-            )
-        )
-
-    def refresh_if_due(self, *, wait_for_refresh: bool = False) -> None:
+    def refresh_if_due(self) -> threading.Event | None:
+        """Start a background refresh when due; returns the event of the active refresh, if any."""
         if not self.enabled:
-            return
+            return None
 
-        refresh_active = False
         with self._lock:
             due = self._is_due_locked()
-            event = self._refresh_done
             if due and not self._refresh_in_progress and self._retry_allowed_locked():
                 self._refresh_in_progress = True
                 self._last_attempt_monotonic = time.monotonic()
                 self._refresh_done = threading.Event()
-                event = self._refresh_done
                 threading.Thread(
                     target=self._refresh_worker,
                     name="chatmock-model-catalog-refresh",
                     daemon=True,
                 ).start()
-                refresh_active = True
-            elif self._refresh_in_progress:
-                event = self._refresh_done
-                refresh_active = True
-
-        if wait_for_refresh and refresh_active:
-            event.wait(FETCH_TIMEOUT_SECONDS + 1)
+                return self._refresh_done
+            if self._refresh_in_progress:
+                return self._refresh_done
+        return None
 
     def _is_due_locked(self) -> bool:
         if not self._models or self._fetched_at is None:
@@ -197,13 +174,17 @@ class ModelCatalog:
                 self._refresh_done.set()
 
     def _fetch_and_apply(self) -> None:
-        access_token, account_id = get_effective_chatgpt_auth()
+        access_token, account_id = get_effective_chatgpt_auth(account=self.account)
         if not access_token or not account_id:
             return
 
         response = self._request_models(access_token, account_id)
         if response.status_code == 401:
-            access_token, account_id = get_effective_chatgpt_auth(force_refresh=True)
+            access_token, account_id = get_effective_chatgpt_auth(
+                force_refresh=True,
+                rejected_access_token=access_token,
+                account=self.account,
+            )
             if not access_token or not account_id:
                 return
             response = self._request_models(access_token, account_id)
@@ -250,7 +231,7 @@ class ModelCatalog:
             return
 
         cached_account_id = payload.get("account_id")
-        current_account_id = _account_id_from_auth_file()
+        current_account_id = self.account.account_id
         if (
             not isinstance(cached_account_id, str)
             or not current_account_id
@@ -292,6 +273,91 @@ class ModelCatalog:
             return
 
 
+class ModelCatalog:
+    """
+    Model metadata for every pooled account.
+
+    Each account keeps its own catalog (and cache file next to its auth.json);
+    lookups see the union, and request routing can ask whether a particular
+    account serves a model.
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        refresh_interval_seconds: float = DEFAULT_REFRESH_INTERVAL_SECONDS,
+        cache_path: str | os.PathLike[str] | None = None,
+        session: requests.Session | None = None,
+        accounts: Callable[[], Iterable[UpstreamAccount]] | None = None,
+    ) -> None:
+        self.enabled = bool(enabled)
+        self.refresh_interval_seconds = max(float(refresh_interval_seconds), 0.0)
+        self.cache_path = Path(cache_path) if cache_path else None
+        self._session = session or requests.Session()
+        self._accounts = accounts or (lambda: get_account_pool().accounts())
+        self._lock = threading.Lock()
+        self._catalogs: dict[str, AccountModelCatalog] = {}
+
+    def for_account(self, account: UpstreamAccount) -> AccountModelCatalog:
+        catalog = self._catalogs.get(account.name)
+        if catalog is not None:
+            return catalog
+        with self._lock:
+            catalog = self._catalogs.get(account.name)
+            if catalog is None:
+                cache_path = self.cache_path if account.name == PRIMARY_ACCOUNT_NAME else None
+                catalog = AccountModelCatalog(
+                    account,
+                    enabled=self.enabled,
+                    refresh_interval_seconds=self.refresh_interval_seconds,
+                    cache_path=cache_path,
+                    session=self._session,
+                )
+                self._catalogs[account.name] = catalog
+            return catalog
+
+    def _account_catalogs(self) -> list[AccountModelCatalog]:
+        return [self.for_account(account) for account in self._accounts() if account.has_credentials]
+
+    def models(self, *, wait_for_refresh: bool = False) -> tuple[CatalogModel, ...]:
+        catalogs = self._account_catalogs()
+        events = [event for event in (catalog.refresh_if_due() for catalog in catalogs) if event is not None]
+        if wait_for_refresh:
+            deadline = time.monotonic() + FETCH_TIMEOUT_SECONDS + 1
+            for event in events:
+                event.wait(max(deadline - time.monotonic(), 0.0))
+
+        if len(catalogs) == 1:
+            return catalogs[0].models()
+        merged: dict[str, CatalogModel] = {}
+        for catalog in catalogs:
+            for model in catalog.models():
+                merged.setdefault(model.slug, model)
+        return tuple(merged.values())
+
+    def visible_models(self, *, wait_for_refresh: bool = False) -> tuple[CatalogModel, ...]:
+        models = self.models(wait_for_refresh=wait_for_refresh)
+        return tuple(
+            sorted(
+                (model for model in models if model.visibility == "list"),
+                key=lambda model: model.priority,
+            )
+        )
+
+    def refresh_if_due(self, *, wait_for_refresh: bool = False) -> None:
+        self.models(wait_for_refresh=wait_for_refresh)
+
+    def account_serves_model(self, account: UpstreamAccount, model: str) -> bool | None:
+        """Whether ``account``'s catalog lists ``model``; ``None`` while that catalog is unknown."""
+        if not self.enabled:
+            return None
+        models = self.for_account(account).models()
+        if not models:
+            return None
+        return any(item.slug == model for item in models)
+
+
 def current_model_catalog() -> ModelCatalog | None:
     try:
         from flask import current_app
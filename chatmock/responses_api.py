@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-import json
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, Iterator, List
+from typing import AbstractSet, Any, Dict, Iterable, Iterator, List
 
 from .fast_mode import ServiceTierResolution, resolve_service_tier
+from .jsoncodec import dumps
+from .lean import LeanStreamFilter, LeanStreamSettings
 from .model_registry import (
     allowed_efforts_for_model,
     extract_reasoning_from_model_name,
@@ -12,6 +13,8 @@ from .model_registry import (
 )
 from .reasoning import build_reasoning_param
 from .session import ensure_session_id
+from .sse import SSEDecoder, SSEEventFilter, iter_sse_json, parse_event_data
+from .timeouts import UpstreamStalled
 
 
 @dataclass(frozen=True)
@@ -31,6 +34,7 @@ class NormalizedResponsesRequest:
     normalized_model: str
     session_id: str
     service_tier_resolution: ServiceTierResolution
+    lean_stream: bool | None = None
 
 
 def extract_client_session_id(headers: Any) -> str | None:
@@ -128,6 +132,7 @@ def normalize_responses_payload(
     else:
         normalized["service_tier"] = service_tier_resolution.service_tier
     normalized.pop("fast_mode", None)
+    lean_stream = normalized.pop("lean_stream", None)
 
     input_items = _input_items_for_session(normalized.get("input"))
     session_id = ensure_session_id(instructions, input_items, client_session_id)
@@ -141,27 +146,40 @@ def normalize_responses_payload(
         normalized_model=normalized_model,
         session_id=session_id,
         service_tier_resolution=service_tier_resolution,
+        lean_stream=lean_stream if isinstance(lean_stream, bool) else None,
     )
 
 
 def iter_sse_event_payloads(upstream: Any) -> Iterator[Dict[str, Any]]:
-    for raw in upstream.iter_lines(decode_unicode=False):
-        if not raw:
-            continue
-        line = raw.decode("utf-8", errors="ignore") if isinstance(raw, (bytes, bytearray)) else raw
-        if not line.startswith("data: "):
-            continue
-        data = line[len("data: ") :].strip()
-        if not data or data == "[DONE]":
-            if data == "[DONE]":
-                break
-            continue
-        try:
-            evt = json.loads(data)
-        except Exception:
-            continue
-        if isinstance(evt, dict):
-            yield evt
+    return iter_sse_json(upstream.iter_content(chunk_size=None))
+
+
+class ResponsesStreamAggregator:
+    """Collects the final response object (or error) from upstream events."""
+
+    def __init__(self, *, on_event: Any | None = None) -> None:
+        self.on_event = on_event
+        self.response: Dict[str, Any] | None = None
+        self.error: Dict[str, Any] | None = None
+
+    def feed(self, evt: Dict[str, Any]) -> bool:
+        """Apply one event; returns ``True`` once the stream is finished."""
+        if callable(self.on_event):
+            try:
+                self.on_event(evt)
+            except Exception:
+                pass
+        response = evt.get("response")
+        if isinstance(response, dict):
+            self.response = response
+        kind = evt.get("type")
+        if kind == "response.failed":
+            if isinstance(response, dict) and isinstance(response.get("error"), dict):
+                self.error = {"error": response.get("error")}
+            else:
+                self.error = {"error": {"message": "response.failed"}}
+            return True
+        return kind == "response.completed"
 
 
 def aggregate_response_from_sse(
@@ -169,63 +187,90 @@ def aggregate_response_from_sse(
     *,
     on_event: Any | None = None,
 ) -> tuple[Dict[str, Any] | None, Dict[str, Any] | None]:
-    response_obj: Dict[str, Any] | None = None
-    error_obj: Dict[str, Any] | None = None
+    aggregator = ResponsesStreamAggregator(on_event=on_event)
     try:
         for evt in iter_sse_event_payloads(upstream):
-            if callable(on_event):
-                try:
-                    on_event(evt)
-                except Exception:
-                    pass
-            response = evt.get("response")
-            if isinstance(response, dict):
-                response_obj = response
-            kind = evt.get("type")
-            if kind == "response.failed":
-                if isinstance(response, dict) and isinstance(response.get("error"), dict):
-                    error_obj = {"error": response.get("error")}
-                else:
-                    error_obj = {"error": {"message": "response.failed"}}
-                break
-            if kind == "response.completed":
+            if aggregator.feed(evt):
                 break
     finally:
         upstream.close()
-    return response_obj, error_obj
+    return aggregator.response, aggregator.error
+
+
+def stall_error_event(exc: UpstreamStalled) -> Dict[str, Any]:
+    return {"type": "error", "status_code": exc.status_code, "error": exc.error_payload()}
+
+
+def interrupted_error_event(exc: BaseException) -> Dict[str, Any]:
+    error = {"message": f"Upstream stream interrupted: {exc}", "type": "upstream_error", "code": "upstream_interrupted"}
+    return {"type": "error", "status_code": 502, "error": error}
+
+
+def encode_stall_error_event(evt: Dict[str, Any]) -> bytes:
+    # The leading blank line terminates whatever partial event was in flight.
+    return b"\n\nevent: error\ndata: " + dumps(evt) + b"\n\n"
+
+
+class _AllEvents:
+    __slots__ = ("_decoder",)
+
+    def __init__(self) -> None:
+        self._decoder = SSEDecoder()
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        events = []
+        for _name, data in self._decoder.feed(chunk):
+            evt = parse_event_data(data)
+            if evt is not None:
+                events.append(evt)
+        return events
 
 
 def stream_upstream_bytes(
     upstream: Any,
     *,
     on_event: Any | None = None,
+    event_types: AbstractSet[str] | None = None,
+    lean: LeanStreamSettings | None = None,
 ) -> Iterable[bytes]:
-    buffer = b""
+    """
+    Relay upstream SSE bytes untouched, handing parsed events to ``on_event``.
+
+    With ``event_types`` only events of those types are decoded for
+    ``on_event`` (see :class:`~chatmock.sse.SSEEventFilter`); the rest are
+    passed through without being parsed. With enabled ``lean`` settings the
+    client gets the trimmed stream instead, while ``on_event`` still sees
+    every upstream event.
+    """
+    picker = None
+    if callable(on_event):
+        picker = SSEEventFilter(event_types) if event_types is not None else _AllEvents()
+    trim = LeanStreamFilter(lean) if lean is not None and lean.enabled else None
     try:
         for chunk in upstream.iter_content(chunk_size=None):
             if chunk:
-                if callable(on_event):
-                    if isinstance(chunk, bytes):
-                        buffer += chunk
-                    else:
-                        buffer += str(chunk).encode("utf-8", errors="ignore")
-                    while b"\n" in buffer:
-                        line, buffer = buffer.split(b"\n", 1)
-                        line = line.rstrip(b"\r")
-                        if not line.startswith(b"data: "):
-                            continue
-                        data = line[len(b"data: ") :].strip()
-                        if not data or data == b"[DONE]":
-                            continue
+                if picker is not None:
+                    for evt in picker.feed(chunk):
                         try:
-                            evt = json.loads(data.decode("utf-8", errors="ignore"))
+                            on_event(evt)
                         except Exception:
-                            evt = None
-                        if isinstance(evt, dict):
-                            try:
-                                on_event(evt)
-                            except Exception:
-                                pass
+                            pass
+                if trim is not None:
+                    chunk = trim.feed(chunk)
+                    if not chunk:
+                        continue
                 yield chunk
+        if trim is not None:
+            tail = trim.close()
+            if tail:
+                yield tail
+    except UpstreamStalled as exc:
+        evt = stall_error_event(exc)
+        if callable(on_event):
+            try:
+                on_event(evt)
+            except Exception:
+                pass
+        yield encode_stall_error_event(evt)
     finally:
         upstream.close()
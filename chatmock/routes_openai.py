@@ -6,7 +6,20 @@ from typing import Any, Dict, List
 
 from flask import Blueprint, Response, current_app, jsonify, make_response, request
 
-from .fast_mode import resolve_service_tier
+from .admission import admission_controlled
+from .chat_api import (
+    ChatCompletionAccumulator,
+    ChatRequestError,
+    build_chat_completion,
+    build_text_completion,
+    normalize_chat_completions_payload,
+    normalize_completions_payload,
+    upstream_error_message,
+)
+from .coalesce import current_coalesce_settings
+from .disconnect import abort_on_disconnect
+from .jsoncodec import loads
+from .lean import current_lean_settings
 from .limits import record_rate_limits_from_response
 from .http import build_cors_headers
 from .model_registry import list_public_models
@@ -14,28 +27,26 @@ from .responses_api import (
     ResponsesRequestError,
     aggregate_response_from_sse,
     extract_client_session_id,
+    iter_sse_event_payloads,
     normalize_responses_payload,
     stream_upstream_bytes,
 )
-from .reasoning import (
-    allowed_efforts_for_model,
-    apply_reasoning_to_message,
-    build_reasoning_param,
-    extract_reasoning_from_model_name,
-)
 from .session import (
+    SESSION_EVENT_TYPES,
     clear_responses_reuse_state,
     note_responses_final_response,
     note_responses_stream_event,
     prepare_responses_request_for_session,
 )
-from .upstream import normalize_model_name, start_upstream_raw_request, start_upstream_request
-from .utils import (
-    convert_chat_messages_to_responses_input,
-    convert_tools_chat_to_responses,
-    sse_translate_chat,
-    sse_translate_text,
+from .timeouts import UpstreamStalled
+from .translate import OutputTooLarge
+from .upstream import (
+    normalize_model_name,
+    start_upstream_raw_request,
+    start_upstream_request,
+    upstream_stalled_response,
 )
+from .utils import sse_translate_chat, sse_translate_text
 
 
 openai_bp = Blueprint("openai", __name__)
@@ -71,198 +82,95 @@ def _wrap_stream_logging(label: str, iterator, enabled: bool):
     return _gen()
 
 
-def _service_tier_from_payload(
-    model: str,
-    payload: Dict[str, Any],
-    *,
-    verbose: bool = False,
-) -> tuple[str | None, Response | None]:
-    resolution = resolve_service_tier(
-        model,
-        request_fast_mode=payload.get("fast_mode"),
-        request_service_tier=payload.get("service_tier"),
-        server_fast_mode=bool(current_app.config.get("FAST_MODE")),
+def _log_error_response(label: str, error_resp: Response) -> None:
+    try:
+        body = error_resp.get_data(as_text=True)
+        if body:
+            try:
+                parsed = json.loads(body)
+            except Exception:
+                parsed = body
+            _log_json(label, parsed)
+    except Exception:
+        pass
+
+
+def _chat_request_error(label: str, exc: ChatRequestError, *, verbose: bool) -> tuple[Response, int]:
+    err: Dict[str, Any] = {"error": {"message": str(exc)}}
+    if exc.code:
+        err["error"]["code"] = exc.code
+    if verbose:
+        _log_json(label, err)
+    return jsonify(err), exc.status_code
+
+
+def _stream_response(stream_iter, status: int) -> Response:
+    resp = Response(
+        stream_iter,
+        status=status,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
     )
-    if resolution.warning_message and verbose:
-        print(f"[FastMode] {resolution.warning_message}")
-    if resolution.error_message:
-        err = {"error": {"message": resolution.error_message}}
-        if verbose:
-            _log_json("OUT POST service_tier resolution", err)
-        resp = make_response(jsonify(err), 400)
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
-        return None, resp
-    return resolution.service_tier, None
+    for k, v in build_cors_headers().items():
+        resp.headers.setdefault(k, v)
+    return resp
 
 
 @openai_bp.route("/v1/chat/completions", methods=["POST"])
+@admission_controlled()
 def chat_completions() -> Response:
     verbose = bool(current_app.config.get("VERBOSE"))
     verbose_obfuscation = bool(current_app.config.get("VERBOSE_OBFUSCATION"))
-    reasoning_effort = current_app.config.get("REASONING_EFFORT", "medium")
-    reasoning_summary = current_app.config.get("REASONING_SUMMARY", "auto")
     reasoning_compat = current_app.config.get("REASONING_COMPAT", "think-tags")
 
-    raw = request.get_data(cache=True, as_text=True) or ""
+    raw = request.get_data(cache=True) or b""
     if verbose:
         try:
-            print("IN POST /v1/chat/completions\n" + raw)
+            print("IN POST /v1/chat/completions\n" + raw.decode("utf-8", errors="replace"))
         except Exception:
             pass
     try:
-        payload = json.loads(raw) if raw else {}
+        payload = loads(raw) if raw else {}
     except Exception:
         try:
-            payload = json.loads(raw.replace("\r", "").replace("\n", ""))
+            payload = loads(raw.replace(b"\r", b"").replace(b"\n", b""))
         except Exception:
             err = {"error": {"message": "Invalid JSON body"}}
             if verbose:
                 _log_json("OUT POST /v1/chat/completions", err)
             return jsonify(err), 400
 
-    requested_model = payload.get("model")
-    model = normalize_model_name(requested_model, current_app.config.get("DEBUG_MODEL"))
-    messages = payload.get("messages")
-    if messages is None and isinstance(payload.get("prompt"), str):
-        messages = [{"role": "user", "content": payload.get("prompt") or ""}]
-    if messages is None and isinstance(payload.get("input"), str):
-        messages = [{"role": "user", "content": payload.get("input") or ""}]
-    if messages is None:
-        messages = []
-    if not isinstance(messages, list):
-        err = {"error": {"message": "Request must include messages: []"}}
-        if verbose:
-            _log_json("OUT POST /v1/chat/completions", err)
-        return jsonify(err), 400
-
-    if isinstance(messages, list):
-        sys_idx = next((i for i, m in enumerate(messages) if isinstance(m, dict) and m.get("role") == "system"), None)
-        if isinstance(sys_idx, int):
-            sys_msg = messages.pop(sys_idx)
-            content = sys_msg.get("content") if isinstance(sys_msg, dict) else ""
-            messages.insert(0, {"role": "user", "content": content})
-    is_stream = bool(payload.get("stream"))
-    stream_options = payload.get("stream_options") if isinstance(payload.get("stream_options"), dict) else {}
-    include_usage = bool(stream_options.get("include_usage", False))
-
-    tools_responses = convert_tools_chat_to_responses(payload.get("tools"))
-    tool_choice = payload.get("tool_choice", "auto")
-    parallel_tool_calls = bool(payload.get("parallel_tool_calls", False))
-    responses_tools_payload = payload.get("responses_tools") if isinstance(payload.get("responses_tools"), list) else []
-    extra_tools: List[Dict[str, Any]] = []
-    had_responses_tools = False
-    if isinstance(responses_tools_payload, list):
-        for _t in responses_tools_payload:
-            if not (isinstance(_t, dict) and isinstance(_t.get("type"), str)):
-                continue
-            if _t.get("type") not in ("web_search", "web_search_preview"):
-                err = {
-                    "error": {
-                        "message": "Only web_search/web_search_preview are supported in responses_tools",
-                        "code": "RESPONSES_TOOL_UNSUPPORTED",
-                    }
-                }
-                if verbose:
-                    _log_json("OUT POST /v1/chat/completions", err)
-                return jsonify(err), 400
-            extra_tools.append(_t)
-
-        if not extra_tools and bool(current_app.config.get("DEFAULT_WEB_SEARCH")):
-            responses_tool_choice = payload.get("responses_tool_choice")
-            if not (isinstance(responses_tool_choice, str) and responses_tool_choice == "none"):
-                extra_tools = [{"type": "web_search"}]
-
-        if extra_tools:
-            import json as _json
-            MAX_TOOLS_BYTES = 32768
-            try:
-                size = len(_json.dumps(extra_tools))
-            except Exception:
-                size = 0
-            if size > MAX_TOOLS_BYTES:
-                err = {"error": {"message": "responses_tools too large", "code": "RESPONSES_TOOLS_TOO_LARGE"}}
-                if verbose:
-                    _log_json("OUT POST /v1/chat/completions", err)
-                return jsonify(err), 400
-            had_responses_tools = True
-            tools_responses = (tools_responses or []) + extra_tools
-
-    responses_tool_choice = payload.get("responses_tool_choice")
-    if isinstance(responses_tool_choice, str) and responses_tool_choice in ("auto", "none"):
-        tool_choice = responses_tool_choice
-
-    input_items = convert_chat_messages_to_responses_input(messages)
-    if not input_items and isinstance(payload.get("prompt"), str) and payload.get("prompt").strip():
-        input_items = [
-            {"type": "message", "role": "user", "content": [{"type": "input_text", "text": payload.get("prompt")}]}
-        ]
-
-    model_reasoning = extract_reasoning_from_model_name(requested_model)
-    reasoning_overrides = payload.get("reasoning") if isinstance(payload.get("reasoning"), dict) else model_reasoning
-    reasoning_param = build_reasoning_param(
-        reasoning_effort,
-        reasoning_summary,
-        reasoning_overrides,
-        allowed_efforts=allowed_efforts_for_model(model),
-    )
-    service_tier, tier_error = _service_tier_from_payload(model, payload, verbose=verbose)
-    if tier_error is not None:
-        return tier_error
-
-    upstream, error_resp = start_upstream_request(
-        model,
-        input_items,
-        tools=tools_responses,
-        tool_choice=tool_choice,
-        parallel_tool_calls=parallel_tool_calls,
-        reasoning_param=reasoning_param,
-        service_tier=service_tier,
-    )
+    try:
+        chat = normalize_chat_completions_payload(payload, config=current_app.config)
+    except ChatRequestError as exc:
+        return _chat_request_error("OUT POST /v1/chat/completions", exc, verbose=verbose)
+    if chat.service_tier_warning and verbose:
+        print(f"[FastMode] {chat.service_tier_warning}")
+    requested_model = chat.requested_model
+    model = chat.model
+
+    upstream, error_resp = start_upstream_request(model, chat.input_items, **chat.upstream_kwargs())
     if error_resp is not None:
         if verbose:
-            try:
-                body = error_resp.get_data(as_text=True)
-                if body:
-                    try:
-                        parsed = json.loads(body)
-                    except Exception:
-                        parsed = body
-                    _log_json("OUT POST /v1/chat/completions", parsed)
-            except Exception:
-                pass
+            _log_error_response("OUT POST /v1/chat/completions", error_resp)
         return error_resp
 
     record_rate_limits_from_response(upstream)
 
     created = int(time.time())
     if upstream.status_code >= 400:
-        try:
-            raw = upstream.content
-            err_body = json.loads(raw.decode("utf-8", errors="ignore")) if raw else {"raw": upstream.text}
-        except Exception:
-            err_body = {"raw": upstream.text}
-        if had_responses_tools:
+        upstream_message = upstream_error_message(upstream.content, upstream.text)
+        if chat.fallback_tools is not None:
             if verbose:
                 print("[Passthrough] Upstream rejected tools; retrying without extra tools (args redacted)")
-            base_tools_only = convert_tools_chat_to_responses(payload.get("tools"))
-            safe_choice = payload.get("tool_choice", "auto")
-            upstream2, err2 = start_upstream_request(
-                model,
-                input_items,
-                tools=base_tools_only,
-                tool_choice=safe_choice,
-                parallel_tool_calls=parallel_tool_calls,
-                reasoning_param=reasoning_param,
-                service_tier=service_tier,
-            )
+            upstream2, err2 = start_upstream_request(model, chat.input_items, **chat.upstream_kwargs(fallback=True))
             record_rate_limits_from_response(upstream2)
             if err2 is None and upstream2 is not None and upstream2.status_code < 400:
                 upstream = upstream2
             else:
                 err = {
                     "error": {
-                        "message": (err_body.get("error", {}) or {}).get("message", "Upstream error"),
+                        "message": upstream_message,
                         "code": "RESPONSES_TOOLS_REJECTED",
                     }
                 }
@@ -272,12 +180,12 @@ def chat_completions() -> Response:
         else:
             if verbose:
                 print("Upstream error status=", upstream.status_code)
-            err = {"error": {"message": (err_body.get("error", {}) or {}).get("message", "Upstream error")}}
+            err = {"error": {"message": upstream_message}}
             if verbose:
                 _log_json("OUT POST /v1/chat/completions", err)
             return jsonify(err), upstream.status_code
 
-    if is_stream:
+    if chat.stream:
         if verbose:
             print("OUT POST /v1/chat/completions (streaming response)")
         stream_iter = sse_translate_chat(
@@ -287,111 +195,30 @@ def chat_completions() -> Response:
             verbose=verbose_obfuscation,
             vlog=print if verbose_obfuscation else None,
             reasoning_compat=reasoning_compat,
-            include_usage=include_usage,
+            include_usage=chat.include_usage,
+            coalesce=current_coalesce_settings(),
         )
+        stream_iter = abort_on_disconnect(stream_iter, upstream)
         stream_iter = _wrap_stream_logging("STREAM OUT /v1/chat/completions", stream_iter, verbose)
-        resp = Response(
-            stream_iter,
-            status=upstream.status_code,
-            mimetype="text/event-stream",
-            headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-        )
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
-        return resp
-
-    full_text = ""
-    reasoning_summary_text = ""
-    reasoning_full_text = ""
-    response_id = "chatcmpl"
-    tool_calls: List[Dict[str, Any]] = []
-    error_message: str | None = None
-    usage_obj: Dict[str, int] | None = None
+        return _stream_response(stream_iter, upstream.status_code)
 
-    def _extract_usage(evt: Dict[str, Any]) -> Dict[str, int] | None:
-        try:
-            usage = (evt.get("response") or {}).get("usage")
-            if not isinstance(usage, dict):
-                return None
-            pt = int(usage.get("input_tokens") or 0)
-            ct = int(usage.get("output_tokens") or 0)
-            tt = int(usage.get("total_tokens") or (pt + ct))
-            return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
-        except Exception:
-            return None
+    acc = ChatCompletionAccumulator(max_output_bytes=current_app.config.get("MAX_OUTPUT_BYTES", 0))
     try:
-        for raw in upstream.iter_lines(decode_unicode=False):
-            if not raw:
-                continue
-            line = raw.decode("utf-8", errors="ignore") if isinstance(raw, (bytes, bytearray)) else raw
-            if not line.startswith("data: "):
-                continue
-            data = line[len("data: "):].strip()
-            if not data:
-                continue
-            if data == "[DONE]":
-                break
-            try:
-                evt = json.loads(data)
-            except Exception:
-                continue
-            kind = evt.get("type")
-            mu = _extract_usage(evt)
-            if mu:
-                usage_obj = mu
-            if isinstance(evt.get("response"), dict) and isinstance(evt["response"].get("id"), str):
-                response_id = evt["response"].get("id") or response_id
-            if kind == "response.output_text.delta":
-                full_text += evt.get("delta") or ""
-            elif kind == "response.reasoning_summary_text.delta":
-                reasoning_summary_text += evt.get("delta") or ""
-            elif kind == "response.reasoning_text.delta":
-                reasoning_full_text += evt.get("delta") or ""
-            elif kind == "response.output_item.done":
-                item = evt.get("item") or {}
-                if isinstance(item, dict) and item.get("type") == "function_call":
-                    call_id = item.get("call_id") or item.get("id") or ""
-                    name = item.get("name") or ""
-                    args = item.get("arguments") or ""
-                    if isinstance(call_id, str) and isinstance(name, str) and isinstance(args, str):
-                        tool_calls.append(
-                            {
-                                "id": call_id,
-                                "type": "function",
-                                "function": {"name": name, "arguments": args},
-                            }
-                        )
-            elif kind == "response.failed":
-                error_message = evt.get("response", {}).get("error", {}).get("message", "response.failed")
-            elif kind == "response.completed":
+        for evt in iter_sse_event_payloads(upstream):
+            if acc.feed(evt):
                 break
+    except (UpstreamStalled, OutputTooLarge) as exc:
+        return upstream_stalled_response(exc)
     finally:
         upstream.close()
 
-    if error_message:
-        resp = make_response(jsonify({"error": {"message": error_message}}), 502)
+    if acc.error_message:
+        resp = make_response(jsonify({"error": {"message": acc.error_message}}), 502)
         for k, v in build_cors_headers().items():
             resp.headers.setdefault(k, v)
         return resp
 
-    message: Dict[str, Any] = {"role": "assistant", "content": full_text if full_text else None}
-    if tool_calls:
-        message["tool_calls"] = tool_calls
-    message = apply_reasoning_to_message(message, reasoning_summary_text, reasoning_full_text, reasoning_compat)
-    completion = {
-        "id": response_id or "chatcmpl",
-        "object": "chat.completion",
-        "created": created,
-        "model": requested_model or model,
-        "choices": [
-            {
-                "index": 0,
-                "message": message,
-                "finish_reason": "tool_calls" if tool_calls else "stop",
-            }
-        ],
-        **({"usage": usage_obj} if usage_obj else {}),
-    }
+    completion = build_chat_completion(acc, requested_model or model, created, reasoning_compat)
     if verbose:
         _log_json("OUT POST /v1/chat/completions", completion)
     resp = make_response(jsonify(completion), upstream.status_code)
@@ -401,85 +228,54 @@ def chat_completions() -> Response:
 
 
 @openai_bp.route("/v1/completions", methods=["POST"])
+@admission_controlled()
 def completions() -> Response:
     verbose = bool(current_app.config.get("VERBOSE"))
     verbose_obfuscation = bool(current_app.config.get("VERBOSE_OBFUSCATION"))
-    reasoning_effort = current_app.config.get("REASONING_EFFORT", "medium")
-    reasoning_summary = current_app.config.get("REASONING_SUMMARY", "auto")
 
-    raw = request.get_data(cache=True, as_text=True) or ""
+    raw = request.get_data(cache=True) or b""
     if verbose:
         try:
-            print("IN POST /v1/completions\n" + raw)
+            print("IN POST /v1/completions\n" + raw.decode("utf-8", errors="replace"))
         except Exception:
             pass
     try:
-        payload = json.loads(raw) if raw else {}
+        payload = loads(raw) if raw else {}
     except Exception:
         err = {"error": {"message": "Invalid JSON body"}}
         if verbose:
             _log_json("OUT POST /v1/completions", err)
         return jsonify(err), 400
 
-    requested_model = payload.get("model")
-    model = normalize_model_name(requested_model, current_app.config.get("DEBUG_MODEL"))
-    prompt = payload.get("prompt")
-    if isinstance(prompt, list):
-        prompt = "".join([p if isinstance(p, str) else "" for p in prompt])
-    if not isinstance(prompt, str):
-        prompt = payload.get("suffix") or ""
-    stream_req = bool(payload.get("stream", False))
-    stream_options = payload.get("stream_options") if isinstance(payload.get("stream_options"), dict) else {}
-    include_usage = bool(stream_options.get("include_usage", False))
-
-    messages = [{"role": "user", "content": prompt or ""}]
-    input_items = convert_chat_messages_to_responses_input(messages)
-
-    model_reasoning = extract_reasoning_from_model_name(requested_model)
-    reasoning_overrides = payload.get("reasoning") if isinstance(payload.get("reasoning"), dict) else model_reasoning
-    reasoning_param = build_reasoning_param(
-        reasoning_effort,
-        reasoning_summary,
-        reasoning_overrides,
-        allowed_efforts=allowed_efforts_for_model(model),
-    )
-    service_tier, tier_error = _service_tier_from_payload(model, payload, verbose=verbose)
-    if tier_error is not None:
-        return tier_error
+    try:
+        completion_req = normalize_completions_payload(payload, config=current_app.config)
+    except ChatRequestError as exc:
+        return _chat_request_error("OUT POST /v1/completions", exc, verbose=verbose)
+    if completion_req.service_tier_warning and verbose:
+        print(f"[FastMode] {completion_req.service_tier_warning}")
+    requested_model = completion_req.requested_model
+    model = completion_req.model
+
     upstream, error_resp = start_upstream_request(
         model,
-        input_items,
-        reasoning_param=reasoning_param,
-        service_tier=service_tier,
+        completion_req.input_items,
+        **completion_req.upstream_kwargs(),
     )
     if error_resp is not None:
         if verbose:
-            try:
-                body = error_resp.get_data(as_text=True)
-                if body:
-                    try:
-                        parsed = json.loads(body)
-                    except Exception:
-                        parsed = body
-                    _log_json("OUT POST /v1/completions", parsed)
-            except Exception:
-                pass
+            _log_error_response("OUT POST /v1/completions", error_resp)
         return error_resp
 
     record_rate_limits_from_response(upstream)
 
     created = int(time.time())
     if upstream.status_code >= 400:
-        try:
-            err_body = json.loads(upstream.content.decode("utf-8", errors="ignore")) if upstream.content else {"raw": upstream.text}
-        except Exception:
-            err_body = {"raw": upstream.text}
-        err = {"error": {"message": (err_body.get("error", {}) or {}).get("message", "Upstream error")}}
+        err = {"error": {"message": upstream_error_message(upstream.content, upstream.text)}}
         if verbose:
             _log_json("OUT POST /v1/completions", err)
         return jsonify(err), upstream.status_code
 
-    if stream_req:
+    if completion_req.stream:
         if verbose:
             print("OUT POST /v1/completions (streaming response)")
         stream_iter = sse_translate_text(
@@ -488,72 +284,24 @@ def completions() -> Response:
             created,
             verbose=verbose_obfuscation,
             vlog=(print if verbose_obfuscation else None),
-            include_usage=include_usage,
+            include_usage=completion_req.include_usage,
+            coalesce=current_coalesce_settings(),
         )
+        stream_iter = abort_on_disconnect(stream_iter, upstream)
         stream_iter = _wrap_stream_logging("STREAM OUT /v1/completions", stream_iter, verbose)
-        resp = Response(
-            stream_iter,
-            status=upstream.status_code,
-            mimetype="text/event-stream",
-            headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-        )
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
-        return resp
+        return _stream_response(stream_iter, upstream.status_code)
 
-    full_text = ""
-    response_id = "cmpl"
-    usage_obj: Dict[str, int] | None = None
-    def _extract_usage(evt: Dict[str, Any]) -> Dict[str, int] | None:
-        try:
-            usage = (evt.get("response") or {}).get("usage")
-            if not isinstance(usage, dict):
-                return None
-            pt = int(usage.get("input_tokens") or 0)
-            ct = int(usage.get("output_tokens") or 0)
-            tt = int(usage.get("total_tokens") or (pt + ct))
-            return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
-        except Exception:
-            return None
+    acc = ChatCompletionAccumulator(response_id="cmpl", max_output_bytes=current_app.config.get("MAX_OUTPUT_BYTES", 0))
     try:
-        for raw_line in upstream.iter_lines(decode_unicode=False):
-            if not raw_line:
-                continue
-            line = raw_line.decode("utf-8", errors="ignore") if isinstance(raw_line, (bytes, bytearray)) else raw_line
-            if not line.startswith("data: "):
-                continue
-            data = line[len("data: "):].strip()
-            if not data or data == "[DONE]":
-                if data == "[DONE]":
-                    break
-                continue
-            try:
-                evt = json.loads(data)
-            except Exception:
-                continue
-            if isinstance(evt.get("response"), dict) and isinstance(evt["response"].get("id"), str):
-                response_id = evt["response"].get("id") or response_id
-            mu = _extract_usage(evt)
-            if mu:
-                usage_obj = mu
-            kind = evt.get("type")
-            if kind == "response.output_text.delta":
-                full_text += evt.get("delta") or ""
-            elif kind == "response.completed":
+        for evt in iter_sse_event_payloads(upstream):
+            if acc.feed(evt):
                 break
+    except (UpstreamStalled, OutputTooLarge) as exc:
+        return upstream_stalled_response(exc)
     finally:
         upstream.close()
 
-    completion = {
-        "id": response_id or "cmpl",
-        "object": "text_completion",
-        "created": created,
-        "model": requested_model or model,
-        "choices": [
-            {"index": 0, "text": full_text, "finish_reason": "stop", "logprobs": None}
-        ],
-        **({"usage": usage_obj} if usage_obj else {}),
-    }
+    completion = build_text_completion(acc, requested_model or model, created)
     if verbose:
         _log_json("OUT POST /v1/completions", completion)
     resp = make_response(jsonify(completion), upstream.status_code)
@@ -563,17 +311,18 @@ def completions() -> Response:
 
 
 @openai_bp.route("/v1/responses", methods=["POST"])
+@admission_controlled()
 def responses_create() -> Response:
     verbose = bool(current_app.config.get("VERBOSE"))
-    raw = request.get_data(cache=True, as_text=True) or ""
+    raw = request.get_data(cache=True) or b""
     if verbose:
         try:
-            print("IN POST /v1/responses\n" + raw)
+            print("IN POST /v1/responses\n" + raw.decode("utf-8", errors="replace"))
         except Exception:
             pass
 
     try:
-        payload = json.loads(raw) if raw else {}
+        payload = loads(raw) if raw else {}
     except Exception:
         err = {"error": {"message": "Invalid JSON body"}}
         if verbose:
@@ -635,7 +384,7 @@ def responses_create() -> Response:
 
     if upstream.status_code >= 400:
         try:
-            err_body = json.loads(upstream.content.decode("utf-8", errors="ignore")) if upstream.content else {"error": {"message": upstream.text}}
+            err_body = loads(upstream.content) if upstream.content else {"error": {"message": upstream.text}}
         except Exception:
             err_body = {"error": {"message": upstream.text or "Upstream error"}}
         finally:
@@ -653,9 +402,14 @@ def responses_create() -> Response:
             print("OUT POST /v1/responses (streaming response)")
         stream_iter = _wrap_stream_logging(
             "STREAM OUT /v1/responses",
-            stream_upstream_bytes(
+            abort_on_disconnect(
+                stream_upstream_bytes(
+                    upstream,
+                    on_event=lambda evt: note_responses_stream_event(normalized.session_id, evt),
+                    event_types=SESSION_EVENT_TYPES,
+                    lean=current_lean_settings().for_request(normalized.lean_stream),
+                ),
                 upstream,
-                on_event=lambda evt: note_responses_stream_event(normalized.session_id, evt),
             ),
             verbose,
         )
@@ -686,10 +440,14 @@ def responses_create() -> Response:
                 resp.headers.setdefault(k, v)
             return resp
 
-    response_obj, error_obj = aggregate_response_from_sse(
-        upstream,
-        on_event=lambda evt: note_responses_stream_event(normalized.session_id, evt),
-    )
+    try:
+        response_obj, error_obj = aggregate_response_from_sse(
+            upstream,
+            on_event=lambda evt: note_responses_stream_event(normalized.session_id, evt),
+        )
+    except UpstreamStalled as exc:
+        clear_responses_reuse_state(normalized.session_id)
+        return upstream_stalled_response(exc)
     if error_obj is not None:
         clear_responses_reuse_state(normalized.session_id)
         if verbose:
@@ -717,12 +475,15 @@ def responses_create() -> Response:
     return resp
 
 
+def openai_models_payload(expose_reasoning_models: bool) -> Dict[str, Any]:
+    model_ids = list_public_models(expose_reasoning_models=expose_reasoning_models)
+    data = [{"id": mid, "object": "model", "owned_by": "owner"} for mid in model_ids]
+    return {"object": "list", "data": data}
+
+
 @openai_bp.route("/v1/models", methods=["GET"])
 def list_models() -> Response:
-    expose_variants = bool(current_app.config.get("EXPOSE_REASONING_MODELS"))
-    model_ids = list_public_models(expose_reasoning_models=expose_variants)
-    data = [{"id": mid, "object": "model", "owned_by": "owner"} for mid in model_ids]
-    models = {"object": "list", "data": data}
+    models = openai_models_payload(bool(current_app.config.get("EXPOSE_REASONING_MODELS")))
     resp = make_response(jsonify(models), 200)
     for k, v in build_cors_headers().items():
         resp.headers.setdefault(k, v)
@@ -1,37 +1,212 @@
 from __future__ import annotations
 
-import copy
 import hashlib
 import json
+import os
 import threading
 import uuid
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import Any, Dict, List
 
+from .jsoncodec import dumps_canonical
+from .session_persist import SessionPersistence, open_session_persistence
+from .session_store import LRUStore, SessionStoreSettings, default_session_store_settings
+from .state_backend import KEY_PREFIX, StateBackendError, get_state_backend
 
-_LOCK = threading.Lock()
-_FINGERPRINT_TO_UUID: Dict[str, str] = {}
-_ORDER: List[str] = []
-_MAX_ENTRIES = 10000
-_RESPONSES_SESSION_STATE: Dict[str, "_ResponsesSessionState"] = {}
-_RESPONSES_ORDER: List[str] = []
+
+DEFAULT_SESSION_SHARDS = 16
+
+
+def _shard_settings(settings: SessionStoreSettings, shards: int, *, fingerprints: bool = False) -> SessionStoreSettings:
+    # Each shard gets an equal slice of the bounds, rounded up, and evicts
+    # on its own: the shards are independent LRUs, so eviction order is only
+    # least-recently-used within a shard, and a shard that holds more than
+    # its share of the sessions evicts before the total reaches the bound.
+    # Keys hash evenly, so with thousands of sessions the difference is a
+    # few percent. Fingerprints are a few dozen bytes each, so only the
+    # entry count and idle expiry bound them.
+    def part(total: int) -> int:
+        return -(-total // shards) if total else 0
+
+    return SessionStoreSettings(
+        max_entries=part(settings.max_entries),
+        ttl_seconds=settings.ttl_seconds,
+        max_bytes=0 if fingerprints else part(settings.max_bytes),
+    )
+
+
+class _Shard:
+    """One lock and the fingerprints and session states whose keys hash to it."""
+
+    __slots__ = ("lock", "fingerprints", "states")
+
+    def __init__(self, settings: SessionStoreSettings, shards: int) -> None:
+        self.lock = threading.Lock()
+        self.fingerprints: LRUStore[str, str] = LRUStore(_shard_settings(settings, shards, fingerprints=True))
+        self.states: LRUStore[str, "_ResponsesSessionState"] = LRUStore(_shard_settings(settings, shards))
+
+
+# Sessions are spread over independent shards so that events from unrelated
+# streams do not queue on one lock; a session only ever touches its own.
+_SHARDS: List[_Shard] = [_Shard(default_session_store_settings(), DEFAULT_SESSION_SHARDS) for _ in range(DEFAULT_SESSION_SHARDS)]
+
+
+# Optional on-disk copy; see :class:`~chatmock.session_persist.SessionPersistence`.
+_PERSIST: SessionPersistence | None = None
+
+
+def _shard(key: str) -> _Shard:
+    return _SHARDS[hash(key) % len(_SHARDS)]
 
 
 @dataclass(frozen=True)
 class PreparedResponsesRequest:
     payload: Dict[str, Any]
     session_id: str
+    # ``previous_response_id`` was added here rather than sent by the client.
+    reused: bool = False
 
 
 @dataclass
 class _ResponsesSessionState:
-    last_request_payload: Dict[str, Any] | None = None
+    """
+    What is needed to recognise a follow-up of the last completed turn.
+
+    Only hashes are kept: ``*_request_hash`` covers every request field but
+    ``input`` and ``previous_response_id``, and the input items plus the
+    reusable reply items form a hash chain (see :func:`_hash_chain`) whose
+    ``*_baseline_len`` long prefix a follow-up's input must reproduce.
+    ``*_connection`` is the caller's token for the upstream socket the turn
+    ran on; upstream only continues a response on that same socket.
+    """
+
+    last_request_hash: bytes | None = None
     last_response_id: str | None = None
-    last_response_items: List[Dict[str, Any]] = field(default_factory=list)
-    inflight_request_payload: Dict[str, Any] | None = None
+    last_baseline_hash: bytes = b""
+    last_baseline_len: int = 0
+    last_connection: Any = None
+    inflight_request_hash: bytes | None = None
     inflight_track_result: bool = False
     inflight_response_id: str | None = None
-    inflight_response_items: List[Dict[str, Any]] = field(default_factory=list)
+    # Chain over the in-flight input, and over that input plus the reply
+    # items streamed so far.
+    inflight_input_hash: bytes = b""
+    inflight_input_len: int = 0
+    inflight_baseline_hash: bytes = b""
+    inflight_baseline_len: int = 0
+    inflight_connection: Any = None
+
+    @property
+    def size(self) -> int:
+        return _STATE_BYTES + len(self.last_response_id or "") + len(self.inflight_response_id or "")
+
+
+# Rough footprint of a state object and its digests, for the byte budget.
+_STATE_BYTES = 512
+
+
+def configure_session_store(settings: SessionStoreSettings, *, shards: int | None = None) -> None:
+    """
+    Apply new bounds to the session stores; entries over them are dropped on
+    the next insert. Changing the number of ``shards`` starts from empty stores.
+    """
+    global _SHARDS, _PERSIST
+    if shards is not None and max(int(shards), 1) != len(_SHARDS):
+        count = max(int(shards), 1)
+        _SHARDS = [_Shard(settings, count) for _ in range(count)]
+    else:
+        count = len(_SHARDS)
+        for shard in _SHARDS:
+            with shard.lock:
+                shard.fingerprints.settings = _shard_settings(settings, count, fingerprints=True)
+                shard.states.settings = _shard_settings(settings, count)
+    current = _PERSIST.path if _PERSIST is not None else None
+    wanted = os.path.abspath(os.path.expanduser(settings.db_path)) if settings.db_path else None
+    if wanted != current:
+        if _PERSIST is not None:
+            _PERSIST.close()
+        _PERSIST = open_session_persistence(settings.db_path, flush_interval=settings.flush_interval)
+        if _PERSIST is not None:
+            _load_persisted(_PERSIST, settings)
+
+
+def _load_persisted(persist: SessionPersistence, settings: SessionStoreSettings) -> None:
+    for fp, sid in persist.load(max_entries=settings.max_entries, ttl_seconds=settings.ttl_seconds):
+        shard = _shard(fp)
+        with shard.lock:
+            shard.fingerprints.put(fp, sid)
+
+
+def _share_fingerprint(shard: _Shard, fp: str, sid: str, created: bool) -> str:
+    """
+    The session id every node uses for ``fp``: the first one written to the
+    shared backend wins, and a node that lost the race adopts it.
+    """
+    backend = get_state_backend()
+    if backend is None:
+        return sid
+    key = KEY_PREFIX + "fp:" + fp
+    ttl = shard.fingerprints.settings.ttl_seconds
+    if not created:
+        # Keeps the shared entry from expiring while the conversation is in use.
+        backend.set_later(key, sid.encode("utf-8"), ttl)
+        return sid
+    try:
+        if backend.add(key, sid.encode("utf-8"), ttl):
+            return sid
+        shared = backend.get(key)
+        shared_sid = shared.decode("utf-8") if shared else None
+    except (StateBackendError, UnicodeDecodeError):
+        return sid
+    if not shared_sid:
+        return sid
+    with shard.lock:
+        shard.fingerprints.put(fp, shared_sid)
+    return shared_sid
+
+
+def session_store_stats() -> Dict[str, int]:
+    """Counters for the ``/stats`` endpoint, summed over the shards."""
+    stats = {"session_entries": 0, "session_bytes": 0, "session_evictions": 0, "session_expirations": 0, "session_fingerprints": 0}
+    for shard in _SHARDS:
+        with shard.lock:
+            for name, value in shard.states.stats().items():
+                stats[f"session_{name}"] += value
+            stats["session_fingerprints"] += len(shard.fingerprints)
+    return stats
+
+
+def _item_digest(obj: Any) -> bytes:
+    try:
+        return hashlib.blake2b(dumps_canonical(obj), digest_size=16).digest()
+    except (TypeError, ValueError):
+        # Unencodable items never match anything.
+        return uuid.uuid4().bytes
+
+
+def _link(prev: bytes, item_digest: bytes) -> bytes:
+    return hashlib.blake2b(prev + item_digest, digest_size=16).digest()
+
+
+def _hash_chain(prev: bytes, digests: List[bytes]) -> List[bytes]:
+    """
+    ``[prev, h1, h2, ...]`` where ``h{i}`` hashes ``h{i-1}`` with the digest
+    of item ``i``, so two item lists share a prefix of length ``n`` exactly
+    when (barring collisions) their chains agree at index ``n``. Items are
+    digested beforehand, outside any lock; linking is cheap.
+    """
+    chain = [prev]
+    for digest in digests:
+        prev = _link(prev, digest)
+        chain.append(prev)
+    return chain
+
+
+def _request_hash(payload: Dict[str, Any]) -> bytes:
+    rest = dict(payload)
+    rest.pop("input", None)
+    rest.pop("previous_response_id", None)
+    return _item_digest(rest)
 
 
 def _canonicalize_first_user_message(input_items: List[Dict[str, Any]]) -> Dict[str, Any] | None:
@@ -81,69 +256,71 @@ def _fingerprint(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 
-def _remember(fp: str, sid: str) -> None:
-    if fp in _FINGERPRINT_TO_UUID:
-        return
-    _FINGERPRINT_TO_UUID[fp] = sid
-    _ORDER.append(fp)
-    if len(_ORDER) > _MAX_ENTRIES:
-        oldest = _ORDER.pop(0)
-        _FINGERPRINT_TO_UUID.pop(oldest, None)
-
-
-def _remember_responses_session(session_id: str) -> _ResponsesSessionState:
-    state = _RESPONSES_SESSION_STATE.get(session_id)
+def _remember_responses_session(shard: _Shard, session_id: str) -> _ResponsesSessionState:
+    state = shard.states.get(session_id)
     if state is None:
         state = _ResponsesSessionState()
-        _RESPONSES_SESSION_STATE[session_id] = state
-        _RESPONSES_ORDER.append(session_id)
-        if len(_RESPONSES_ORDER) > _MAX_ENTRIES:
-            oldest = _RESPONSES_ORDER.pop(0)
-            _RESPONSES_SESSION_STATE.pop(oldest, None)
+        shard.states.put(session_id, state)
     return state
 
 
-def _request_without_input(payload: Dict[str, Any]) -> Dict[str, Any]:
-    clone = copy.deepcopy(payload)
-    clone["input"] = []
-    clone.pop("previous_response_id", None)
-    return clone
-
-
 def _input_list(payload: Dict[str, Any]) -> List[Dict[str, Any]] | None:
     raw = payload.get("input")
     if not isinstance(raw, list):
         return None
-    return [item for item in copy.deepcopy(raw) if isinstance(item, dict)]
+    return [item for item in raw if isinstance(item, dict)]
 
 
-def _conversation_output_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    reusable: List[Dict[str, Any]] = []
-    for item in items:
-        if not isinstance(item, dict):
-            continue
-        item_type = item.get("type")
-        if item_type == "reasoning":
-            continue
-        reusable.append(copy.deepcopy(item))
-    return reusable
+def _conversation_output_items(items: List[Any]) -> List[Dict[str, Any]]:
+    return [item for item in items if isinstance(item, dict) and item.get("type") != "reasoning"]
 
 
 def _clear_reuse_state(state: _ResponsesSessionState) -> None:
-    state.last_request_payload = None
+    state.last_request_hash = None
     state.last_response_id = None
-    state.last_response_items = []
-    state.inflight_request_payload = None
-    state.inflight_track_result = False
-    state.inflight_response_id = None
-    state.inflight_response_items = []
+    state.last_baseline_hash = b""
+    state.last_baseline_len = 0
+    state.last_connection = None
+    _clear_inflight(state)
 
 
 def _clear_inflight(state: _ResponsesSessionState) -> None:
-    state.inflight_request_payload = None
+    state.inflight_request_hash = None
     state.inflight_track_result = False
     state.inflight_response_id = None
-    state.inflight_response_items = []
+    state.inflight_input_hash = b""
+    state.inflight_input_len = 0
+    state.inflight_baseline_hash = b""
+    state.inflight_baseline_len = 0
+    state.inflight_connection = None
+
+
+def _output_digests(output: List[Any]) -> List[bytes]:
+    return [_item_digest(item) for item in _conversation_output_items(output)]
+
+
+def _finish_response(state: _ResponsesSessionState, response_id: str | None, output: List[bytes] | None) -> None:
+    """Make the in-flight turn the baseline; ``output`` digests replace the streamed reply items when given."""
+    if state.inflight_track_result and state.inflight_request_hash is not None and response_id:
+        if output is not None:
+            state.inflight_baseline_hash = _hash_chain(state.inflight_input_hash, output)[-1]
+            state.inflight_baseline_len = state.inflight_input_len + len(output)
+        state.last_request_hash = state.inflight_request_hash
+        state.last_response_id = response_id
+        state.last_baseline_hash = state.inflight_baseline_hash
+        state.last_baseline_len = state.inflight_baseline_len
+        state.last_connection = state.inflight_connection
+    else:
+        state.last_request_hash = None
+        state.last_response_id = None
+        state.last_baseline_hash = b""
+        state.last_baseline_len = 0
+        state.last_connection = None
+    _clear_inflight(state)
+
+
+def _resized(shard: _Shard, session_id: str, state: _ResponsesSessionState) -> None:
+    shard.states.resize(session_id, state.size)
 
 
 def ensure_session_id(
@@ -156,12 +333,19 @@ def ensure_session_id(
 
     canon = canonicalize_prefix(instructions, input_items)
     fp = _fingerprint(canon)
-    with _LOCK:
-        if fp in _FINGERPRINT_TO_UUID:
-            return _FINGERPRINT_TO_UUID[fp]
-        sid = str(uuid.uuid4())
-        _remember(fp, sid)
-        return sid
+    shard = _shard(fp)
+    with shard.lock:
+        sid = shard.fingerprints.get(fp)
+        created = sid is None
+        if created:
+            sid = str(uuid.uuid4())
+            shard.fingerprints.put(fp, sid)
+    sid = _share_fingerprint(shard, fp, sid, created)
+    # Saved on every use so the stored row's age follows the conversation's.
+    persist = _PERSIST
+    if persist is not None:
+        persist.save_fingerprint(fp, sid)
+    return sid
 
 
 def prepare_responses_request_for_session(
@@ -169,104 +353,140 @@ def prepare_responses_request_for_session(
     payload: Dict[str, Any],
     *,
     allow_previous_response_id: bool = True,
+    connection: Any = None,
 ) -> PreparedResponsesRequest:
-    full_payload = copy.deepcopy(payload)
-    outbound_payload = copy.deepcopy(payload)
+    """
+    ``payload`` as a delta of the session's last turn when it continues
+    that turn and ``connection``, the caller's token for the upstream socket
+    this request goes out on, is the one that turn ran on.
+    """
+    outbound_payload = dict(payload)
     explicit_previous_response_id = (
-        isinstance(full_payload.get("previous_response_id"), str)
-        and bool(full_payload.get("previous_response_id").strip())
+        isinstance(payload.get("previous_response_id"), str)
+        and bool(payload.get("previous_response_id").strip())
     )
-
-    with _LOCK:
-        state = _remember_responses_session(session_id)
-
-        if explicit_previous_response_id:
+    request_input: List[Dict[str, Any]] | None = None
+    chain = [b""]
+    request_hash = b""
+    if not explicit_previous_response_id:
+        # Hashing reads every item once and happens outside the lock.
+        request_input = _input_list(payload)
+        chain = _hash_chain(b"", [_item_digest(item) for item in request_input or []])
+        request_hash = _request_hash(payload)
+
+    shard = _shard(session_id)
+    if explicit_previous_response_id:
+        with shard.lock:
+            state = _remember_responses_session(shard, session_id)
             _clear_reuse_state(state)
-            return PreparedResponsesRequest(
-                payload=outbound_payload,
-                session_id=session_id,
-            )
+            _resized(shard, session_id, state)
+        return PreparedResponsesRequest(
+            payload=outbound_payload,
+            session_id=session_id,
+        )
 
-        request_input = _input_list(full_payload)
+    reused = False
+    with shard.lock:
+        state = _remember_responses_session(shard, session_id)
+
+        baseline_len = state.last_baseline_len
         if (
             allow_previous_response_id
-            and
-            state.last_request_payload is not None
+            and state.last_connection is connection
+            and state.last_request_hash == request_hash
             and state.last_response_id
             and request_input is not None
-            and _request_without_input(state.last_request_payload) == _request_without_input(full_payload)
+            and baseline_len < len(chain)
+            and chain[baseline_len] == state.last_baseline_hash
         ):
-            baseline: List[Dict[str, Any]] = []
-            previous_input = _input_list(state.last_request_payload)
-            if previous_input is not None:
-                baseline.extend(previous_input)
-            baseline.extend(copy.deepcopy(state.last_response_items))
-            baseline_len = len(baseline)
-            if request_input[:baseline_len] == baseline and baseline_len <= len(request_input):
-                outbound_payload["input"] = copy.deepcopy(request_input[baseline_len:])
-                outbound_payload["previous_response_id"] = state.last_response_id
-
-        state.inflight_request_payload = full_payload
+            outbound_payload["input"] = request_input[baseline_len:]
+            outbound_payload["previous_response_id"] = state.last_response_id
+            reused = True
+
+        state.inflight_request_hash = request_hash
         state.inflight_track_result = True
         state.inflight_response_id = None
-        state.inflight_response_items = []
+        state.inflight_input_hash = state.inflight_baseline_hash = chain[-1]
+        state.inflight_input_len = state.inflight_baseline_len = len(chain) - 1
+        state.inflight_connection = connection
+        _resized(shard, session_id, state)
 
     return PreparedResponsesRequest(
         payload=outbound_payload,
         session_id=session_id,
+        reused=reused,
+    )
+
+
+def rejects_previous_response(event: Any) -> bool:
+    """Whether ``event`` is upstream refusing the ``previous_response_id`` a request continued from."""
+    if not isinstance(event, dict) or event.get("type") not in ("error", "response.failed"):
+        return False
+    error = event.get("error")
+    if not isinstance(error, dict) and isinstance(event.get("response"), dict):
+        error = event["response"].get("error")
+    if not isinstance(error, dict):
+        return False
+    return any(
+        isinstance(error.get(field), str) and "previous_response" in error[field]
+        for field in ("code", "param", "message")
     )
 
 
+# The only stream events ``note_responses_stream_event`` looks at; relays can
+# skip decoding everything else.
+SESSION_EVENT_TYPES = frozenset(
+    {"response.created", "response.output_item.done", "response.completed", "response.failed", "error"}
+)
+
+
 def note_responses_stream_event(session_id: str, event: Dict[str, Any]) -> None:
     if not isinstance(session_id, str) or not session_id.strip():
         return
     if not isinstance(event, dict):
         return
+    kind = event.get("type")
+    if kind not in SESSION_EVENT_TYPES:
+        return
 
-    with _LOCK:
-        state = _RESPONSES_SESSION_STATE.get(session_id)
+    # Reply items are digested before the lock is taken.
+    item_digest = None
+    response_id = None
+    output = None
+    if kind == "response.output_item.done":
+        item = event.get("item")
+        if not isinstance(item, dict) or item.get("type") == "reasoning":
+            return
+        item_digest = _item_digest(item)
+    elif kind in ("response.created", "response.completed"):
+        response = event.get("response")
+        if isinstance(response, dict):
+            if isinstance(response.get("id"), str):
+                response_id = response.get("id")
+            if kind == "response.completed" and isinstance(response.get("output"), list) and response.get("output"):
+                output = _output_digests(response.get("output"))
+
+    shard = _shard(session_id)
+    with shard.lock:
+        state = shard.states.get(session_id)
         if state is None:
             return
 
-        kind = event.get("type")
         if kind == "response.created":
-            response = event.get("response")
-            if isinstance(response, dict) and isinstance(response.get("id"), str):
-                state.inflight_response_id = response.get("id")
+            if response_id is not None:
+                state.inflight_response_id = response_id
             return
 
         if kind == "response.output_item.done":
-            item = event.get("item")
-            if isinstance(item, dict):
-                state.inflight_response_items.append(copy.deepcopy(item))
+            state.inflight_baseline_hash = _link(state.inflight_baseline_hash, item_digest)
+            state.inflight_baseline_len += 1
             return
 
         if kind == "response.completed":
-            response = event.get("response")
-            response_id = None
-            response_items: List[Dict[str, Any]] = copy.deepcopy(state.inflight_response_items)
-            if isinstance(response, dict):
-                if isinstance(response.get("id"), str):
-                    response_id = response.get("id")
-                output = response.get("output")
-                if isinstance(output, list) and output:
-                    response_items = [copy.deepcopy(item) for item in output if isinstance(item, dict)]
-            if not response_id:
-                response_id = state.inflight_response_id
-
-            if state.inflight_track_result and state.inflight_request_payload is not None and response_id:
-                state.last_request_payload = copy.deepcopy(state.inflight_request_payload)
-                state.last_response_id = response_id
-                state.last_response_items = _conversation_output_items(response_items)
-            else:
-                state.last_request_payload = None
-                state.last_response_id = None
-                state.last_response_items = []
-            _clear_inflight(state)
-            return
-
-        if kind in ("response.failed", "error"):
+            _finish_response(state, response_id or state.inflight_response_id, output)
+        else:
             _clear_reuse_state(state)
+        _resized(shard, session_id, state)
 
 
 def note_responses_final_response(session_id: str, response_obj: Dict[str, Any]) -> None:
@@ -275,38 +495,32 @@ def note_responses_final_response(session_id: str, response_obj: Dict[str, Any])
     if not isinstance(response_obj, dict):
         return
 
-    with _LOCK:
-        state = _RESPONSES_SESSION_STATE.get(session_id)
+    response_id = response_obj.get("id") if isinstance(response_obj.get("id"), str) else None
+    output = response_obj.get("output")
+    digests = _output_digests(output) if isinstance(output, list) else []
+    shard = _shard(session_id)
+    with shard.lock:
+        state = shard.states.get(session_id)
         if state is None:
             return
-
-        response_id = response_obj.get("id") if isinstance(response_obj.get("id"), str) else None
-        output = response_obj.get("output")
-        output_items = [copy.deepcopy(item) for item in output if isinstance(item, dict)] if isinstance(output, list) else []
-        if state.inflight_track_result and state.inflight_request_payload is not None and response_id:
-            state.last_request_payload = copy.deepcopy(state.inflight_request_payload)
-            state.last_response_id = response_id
-            state.last_response_items = _conversation_output_items(output_items)
-        else:
-            state.last_request_payload = None
-            state.last_response_id = None
-            state.last_response_items = []
-        _clear_inflight(state)
+        _finish_response(state, response_id, digests)
+        _resized(shard, session_id, state)
 
 
 def clear_responses_reuse_state(session_id: str) -> None:
     if not isinstance(session_id, str) or not session_id.strip():
         return
-    with _LOCK:
-        state = _RESPONSES_SESSION_STATE.get(session_id)
+    shard = _shard(session_id)
+    with shard.lock:
+        state = shard.states.get(session_id)
         if state is None:
             return
         _clear_reuse_state(state)
+        _resized(shard, session_id, state)
 
 
 def reset_session_state() -> None:
-    with _LOCK:
-        _FINGERPRINT_TO_UUID.clear()
-        _ORDER.clear()
-        _RESPONSES_SESSION_STATE.clear()
-        _RESPONSES_ORDER.clear()
+    for shard in _SHARDS:
+        with shard.lock:
+            shard.fingerprints.clear()
+            shard.states.clear()
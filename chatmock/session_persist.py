@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from .log import eprint
+from .session_store import DEFAULT_SESSION_FLUSH_INTERVAL_SECONDS
+
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS fingerprints (fingerprint TEXT PRIMARY KEY, session_id TEXT NOT NULL, updated REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS fingerprints_updated ON fingerprints (updated)",
+)
+_UPSERT_FINGERPRINT = (
+    "INSERT INTO fingerprints (fingerprint, session_id, updated) VALUES (?, ?, ?) "
+    "ON CONFLICT (fingerprint) DO UPDATE SET session_id = excluded.session_id, updated = excluded.updated"
+)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    # WAL lets pre-forked workers sharing one file read while another writes.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+class SessionPersistence:
+    """
+    Write-behind SQLite copy of the fingerprint to session id map.
+
+    ``previous_response_id`` baselines are not kept: upstream only continues
+    a response on the socket that produced it, and no socket outlives a
+    restart. Writes are only recorded in memory, with later writes to a key
+    replacing earlier ones, and a background thread commits them in one
+    transaction every ``flush_interval`` seconds and at exit. A crash loses
+    at most that interval, which only costs the affected conversations
+    their prompt-cache key.
+    The thread and its connection are started lazily in the process that
+    writes, so an instance created before a fork is safe to use after it.
+    """
+
+    def __init__(self, path: str, *, flush_interval: float = DEFAULT_SESSION_FLUSH_INTERVAL_SECONDS) -> None:
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.flush_interval = max(float(flush_interval), 0.01)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._fingerprints: Dict[str, Tuple[str, float]] = {}
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pid = 0
+        self._closed = False
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _connect(self.path).close()
+        atexit.register(self.close)
+
+    def load(self, *, max_entries: int = 0, ttl_seconds: float = 0.0) -> List[Tuple[str, str]]:
+        """
+        Fingerprints and session ids still within the bounds, oldest first,
+        so that inserting them in order leaves the most recent ones in
+        memory. Rows outside the bounds are deleted.
+        """
+        conn = _connect(self.path)
+        try:
+            with conn:
+                if ttl_seconds > 0:
+                    conn.execute("DELETE FROM fingerprints WHERE updated < ?", (time.time() - ttl_seconds,))
+                if max_entries > 0:
+                    conn.execute(
+                        "DELETE FROM fingerprints WHERE rowid NOT IN "
+                        "(SELECT rowid FROM fingerprints ORDER BY updated DESC LIMIT ?)",
+                        (max_entries,),
+                    )
+            return [
+                (row[0], row[1])
+                for row in conn.execute("SELECT fingerprint, session_id FROM fingerprints ORDER BY updated")
+            ]
+        finally:
+            conn.close()
+
+    def save_fingerprint(self, fingerprint: str, session_id: str) -> None:
+        with self._lock:
+            self._fingerprints[fingerprint] = (session_id, time.time())
+        self._ensure_writer()
+
+    def _ensure_writer(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid or self._closed:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="chatmock-session-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            conn = _connect(self.path)
+        except sqlite3.Error:
+            return
+        try:
+            while not self._closed:
+                self._wake.wait(self.flush_interval)
+                self._flush(conn)
+            self._flush(conn)
+        finally:
+            conn.close()
+
+    def _flush(self, conn: sqlite3.Connection) -> None:
+        with self._flush_lock:
+            self._commit(conn)
+
+    def _commit(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            fingerprints, self._fingerprints = self._fingerprints, {}
+        if not fingerprints:
+            return
+        try:
+            with conn:
+                conn.executemany(
+                    _UPSERT_FINGERPRINT,
+                    [(fp, sid, updated) for fp, (sid, updated) in fingerprints.items()],
+                )
+        except sqlite3.Error:
+            # Persistence is best effort; the in-memory state is unaffected.
+            pass
+
+    def flush(self) -> None:
+        """Commit pending writes now, from the calling thread."""
+        with self._lock:
+            if not self._fingerprints:
+                return
+        try:
+            conn = _connect(self.path)
+        except sqlite3.Error:
+            return
+        try:
+            self._flush(conn)
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=5)
+        self.flush()
+
+
+def open_session_persistence(path: Any, *, flush_interval: float = DEFAULT_SESSION_FLUSH_INTERVAL_SECONDS) -> SessionPersistence | None:
+    """A store at ``path``, or ``None`` when persistence is off (no path) or the file cannot be opened."""
+    if not isinstance(path, str) or not path.strip():
+        return None
+    try:
+        return SessionPersistence(path.strip(), flush_interval=flush_interval)
+    except (OSError, sqlite3.Error) as exc:
+        eprint(f"WARNING: session state will not be persisted; cannot open {path}: {exc}")
+        return None
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Generic, Hashable, Iterator, TypeVar
+
+from .config import float_env, int_env
+
+
+DEFAULT_SESSION_MAX_ENTRIES = 10000
+DEFAULT_SESSION_TTL_SECONDS = 3600.0
+DEFAULT_SESSION_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_SESSION_FLUSH_INTERVAL_SECONDS = 1.0
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass(frozen=True)
+class SessionStoreSettings:
+    """
+    Bounds on the per-session state kept for ``previous_response_id`` reuse.
+
+    Sessions idle for ``ttl_seconds`` expire, and the least recently used
+    are evicted once there are more than ``max_entries`` or their stored
+    payloads add up to more than ``max_bytes``. ``0`` disables a bound.
+    With ``db_path`` session ids are also written to that SQLite file every
+    ``flush_interval`` seconds and reloaded at startup.
+    """
+
+    max_entries: int = DEFAULT_SESSION_MAX_ENTRIES
+    ttl_seconds: float = DEFAULT_SESSION_TTL_SECONDS
+    max_bytes: int = DEFAULT_SESSION_MAX_BYTES
+    db_path: str | None = None
+    flush_interval: float = DEFAULT_SESSION_FLUSH_INTERVAL_SECONDS
+
+
+def default_session_store_settings(
+    *,
+    max_entries: int | None = None,
+    ttl_seconds: float | None = None,
+    max_bytes: int | None = None,
+    db_path: str | None = None,
+    flush_interval: float | None = None,
+) -> SessionStoreSettings:
+    """Settings from the arguments given, falling back to the environment and then the defaults."""
+    if max_entries is None:
+        max_entries = int_env("CHATGPT_LOCAL_SESSION_MAX_ENTRIES", DEFAULT_SESSION_MAX_ENTRIES)
+    if ttl_seconds is None:
+        ttl_seconds = float_env("CHATGPT_LOCAL_SESSION_TTL", DEFAULT_SESSION_TTL_SECONDS)
+    if max_bytes is None:
+        max_bytes = int_env("CHATGPT_LOCAL_SESSION_MAX_BYTES", DEFAULT_SESSION_MAX_BYTES)
+    if db_path is None:
+        db_path = os.getenv("CHATGPT_LOCAL_SESSION_DB")
+    if flush_interval is None:
+        flush_interval = float_env("CHATGPT_LOCAL_SESSION_FLUSH_INTERVAL", DEFAULT_SESSION_FLUSH_INTERVAL_SECONDS)
+    return SessionStoreSettings(
+        max_entries=max(int(max_entries), 0),
+        ttl_seconds=max(float(ttl_seconds), 0.0),
+        max_bytes=max(int(max_bytes), 0),
+        db_path=(db_path.strip() or None) if isinstance(db_path, str) else None,
+        flush_interval=max(float(flush_interval), 0.01),
+    )
+
+
+class LRUStore(Generic[K, V]):
+    """
+    A mapping kept in least-recently-used order with idle expiry and a byte
+    budget.
+
+    Entries live in an ``OrderedDict`` ordered by last use, so a lookup, an
+    insert and an eviction are all O(1): the next entry to expire or be
+    evicted is always the first one. Each entry carries the size its owner
+    reported and the time it was last used. Not thread-safe; callers hold
+    their own lock.
+    """
+
+    __slots__ = ("settings", "_clock", "_entries", "bytes", "evictions", "expirations")
+
+    def __init__(self, settings: SessionStoreSettings, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.settings = settings
+        self._clock = clock
+        # key -> [value, size, last used]
+        self._entries: "OrderedDict[K, list]" = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self._entries)
+
+    def _expired(self, used: float, now: float) -> bool:
+        ttl = self.settings.ttl_seconds
+        return ttl > 0 and now - used >= ttl
+
+    def get(self, key: K) -> V | None:
+        """The value for ``key``, marked as just used, or ``None`` if absent or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = self._clock()
+        if self._expired(entry[2], now):
+            self._drop(key)
+            self.expirations += 1
+            return None
+        entry[2] = now
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: K, value: V, size: int = 0) -> None:
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = [value, size, now]
+        else:
+            self.bytes -= entry[1]
+            entry[0], entry[1], entry[2] = value, size, now
+            self._entries.move_to_end(key)
+        self.bytes += size
+        self._trim(now)
+
+    def resize(self, key: K, size: int) -> None:
+        """Record a new size for ``key`` after its value changed in place."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        self.bytes += size - entry[1]
+        entry[1] = size
+        if size > 0:
+            self._trim(self._clock())
+
+    def pop(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._drop(key)
+        return entry[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _drop(self, key: K) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry[1]
+
+    def _trim(self, now: float) -> None:
+        entries = self._entries
+        settings = self.settings
+        if settings.ttl_seconds > 0:
+            cutoff = now - settings.ttl_seconds
+            while entries:
+                entry = entries[next(iter(entries))]
+                if entry[2] > cutoff:
+                    break
+                self.bytes -= entries.popitem(last=False)[1][1]
+                self.expirations += 1
+        max_entries = settings.max_entries
+        max_bytes = settings.max_bytes
+        while entries and (
+            (max_entries and len(entries) > max_entries) or (max_bytes and self.bytes > max_bytes)
+        ):
+            self.bytes -= entries.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self.bytes, "evictions": self.evictions, "expirations": self.expirations}
@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import re
+from typing import AbstractSet, Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from .jsoncodec import loads
+
+
+DONE = b"[DONE]"
+
+# (event name or None, data bytes); multi-line ``data:`` fields are joined with b"\n".
+SSEEvent = Tuple[bytes | None, bytes]
+
+
+class SSEDecoder:
+    """
+    Incremental ``text/event-stream`` decoder fed with raw network chunks.
+
+    Each chunk is split into lines with a single ``bytes.split`` and never
+    decoded to ``str``. A trailing partial line is held as a list of pieces
+    and joined once its newline arrives, so a multi-megabyte event spread
+    over thousands of chunks is copied a constant number of times rather
+    than once per chunk, and nothing beyond the current line is held. Lines
+    end in ``\\n`` or ``\\r\\n``. ``id:``/``retry:`` fields and ``:``
+    comments are ignored.
+    """
+
+    __slots__ = ("_pending", "_event", "_data")
+
+    def __init__(self) -> None:
+        self._pending: List[bytes] = []
+        self._event: bytes | None = None
+        self._data: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        if not isinstance(chunk, bytes):
+            chunk = _as_bytes(chunk)
+        pending = self._pending
+        # The held pieces contain no newline, so only the new bytes need searching.
+        cut = chunk.rfind(b"\n")
+        if cut < 0:
+            pending.append(chunk)
+            return []
+        if pending:
+            pending.append(chunk[:cut])
+            block = b"".join(pending)
+            pending.clear()
+        else:
+            block = chunk[:cut]
+        if cut + 1 < len(chunk):
+            pending.append(chunk[cut + 1 :])
+        if b"\r" in block:
+            block = block.replace(b"\r\n", b"\n")
+            if block.endswith(b"\r"):
+                block = block[:-1]
+        events: List[SSEEvent] = []
+        data = self._data
+        for line in block.split(b"\n"):
+            if not line:
+                if data:
+                    events.append((self._event, data[0] if len(data) == 1 else b"\n".join(data)))
+                    data = self._data = []
+                self._event = None
+            elif line.startswith(b"data: "):
+                data.append(line[6:])
+            elif line.startswith(b"event:"):
+                self._event = line[7:] if line[6:7] == b" " else line[6:]
+            elif line.startswith(b"data:"):
+                data.append(line[5:])
+        return events
+
+    def close(self) -> List[SSEEvent]:
+        """Events still buffered when the stream ends without a final blank line."""
+        events = self.feed(b"\n\n")
+        self._pending.clear()
+        return events
+
+
+def _as_bytes(chunk: Any) -> bytes:
+    if isinstance(chunk, bytes):
+        return chunk
+    if isinstance(chunk, (bytearray, memoryview)):
+        return bytes(chunk)
+    return str(chunk).encode("utf-8", errors="ignore")
+
+
+def iter_sse(chunks: Iterable[Any]) -> Iterator[SSEEvent]:
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        if chunk:
+            yield from decoder.feed(chunk)
+    yield from decoder.close()
+
+
+async def aiter_sse(chunks: AsyncIterable[Any]) -> AsyncIterator[SSEEvent]:
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        if chunk:
+            for event in decoder.feed(chunk):
+                yield event
+    for event in decoder.close():
+        yield event
+
+
+def is_done(data: bytes) -> bool:
+    return data[:1] == b"[" and data.strip() == DONE
+
+
+# Upstream writes ``type`` as the first key of every event object, so it can
+# be read off the front of the raw payload: compact output is a prefix check,
+# anything with whitespace goes through the pattern. Escaped names never
+# match and fall through to a full decode.
+_TYPE_BYTES = re.compile(rb'\s*\{\s*"type"\s*:\s*"([^"\\]*)"')
+_TYPE_TEXT = re.compile(r'\s*\{\s*"type"\s*:\s*"([^"\\]*)"')
+
+
+def sniff_event_type(data: bytes | str) -> str | None:
+    """
+    The ``type`` of an event object read from its raw JSON without decoding
+    it, or ``None`` when it cannot be told that way (``type`` not the first
+    key, escapes in the name, not an object at all).
+    """
+    if isinstance(data, str):
+        if data.startswith('{"type":"'):
+            end = data.find('"', 9)
+            if end > 0 and "\\" not in data[9:end]:
+                return data[9:end]
+        match = _TYPE_TEXT.match(data)
+        return match.group(1) if match else None
+    if data.startswith(b'{"type":"'):
+        end = data.find(b'"', 9)
+        if end > 0 and b"\\" not in data[9:end]:
+            return data[9:end].decode("utf-8", errors="replace")
+    match = _TYPE_BYTES.match(data)
+    return match.group(1).decode("utf-8", errors="replace") if match else None
+
+
+def wants_event(data: bytes | str, types: AbstractSet[str] | None) -> bool:
+    """Whether an event may be one of ``types`` (every event when ``types`` is ``None``)."""
+    if types is None:
+        return True
+    kind = sniff_event_type(data)
+    return kind is None or kind in types
+
+
+def parse_event_data(data: bytes, types: AbstractSet[str] | None = None) -> Dict[str, Any] | None:
+    """
+    The JSON object carried by an event, or ``None`` for anything else.
+
+    With ``types``, events whose sniffed type is not listed are skipped
+    without being decoded.
+    """
+    if types is not None and not wants_event(data, types):
+        return None
+    try:
+        evt = loads(data)
+    except ValueError:
+        return None
+    return evt if isinstance(evt, dict) else None
+
+
+def _last_boundary(buf: bytes) -> int:
+    """Offset just past the last blank line in ``buf``, or ``-1`` without one."""
+    end = buf.rfind(b"\n\n")
+    if end >= 0:
+        end += 2
+    if b"\r" in buf:
+        crlf = buf.rfind(b"\r\n\r\n")
+        if crlf >= 0:
+            end = max(end, crlf + 4)
+    return end
+
+
+class SSEEventFilter:
+    """
+    The events of a few ``types`` picked out of a raw event stream.
+
+    Chunks are cut at the last event boundary and each run of complete
+    events is searched for the quoted type names first. A JSON string token
+    like ``"response.completed"`` cannot occur unescaped inside another
+    string, so a run without any of them holds no wanted event and is
+    dropped without being split into events or decoded; the cost then
+    follows the structural events rather than the text deltas between them.
+    """
+
+    __slots__ = ("_types", "_markers", "_parts", "_tail", "_decoder")
+
+    def __init__(self, types: AbstractSet[str]) -> None:
+        self._types = frozenset(types)
+        self._markers = tuple(b'"' + kind.encode("utf-8") + b'"' for kind in sorted(self._types))
+        self._parts: List[bytes] = []
+        self._tail = b""
+        self._decoder = SSEDecoder()
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        if not isinstance(chunk, bytes):
+            chunk = _as_bytes(chunk)
+        parts = self._parts
+        # A boundary may straddle the held bytes, which contain none of their own.
+        head = self._tail
+        cut = _last_boundary(head + chunk if head else chunk)
+        if cut < 0:
+            parts.append(chunk)
+            self._tail = (head + chunk)[-3:]
+            return []
+        cut -= len(head)
+        if parts:
+            parts.append(chunk[:cut])
+            run = b"".join(parts)
+        else:
+            run = chunk[:cut] if cut < len(chunk) else chunk
+        rest = chunk[cut:]
+        self._parts = [rest] if rest else []
+        self._tail = rest[-3:]
+        for marker in self._markers:
+            if marker in run:
+                break
+        else:
+            return []
+        events: List[Dict[str, Any]] = []
+        for _name, data in self._decoder.feed(run):
+            evt = parse_event_data(data, self._types)
+            if evt is not None:
+                events.append(evt)
+        return events
+
+
+def iter_sse_json(
+    chunks: Iterable[Any],
+    *,
+    vlog: Callable[[str], Any] | None = None,
+    stop_at_done: bool = True,
+) -> Iterator[Dict[str, Any] | None]:
+    """Parsed SSE events; yields ``None`` for ``[DONE]`` unless it ends the stream."""
+    for _name, data in iter_sse(chunks):
+        if vlog:
+            vlog(data.decode("utf-8", errors="ignore"))
+        if is_done(data):
+            if stop_at_done:
+                return
+            yield None
+            continue
+        evt = parse_event_data(data)
+        if evt is not None:
+            yield evt
+
+
+async def aiter_sse_json(
+    chunks: AsyncIterable[Any],
+    *,
+    vlog: Callable[[str], Any] | None = None,
+    stop_at_done: bool = True,
+) -> AsyncIterator[Dict[str, Any] | None]:
+    """Async counterpart of :func:`iter_sse_json`."""
+    async for _name, data in aiter_sse(chunks):
+        if vlog:
+            vlog(data.decode("utf-8", errors="ignore"))
+        if is_done(data):
+            if stop_at_done:
+                return
+            yield None
+            continue
+        evt = parse_event_data(data)
+        if evt is not None:
+            yield evt
+
+
+def _json_batch(
+    events: List[SSEEvent],
+    vlog: Callable[[str], Any] | None,
+    stop_at_done: bool,
+) -> Tuple[List[Dict[str, Any] | None], bool]:
+    batch: List[Dict[str, Any] | None] = []
+    for _name, data in events:
+        if vlog:
+            vlog(data.decode("utf-8", errors="ignore"))
+        if is_done(data):
+            if stop_at_done:
+                return batch, True
+            batch.append(None)
+            continue
+        evt = parse_event_data(data)
+        if evt is not None:
+            batch.append(evt)
+    return batch, False
+
+
+def iter_sse_json_batches(
+    chunks: Iterable[Any],
+    *,
+    vlog: Callable[[str], Any] | None = None,
+    stop_at_done: bool = True,
+) -> Iterator[List[Dict[str, Any] | None]]:
+    """:func:`iter_sse_json` grouped by network chunk; a batch may be empty."""
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        if not chunk:
+            continue
+        batch, done = _json_batch(decoder.feed(chunk), vlog, stop_at_done)
+        yield batch
+        if done:
+            return
+    batch, _ = _json_batch(decoder.close(), vlog, stop_at_done)
+    if batch:
+        yield batch
+
+
+async def aiter_sse_json_batches(
+    chunks: AsyncIterable[Any],
+    *,
+    vlog: Callable[[str], Any] | None = None,
+    stop_at_done: bool = True,
+) -> AsyncIterator[List[Dict[str, Any] | None]]:
+    """Async counterpart of :func:`iter_sse_json_batches`."""
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        batch, done = _json_batch(decoder.feed(chunk), vlog, stop_at_done)
+        yield batch
+        if done:
+            return
+    batch, _ = _json_batch(decoder.close(), vlog, stop_at_done)
+    if batch:
+        yield batch
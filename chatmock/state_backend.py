@@ -0,0 +1,523 @@
+from __future__ import annotations
+
+import abc
+import atexit
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+from urllib.parse import unquote, urlsplit
+
+from .log import eprint
+
+
+# Every key ChatMock writes starts with this, so one server can be shared
+# with other applications.
+KEY_PREFIX = "chatmock:"
+DEFAULT_NETWORK_TIMEOUT_SECONDS = 0.5
+
+
+class StateBackendError(Exception):
+    """The backend could not be reached or rejected a command; callers fall back to local state."""
+
+
+class StateBackend(abc.ABC):
+    """
+    Key-value store shared by the ChatMock nodes behind one load balancer.
+
+    Values are bytes and ``ttl`` is in seconds, with ``None`` or ``0``
+    meaning no expiry. :meth:`add` only writes a key that is absent, which
+    is what lets nodes agree on one session id per conversation and on one
+    token-refresh leader. :meth:`set_later` queues a write to a background
+    thread so that request threads never wait on the network for state
+    that only the next turn needs.
+    """
+
+    name = "state"
+    # Whether refreshed ChatGPT tokens are published for the other nodes to
+    # adopt. Off unless asked for, as the tokens are stored in plain text.
+    share_tokens = False
+
+    def __init__(self) -> None:
+        self._queue: "queue.SimpleQueue[Tuple[str, bytes, float | None] | None]" = queue.SimpleQueue()
+        self._writer_lock = threading.Lock()
+        # Notified when the last queued write has been attempted.
+        self._writes_done = threading.Condition(self._writer_lock)
+        self._writer_pid = 0
+        self._pending = 0
+        self.errors = 0
+
+    @abc.abstractmethod
+    def get(self, key: str) -> bytes | None:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        """Store ``value`` only if ``key`` is absent; ``True`` when it was stored."""
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def release(self, key: str, owner: bytes) -> None:
+        """
+        Delete ``key`` only if it still holds ``owner``, e.g. a lease this
+        node took with :meth:`add`, in one step so that a lease another node
+        took after ours expired is never deleted.
+        """
+
+    def close(self) -> None:
+        self._queue.put(None)
+
+    def set_later(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        """:meth:`set` from a background thread; errors only bump :attr:`errors`."""
+        with self._writer_lock:
+            self._pending += 1
+        self._queue.put((key, value, ttl))
+        pid = os.getpid()
+        if self._writer_pid == pid:
+            return
+        with self._writer_lock:
+            if self._writer_pid == pid:
+                return
+            self._writer_pid = pid
+            threading.Thread(target=self._write_behind, name="chatmock-state-writer", daemon=True).start()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait until the writes queued so far have been attempted."""
+        if self._writer_pid != os.getpid():
+            return
+        with self._writes_done:
+            self._writes_done.wait_for(lambda: not self._pending, timeout)
+
+    def _write_behind(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self.set(*item)
+            except StateBackendError:
+                pass
+            finally:
+                with self._writes_done:
+                    self._pending -= 1
+                    if not self._pending:
+                        self._writes_done.notify_all()
+
+
+def _expiry(ttl: float | None) -> float | None:
+    return time.time() + ttl if ttl else None
+
+
+class MemoryStateBackend(StateBackend):
+    """A process-local backend, for single-node setups and tests."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[bytes, float | None]] = {}
+
+    def _live(self, key: str, now: float) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry[0]
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            return self._live(key, time.time())
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        with self._lock:
+            self._data[key] = (bytes(value), _expiry(ttl))
+
+    def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        with self._lock:
+            if self._live(key, time.time()) is not None:
+                return False
+            self._data[key] = (bytes(value), _expiry(ttl))
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def release(self, key: str, owner: bytes) -> None:
+        with self._lock:
+            if self._live(key, time.time()) == owner:
+                del self._data[key]
+
+    def set_later(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        # Nothing to wait on.
+        self.set(key, value, ttl)
+
+
+class FileStateBackend(StateBackend):
+    """
+    A SQLite file, shared by the worker processes of one host or by hosts
+    that mount the same volume. :meth:`add` runs in one write transaction,
+    so it is atomic across processes.
+    """
+
+    name = "file"
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = os.path.abspath(os.path.expanduser(path))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid = 0
+        self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        # A connection must not be used across a fork; reopen in the child.
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _execute(self, sql: str, params: Tuple[Any, ...], *, write: bool = False) -> Any:
+        """The first row a read returns, or the number of rows a write changed."""
+        try:
+            with self._lock:
+                conn = self._connection()
+                if not write:
+                    return conn.execute(sql, params).fetchone()
+                with conn:
+                    return conn.execute(sql, params).rowcount
+        except sqlite3.Error as exc:
+            self.errors += 1
+            raise StateBackendError(str(exc)) from exc
+
+    def get(self, key: str) -> bytes | None:
+        row = self._execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        )
+        return bytes(row[0]) if row is not None else None
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)", (key, bytes(value), _expiry(ttl)), write=True
+        )
+
+    def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        # An expired row is replaced in the same statement, inside one write
+        # transaction, so two processes cannot both see the key as absent.
+        changed = self._execute(
+            "INSERT INTO kv (key, value, expires) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+            "value = excluded.value, expires = excluded.expires WHERE kv.expires IS NOT NULL AND kv.expires <= ?",
+            (key, bytes(value), _expiry(ttl), time.time()),
+            write=True,
+        )
+        return changed == 1
+
+    def delete(self, key: str) -> None:
+        self._execute("DELETE FROM kv WHERE key = ?", (key,), write=True)
+
+    def release(self, key: str, owner: bytes) -> None:
+        self._execute("DELETE FROM kv WHERE key = ? AND value = ?", (key, bytes(owner)), write=True)
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+def _encode_command(args: Tuple[Any, ...]) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(out)
+
+
+class _RespConnection:
+    __slots__ = ("sock", "reader")
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+        finally:
+            self.sock.close()
+
+    def call(self, *args: Any) -> Any:
+        self.sock.sendall(_encode_command(args))
+        return self._reply()
+
+    def _reply(self) -> Any:
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode("utf-8", errors="replace")
+        if kind == b"-":
+            return _RespError(body.decode("utf-8", errors="replace"))
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            if size < 0:
+                return None
+            data = self.reader.read(size + 2)
+            if len(data) != size + 2:
+                raise ConnectionError("connection closed")
+            return data[:-2]
+        if kind == b"*":
+            size = int(body)
+            return None if size < 0 else [self._reply() for _ in range(size)]
+        raise ConnectionError(f"unexpected reply {line[:32]!r}")
+
+
+# Compare-and-delete, run atomically by the server.
+_RELEASE_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+)
+
+
+class _RespError(str):
+    pass
+
+
+class RedisStateBackend(StateBackend):
+    """
+    A Redis-protocol server (Redis, Valkey, KeyDB, ...) spoken to directly
+    over RESP, so no client library is needed. Only ``GET``, ``SET`` with
+    ``PX``/``NX`` and ``DEL`` are used. Connections are pooled per process
+    and commands time out after ``timeout`` seconds, so an unreachable
+    server costs a request at most that long before local state is used.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        *,
+        db: int = 0,
+        password: str | None = None,
+        username: str | None = None,
+        timeout: float = DEFAULT_NETWORK_TIMEOUT_SECONDS,
+    ) -> None:
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._auth = (username, password)
+        self._lock = threading.Lock()
+        self._idle: List[_RespConnection] = []
+        self._pid = os.getpid()
+
+    def _connect(self) -> _RespConnection:
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = _RespConnection(sock)
+        try:
+            username, password = self._auth
+            if password is not None:
+                reply = conn.call("AUTH", username, password) if username else conn.call("AUTH", password)
+                if isinstance(reply, _RespError):
+                    raise StateBackendError(f"AUTH failed: {reply}")
+            if self.db:
+                reply = conn.call("SELECT", self.db)
+                if isinstance(reply, _RespError):
+                    raise StateBackendError(f"SELECT failed: {reply}")
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _checkout(self) -> _RespConnection:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Sockets inherited over a fork belong to the parent.
+                self._idle = []
+                self._pid = os.getpid()
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _call(self, *args: Any) -> Any:
+        try:
+            conn = self._checkout()
+        except OSError as exc:
+            self.errors += 1
+            raise StateBackendError(f"cannot reach {self.host}:{self.port}: {exc}") from exc
+        try:
+            reply = conn.call(*args)
+        except (OSError, ValueError) as exc:
+            conn.close()
+            self.errors += 1
+            raise StateBackendError(f"{self.host}:{self.port}: {exc}") from exc
+        with self._lock:
+            if self._pid == os.getpid():
+                self._idle.append(conn)
+            else:
+                conn.close()
+        if isinstance(reply, _RespError):
+            self.errors += 1
+            raise StateBackendError(reply)
+        return reply
+
+    @staticmethod
+    def _expiry_args(ttl: float | None) -> Tuple[Any, ...]:
+        return ("PX", max(int(ttl * 1000), 1)) if ttl else ()
+
+    def get(self, key: str) -> bytes | None:
+        reply = self._call("GET", key)
+        return reply if isinstance(reply, bytes) else None
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        self._call("SET", key, bytes(value), *self._expiry_args(ttl))
+
+    def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        return self._call("SET", key, bytes(value), *self._expiry_args(ttl), "NX") == "OK"
+
+    def delete(self, key: str) -> None:
+        self._call("DEL", key)
+
+    def release(self, key: str, owner: bytes) -> None:
+        self._call("EVAL", _RELEASE_SCRIPT, 1, key, bytes(owner))
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def open_state_backend(url: Any) -> StateBackend | None:
+    """
+    The backend ``url`` names, or ``None`` when it is empty or unusable:
+
+    * ``memory://``
+    * ``file:///path/state.db``, ``sqlite:///path/state.db`` or a plain path
+    * ``redis://[[user]:password@]host[:port][/db][?timeout=seconds]``
+    """
+    if not isinstance(url, str) or not url.strip():
+        return None
+    url = url.strip()
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    try:
+        if scheme == "memory":
+            return MemoryStateBackend()
+        if scheme in ("file", "sqlite"):
+            return FileStateBackend(unquote(parts.netloc + parts.path))
+        if scheme in ("redis", "valkey"):
+            timeout = DEFAULT_NETWORK_TIMEOUT_SECONDS
+            for pair in parts.query.split("&"):
+                name, _, value = pair.partition("=")
+                if name == "timeout" and value:
+                    timeout = max(float(value), 0.01)
+            db = parts.path.strip("/")
+            return RedisStateBackend(
+                parts.hostname or "localhost",
+                parts.port or 6379,
+                db=int(db) if db else 0,
+                password=unquote(parts.password) if parts.password is not None else None,
+                username=unquote(parts.username) if parts.username else None,
+                timeout=timeout,
+            )
+        if not scheme:
+            return FileStateBackend(url)
+    except (OSError, ValueError, sqlite3.Error) as exc:
+        eprint(f"WARNING: state will not be shared; cannot open {url}: {exc}")
+        return None
+    eprint(f"WARNING: state will not be shared; unknown state backend {url!r}")
+    return None
+
+
+_BACKEND: StateBackend | None = None
+_CONFIGURED = False
+_CONFIG_LOCK = threading.Lock()
+
+
+def _share_tokens_from_env() -> bool:
+    return (os.getenv("CHATGPT_LOCAL_STATE_SHARE_TOKENS") or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def configure_state_backend(url: Any, *, share_tokens: bool | None = None) -> StateBackend | None:
+    """
+    Open the backend for ``url`` (see :func:`open_state_backend`) and make it
+    the shared one. ``share_tokens`` defaults to ``CHATGPT_LOCAL_STATE_SHARE_TOKENS``.
+    """
+    global _BACKEND, _CONFIGURED
+    backend = open_state_backend(url)
+    if backend is not None:
+        backend.share_tokens = _share_tokens_from_env() if share_tokens is None else bool(share_tokens)
+    with _CONFIG_LOCK:
+        previous, _BACKEND = _BACKEND, backend
+        _CONFIGURED = True
+    if previous is not None and previous is not backend:
+        previous.flush()
+        previous.close()
+    return backend
+
+
+def get_state_backend() -> StateBackend | None:
+    """
+    The shared backend, or ``None`` when state is node-local. Until
+    :func:`configure_state_backend` is called it comes from
+    ``CHATGPT_LOCAL_STATE_BACKEND``, so one-off commands see the same state
+    as the server.
+    """
+    if not _CONFIGURED:
+        with _CONFIG_LOCK:
+            if not _CONFIGURED:
+                _set_default_backend()
+    return _BACKEND
+
+
+def _set_default_backend() -> None:
+    global _BACKEND, _CONFIGURED
+    _BACKEND = open_state_backend(os.getenv("CHATGPT_LOCAL_STATE_BACKEND"))
+    if _BACKEND is not None:
+        _BACKEND.share_tokens = _share_tokens_from_env()
+    _CONFIGURED = True
+
+
+def state_backend_stats() -> Dict[str, Any]:
+    """Counters for the ``/stats`` endpoint."""
+    backend = _BACKEND
+    if backend is None:
+        return {"state_backend": None}
+    return {"state_backend": backend.name, "state_backend_errors": backend.errors}
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    backend = _BACKEND
+    if backend is not None:
+        backend.flush()
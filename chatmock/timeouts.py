@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import socket
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Tuple
+
+import requests
+from flask import current_app
+from urllib3.exceptions import ReadTimeoutError
+
+from .config import float_env, int_env
+
+
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 15.0
+DEFAULT_FIRST_EVENT_TIMEOUT_SECONDS = 90.0
+DEFAULT_IDLE_TIMEOUT_SECONDS = 300.0
+DEFAULT_STALL_RETRIES = 1
+
+
+@dataclass(frozen=True)
+class UpstreamTimeouts:
+    """
+    Limits for one upstream call; ``0`` disables a limit.
+
+    ``connect`` bounds establishing the connection, ``first_event`` how long
+    upstream may take to start answering, and ``idle`` the silence allowed
+    between events once the stream is flowing. A call that stalls before any
+    output reached the client is retried up to ``stall_retries`` times.
+    """
+
+    connect: float = DEFAULT_CONNECT_TIMEOUT_SECONDS
+    first_event: float = DEFAULT_FIRST_EVENT_TIMEOUT_SECONDS
+    idle: float = DEFAULT_IDLE_TIMEOUT_SECONDS
+    stall_retries: int = DEFAULT_STALL_RETRIES
+
+    @staticmethod
+    def _limit(seconds: float) -> float | None:
+        return seconds if seconds > 0 else None
+
+    @property
+    def connect_limit(self) -> float | None:
+        return self._limit(self.connect)
+
+    @property
+    def first_event_limit(self) -> float | None:
+        return self._limit(self.first_event)
+
+    @property
+    def idle_limit(self) -> float | None:
+        return self._limit(self.idle)
+
+    def requests_timeout(self) -> Tuple[float | None, float | None]:
+        return self.connect_limit, self.first_event_limit
+
+
+@dataclass(frozen=True)
+class UpstreamStalled(Exception):
+    message: str
+    phase: str = "idle"
+    status_code: int = 504
+
+    def __str__(self) -> str:
+        return self.message
+
+    def error_payload(self) -> Dict[str, Any]:
+        return {"message": self.message, "type": "timeout_error", "code": "upstream_timeout"}
+
+
+def stalled(phase: str, seconds: float | None) -> UpstreamStalled:
+    waited = f"{seconds:g} seconds" if seconds is not None else "too long"
+    if phase == "first_event":
+        message = f"Upstream sent no events within {waited}."
+    else:
+        message = f"Upstream stream stalled for {waited}."
+    return UpstreamStalled(message, phase=phase)
+
+
+def default_upstream_timeouts(
+    *,
+    connect: float | None = None,
+    first_event: float | None = None,
+    idle: float | None = None,
+    stall_retries: int | None = None,
+) -> UpstreamTimeouts:
+    """Timeouts from the arguments given, falling back to the environment and then the defaults."""
+    if connect is None:
+        connect = float_env("CHATGPT_LOCAL_UPSTREAM_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT_SECONDS)
+    if first_event is None:
+        first_event = float_env("CHATGPT_LOCAL_UPSTREAM_FIRST_EVENT_TIMEOUT", DEFAULT_FIRST_EVENT_TIMEOUT_SECONDS)
+    if idle is None:
+        idle = float_env("CHATGPT_LOCAL_UPSTREAM_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT_SECONDS)
+    if stall_retries is None:
+        stall_retries = int_env("CHATGPT_LOCAL_UPSTREAM_STALL_RETRIES", DEFAULT_STALL_RETRIES)
+    return UpstreamTimeouts(
+        connect=max(float(connect), 0.0),
+        first_event=max(float(first_event), 0.0),
+        idle=max(float(idle), 0.0),
+        stall_retries=max(int(stall_retries), 0),
+    )
+
+
+def current_upstream_timeouts() -> UpstreamTimeouts:
+    try:
+        timeouts = current_app.config.get("UPSTREAM_TIMEOUTS")
+    except RuntimeError:
+        timeouts = None
+    return timeouts if isinstance(timeouts, UpstreamTimeouts) else default_upstream_timeouts()
+
+
+def is_read_timeout(exc: BaseException) -> bool:
+    """``requests`` reports a body read timeout as a ``ConnectionError`` wrapping urllib3's error."""
+    if isinstance(exc, requests.exceptions.ReadTimeout):
+        return True
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        return any(isinstance(arg, ReadTimeoutError) for arg in exc.args)
+    return False
+
+
+def _upstream_socket(response: Any) -> socket.socket | None:
+    try:
+        sock = response.raw.connection.sock
+    except AttributeError:
+        return None
+    return sock if isinstance(sock, socket.socket) else None
+
+
+def _set_read_timeout(response: Any, seconds: float | None) -> None:
+    sock = _upstream_socket(response)
+    if sock is None:
+        return
+    try:
+        sock.settimeout(seconds)
+    except OSError:
+        pass
+
+
+class GuardedUpstream:
+    """
+    A streaming ``requests.Response`` whose first chunk has already arrived.
+
+    Later reads are bounded by the idle timeout, and a read that hits it raises
+    ``UpstreamStalled`` instead of a generic connection error. ``cancel`` may
+    be called from another thread to drop the connection; the reader then
+    simply sees the stream end. Everything else is delegated to the wrapped
+    response.
+    """
+
+    def __init__(self, response: Any, chunks: Iterator[bytes], first_chunk: bytes, idle: float | None) -> None:
+        self.response = response
+        self.bytes_read = len(first_chunk)
+        self.cancelled = False
+        self._chunks = chunks
+        self._first_chunk = first_chunk
+        self._idle = idle
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.response, name)
+
+    def iter_content(self, chunk_size: int | None = None, decode_unicode: bool = False) -> Iterator[bytes]:
+        first, self._first_chunk = self._first_chunk, b""
+        if first:
+            yield first
+        try:
+            for chunk in self._chunks:
+                self.bytes_read += len(chunk)
+                yield chunk
+        except Exception as exc:
+            if self.cancelled:
+                return
+            if isinstance(exc, requests.exceptions.RequestException) and is_read_timeout(exc):
+                raise stalled("idle", self._idle) from exc
+            raise
+
+    iter_lines = requests.Response.iter_lines
+
+    @property
+    def socket(self) -> socket.socket | None:
+        return _upstream_socket(self.response)
+
+    def cancel(self) -> None:
+        # ``close`` from another thread does not wake a blocked ``recv``;
+        # shutting the socket down does.
+        self.cancelled = True
+        sock = _upstream_socket(self.response)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def await_first_chunk(response: Any, timeouts: UpstreamTimeouts) -> GuardedUpstream:
+    """
+    Block until a streaming response produces its first body chunk.
+
+    The read timeout set on the request (``first_event``) applies while
+    waiting; afterwards the socket is switched to the idle timeout. The
+    response is closed before ``UpstreamStalled`` is raised.
+    """
+    chunks = iter(response.iter_content(chunk_size=None))
+    try:
+        first_chunk = next(chunks, b"")
+    except requests.exceptions.RequestException as exc:
+        try:
+            response.close()
+        except Exception:
+            pass
+        if is_read_timeout(exc):
+            raise stalled("first_event", timeouts.first_event_limit) from exc
+        raise
+    _set_read_timeout(response, timeouts.idle_limit)
+    return GuardedUpstream(response, chunks, first_chunk, timeouts.idle_limit)
@@ -0,0 +1,954 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+from .coalesce import CoalesceSettings, DeltaCoalescer, PendingDelta
+from .config import int_env
+from .jsoncodec import JSONTemplate, dumps
+from .timeouts import UpstreamStalled
+
+
+OLLAMA_FAKE_EVAL = {
+    "total_duration": 8497226791,
+    "load_duration": 1747193958,
+    "prompt_eval_count": 24,
+    "prompt_eval_duration": 269219750,
+    "eval_count": 247,
+    "eval_duration": 6413802458,
+}
+
+# How a translator presents reasoning deltas:
+#   "think-tags"  inline as answer text wrapped in <think>...</think>
+#   "o3"          through the encoder, with summary parts separated by newlines
+#   "plain"       through the encoder as they arrive
+#   "hidden"      dropped
+REASONING_LAYOUTS = ("think-tags", "o3", "plain", "hidden")
+
+
+def _serialize_tool_args(eff_args: Any) -> str:
+    """
+    Serialize tool call arguments with proper JSON handling.
+
+    Args:
+        eff_args: Arguments to serialize (dict, list, str, or other)
+
+    Returns:
+        JSON string representation of the arguments
+    """
+    if isinstance(eff_args, (dict, list)):
+        return json.dumps(eff_args)
+    elif isinstance(eff_args, str):
+        try:
+            parsed = json.loads(eff_args)
+            if isinstance(parsed, (dict, list)):
+                return json.dumps(parsed)
+            else:
+                return json.dumps({"query": eff_args})
+        except (json.JSONDecodeError, ValueError):
+            return json.dumps({"query": eff_args})
+    else:
+        return "{}"
+
+
+def _extract_usage(response: Dict[str, Any]) -> Dict[str, int] | None:
+    try:
+        usage = response.get("usage")
+        if not isinstance(usage, dict):
+            return None
+        pt = int(usage.get("input_tokens") or 0)
+        ct = int(usage.get("output_tokens") or 0)
+        tt = int(usage.get("total_tokens") or (pt + ct))
+        return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
+    except Exception:
+        return None
+
+
+def _sse_chunk(obj: Dict[str, Any]) -> bytes:
+    return b"data: " + dumps(obj) + b"\n\n"
+
+
+def stalled_stream_chunks(exc: UpstreamStalled) -> List[bytes]:
+    """Frames ending an OpenAI-style SSE stream whose upstream stalled."""
+    return [_sse_chunk({"error": exc.error_payload()}), b"data: [DONE]\n\n"]
+
+
+def interrupted_stream_chunks(exc: BaseException) -> List[bytes]:
+    """Frames ending an OpenAI-style SSE stream whose upstream connection broke."""
+    error = {"message": f"Upstream stream interrupted: {exc}", "type": "upstream_error", "code": "upstream_interrupted"}
+    return [_sse_chunk({"error": error}), b"data: [DONE]\n\n"]
+
+
+class ToolCall:
+    """A function or web search call; ``done`` is false while it is still in progress."""
+
+    __slots__ = ("index", "call_id", "name", "arguments", "raw_arguments", "kind", "done")
+
+    def __init__(
+        self,
+        index: int,
+        call_id: str,
+        name: str,
+        arguments: str,
+        raw_arguments: Any,
+        kind: str,
+        done: bool = True,
+    ) -> None:
+        self.index = index
+        self.call_id = call_id
+        self.name = name
+        # ``arguments`` is the normalized JSON text; ``raw_arguments`` what upstream sent.
+        self.arguments = arguments
+        self.raw_arguments = raw_arguments
+        self.kind = kind
+        self.done = done
+
+
+class ResponsesEncoder:
+    """
+    Output side of a :class:`ResponsesTranslator`.
+
+    The translator keeps all per-response state and calls these hooks;
+    an encoder only decides what each one looks like on the wire (or in
+    an aggregate). Unused hooks can be left as the no-ops below.
+    """
+
+    response_id: str = ""
+    usage: Dict[str, int] | None = None
+    # Set once the encoder has ended the output itself; the translator
+    # then ignores the rest of the upstream stream.
+    ended: bool = False
+
+    def text(self, text: str) -> None:
+        pass
+
+    def marker(self, text: str) -> None:
+        """Answer text that must stay a frame of its own (``<think>`` tags)."""
+        pass
+
+    def summary(self, text: str) -> None:
+        pass
+
+    def reasoning(self, text: str) -> None:
+        pass
+
+    def tool_call_started(self, call: ToolCall) -> None:
+        """A call upstream has begun; its arguments follow as deltas or with :meth:`tool_call`."""
+        pass
+
+    def tool_call_delta(self, call: ToolCall, text: str) -> None:
+        """The next piece of a started call's raw argument text."""
+        pass
+
+    def tool_call(self, call: ToolCall) -> None:
+        pass
+
+    def text_done(self) -> None:
+        pass
+
+    def failed(self, message: str) -> None:
+        pass
+
+    def completed(self, finish_reason: str) -> None:
+        pass
+
+    def drain(self) -> List[bytes]:
+        return []
+
+    def flush(self) -> List[bytes]:
+        return []
+
+    def flush_delay(self) -> float | None:
+        return None
+
+
+class ResponsesTranslator:
+    """
+    Table-dispatched state machine over upstream Responses events.
+
+    Every endpoint that answers from a Responses stream (chat and text
+    completions, Ollama chat; streaming or aggregated) runs this one core
+    and only swaps the encoder. Each event costs one lookup in a handler
+    table built for the translator's reasoning layout, so layout choices
+    are made once per request rather than once per event.
+    """
+
+    def __init__(self, encoder: ResponsesEncoder, *, reasoning: str = "plain", vlog=None) -> None:
+        if reasoning not in REASONING_LAYOUTS:
+            raise ValueError(f"unknown reasoning layout: {reasoning!r}")
+        self.encoder = encoder
+        self.vlog = vlog
+        self.finished = False
+        self._think_open = False
+        self._think_closed = False
+        self._saw_any_summary = False
+        self._pending_paragraph = False
+        self._saw_function_call = False
+        self._tool_args: Dict[str, Any] = {}
+        self._tool_index: Dict[str, int] = {}
+        # Calls announced by ``output_item.added``, by upstream item id.
+        self._started_calls: Dict[Any, ToolCall] = {}
+        # Bound once: these run for nearly every event.
+        self._emit_text = encoder.text
+        self._drain = encoder.drain
+        self._handlers = self._build_handlers(reasoning)
+
+    def _build_handlers(self, reasoning: str) -> Dict[Any, Callable[[Dict[str, Any]], None]]:
+        handlers: Dict[Any, Callable[[Dict[str, Any]], None]] = {
+            "response.created": self._on_envelope,
+            "response.in_progress": self._on_envelope,
+            "response.output_text.delta": self._on_text_delta,
+            "response.output_text.done": self._on_text_done,
+            "response.output_item.added": self._on_item_added,
+            "response.function_call_arguments.delta": self._on_arguments_delta,
+            "response.output_item.done": self._on_item_done,
+            "response.failed": self._on_failed,
+            "response.completed": self._on_completed,
+        }
+        summary = "response.reasoning_summary_text.delta"
+        raw = "response.reasoning_text.delta"
+        if reasoning == "think-tags":
+            handlers["response.reasoning_summary_part.added"] = self._on_summary_part
+            handlers[summary] = self._on_think_summary
+            handlers[raw] = self._on_think_reasoning
+        elif reasoning == "o3":
+            handlers["response.reasoning_summary_part.added"] = self._on_summary_part
+            handlers[summary] = self._on_paragraph_summary
+            handlers[raw] = self._on_reasoning
+        elif reasoning == "plain":
+            handlers[summary] = self._on_summary
+            handlers[raw] = self._on_reasoning
+        return handlers
+
+    @property
+    def response_id(self) -> str:
+        return self.encoder.response_id
+
+    @response_id.setter
+    def response_id(self, value: str) -> None:
+        self.encoder.response_id = value
+
+    @property
+    def coalescing(self) -> bool:
+        return getattr(self.encoder, "coalescing", False)
+
+    def feed(self, evt: Dict[str, Any]) -> List[bytes]:
+        """Apply one parsed upstream event and return the output it produced."""
+        if not self.finished:
+            kind = evt.get("type")
+            try:
+                handler = self._handlers[kind]
+            except (KeyError, TypeError):
+                handler = self._resolve(kind)
+            handler(evt)
+        return self._drain()
+
+    def flush(self) -> List[bytes]:
+        """Send any held text now."""
+        return self.encoder.flush()
+
+    def flush_delay(self) -> float | None:
+        """Seconds until held text is due, or ``None`` when nothing is held."""
+        return self.encoder.flush_delay()
+
+    def _resolve(self, kind: Any) -> Callable[[Dict[str, Any]], None]:
+        if not isinstance(kind, str):
+            return self._on_envelope
+        # Web search progress arrives under several event names; anything
+        # else unknown may still carry the response envelope.
+        handler = self._on_web_search if "web_search_call" in kind else self._on_envelope
+        self._handlers[kind] = handler
+        return handler
+
+    def _on_envelope(self, evt: Dict[str, Any]) -> None:
+        response = evt.get("response")
+        if isinstance(response, dict):
+            response_id = response.get("id")
+            if isinstance(response_id, str) and response_id:
+                self.encoder.response_id = response_id
+            usage = _extract_usage(response)
+            if usage:
+                self.encoder.usage = usage
+
+    def _close_think(self) -> None:
+        if self._think_open:
+            self.encoder.marker("</think>")
+            self._think_open = False
+            self._think_closed = True
+
+    def _open_think(self) -> bool:
+        if not self._think_open:
+            if self._think_closed:
+                return False
+            self.encoder.marker("<think>")
+            self._think_open = True
+        return True
+
+    def _on_text_delta(self, evt: Dict[str, Any]) -> None:
+        if self._think_open:
+            self._close_think()
+        self._emit_text(evt.get("delta") or "")
+
+    def _on_text_done(self, evt: Dict[str, Any]) -> None:
+        self.encoder.text_done()
+
+    def _on_summary_part(self, evt: Dict[str, Any]) -> None:
+        if self._saw_any_summary:
+            self._pending_paragraph = True
+        else:
+            self._saw_any_summary = True
+
+    def _on_think_summary(self, evt: Dict[str, Any]) -> None:
+        if self._open_think():
+            if self._pending_paragraph:
+                self.encoder.text("\n")
+                self._pending_paragraph = False
+            self.encoder.text(evt.get("delta") or "")
+
+    def _on_think_reasoning(self, evt: Dict[str, Any]) -> None:
+        if self._open_think():
+            self.encoder.text(evt.get("delta") or "")
+
+    def _on_paragraph_summary(self, evt: Dict[str, Any]) -> None:
+        if self._pending_paragraph:
+            self.encoder.summary("\n")
+            self._pending_paragraph = False
+        self.encoder.summary(evt.get("delta") or "")
+
+    def _on_summary(self, evt: Dict[str, Any]) -> None:
+        self.encoder.summary(evt.get("delta") or "")
+
+    def _on_reasoning(self, evt: Dict[str, Any]) -> None:
+        self.encoder.reasoning(evt.get("delta") or "")
+
+    def _call_index(self, call_id: str) -> int:
+        index = self._tool_index.get(call_id)
+        if index is None:
+            index = self._tool_index[call_id] = len(self._tool_index)
+        return index
+
+    def _on_web_search(self, evt: Dict[str, Any]) -> None:
+        kind = evt.get("type")
+        vlog = self.vlog
+        try:
+            call_id = evt.get("item_id") or "ws_call"
+            if vlog:
+                try:
+                    vlog(f"CM_TOOLS {kind} id={call_id} -> tool_calls(web_search)")
+                except Exception:
+                    pass
+            item = evt.get('item') if isinstance(evt.get('item'), dict) else {}
+            params_dict = self._tool_args.setdefault(call_id, {}) if isinstance(self._tool_args.get(call_id), dict) else {}
+            def _merge_from(src):
+                if not isinstance(src, dict):
+                    return
+                for whole in ('parameters','args','arguments','input'):
+                    if isinstance(src.get(whole), dict):
+                        params_dict.update(src.get(whole))
+                if isinstance(src.get('query'), str): params_dict.setdefault('query', src.get('query'))
+                if isinstance(src.get('q'), str): params_dict.setdefault('query', src.get('q'))
+                for rk in ('recency','time_range','days'):
+                    if src.get(rk) is not None and rk not in params_dict: params_dict[rk] = src.get(rk)
+                for dk in ('domains','include_domains','include'):
+                    if isinstance(src.get(dk), list) and 'domains' not in params_dict: params_dict['domains'] = src.get(dk)
+                for mk in ('max_results','topn','limit'):
+                    if src.get(mk) is not None and 'max_results' not in params_dict: params_dict['max_results'] = src.get(mk)
+            _merge_from(item)
+            _merge_from(evt if isinstance(evt, dict) else None)
+            params = params_dict if params_dict else None
+            if isinstance(params, dict):
+                try:
+                    self._tool_args.setdefault(call_id, {}).update(params)
+                except Exception:
+                    pass
+            eff_params = self._tool_args.get(call_id, params if isinstance(params, (dict, list, str)) else {})
+            args_str = _serialize_tool_args(eff_params)
+            index = self._call_index(call_id)
+            self.encoder.tool_call(ToolCall(index, call_id, "web_search", args_str, params, "web_search_call", done=False))
+        except Exception:
+            pass
+
+    def _on_item_added(self, evt: Dict[str, Any]) -> None:
+        item = evt.get("item")
+        if not isinstance(item, dict):
+            return
+        item_type = item.get("type")
+        if item_type == "function_call":
+            name = item.get("name") or ""
+        elif item_type == "web_search_call":
+            name = "web_search"
+        else:
+            return
+        call_id = item.get("call_id") or item.get("id") or ""
+        if not isinstance(call_id, str) or not isinstance(name, str):
+            return
+        item_id = item.get("id")
+        call = ToolCall(self._call_index(call_id), call_id, name, "", None, item_type, done=False)
+        self._started_calls[item_id if isinstance(item_id, str) and item_id else call_id] = call
+        self.encoder.tool_call_started(call)
+
+    def _on_arguments_delta(self, evt: Dict[str, Any]) -> None:
+        item_id = evt.get("item_id")
+        delta = evt.get("delta")
+        if isinstance(item_id, str) and isinstance(delta, str) and delta:
+            call = self._started_calls.get(item_id)
+            if call is not None:
+                self.encoder.tool_call_delta(call, delta)
+
+    def _on_item_done(self, evt: Dict[str, Any]) -> None:
+        item = evt.get("item") or {}
+        if not isinstance(item, dict):
+            return
+        item_type = item.get("type")
+        if item_type != "function_call" and item_type != "web_search_call":
+            return
+        call_id = item.get("call_id") or item.get("id") or ""
+        name = item.get("name") or ("web_search" if item_type == "web_search_call" else "")
+        raw_args = item.get("arguments") or item.get("parameters")
+        if isinstance(raw_args, dict):
+            try:
+                self._tool_args.setdefault(call_id, {}).update(raw_args)
+            except Exception:
+                pass
+        eff_args = self._tool_args.get(call_id, raw_args if isinstance(raw_args, (dict, list, str)) else {})
+        try:
+            args = _serialize_tool_args(eff_args)
+        except Exception:
+            args = "{}"
+        if item_type == "web_search_call" and self.vlog:
+            try:
+                self.vlog(f"CM_TOOLS response.output_item.done web_search_call id={call_id} has_args={bool(args)}")
+            except Exception:
+                pass
+        index = self._call_index(call_id)
+        if isinstance(call_id, str) and isinstance(name, str):
+            if item_type == "function_call":
+                self._saw_function_call = True
+            self.encoder.tool_call(ToolCall(index, call_id, name, args, raw_args, item_type))
+            if self.encoder.ended:
+                self.finished = True
+
+    def _on_failed(self, evt: Dict[str, Any]) -> None:
+        self._on_envelope(evt)
+        error = (evt.get("response") or {}).get("error") or {}
+        self.encoder.failed(error.get("message", "response.failed") if isinstance(error, dict) else "response.failed")
+
+    def _on_completed(self, evt: Dict[str, Any]) -> None:
+        self._on_envelope(evt)
+        self._close_think()
+        self.finished = True
+        self.encoder.completed("tool_calls" if self._saw_function_call else "stop")
+
+
+class _ChunkFrames:
+    """Pre-encoded ``*.chunk`` SSE envelopes for one response id."""
+
+    __slots__ = ("response_id", "value", "content")
+
+    def __init__(self, object_type: str, field: str, response_id: str, created: int, model: str) -> None:
+        def envelope(value: Any) -> JSONTemplate:
+            return JSONTemplate(
+                {
+                    "id": response_id,
+                    "object": object_type,
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, field: value, "finish_reason": None}],
+                },
+                prefix=b"data: ",
+                suffix=b"\n\n",
+            )
+
+        self.response_id = response_id
+        self.value = envelope(JSONTemplate.SLOT)
+        self.content = envelope({"content": JSONTemplate.SLOT}) if field == "delta" else self.value
+
+
+class _FrameEncoder(ResponsesEncoder):
+    """Encoders producing wire frames, with optional coalescing of mergeable text deltas."""
+
+    def __init__(self, coalesce: CoalesceSettings | None) -> None:
+        self.out: List[Any] = []
+        self._coalescer = DeltaCoalescer(coalesce) if coalesce is not None and coalesce.enabled else None
+
+    @property
+    def coalescing(self) -> bool:
+        return self._coalescer is not None
+
+    def _text(self, key: str, text: str, render: Callable[[str], bytes]) -> None:
+        if self._coalescer is None:
+            self.out.append(render(text))
+        else:
+            self.out.append(PendingDelta(key, text, render))
+
+    def _send_held(self) -> None:
+        """End the current run of mergeable text even when no frame follows it."""
+        if self._coalescer is not None:
+            out = self._coalescer.merge(self.out)
+            out.extend(self._coalescer.flush())
+            self.out = out
+
+    def drain(self) -> List[bytes]:
+        out, self.out = self.out, []
+        return out if self._coalescer is None else self._coalescer.merge(out)
+
+    def flush(self) -> List[bytes]:
+        return [] if self._coalescer is None else self._coalescer.flush()
+
+    def flush_delay(self) -> float | None:
+        return None if self._coalescer is None else self._coalescer.delay()
+
+
+class ChatChunkEncoder(_FrameEncoder):
+    """``chat.completion.chunk`` SSE frames."""
+
+    def __init__(
+        self,
+        model: str,
+        created: int,
+        *,
+        reasoning_compat: str = "think-tags",
+        include_usage: bool = False,
+        coalesce: CoalesceSettings | None = None,
+    ) -> None:
+        super().__init__(coalesce)
+        self.model = model
+        self.created = created
+        self.include_usage = include_usage
+        self.response_id = "chatcmpl-stream"
+        self._frames: _ChunkFrames | None = None
+        # Argument text sent so far for each announced tool call index.
+        self._tool_args_sent: Dict[int, List[str]] = {}
+        # Latest arguments of web search calls still in progress.
+        self._tool_args_held: Dict[int, str] = {}
+        if reasoning_compat == "o3":
+            self._summary = self._reasoning = ("o3", self._o3_reasoning)
+        else:
+            self._summary = ("summary", self._legacy_summary)
+            self._reasoning = ("reasoning", self._legacy_reasoning)
+
+    def _chunk_frames(self) -> _ChunkFrames:
+        frames = self._frames
+        if frames is None or frames.response_id != self.response_id:
+            frames = self._frames = _ChunkFrames(
+                "chat.completion.chunk", "delta", self.response_id, self.created, self.model
+            )
+        return frames
+
+    def _content(self, text: str) -> bytes:
+        return self._chunk_frames().content.render(text)
+
+    def _o3_reasoning(self, text: str) -> bytes:
+        return self._chunk({"reasoning": {"content": [{"type": "text", "text": text}]}})
+
+    def _legacy_summary(self, text: str) -> bytes:
+        return self._chunk({"reasoning_summary": text, "reasoning": text})
+
+    def _legacy_reasoning(self, text: str) -> bytes:
+        return self._chunk({"reasoning": text})
+
+    def _chunk(self, delta: Dict[str, Any], finish_reason: str | None = None) -> bytes:
+        if finish_reason is None:
+            return self._chunk_frames().value.render(delta)
+        return _sse_chunk(
+            {
+                "id": self.response_id,
+                "object": "chat.completion.chunk",
+                "created": self.created,
+                "model": self.model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+        )
+
+    def text(self, text: str) -> None:
+        self._text("content", text, self._content)
+
+    def marker(self, text: str) -> None:
+        self.out.append(self._content(text))
+
+    def summary(self, text: str) -> None:
+        key, render = self._summary
+        self._text(key, text, render)
+
+    def reasoning(self, text: str) -> None:
+        key, render = self._reasoning
+        self._text(key, text, render)
+
+    def _tool_header(self, call: ToolCall, arguments: str) -> None:
+        self._tool_args_sent[call.index] = [arguments] if arguments else []
+        self.out.append(
+            self._chunk(
+                {
+                    "tool_calls": [
+                        {
+                            "index": call.index,
+                            "id": call.call_id,
+                            "type": "function",
+                            "function": {"name": call.name, "arguments": arguments},
+                        }
+                    ]
+                }
+            )
+        )
+
+    def _tool_arguments(self, index: int, text: str) -> bytes:
+        return self._chunk({"tool_calls": [{"index": index, "function": {"arguments": text}}]})
+
+    def tool_call_started(self, call: ToolCall) -> None:
+        if call.index not in self._tool_args_sent:
+            self._tool_header(call, "")
+
+    def tool_call_delta(self, call: ToolCall, text: str) -> None:
+        sent = self._tool_args_sent.get(call.index)
+        if sent is None:
+            self._tool_header(call, "")
+            sent = self._tool_args_sent[call.index]
+        sent.append(text)
+        index = call.index
+        self._text(f"tool:{index}", text, lambda merged: self._tool_arguments(index, merged))
+
+    def tool_call(self, call: ToolCall) -> None:
+        # OpenAI clients concatenate ``arguments`` across deltas, so only text
+        # extending what was already sent for this index may follow the header.
+        sent = self._tool_args_sent.get(call.index)
+        if not call.done:
+            if sent is None:
+                self._tool_header(call, "")
+            self._tool_args_held[call.index] = call.arguments
+            return
+        self._tool_args_held.pop(call.index, None)
+        self._send_held()
+        if sent is None:
+            self._tool_header(call, call.arguments)
+            return
+        streamed = "".join(sent)
+        final = call.raw_arguments if isinstance(call.raw_arguments, str) else call.arguments
+        if not streamed:
+            rest = call.arguments
+        elif final.startswith(streamed):
+            rest = final[len(streamed) :]
+        else:
+            # The deltas the client already concatenated are not a prefix of
+            # the final arguments and cannot be taken back: end the stream
+            # with an error carrying the final arguments rather than leave
+            # the client's copy wrong. OpenAI clients raise on an error
+            # frame, so nothing may follow it but ``[DONE]``.
+            sent[:] = [call.arguments]
+            self.out.append(
+                _sse_chunk(
+                    {
+                        "error": {
+                            "message": f"Arguments of tool call {call.call_id} changed after they were streamed.",
+                            "type": "upstream_error",
+                            "code": "tool_arguments_mismatch",
+                            "tool_call": {
+                                "index": call.index,
+                                "id": call.call_id,
+                                "type": "function",
+                                "function": {"name": call.name, "arguments": call.arguments},
+                            },
+                        }
+                    }
+                )
+            )
+            self.out.append(b"data: [DONE]\n\n")
+            self.ended = True
+            return
+        sent[:] = [streamed + rest]
+        if rest:
+            self.out.append(self._tool_arguments(call.index, rest))
+
+    def failed(self, message: str) -> None:
+        self.out.append(_sse_chunk({"error": {"message": message}}))
+
+    def completed(self, finish_reason: str) -> None:
+        for index, arguments in self._tool_args_held.items():
+            if arguments and not self._tool_args_sent.get(index):
+                self.out.append(self._tool_arguments(index, arguments))
+        self._tool_args_held.clear()
+        self.out.append(self._chunk({}, finish_reason))
+        if self.include_usage and self.usage:
+            self.out.append(
+                _sse_chunk(
+                    {
+                        "id": self.response_id,
+                        "object": "chat.completion.chunk",
+                        "created": self.created,
+                        "model": self.model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": None}],
+                        "usage": self.usage,
+                    }
+                )
+            )
+        self.out.append(b"data: [DONE]\n\n")
+
+
+class TextChunkEncoder(_FrameEncoder):
+    """``text_completion.chunk`` SSE frames."""
+
+    def __init__(self, model: str, created: int, *, include_usage: bool = False, coalesce: CoalesceSettings | None = None) -> None:
+        super().__init__(coalesce)
+        self.model = model
+        self.created = created
+        self.include_usage = include_usage
+        self.response_id = "cmpl-stream"
+        self._frames: _ChunkFrames | None = None
+
+    def _chunk(self, text: str, finish_reason: str | None = None) -> bytes:
+        if finish_reason is None:
+            frames = self._frames
+            if frames is None or frames.response_id != self.response_id:
+                frames = self._frames = _ChunkFrames(
+                    "text_completion.chunk", "text", self.response_id, self.created, self.model
+                )
+            return frames.value.render(text)
+        return _sse_chunk(
+            {
+                "id": self.response_id,
+                "object": "text_completion.chunk",
+                "created": self.created,
+                "model": self.model,
+                "choices": [{"index": 0, "text": text, "finish_reason": finish_reason}],
+            }
+        )
+
+    def text(self, text: str) -> None:
+        self._text("text", text, self._chunk)
+
+    def text_done(self) -> None:
+        self.out.append(self._chunk("", "stop"))
+
+    def completed(self, finish_reason: str) -> None:
+        if self.include_usage and self.usage:
+            self.out.append(
+                _sse_chunk(
+                    {
+                        "id": self.response_id,
+                        "object": "text_completion.chunk",
+                        "created": self.created,
+                        "model": self.model,
+                        "choices": [{"index": 0, "text": "", "finish_reason": None}],
+                        "usage": self.usage,
+                    }
+                )
+            )
+        self.out.append(b"data: [DONE]\n\n")
+
+
+class OllamaLineEncoder(_FrameEncoder):
+    """Ollama ``/api/chat`` NDJSON lines; reasoning, when shown, goes into the message content."""
+
+    def __init__(self, model: str, created_at: str, *, coalesce: CoalesceSettings | None = None) -> None:
+        super().__init__(coalesce)
+        self.model = model
+        self.created_at = created_at
+        self._line_frame = JSONTemplate(
+            {
+                "model": model,
+                "created_at": created_at,
+                "message": {"role": "assistant", "content": JSONTemplate.SLOT},
+                "done": False,
+            },
+            suffix=b"\n",
+        )
+
+    def _line(self, content: str) -> bytes:
+        return self._line_frame.render(content)
+
+    def text(self, text: str) -> None:
+        if text:
+            self._text("content", text, self._line)
+
+    def marker(self, text: str) -> None:
+        self.out.append(self._line(text))
+
+    summary = reasoning = text
+
+    def done_line(self) -> bytes:
+        done_obj = {
+            "model": self.model,
+            "created_at": self.created_at,
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+        }
+        done_obj.update(OLLAMA_FAKE_EVAL)
+        return dumps(done_obj) + b"\n"
+
+
+def _compat(reasoning_compat: str | None) -> str:
+    return (reasoning_compat or "think-tags").strip().lower()
+
+
+class ChatCompletionStreamTranslator(ResponsesTranslator):
+    """Turns upstream Responses events into ``chat.completion.chunk`` SSE frames.
+
+    Push-style so both the threaded and the asyncio servers can drive it:
+    ``feed`` takes one parsed event and returns the frames to send, and
+    ``finished`` flips once the terminating ``[DONE]`` frame was produced.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        created: int,
+        *,
+        reasoning_compat: str = "think-tags",
+        include_usage: bool = False,
+        vlog=None,
+        coalesce: CoalesceSettings | None = None,
+    ) -> None:
+        compat = _compat(reasoning_compat)
+        encoder = ChatChunkEncoder(
+            model, created, reasoning_compat=compat, include_usage=include_usage, coalesce=coalesce
+        )
+        super().__init__(encoder, reasoning=compat if compat in ("think-tags", "o3") else "plain", vlog=vlog)
+
+
+class TextCompletionStreamTranslator(ResponsesTranslator):
+    """Turns upstream Responses events into ``text_completion.chunk`` SSE frames."""
+
+    def __init__(
+        self,
+        model: str,
+        created: int,
+        *,
+        include_usage: bool = False,
+        coalesce: CoalesceSettings | None = None,
+    ) -> None:
+        encoder = TextChunkEncoder(model, created, include_usage=include_usage, coalesce=coalesce)
+        super().__init__(encoder, reasoning="hidden")
+
+    def feed_done_marker(self) -> List[bytes]:
+        """Frames for an upstream ``data: [DONE]`` line."""
+        self.encoder.text_done()
+        return self.encoder.drain()
+
+
+class OllamaChatStreamTranslator(ResponsesTranslator):
+    """Turns upstream Responses events into Ollama ``/api/chat`` NDJSON lines.
+
+    ``close`` must be called once the upstream ends (for any reason); it
+    closes an open ``<think>`` block and emits the final ``done`` line.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        created_at: str,
+        *,
+        reasoning_compat: str = "think-tags",
+        coalesce: CoalesceSettings | None = None,
+    ) -> None:
+        compat = _compat(reasoning_compat)
+        encoder = OllamaLineEncoder(model, created_at, coalesce=coalesce)
+        super().__init__(encoder, reasoning=compat if compat in ("think-tags", "o3") else "hidden")
+
+    def close(self) -> List[bytes]:
+        self._close_think()
+        self.finished = True
+        out = self.encoder.drain()
+        out.extend(self.encoder.flush())
+        out.append(self.encoder.done_line())
+        return out
+
+
+DEFAULT_MAX_OUTPUT_BYTES = 64 * 1024 * 1024
+
+
+def default_max_output_bytes() -> int:
+    """Output cap for non-streaming replies from the environment; ``0`` means no cap."""
+    return max(int_env("CHATGPT_LOCAL_MAX_OUTPUT_BYTES", DEFAULT_MAX_OUTPUT_BYTES), 0)
+
+
+@dataclass(frozen=True)
+class OutputTooLarge(Exception):
+    limit: int
+    status_code: int = 502
+
+    def __str__(self) -> str:
+        return f"Upstream response exceeded the {self.limit}-byte output limit."
+
+    def error_payload(self) -> Dict[str, Any]:
+        return {"message": str(self), "type": "server_error", "code": "output_too_large"}
+
+
+def _joined(parts: List[str]) -> str:
+    if len(parts) > 1:
+        parts[:] = ["".join(parts)]
+    return parts[0] if parts else ""
+
+
+@dataclass
+class ChatCompletionAccumulator(ResponsesEncoder):
+    """
+    Folds upstream Responses events into a single non-streaming reply.
+
+    Text arrives as many small deltas, so each kind is collected as a list
+    of parts and joined once when read. Answer text, reasoning and tool call
+    arguments together may take at most ``max_output_bytes`` (``0`` for no
+    cap); past that :class:`OutputTooLarge` is raised from :meth:`feed`.
+    """
+
+    response_id: str = "chatcmpl"
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+    usage: Dict[str, int] | None = None
+    error_message: str | None = None
+    max_output_bytes: int = 0
+    output_bytes: int = field(default=0, init=False)
+    _text: List[str] = field(default_factory=list, init=False, repr=False)
+    _summary: List[str] = field(default_factory=list, init=False, repr=False)
+    _reasoning: List[str] = field(default_factory=list, init=False, repr=False)
+    _translator: ResponsesTranslator | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def full_text(self) -> str:
+        return _joined(self._text)
+
+    @property
+    def reasoning_summary_text(self) -> str:
+        return _joined(self._summary)
+
+    @property
+    def reasoning_full_text(self) -> str:
+        return _joined(self._reasoning)
+
+    def feed(self, evt: Dict[str, Any]) -> bool:
+        """Apply one event; returns ``True`` once the response is complete."""
+        translator = self._translator
+        if translator is None:
+            translator = self._translator = ResponsesTranslator(self, reasoning="plain")
+        translator.feed(evt)
+        return translator.finished
+
+    def _count(self, text: str) -> None:
+        self.output_bytes += len(text) if text.isascii() else len(text.encode("utf-8"))
+        if self.max_output_bytes and self.output_bytes > self.max_output_bytes:
+            raise OutputTooLarge(self.max_output_bytes)
+
+    def text(self, text: str) -> None:
+        self._count(text)
+        self._text.append(text)
+
+    def summary(self, text: str) -> None:
+        self._count(text)
+        self._summary.append(text)
+
+    def reasoning(self, text: str) -> None:
+        self._count(text)
+        self._reasoning.append(text)
+
+    def tool_call(self, call: ToolCall) -> None:
+        args = call.raw_arguments or ""
+        if call.kind == "function_call" and isinstance(args, str):
+            self._count(args)
+            self.tool_calls.append(
+                {
+                    "id": call.call_id,
+                    "type": "function",
+                    "function": {"name": call.name, "arguments": args},
+                }
+            )
+
+    def failed(self, message: str) -> None:
+        self.error_message = message
@@ -1,18 +1,33 @@
 from __future__ import annotations
 
+import functools
 import json
 import time
-from typing import Any, Dict, List, Tuple
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Tuple
 from urllib.parse import urlparse, urlunparse
 
 import requests
 from flask import Response, current_app, jsonify, make_response
 
+from .accounts import UpstreamAccount, get_account_pool
 from .config import CHATGPT_RESPONSES_URL, ORIGINATOR
 from .http import build_cors_headers
+from .http_pool import get_upstream_session
+from .jsoncodec import dumps
+from .model_catalog import current_model_catalog
 from .model_registry import normalize_model_name
 from .session import ensure_session_id
+from .timeouts import (
+    UpstreamStalled,
+    UpstreamTimeouts,
+    await_first_chunk,
+    current_upstream_timeouts,
+    is_read_timeout,
+    stalled,
+)
 from flask import request as flask_request
+from .translate import OutputTooLarge
 from .utils import get_codex_user_agent, get_effective_chatgpt_auth, resolve_installation_id
 
 
@@ -25,48 +40,25 @@ def _log_json(prefix: str, payload: Any) -> None:
         except Exception:
             pass
 
-def start_upstream_request(
+MISSING_CREDENTIALS_MESSAGE = "Missing ChatGPT credentials. Run 'python3 chatmock.py login' first."
+
+
+def build_responses_payload(
     model: str,
     input_items: List[Dict[str, Any]],
     *,
+    session_id: str,
     instructions: str | None = None,
     tools: List[Dict[str, Any]] | None = None,
     tool_choice: Any | None = None,
     parallel_tool_calls: bool = False,
     reasoning_param: Dict[str, Any] | None = None,
     service_tier: str | None = None,
-):
-    access_token, account_id = get_effective_chatgpt_auth()
-    if not access_token or not account_id:
-        resp = make_response(
-            jsonify(
-                {
-                    "error": {
-                        "message": "Missing ChatGPT credentials. Run 'python3 chatmock.py login' first.",
-                    }
-                }
-            ),
-            401,
-        )
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
-        return None, resp
-
+) -> Dict[str, Any]:
     include: List[str] = []
     if isinstance(reasoning_param, dict):
         include.append("reasoning.encrypted_content")
 
-    client_session_id = None
-    try:
-        client_session_id = (
-            flask_request.headers.get("X-Session-Id")
-            or flask_request.headers.get("session_id")
-            or None
-        )
-    except Exception:
-        client_session_id = None
-    session_id = ensure_session_id(instructions, input_items, client_session_id)
-
     responses_payload = {
         "model": model,
         "input": input_items,
@@ -86,6 +78,42 @@ def start_upstream_request(
         responses_payload["reasoning"] = reasoning_param
     if isinstance(service_tier, str) and service_tier.strip():
         responses_payload["service_tier"] = service_tier.strip().lower()
+    return responses_payload
+
+
+def start_upstream_request(
+    model: str,
+    input_items: List[Dict[str, Any]],
+    *,
+    instructions: str | None = None,
+    tools: List[Dict[str, Any]] | None = None,
+    tool_choice: Any | None = None,
+    parallel_tool_calls: bool = False,
+    reasoning_param: Dict[str, Any] | None = None,
+    service_tier: str | None = None,
+):
+    client_session_id = None
+    try:
+        client_session_id = (
+            flask_request.headers.get("X-Session-Id")
+            or flask_request.headers.get("session_id")
+            or None
+        )
+    except Exception:
+        client_session_id = None
+    session_id = ensure_session_id(instructions, input_items, client_session_id)
+
+    responses_payload = build_responses_payload(
+        model,
+        input_items,
+        session_id=session_id,
+        instructions=instructions,
+        tools=tools,
+        tool_choice=tool_choice,
+        parallel_tool_calls=parallel_tool_calls,
+        reasoning_param=reasoning_param,
+        service_tier=service_tier,
+    )
 
     return start_upstream_raw_request(
         responses_payload,
@@ -94,6 +122,20 @@ def start_upstream_request(
     )
 
 
+@functools.lru_cache(maxsize=8)
+def _upstream_header_template(installation_id: str, accept: str) -> Mapping[str, str]:
+    return MappingProxyType(
+        {
+            "Content-Type": "application/json",
+            "Accept": accept,
+            "User-Agent": get_codex_user_agent(),
+            "originator": ORIGINATOR,
+            "OpenAI-Beta": "responses=experimental",
+            "x-codex-installation-id": installation_id,
+        }
+    )
+
+
 def build_upstream_headers(
     access_token: str,
     account_id: str,
@@ -101,41 +143,14 @@ def build_upstream_headers(
     *,
     accept: str = "text/event-stream",
 ) -> Dict[str, str]:
-    return {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-        "Accept": accept,
-        "ChatGPT-Account-ID": account_id,
-        "User-Agent": get_codex_user_agent(),
-        "originator": ORIGINATOR,
-        "OpenAI-Beta": "responses=experimental",
-        "session-id": session_id,
-        "x-codex-installation-id": resolve_installation_id(),
-    }
-
+    headers = dict(_upstream_header_template(resolve_installation_id(), accept))
+    headers["Authorization"] = f"Bearer {access_token}"
+    headers["ChatGPT-Account-ID"] = account_id
+    headers["session-id"] = session_id
+    return headers
 
-def start_upstream_raw_request(
-    responses_payload: Dict[str, Any],
-    *,
-    session_id: str | None = None,
-    stream: bool = True,
-):
-    access_token, account_id = get_effective_chatgpt_auth()
-    if not access_token or not account_id:
-        resp = make_response(
-            jsonify(
-                {
-                    "error": {
-                        "message": "Missing ChatGPT credentials. Run 'python3 chatmock.py login' first.",
-                    }
-                }
-            ),
-            401,
-        )
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
-        return None, resp
 
+def resolve_upstream_session_id(session_id: str | None, responses_payload: Dict[str, Any]) -> str:
     effective_session_id = session_id
     if not isinstance(effective_session_id, str) or not effective_session_id.strip():
         payload_prompt_cache_key = responses_payload.get("prompt_cache_key")
@@ -143,15 +158,10 @@ def start_upstream_raw_request(
             effective_session_id = payload_prompt_cache_key.strip()
     if not isinstance(effective_session_id, str) or not effective_session_id.strip():
         effective_session_id = str(int(time.time() * 1000))
+    return effective_session_id
 
-    verbose = False
-    try:
-        verbose = bool(current_app.config.get("VERBOSE"))
-    except Exception:
-        verbose = False
-    if verbose:
-        _log_json("OUTBOUND >> ChatGPT Responses API payload", responses_payload)
 
+def prepare_outbound_payload(responses_payload: Dict[str, Any]) -> Dict[str, Any]:
     payload_to_send = dict(responses_payload)
     if not (isinstance(payload_to_send.get("instructions"), str) and payload_to_send["instructions"].strip()):
         payload_to_send.pop("instructions", None)
@@ -162,30 +172,71 @@ def start_upstream_raw_request(
         client_metadata = dict(client_metadata)
     client_metadata.setdefault("x-codex-installation-id", resolve_installation_id())
     payload_to_send["client_metadata"] = client_metadata
+    return payload_to_send
 
-    headers = build_upstream_headers(
-        access_token,
-        account_id,
-        effective_session_id,
-        accept=("text/event-stream" if stream else "application/json"),
-    )
 
+def _missing_credentials_response():
+    resp = make_response(jsonify({"error": {"message": MISSING_CREDENTIALS_MESSAGE}}), 401)
+    for k, v in build_cors_headers().items():
+        resp.headers.setdefault(k, v)
+    return resp
+
+
+def _upstream_failed_response(message: str):
+    resp = make_response(jsonify({"error": {"message": message}}), 502)
+    for k, v in build_cors_headers().items():
+        resp.headers.setdefault(k, v)
+    return resp
+
+
+def upstream_stalled_response(exc: UpstreamStalled | OutputTooLarge, error_style: str = "openai"):
+    body: Dict[str, Any] = {"error": str(exc)} if error_style == "ollama" else {"error": exc.error_payload()}
+    resp = make_response(jsonify(body), exc.status_code)
+    for k, v in build_cors_headers().items():
+        resp.headers.setdefault(k, v)
+    return resp
+
+
+def account_model_preference(model: Any):
+    """``AccountPool.select`` filter preferring accounts whose catalog lists ``model``."""
+    catalog = current_model_catalog()
+    if catalog is None or not isinstance(model, str) or not model:
+        return None
+    return lambda account: catalog.account_serves_model(account, model)
+
+
+def _post_for_account(
+    account: UpstreamAccount | None,
+    body: bytes,
+    session_id: str,
+    stream: bool,
+    timeouts: UpstreamTimeouts,
+):
+    """POST to upstream as ``account``; a read timeout raises ``UpstreamStalled``."""
+    access_token, account_id = get_effective_chatgpt_auth(account=account)
+    if not access_token or not account_id:
+        return None, _missing_credentials_response()
+
+    accept = "text/event-stream" if stream else "application/json"
     try:
-        upstream = requests.post(
+        upstream = get_upstream_session().post(
             CHATGPT_RESPONSES_URL,
-            headers=headers,
-            json=payload_to_send,
+            headers=build_upstream_headers(access_token, account_id, session_id, accept=accept),
+            data=body,
             stream=stream,
-            timeout=600,
+            timeout=timeouts.requests_timeout(),
         )
     except requests.RequestException as e:
-        resp = make_response(jsonify({"error": {"message": f"Upstream ChatGPT request failed: {e}"}}), 502)
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
-        return None, resp
+        if is_read_timeout(e):
+            raise stalled("first_event", timeouts.first_event_limit) from e
+        return None, _upstream_failed_response(f"Upstream ChatGPT request failed: {e}")
 
     if upstream.status_code == 401:
-        refreshed_access_token, refreshed_account_id = get_effective_chatgpt_auth(force_refresh=True)
+        refreshed_access_token, refreshed_account_id = get_effective_chatgpt_auth(
+            force_refresh=True,
+            rejected_access_token=access_token,
+            account=account,
+        )
         if (
             isinstance(refreshed_access_token, str)
             and refreshed_access_token
@@ -197,28 +248,89 @@ def start_upstream_raw_request(
                 upstream.close()
             except Exception:
                 pass
-            retry_headers = build_upstream_headers(
-                refreshed_access_token,
-                refreshed_account_id,
-                effective_session_id,
-                accept=("text/event-stream" if stream else "application/json"),
-            )
             try:
-                upstream = requests.post(
+                upstream = get_upstream_session().post(
                     CHATGPT_RESPONSES_URL,
-                    headers=retry_headers,
-                    json=payload_to_send,
+                    headers=build_upstream_headers(
+                        refreshed_access_token,
+                        refreshed_account_id,
+                        session_id,
+                        accept=accept,
+                    ),
+                    data=body,
                     stream=stream,
-                    timeout=600,
+                    timeout=timeouts.requests_timeout(),
                 )
             except requests.RequestException as e:
-                resp = make_response(jsonify({"error": {"message": f"Upstream ChatGPT request failed after token refresh: {e}"}}), 502)
-                for k, v in build_cors_headers().items():
-                    resp.headers.setdefault(k, v)
-                return None, resp
+                if is_read_timeout(e):
+                    raise stalled("first_event", timeouts.first_event_limit) from e
+                return None, _upstream_failed_response(f"Upstream ChatGPT request failed after token refresh: {e}")
     return upstream, None
 
 
+def start_upstream_raw_request(
+    responses_payload: Dict[str, Any],
+    *,
+    session_id: str | None = None,
+    stream: bool = True,
+):
+    effective_session_id = resolve_upstream_session_id(session_id, responses_payload)
+
+    verbose = False
+    try:
+        verbose = bool(current_app.config.get("VERBOSE"))
+    except Exception:
+        verbose = False
+    if verbose:
+        _log_json("OUTBOUND >> ChatGPT Responses API payload", responses_payload)
+
+    body = dumps(prepare_outbound_payload(responses_payload))
+
+    timeouts = current_upstream_timeouts()
+    pool = get_account_pool()
+    prefer = account_model_preference(responses_payload.get("model"))
+    account = pool.select(effective_session_id, prefer=prefer)
+    tried: List[str] = []
+    stalls = 0
+    while True:
+        try:
+            upstream, error_resp = _post_for_account(
+                account, body, effective_session_id, stream, timeouts
+            )
+            if upstream is None:
+                return None, error_resp
+            if account is not None:
+                pool.record_response(account, upstream.headers, upstream.status_code)
+            if account is not None and upstream.status_code == 429:
+                # Nothing has been sent to the client yet, so a rate-limited account
+                # can be swapped for another one transparently.
+                tried.append(account.name)
+                next_account = pool.select(effective_session_id, exclude=tried, prefer=prefer)
+                if next_account is None:
+                    return upstream, None
+                if verbose:
+                    print(f"[accounts] {account.name} is rate limited; retrying on {next_account.name}")
+                try:
+                    upstream.close()
+                except Exception:
+                    pass
+                account = next_account
+                continue
+            if stream and upstream.status_code < 400:
+                upstream = await_first_chunk(upstream, timeouts)
+            return upstream, None
+        except UpstreamStalled as exc:
+            # Same reasoning as the 429 failover: the client has seen nothing
+            # yet, so a stalled attempt can simply be made again.
+            stalls += 1
+            if stalls > timeouts.stall_retries:
+                return None, upstream_stalled_response(exc)
+            if verbose:
+                print(f"[upstream] {exc} Retrying ({stalls}/{timeouts.stall_retries}).")
+        except requests.RequestException as e:
+            return None, _upstream_failed_response(f"Upstream ChatGPT stream failed: {e}")
+
+
 def build_upstream_websocket_url() -> str:
     parsed = urlparse(CHATGPT_RESPONSES_URL)
     scheme = parsed.scheme.lower()
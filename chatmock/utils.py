@@ -1,24 +1,41 @@
 from __future__ import annotations
 
 import base64
+import contextlib
 import datetime
+import functools
 import hashlib
 import json
 import os
 import platform
 import secrets
-import sys
+import threading
+import time
 import uuid
+from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
-from .config import CLIENT_ID_DEFAULT, OAUTH_TOKEN_URL
+from .coalesce import CoalesceSettings, translate_batches
+from .config import CLIENT_ID_DEFAULT, OAUTH_TOKEN_URL, float_env
+from .http_pool import get_upstream_session
+from .log import eprint
+from .sse import iter_sse_json_batches
+from .state_backend import KEY_PREFIX, StateBackend, StateBackendError, get_state_backend
+from .timeouts import UpstreamStalled
+from .translate import ChatCompletionStreamTranslator, TextCompletionStreamTranslator, stalled_stream_chunks
 from .version import __version__
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
-def eprint(*args, **kwargs) -> None:
-    print(*args, file=sys.stderr, **kwargs)
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
 
 
 def get_home_dir() -> str:
@@ -28,6 +45,7 @@ def get_home_dir() -> str:
     return home
 
 
+@functools.lru_cache(maxsize=1)
 def get_codex_user_agent() -> str:
     system = platform.system() or "Unknown OS"
     release = platform.release() or "unknown"
@@ -35,25 +53,32 @@ def get_codex_user_agent() -> str:
     return f"chatmock/{__version__} ({system} {release}; {machine})"
 
 
+_INSTALLATION_IDS: Dict[str, str] = {}
+
+
 def resolve_installation_id() -> str:
     home = get_home_dir()
+    cached = _INSTALLATION_IDS.get(home)
+    if cached is not None:
+        return cached
     path = os.path.join(home, "installation_id")
     try:
         os.makedirs(home, exist_ok=True)
         try:
             with open(path, "r", encoding="utf-8") as fp:
                 existing = fp.read().strip()
-            return str(uuid.UUID(existing))
+            installation_id = str(uuid.UUID(existing))
         except Exception:
             installation_id = str(uuid.uuid4())
             with open(path, "w", encoding="utf-8") as fp:
                 fp.write(installation_id)
-            return installation_id
     except Exception:
-        return str(uuid.uuid4())
+        installation_id = str(uuid.uuid4())
+    return _INSTALLATION_IDS.setdefault(home, installation_id)
 
 
-def read_auth_file() -> Dict[str, Any] | None:
+def _auth_file_candidates() -> List[str]:
+    paths: List[str] = []
     for base in [
         os.getenv("CHATGPT_LOCAL_HOME"),
         os.getenv("CODEX_HOME"),
@@ -62,7 +87,12 @@ def read_auth_file() -> Dict[str, Any] | None:
     ]:
         if not base:
             continue
-        path = os.path.join(base, "auth.json")
+        paths.append(os.path.join(base, "auth.json"))
+    return paths
+
+
+def read_auth_file() -> Dict[str, Any] | None:
+    for path in _auth_file_candidates():
         try:
             with open(path, "r", encoding="utf-8") as f:
                 return json.load(f)
@@ -73,25 +103,451 @@ def read_auth_file() -> Dict[str, Any] | None:
     return None
 
 
-def write_auth_file(auth: Dict[str, Any]) -> bool:
-    home = get_home_dir()
+def write_auth_file(auth: Dict[str, Any], path: str | None = None) -> bool:
+    home = os.path.dirname(path) if path else get_home_dir()
     try:
         os.makedirs(home, exist_ok=True)
     except Exception as exc:
         eprint(f"ERROR: unable to create auth home directory {home}: {exc}")
         return False
-    path = os.path.join(home, "auth.json")
+    target_path = path or os.path.join(home, "auth.json")
+    temporary_path = f"{target_path}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        with open(path, "w", encoding="utf-8") as fp:
+        # Replace atomically so other workers never read a half-written file.
+        with open(temporary_path, "w", encoding="utf-8") as fp:
             if hasattr(os, "fchmod"):
                 os.fchmod(fp.fileno(), 0o600)
             json.dump(auth, fp, indent=2)
+        os.replace(temporary_path, target_path)
+        if path is None:
+            _AUTH_CACHE.invalidate()
         return True
     except Exception as exc:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
         eprint(f"ERROR: unable to write auth file: {exc}")
         return False
 
 
+AUTH_CACHE_CHECK_INTERVAL_SECONDS = max(float_env("CHATGPT_LOCAL_AUTH_CHECK_INTERVAL", 1.0), 0.05)
+
+
+@dataclass(frozen=True)
+class CachedAuth:
+    signature: Tuple[Any, ...]
+    auth: Dict[str, Any] | None
+    access_token: str | None
+    account_id: str | None
+    id_token: str | None
+    refresh_token: str | None
+    access_expires_at: float | None
+    last_refresh_at: float | None
+
+
+def _str_or_none(value: Any) -> str | None:
+    return value if isinstance(value, str) and value else None
+
+
+def _auth_file_signature(paths: List[str]) -> Tuple[Any, ...]:
+    signature: List[Tuple[str, int, int, int]] = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, st.st_ino, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+def _cached_auth_from(auth: Any, signature: Tuple[Any, ...]) -> CachedAuth:
+    if not isinstance(auth, dict):
+        return CachedAuth(signature, None, None, None, None, None, None, None)
+    tokens = auth.get("tokens") if isinstance(auth.get("tokens"), dict) else {}
+    access_token = _str_or_none(tokens.get("access_token"))
+    id_token = _str_or_none(tokens.get("id_token"))
+    account_id = _str_or_none(tokens.get("account_id")) or _derive_account_id(id_token)
+
+    access_expires_at: float | None = None
+    claims = parse_jwt_claims(access_token) if access_token else None
+    exp = claims.get("exp") if isinstance(claims, dict) else None
+    if isinstance(exp, (int, float)) and not isinstance(exp, bool):
+        access_expires_at = float(exp)
+
+    last_refresh_at: float | None = None
+    if isinstance(auth.get("last_refresh"), str):
+        refreshed_at = _parse_iso8601(auth["last_refresh"])
+        if refreshed_at is not None:
+            last_refresh_at = refreshed_at.timestamp()
+
+    return CachedAuth(
+        signature=signature,
+        auth=auth,
+        access_token=access_token,
+        account_id=account_id,
+        id_token=id_token,
+        refresh_token=_str_or_none(tokens.get("refresh_token")),
+        access_expires_at=access_expires_at,
+        last_refresh_at=last_refresh_at,
+    )
+
+
+class AuthFileCache:
+    """
+    Parsed auth.json kept in memory.
+
+    Lookups only read the current in-memory entry. A shared watcher thread stats
+    the candidate files in the background and reloads the entry when a file's
+    inode, mtime or size changes.
+    """
+
+    def __init__(self, candidates=_auth_file_candidates) -> None:
+        self._candidates = candidates
+        self._lock = threading.Lock()
+        self._entry: CachedAuth | None = None
+
+    def get(self) -> CachedAuth:
+        entry = self._entry
+        if entry is not None:
+            return entry
+        with self._lock:
+            if self._entry is None:
+                self._entry = self._load()
+            entry = self._entry
+        _watch_auth_cache(self)
+        return entry
+
+    def revalidate(self) -> bool:
+        entry = self._entry
+        if entry is None:
+            return False
+        signature = _auth_file_signature(self._candidates())
+        if signature == entry.signature:
+            return False
+        with self._lock:
+            self._entry = self._load(signature)
+        return True
+
+    def replace(self, auth: Dict[str, Any], *, keep_signature: bool = False) -> CachedAuth:
+        with self._lock:
+            if keep_signature and self._entry is not None:
+                signature = self._entry.signature
+            else:
+                signature = _auth_file_signature(self._candidates())
+            entry = _cached_auth_from(auth, signature)
+            self._entry = entry
+        return entry
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entry = None
+
+    def _load(self, signature: Tuple[Any, ...] | None = None) -> CachedAuth:
+        paths = self._candidates()
+        if signature is None:
+            signature = _auth_file_signature(paths)
+        auth: Dict[str, Any] | None = None
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    auth = json.load(f)
+                break
+            except Exception:
+                continue
+        return _cached_auth_from(auth, signature)
+
+
+_AUTH_CACHE = AuthFileCache()
+_AUTH_WATCH_LOCK = threading.Lock()
+_AUTH_WATCHED: List[AuthFileCache] = []
+_AUTH_WATCHER: threading.Thread | None = None
+
+
+def _auth_watch_loop() -> None:
+    while True:
+        time.sleep(AUTH_CACHE_CHECK_INTERVAL_SECONDS)
+        with _AUTH_WATCH_LOCK:
+            caches = list(_AUTH_WATCHED)
+        for cache in caches:
+            try:
+                cache.revalidate()
+            except Exception:
+                pass
+
+
+def _watch_auth_cache(cache: AuthFileCache) -> None:
+    global _AUTH_WATCHER
+    with _AUTH_WATCH_LOCK:
+        if cache not in _AUTH_WATCHED:
+            _AUTH_WATCHED.append(cache)
+        if _AUTH_WATCHER is None:
+            _AUTH_WATCHER = threading.Thread(
+                target=_auth_watch_loop,
+                name="chatmock-auth-watch",
+                daemon=True,
+            )
+            _AUTH_WATCHER.start()
+
+
+def get_auth_cache() -> AuthFileCache:
+    return _AUTH_CACHE
+
+
+# Request threads refresh synchronously only inside this window; before that the
+# background refresher renews the token ahead of expiry.
+REFRESH_BLOCKING_MARGIN_SECONDS = 30
+REFRESH_BACKGROUND_LEAD_SECONDS = 10 * 60
+REFRESH_RETRY_SECONDS = 60
+REFRESH_IDLE_POLL_SECONDS = 5 * 60
+# With a shared state backend, how long one node may hold the refresh lease,
+# how often the others check whether it has published new tokens, and how
+# long the published tokens stay in the backend.
+REFRESH_LEASE_SECONDS = 30
+REFRESH_LEASE_POLL_SECONDS = 0.25
+SHARED_TOKENS_TTL_SECONDS = 60 * 60
+
+
+@contextlib.contextmanager
+def _auth_file_lock(path: str):
+    """Exclusive cross-process lock so only one worker refreshes auth.json at a time."""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handle = open(path, "a+b")
+    except OSError:
+        yield
+        return
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        yield
+    finally:
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        handle.close()
+
+
+def _seconds_until_background_refresh(entry: CachedAuth, now: float) -> float | None:
+    if not isinstance(entry.auth, dict) or not entry.refresh_token:
+        return None
+    if not entry.access_token:
+        return 0.0
+    if entry.access_expires_at is not None:
+        return entry.access_expires_at - REFRESH_BACKGROUND_LEAD_SECONDS - now
+    if entry.last_refresh_at is not None:
+        return entry.last_refresh_at + 50 * 60 - now
+    return None
+
+
+class TokenRefresher:
+    """
+    Single-flight ChatGPT token refresh.
+
+    Concurrent callers share one in-flight refresh, a file lock next to
+    auth.json serialises refreshes across worker processes, and an optional
+    background thread renews the token before request threads ever see it expire.
+    """
+
+    def __init__(self, cache: AuthFileCache, lock_path=None, auth_path: str | None = None) -> None:
+        self._cache = cache
+        self._lock_path = lock_path or (lambda: os.path.join(get_home_dir(), "auth.json.lock"))
+        self._auth_path = auth_path
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        with self._lock:
+            if self.running:
+                return False
+            self._thread = threading.Thread(
+                target=self._run,
+                name="chatmock-token-refresh",
+                daemon=True,
+            )
+            self._thread.start()
+        return True
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def refresh(self, *, force: bool = False, rejected_access_token: str | None = None) -> CachedAuth:
+        stale_token = rejected_access_token if rejected_access_token is not None else self._cache.get().access_token
+        deadline: float | None = None
+        while True:
+            with self._lock:
+                entry = self._cache.get()
+                if not self._should_refresh(entry, force, stale_token):
+                    return entry
+                with _auth_file_lock(self._lock_path()):
+                    # Another worker may have refreshed while we waited for the lock.
+                    self._cache.revalidate()
+                    entry = self._cache.get()
+                    if not self._should_refresh(entry, force, stale_token):
+                        return entry
+                    backend = get_state_backend()
+                    if backend is None or not backend.share_tokens:
+                        return self._refresh_locked(entry)
+                    refreshed = self._refresh_shared(backend, entry, force, stale_token)
+                    if refreshed is not None:
+                        return refreshed
+            # Another node holds the refresh lease: wait for its tokens
+            # without holding the locks, so other callers are not stuck behind us.
+            if deadline is None:
+                deadline = time.monotonic() + REFRESH_LEASE_SECONDS
+            elif time.monotonic() >= deadline:
+                return entry
+            time.sleep(REFRESH_LEASE_POLL_SECONDS)
+
+    def _should_refresh(self, entry: CachedAuth, force: bool, stale_token: str | None) -> bool:
+        if not isinstance(entry.auth, dict) or not entry.refresh_token or not CLIENT_ID_DEFAULT:
+            return False
+        if force:
+            return entry.access_token == stale_token or _cached_auth_needs_refresh(entry)
+        return _cached_auth_needs_refresh(entry)
+
+    def _refresh_locked(self, entry: CachedAuth) -> CachedAuth:
+        refreshed = _refresh_chatgpt_tokens(entry.refresh_token, CLIENT_ID_DEFAULT)
+        if not refreshed:
+            return entry
+        tokens = entry.auth.get("tokens") if isinstance(entry.auth.get("tokens"), dict) else {}
+        updated_tokens = dict(tokens)
+        for key in ("access_token", "id_token", "refresh_token", "account_id"):
+            value = refreshed.get(key)
+            if isinstance(value, str) and value:
+                updated_tokens[key] = value
+
+        persisted = _persist_refreshed_auth(entry.auth, updated_tokens, self._auth_path)
+        if persisted is not None:
+            entry = self._cache.replace(persisted[0])
+        else:
+            # Keep serving the refreshed tokens even if auth.json is read-only.
+            updated_auth = dict(entry.auth)
+            updated_auth["tokens"] = updated_tokens
+            entry = self._cache.replace(updated_auth, keep_signature=True)
+        self._wake.set()
+        return entry
+
+    def _refresh_shared(
+        self, backend: StateBackend, entry: CachedAuth, force: bool, stale_token: str | None
+    ) -> CachedAuth | None:
+        """
+        Refresh with the nodes sharing ``backend``: one node at a time holds a
+        lease and refreshes, then publishes the new tokens, which the others
+        adopt instead of spending the (single-use) refresh token themselves.
+        ``None`` when another node holds the lease and has not published yet.
+        """
+        account = entry.account_id or "default"
+        lease_key = f"{KEY_PREFIX}refresh-lease:{account}"
+        tokens_key = f"{KEY_PREFIX}tokens:{account}"
+        owner = f"{platform.node()}:{os.getpid()}:{uuid.uuid4().hex}".encode("utf-8")
+        entry = self._adopt_shared_tokens(backend, tokens_key, entry)
+        if not self._should_refresh(entry, force, stale_token):
+            return entry
+        try:
+            if not backend.add(lease_key, owner, REFRESH_LEASE_SECONDS):
+                return None
+        except StateBackendError:
+            # Without the backend this node refreshes on its own.
+            return self._refresh_locked(entry)
+        try:
+            entry = self._adopt_shared_tokens(backend, tokens_key, entry)
+            if not self._should_refresh(entry, force, stale_token):
+                return entry
+            refreshed = self._refresh_locked(entry)
+            if refreshed is not entry and isinstance(refreshed.auth, dict):
+                shared = {
+                    "tokens": refreshed.auth.get("tokens"),
+                    "last_refresh": refreshed.auth.get("last_refresh") or _now_iso8601(),
+                }
+                try:
+                    backend.set(tokens_key, json.dumps(shared).encode("utf-8"), SHARED_TOKENS_TTL_SECONDS)
+                except StateBackendError:
+                    pass
+            return refreshed
+        finally:
+            try:
+                backend.release(lease_key, owner)
+            except StateBackendError:
+                pass
+
+    def _adopt_shared_tokens(self, backend: StateBackend, tokens_key: str, entry: CachedAuth) -> CachedAuth:
+        """``entry`` with the tokens another node published, when those are newer."""
+        try:
+            data = backend.get(tokens_key)
+            shared = json.loads(data) if data is not None else None
+        except (StateBackendError, ValueError):
+            return entry
+        if not isinstance(shared, dict) or not isinstance(shared.get("tokens"), dict) or not isinstance(entry.auth, dict):
+            return entry
+        tokens = shared["tokens"]
+        if not _str_or_none(tokens.get("access_token")) or tokens.get("access_token") == entry.access_token:
+            return entry
+        refreshed_at = _parse_iso8601(shared["last_refresh"]) if isinstance(shared.get("last_refresh"), str) else None
+        if refreshed_at is None or (entry.last_refresh_at is not None and refreshed_at.timestamp() < entry.last_refresh_at):
+            return entry
+        updated_tokens = dict(entry.auth.get("tokens") if isinstance(entry.auth.get("tokens"), dict) else {})
+        updated_tokens.update({k: v for k, v in tokens.items() if isinstance(v, str) and v})
+        persisted = _persist_refreshed_auth(entry.auth, updated_tokens, self._auth_path)
+        if persisted is not None:
+            entry = self._cache.replace(persisted[0])
+        else:
+            updated_auth = dict(entry.auth)
+            updated_auth["tokens"] = updated_tokens
+            entry = self._cache.replace(updated_auth, keep_signature=True)
+        self._wake.set()
+        return entry
+
+    def _run(self) -> None:
+        failures = 0
+        while True:
+            entry = self._cache.get()
+            delay = _seconds_until_background_refresh(entry, time.time())
+            if delay is None:
+                delay = REFRESH_IDLE_POLL_SECONDS
+            elif delay <= 0:
+                try:
+                    refreshed = self.refresh(force=True, rejected_access_token=entry.access_token)
+                except Exception:
+                    refreshed = entry
+                if refreshed.access_token != entry.access_token:
+                    failures = 0
+                    continue
+                failures += 1
+                delay = min(REFRESH_RETRY_SECONDS * (2 ** (failures - 1)), REFRESH_IDLE_POLL_SECONDS)
+            self._wake.wait(delay)
+            self._wake.clear()
+
+
+_TOKEN_REFRESHER = TokenRefresher(_AUTH_CACHE)
+
+
+def get_token_refresher() -> TokenRefresher:
+    return _TOKEN_REFRESHER
+
+
+def start_token_refresher() -> bool:
+    return _TOKEN_REFRESHER.start()
+
+
 def parse_jwt_claims(token: str) -> Dict[str, Any] | None:
     if not token or token.count(".") != 2:
         return None
@@ -251,51 +707,31 @@ def load_chatgpt_tokens(
     ensure_fresh: bool = True,
     *,
     force_refresh: bool = False,
+    rejected_access_token: str | None = None,
+    account: Any | None = None,
 ) -> tuple[str | None, str | None, str | None]:
-    auth = read_auth_file()
-    if not isinstance(auth, dict):
+    """Tokens for ``account`` (an ``accounts.UpstreamAccount``), or the primary auth.json when omitted."""
+    cache = account.cache if account is not None else _AUTH_CACHE
+    refresher = account.refresher if account is not None else _TOKEN_REFRESHER
+    entry = cache.get()
+    if not isinstance(entry.auth, dict):
         return None, None, None
 
-    tokens = auth.get("tokens") if isinstance(auth.get("tokens"), dict) else {}
-    access_token: Optional[str] = tokens.get("access_token")
-    account_id: Optional[str] = tokens.get("account_id")
-    id_token: Optional[str] = tokens.get("id_token")
-    refresh_token: Optional[str] = tokens.get("refresh_token")
-    last_refresh = auth.get("last_refresh")
-
-    if ensure_fresh and isinstance(refresh_token, str) and refresh_token and CLIENT_ID_DEFAULT:
-        needs_refresh = _should_refresh_access_token(access_token, last_refresh)
-        if force_refresh or needs_refresh or not (isinstance(access_token, str) and access_token):
-            refreshed = _refresh_chatgpt_tokens(refresh_token, CLIENT_ID_DEFAULT)
-            if refreshed:
-                access_token = refreshed.get("access_token") or access_token
-                id_token = refreshed.get("id_token") or id_token
-                refresh_token = refreshed.get("refresh_token") or refresh_token
-                account_id = refreshed.get("account_id") or account_id
-
-                updated_tokens = dict(tokens)
-                if isinstance(access_token, str) and access_token:
-                    updated_tokens["access_token"] = access_token
-                if isinstance(id_token, str) and id_token:
-                    updated_tokens["id_token"] = id_token
-                if isinstance(refresh_token, str) and refresh_token:
-                    updated_tokens["refresh_token"] = refresh_token
-                if isinstance(account_id, str) and account_id:
-                    updated_tokens["account_id"] = account_id
-
-                persisted = _persist_refreshed_auth(auth, updated_tokens)
-                if persisted is not None:
-                    auth, tokens = persisted
-                else:
-                    tokens = updated_tokens
-
-    if not isinstance(account_id, str) or not account_id:
-        account_id = _derive_account_id(id_token)
+    if ensure_fresh and entry.refresh_token and CLIENT_ID_DEFAULT:
+        if force_refresh:
+            entry = refresher.refresh(force=True, rejected_access_token=rejected_access_token)
+        elif _cached_auth_needs_refresh(entry):
+            still_valid = (
+                entry.access_token is not None
+                and entry.access_expires_at is not None
+                and entry.access_expires_at > time.time() + REFRESH_BLOCKING_MARGIN_SECONDS
+            )
+            if still_valid and refresher.running:
+                refresher.wake()
+            else:
+                entry = refresher.refresh()
 
-    access_token = access_token if isinstance(access_token, str) and access_token else None
-    id_token = id_token if isinstance(id_token, str) and id_token else None
-    account_id = account_id if isinstance(account_id, str) and account_id else None
-    return access_token, account_id, id_token
+    return entry.access_token, entry.account_id, entry.id_token
 
 
 def force_refresh_chatgpt_auth() -> tuple[str | None, str | None]:
@@ -312,25 +748,14 @@ def force_refresh_chatgpt_auth() -> tuple[str | None, str | None]:
     return access_token, account_id
 
 
-def _should_refresh_access_token(access_token: Optional[str], last_refresh: Any) -> bool:
-    if not isinstance(access_token, str) or not access_token:
+def _cached_auth_needs_refresh(entry: CachedAuth, now: float | None = None) -> bool:
+    if not entry.access_token:
         return True
-
-    claims = parse_jwt_claims(access_token) or {}
-    exp = claims.get("exp") if isinstance(claims, dict) else None
-    now = datetime.datetime.now(datetime.timezone.utc)
-    if isinstance(exp, (int, float)):
-        try:
-            expiry = datetime.datetime.fromtimestamp(float(exp), datetime.timezone.utc)
-        except (OverflowError, OSError, ValueError):
-            expiry = None
-        if expiry is not None:
-            return expiry <= now + datetime.timedelta(minutes=5)
-
-    if isinstance(last_refresh, str):
-        refreshed_at = _parse_iso8601(last_refresh)
-        if refreshed_at is not None:
-            return refreshed_at <= now - datetime.timedelta(minutes=55)
+    now = time.time() if now is None else now
+    if entry.access_expires_at is not None:
+        return entry.access_expires_at <= now + 5 * 60
+    if entry.last_refresh_at is not None:
+        return entry.last_refresh_at <= now - 55 * 60
     return False
 
 
@@ -342,7 +767,7 @@ def _refresh_chatgpt_tokens(refresh_token: str, client_id: str) -> Optional[Dict
     }
 
     try:
-        resp = requests.post(
+        resp = get_upstream_session().post(
             OAUTH_TOKEN_URL,
             data=payload,
             headers={"Content-Type": "application/x-www-form-urlencoded"},
@@ -379,11 +804,15 @@ def _refresh_chatgpt_tokens(refresh_token: str, client_id: str) -> Optional[Dict
     }
 
 
-def _persist_refreshed_auth(auth: Dict[str, Any], updated_tokens: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+def _persist_refreshed_auth(
+    auth: Dict[str, Any],
+    updated_tokens: Dict[str, Any],
+    path: str | None = None,
+) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
     updated_auth = dict(auth)
     updated_auth["tokens"] = updated_tokens
     updated_auth["last_refresh"] = _now_iso8601()
-    if write_auth_file(updated_auth):
+    if write_auth_file(updated_auth, path):
         return updated_auth, updated_tokens
     eprint("ERROR: unable to persist refreshed auth tokens")
     return None
@@ -417,8 +846,17 @@ def _now_iso8601() -> str:
     return datetime.datetime.now(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
 
 
-def get_effective_chatgpt_auth(*, force_refresh: bool = False) -> tuple[str | None, str | None]:
-    access_token, account_id, id_token = load_chatgpt_tokens(force_refresh=force_refresh)
+def get_effective_chatgpt_auth(
+    *,
+    force_refresh: bool = False,
+    rejected_access_token: str | None = None,
+    account: Any | None = None,
+) -> tuple[str | None, str | None]:
+    access_token, account_id, id_token = load_chatgpt_tokens(
+        force_refresh=force_refresh,
+        rejected_access_token=rejected_access_token,
+        account=account,
+    )
     if not account_id:
         account_id = _derive_account_id(id_token)
     return access_token, account_id
@@ -433,477 +871,60 @@ def sse_translate_chat(
     reasoning_compat: str = "think-tags",
     *,
     include_usage: bool = False,
+    coalesce: CoalesceSettings | None = None,
 ):
-    response_id = "chatcmpl-stream"
-    compat = (reasoning_compat or "think-tags").strip().lower()
-    think_open = False
-    think_closed = False
-    saw_output = False
-    sent_stop_chunk = False
-    saw_function_call = False
-    saw_any_summary = False
-    pending_summary_paragraph = False
-    upstream_usage = None
-    ws_state: dict[str, Any] = {}
-    ws_index: dict[str, int] = {}
-    ws_next_index: int = 0
-    
-    def _serialize_tool_args(eff_args: Any) -> str:
-        """
-        Serialize tool call arguments with proper JSON handling.
-        
-        Args:
-            eff_args: Arguments to serialize (dict, list, str, or other)
-            
-        Returns:
-            JSON string representation of the arguments
-        """
-        if isinstance(eff_args, (dict, list)):
-            return json.dumps(eff_args)
-        elif isinstance(eff_args, str):
-            try:
-                parsed = json.loads(eff_args)
-                if isinstance(parsed, (dict, list)):
-                    return json.dumps(parsed) 
-                else:
-                    return json.dumps({"query": eff_args})  
-            except (json.JSONDecodeError, ValueError):
-                return json.dumps({"query": eff_args})
-        else:
-            return "{}"
-    
-    def _extract_usage(evt: Dict[str, Any]) -> Dict[str, int] | None:
-        try:
-            usage = (evt.get("response") or {}).get("usage")
-            if not isinstance(usage, dict):
-                return None
-            pt = int(usage.get("input_tokens") or 0)
-            ct = int(usage.get("output_tokens") or 0)
-            tt = int(usage.get("total_tokens") or (pt + ct))
-            return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
-        except Exception:
-            return None
+    translator = ChatCompletionStreamTranslator(
+        model,
+        created,
+        reasoning_compat=reasoning_compat,
+        include_usage=include_usage,
+        vlog=vlog if verbose else None,
+        coalesce=coalesce,
+    )
     try:
-        try:
-            line_iterator = upstream.iter_lines(decode_unicode=False)
-        except requests.exceptions.ChunkedEncodingError as e:
-            if verbose and vlog:
-                vlog(f"Failed to start stream: {e}")
-            yield b"data: [DONE]\n\n"
-            return
-
-        for raw in line_iterator:
-            try:
-                if not raw:
-                    continue
-                line = (
-                    raw.decode("utf-8", errors="ignore")
-                    if isinstance(raw, (bytes, bytearray))
-                    else raw
-                )
-                if verbose and vlog:
-                    vlog(line)
-                if not line.startswith("data: "):
-                    continue
-                data = line[len("data: ") :].strip()
-                if not data:
-                    continue
-                if data == "[DONE]":
-                    break
-                try:
-                    evt = json.loads(data)
-                except (json.JSONDecodeError, UnicodeDecodeError):
-                    continue
-            except (
-                requests.exceptions.ChunkedEncodingError,
-                ConnectionError,
-                BrokenPipeError,
-            ) as e:
-                # Connection interrupted mid-stream - end gracefully
-                if verbose and vlog:
-                    vlog(f"Stream interrupted: {e}")
-                yield b"data: [DONE]\n\n"
-                return
-            kind = evt.get("type")
-            if isinstance(evt.get("response"), dict) and isinstance(evt["response"].get("id"), str):
-                response_id = evt["response"].get("id") or response_id
-
-            if isinstance(kind, str) and ("web_search_call" in kind):
-                try:
-                    call_id = evt.get("item_id") or "ws_call"
-                    if verbose and vlog:
-                        try:
-                            vlog(f"CM_TOOLS {kind} id={call_id} -> tool_calls(web_search)")
-                        except Exception:
-                            pass
-                    item = evt.get('item') if isinstance(evt.get('item'), dict) else {}
-                    params_dict = ws_state.setdefault(call_id, {}) if isinstance(ws_state.get(call_id), dict) else {}
-                    def _merge_from(src):
-                        if not isinstance(src, dict):
-                            return
-                        for whole in ('parameters','args','arguments','input'):
-                            if isinstance(src.get(whole), dict):
-                                params_dict.update(src.get(whole))
-                        if isinstance(src.get('query'), str): params_dict.setdefault('query', src.get('query'))
-                        if isinstance(src.get('q'), str): params_dict.setdefault('query', src.get('q'))
-                        for rk in ('recency','time_range','days'):
-                            if src.get(rk) is not None and rk not in params_dict: params_dict[rk] = src.get(rk)
-                        for dk in ('domains','include_domains','include'):
-                            if isinstance(src.get(dk), list) and 'domains' not in params_dict: params_dict['domains'] = src.get(dk)
-                        for mk in ('max_results','topn','limit'):
-                            if src.get(mk) is not None and 'max_results' not in params_dict: params_dict['max_results'] = src.get(mk)
-                    _merge_from(item)
-                    _merge_from(evt if isinstance(evt, dict) else None)
-                    params = params_dict if params_dict else None
-                    if isinstance(params, dict):
-                        try:
-                            ws_state.setdefault(call_id, {}).update(params)
-                        except Exception:
-                            pass
-                    eff_params = ws_state.get(call_id, params if isinstance(params, (dict, list, str)) else {})
-                    args_str = _serialize_tool_args(eff_params)
-                    if call_id not in ws_index:
-                        ws_index[call_id] = ws_next_index
-                        ws_next_index += 1
-                    _idx = ws_index.get(call_id, 0)
-                    delta_chunk = {
-                        "id": response_id,
-                        "object": "chat.completion.chunk",
-                        "created": created,
-                        "model": model,
-                        "choices": [
-                            {
-                                "index": 0,
-                                "delta": {
-                                    "tool_calls": [
-                                        {
-                                            "index": _idx,
-                                            "id": call_id,
-                                            "type": "function",
-                                            "function": {"name": "web_search", "arguments": args_str},
-                                        }
-                                    ]
-                                },
-                                "finish_reason": None,
-                            }
-                        ],
-                    }
-                    yield f"data: {json.dumps(delta_chunk)}\n\n".encode("utf-8")
-                except Exception:
-                    pass
-
-            if kind == "response.output_text.delta":
-                delta = evt.get("delta") or ""
-                if compat == "think-tags" and think_open and not think_closed:
-                    close_chunk = {
-                        "id": response_id,
-                        "object": "chat.completion.chunk",
-                        "created": created,
-                        "model": model,
-                        "choices": [{"index": 0, "delta": {"content": "</think>"}, "finish_reason": None}],
-                    }
-                    yield f"data: {json.dumps(close_chunk)}\n\n".encode("utf-8")
-                    think_open = False
-                    think_closed = True
-                saw_output = True
-                chunk = {
-                    "id": response_id,
-                    "object": "chat.completion.chunk",
-                    "created": created,
-                    "model": model,
-                    "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
-                }
-                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
-            elif kind == "response.output_item.done":
-                item = evt.get("item") or {}
-                if isinstance(item, dict) and (item.get("type") == "function_call" or item.get("type") == "web_search_call"):
-                    call_id = item.get("call_id") or item.get("id") or ""
-                    name = item.get("name") or ("web_search" if item.get("type") == "web_search_call" else "")
-                    raw_args = item.get("arguments") or item.get("parameters")
-                    if isinstance(raw_args, dict):
-                        try:
-                            ws_state.setdefault(call_id, {}).update(raw_args)
-                        except Exception:
-                            pass
-                    eff_args = ws_state.get(call_id, raw_args if isinstance(raw_args, (dict, list, str)) else {})
-                    try:
-                        args = _serialize_tool_args(eff_args)
-                    except Exception:
-                        args = "{}"
-                    if item.get("type") == "web_search_call" and verbose and vlog:
-                        try:
-                            vlog(f"CM_TOOLS response.output_item.done web_search_call id={call_id} has_args={bool(args)}")
-                        except Exception:
-                            pass
-                    if call_id not in ws_index:
-                        ws_index[call_id] = ws_next_index
-                        ws_next_index += 1
-                    _idx = ws_index.get(call_id, 0)
-                    if isinstance(call_id, str) and isinstance(name, str) and isinstance(args, str):
-                        delta_chunk = {
-                            "id": response_id,
-                            "object": "chat.completion.chunk",
-                            "created": created,
-                            "model": model,
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "delta": {
-                                        "tool_calls": [
-                                            {
-                                                "index": _idx,
-                                                "id": call_id,
-                                                "type": "function",
-                                                "function": {"name": name, "arguments": args},
-                                            }
-                                        ]
-                                    },
-                                    "finish_reason": None,
-                                }
-                            ],
-                        }
-                        yield f"data: {json.dumps(delta_chunk)}\n\n".encode("utf-8")
-
-                        if item.get("type") == "function_call":
-                            saw_function_call = True
-            elif kind == "response.reasoning_summary_part.added":
-                if compat in ("think-tags", "o3"):
-                    if saw_any_summary:
-                        pending_summary_paragraph = True
-                    else:
-                        saw_any_summary = True
-            elif kind in ("response.reasoning_summary_text.delta", "response.reasoning_text.delta"):
-                delta_txt = evt.get("delta") or ""
-                if compat == "o3":
-                    if kind == "response.reasoning_summary_text.delta" and pending_summary_paragraph:
-                        nl_chunk = {
-                            "id": response_id,
-                            "object": "chat.completion.chunk",
-                            "created": created,
-                            "model": model,
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "delta": {"reasoning": {"content": [{"type": "text", "text": "\n"}]}},
-                                    "finish_reason": None,
-                                }
-                            ],
-                        }
-                        yield f"data: {json.dumps(nl_chunk)}\n\n".encode("utf-8")
-                        pending_summary_paragraph = False
-                    chunk = {
-                        "id": response_id,
-                        "object": "chat.completion.chunk",
-                        "created": created,
-                        "model": model,
-                        "choices": [
-                            {
-                                "index": 0,
-                                "delta": {"reasoning": {"content": [{"type": "text", "text": delta_txt}]}},
-                                "finish_reason": None,
-                            }
-                        ],
-                    }
-                    yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
-                elif compat == "think-tags":
-                    if not think_open and not think_closed:
-                        open_chunk = {
-                            "id": response_id,
-                            "object": "chat.completion.chunk",
-                            "created": created,
-                            "model": model,
-                            "choices": [{"index": 0, "delta": {"content": "<think>"}, "finish_reason": None}],
-                        }
-                        yield f"data: {json.dumps(open_chunk)}\n\n".encode("utf-8")
-                        think_open = True
-                    if think_open and not think_closed:
-                        if kind == "response.reasoning_summary_text.delta" and pending_summary_paragraph:
-                            nl_chunk = {
-                                "id": response_id,
-                                "object": "chat.completion.chunk",
-                                "created": created,
-                                "model": model,
-                                "choices": [{"index": 0, "delta": {"content": "\n"}, "finish_reason": None}],
-                            }
-                            yield f"data: {json.dumps(nl_chunk)}\n\n".encode("utf-8")
-                            pending_summary_paragraph = False
-                        content_chunk = {
-                            "id": response_id,
-                            "object": "chat.completion.chunk",
-                            "created": created,
-                            "model": model,
-                            "choices": [{"index": 0, "delta": {"content": delta_txt}, "finish_reason": None}],
-                        }
-                        yield f"data: {json.dumps(content_chunk)}\n\n".encode("utf-8")
-                else:
-                    if kind == "response.reasoning_summary_text.delta":
-                        chunk = {
-                            "id": response_id,
-                            "object": "chat.completion.chunk",
-                            "created": created,
-                            "model": model,
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "delta": {"reasoning_summary": delta_txt, "reasoning": delta_txt},
-                                    "finish_reason": None,
-                                }
-                            ],
-                        }
-                        yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
-                    else:
-                        chunk = {
-                            "id": response_id,
-                            "object": "chat.completion.chunk",
-                            "created": created,
-                            "model": model,
-                            "choices": [
-                                {"index": 0, "delta": {"reasoning": delta_txt}, "finish_reason": None}
-                            ],
-                        }
-                        yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
-            elif isinstance(kind, str) and kind.endswith(".done"):
-                pass
-            elif kind == "response.output_text.done":
-                chunk = {
-                    "id": response_id,
-                    "object": "chat.completion.chunk",
-                    "created": created,
-                    "model": model,
-                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
-                }
-                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
-                sent_stop_chunk = True
-            elif kind == "response.failed":
-                err = evt.get("response", {}).get("error", {}).get("message", "response.failed")
-                chunk = {"error": {"message": err}}
-                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
-            elif kind == "response.completed":
-                m = _extract_usage(evt)
-                if m:
-                    upstream_usage = m
-                if compat == "think-tags" and think_open and not think_closed:
-                    close_chunk = {
-                        "id": response_id,
-                        "object": "chat.completion.chunk",
-                        "created": created,
-                        "model": model,
-                        "choices": [{"index": 0, "delta": {"content": "</think>"}, "finish_reason": None}],
-                    }
-                    yield f"data: {json.dumps(close_chunk)}\n\n".encode("utf-8")
-                    think_open = False
-                    think_closed = True
-                if not sent_stop_chunk:
-                    finish_reason = "tool_calls" if saw_function_call else "stop"
-                    chunk = {
-                        "id": response_id,
-                        "object": "chat.completion.chunk",
-                        "created": created,
-                        "model": model,
-                        "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
-                    }
-                    yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
-                    sent_stop_chunk = True
-
-                if include_usage and upstream_usage:
-                    try:
-                        usage_chunk = {
-                            "id": response_id,
-                            "object": "chat.completion.chunk",
-                            "created": created,
-                            "model": model,
-                            "choices": [{"index": 0, "delta": {}, "finish_reason": None}],
-                            "usage": upstream_usage,
-                        }
-                        yield f"data: {json.dumps(usage_chunk)}\n\n".encode("utf-8")
-                    except Exception:
-                        pass
-                yield b"data: [DONE]\n\n"
-                break
+        batches = iter_sse_json_batches(upstream.iter_content(chunk_size=None), vlog=vlog if verbose else None)
+        yield from translate_batches(batches, translator, upstream)
+    except (
+        requests.exceptions.ChunkedEncodingError,
+        ConnectionError,
+        BrokenPipeError,
+    ) as e:
+        # Connection interrupted mid-stream - end gracefully
+        if verbose and vlog:
+            vlog(f"Stream interrupted: {e}")
+        yield from translator.flush()
+        yield b"data: [DONE]\n\n"
+    except UpstreamStalled as e:
+        if verbose and vlog:
+            vlog(f"Stream stalled: {e}")
+        yield from translator.flush()
+        yield from stalled_stream_chunks(e)
     finally:
         upstream.close()
 
 
-def sse_translate_text(upstream, model: str, created: int, verbose: bool = False, vlog=None, *, include_usage: bool = False):
-    response_id = "cmpl-stream"
-    upstream_usage = None
-    
-    def _extract_usage(evt: Dict[str, Any]) -> Dict[str, int] | None:
-        try:
-            usage = (evt.get("response") or {}).get("usage")
-            if not isinstance(usage, dict):
-                return None
-            pt = int(usage.get("input_tokens") or 0)
-            ct = int(usage.get("output_tokens") or 0)
-            tt = int(usage.get("total_tokens") or (pt + ct))
-            return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
-        except Exception:
-            return None
+def sse_translate_text(
+    upstream,
+    model: str,
+    created: int,
+    verbose: bool = False,
+    vlog=None,
+    *,
+    include_usage: bool = False,
+    coalesce: CoalesceSettings | None = None,
+):
+    translator = TextCompletionStreamTranslator(model, created, include_usage=include_usage, coalesce=coalesce)
     try:
-        for raw_line in upstream.iter_lines(decode_unicode=False):
-            if not raw_line:
-                continue
-            line = raw_line.decode("utf-8", errors="ignore") if isinstance(raw_line, (bytes, bytearray)) else raw_line
-            if verbose and vlog:
-                vlog(line)
-            if not line.startswith("data: "):
-                continue
-            data = line[len("data: "):].strip()
-            if not data or data == "[DONE]":
-                if data == "[DONE]":
-                    chunk = {
-                        "id": response_id,
-                        "object": "text_completion.chunk",
-                        "created": created,
-                        "model": model,
-                        "choices": [{"index": 0, "text": "", "finish_reason": "stop"}],
-                    }
-                    yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
-                continue
-            try:
-                evt = json.loads(data)
-            except Exception:
-                continue
-            kind = evt.get("type")
-            if isinstance(evt.get("response"), dict) and isinstance(evt["response"].get("id"), str):
-                response_id = evt["response"].get("id") or response_id
-            if kind == "response.output_text.delta":
-                delta_text = evt.get("delta") or ""
-                chunk = {
-                    "id": response_id,
-                    "object": "text_completion.chunk",
-                    "created": created,
-                    "model": model,
-                    "choices": [{"index": 0, "text": delta_text, "finish_reason": None}],
-                }
-                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
-            elif kind == "response.output_text.done":
-                chunk = {
-                    "id": response_id,
-                    "object": "text_completion.chunk",
-                    "created": created,
-                    "model": model,
-                    "choices": [{"index": 0, "text": "", "finish_reason": "stop"}],
-                }
-                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
-            elif kind == "response.completed":
-                m = _extract_usage(evt)
-                if m:
-                    upstream_usage = m
-                if include_usage and upstream_usage:
-                    try:
-                        usage_chunk = {
-                            "id": response_id,
-                            "object": "text_completion.chunk",
-                            "created": created,
-                            "model": model,
-                            "choices": [{"index": 0, "text": "", "finish_reason": None}],
-                            "usage": upstream_usage,
-                        }
-                        yield f"data: {json.dumps(usage_chunk)}\n\n".encode("utf-8")
-                    except Exception:
-                        pass
-                yield b"data: [DONE]\n\n"
-                break
+        batches = iter_sse_json_batches(
+            upstream.iter_content(chunk_size=None),
+            vlog=vlog if verbose else None,
+            stop_at_done=False,
+        )
+        yield from translate_batches(batches, translator, upstream)
+    except UpstreamStalled as e:
+        if verbose and vlog:
+            vlog(f"Stream stalled: {e}")
+        yield from translator.flush()
+        yield from stalled_stream_chunks(e)
     finally:
         upstream.close()
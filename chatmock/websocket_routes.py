@@ -11,17 +11,25 @@ from flask_sock import Sock
 from websockets.sync.client import connect as websocket_connect
 from websockets.exceptions import ConnectionClosed
 
+from .accounts import get_account_pool
+from .admission import AdmissionRejected, AdmissionTicket, admission_error_body, current_admission_controller
+from .jsoncodec import dumps_text, loads
+from .lean import LeanStreamFilter, current_lean_settings
 from .responses_api import (
     ResponsesRequestError,
     extract_client_session_id,
     normalize_responses_payload,
 )
 from .session import (
+    SESSION_EVENT_TYPES,
     clear_responses_reuse_state,
     note_responses_stream_event,
     prepare_responses_request_for_session,
+    rejects_previous_response,
 )
-from .upstream import build_upstream_headers, build_upstream_websocket_url
+from .sse import wants_event
+from .timeouts import DEFAULT_CONNECT_TIMEOUT_SECONDS, current_upstream_timeouts, stalled
+from .upstream import account_model_preference, build_upstream_headers, build_upstream_websocket_url
 from .utils import get_effective_chatgpt_auth
 
 
@@ -35,21 +43,21 @@ def _log_json(prefix: str, payload: Any) -> None:
             pass
 
 
-def _error_event(message: str, *, status_code: int = 400, code: str | None = None) -> Dict[str, Any]:
+def error_event(message: str, *, status_code: int = 400, code: str | None = None) -> Dict[str, Any]:
     error: Dict[str, Any] = {"message": message}
     if code:
         error["code"] = code
     return {"type": "error", "status_code": status_code, "error": error}
 
 
-def _is_terminal_event(event: Any) -> bool:
+def is_terminal_event(event: Any) -> bool:
     if not isinstance(event, dict):
         return False
     kind = event.get("type")
     return kind in ("response.completed", "response.failed", "error")
 
 
-def _build_websocket_ssl_context() -> ssl.SSLContext:
+def build_websocket_ssl_context() -> ssl.SSLContext:
     cafile = (
         os.getenv("CODEX_CA_CERTIFICATE")
         or os.getenv("SSL_CERT_FILE")
@@ -58,12 +66,17 @@ def _build_websocket_ssl_context() -> ssl.SSLContext:
     return ssl.create_default_context(cafile=cafile)
 
 
-def connect_upstream_websocket(url: str, headers: Dict[str, str]):
+def connect_upstream_websocket(
+    url: str,
+    headers: Dict[str, str],
+    *,
+    open_timeout: float | None = DEFAULT_CONNECT_TIMEOUT_SECONDS,
+):
     return websocket_connect(
         url,
         additional_headers=headers,
-        open_timeout=15,
-        ssl=_build_websocket_ssl_context(),
+        open_timeout=open_timeout,
+        ssl=build_websocket_ssl_context(),
     )
 
 
@@ -71,19 +84,63 @@ def register_websocket_routes(sock: Sock) -> None:
     @sock.route("/v1/responses")
     def responses_websocket(ws) -> None:
         verbose = bool(current_app.config.get("VERBOSE"))
+        timeouts = current_upstream_timeouts()
         upstream_ws = None
+        upstream_headers: Dict[str, str] = {}
         upstream_session_id: str | None = None
+        # Identifies the current upstream socket to the session store, which
+        # only continues a response on the socket that produced it.
+        upstream_token: object | None = None
         active_session_id: str | None = None
+        turn_payload: Dict[str, Any] | None = None
+        outbound_text = ""
+        trim: LeanStreamFilter | None = None
+        # Each response.create holds an admission slot until its terminal event.
+        admission = current_admission_controller()
+        ticket: AdmissionTicket | None = None
 
         def _send_error(message: str, *, status_code: int = 400, code: str | None = None) -> None:
-            evt = _error_event(message, status_code=status_code, code=code)
+            evt = error_event(message, status_code=status_code, code=code)
             if verbose:
                 _log_json("STREAM OUT WS /v1/responses (error)", evt)
             try:
-                ws.send(json.dumps(evt))
+                ws.send(dumps_text(evt))
             except Exception:
                 pass
 
+        def _reconnect_and_resend() -> bool:
+            """Send this turn again on a new upstream socket, in full; ``False`` after reporting a failure."""
+            nonlocal upstream_ws, upstream_token, outbound_text
+            text = outbound_text
+            token = object()
+            if turn_payload is not None and active_session_id:
+                prepared = prepare_responses_request_for_session(
+                    active_session_id,
+                    turn_payload,
+                    allow_previous_response_id=False,
+                    connection=token,
+                )
+                text = dumps_text(prepared.payload)
+            try:
+                upstream_ws = connect_upstream_websocket(
+                    build_upstream_websocket_url(),
+                    upstream_headers,
+                    open_timeout=timeouts.connect_limit,
+                )
+                upstream_ws.send(text)
+            except Exception as reconnect_exc:
+                upstream_ws = None
+                if active_session_id:
+                    clear_responses_reuse_state(active_session_id)
+                _send_error(
+                    f"Upstream websocket connection failed: {reconnect_exc}",
+                    status_code=502,
+                )
+                return False
+            upstream_token = token
+            outbound_text = text
+            return True
+
         try:
             while True:
                 incoming = ws.receive()
@@ -98,7 +155,7 @@ def register_websocket_routes(sock: Sock) -> None:
                     print("IN WS /v1/responses\n" + incoming_text)
 
                 try:
-                    payload = json.loads(incoming_text)
+                    payload = loads(incoming_text)
                 except Exception:
                     _send_error("Websocket frames must be valid JSON objects.", status_code=400)
                     break
@@ -109,7 +166,11 @@ def register_websocket_routes(sock: Sock) -> None:
 
                 client_session_id = extract_client_session_id(request.headers)
                 outbound_text = incoming_text
+                outbound_payload = payload
                 session_id = upstream_session_id
+                connection = upstream_token
+                turn_payload = None
+                reused = False
 
                 if payload.get("type") == "response.create":
                     try:
@@ -121,17 +182,32 @@ def register_websocket_routes(sock: Sock) -> None:
                     except ResponsesRequestError as exc:
                         _send_error(str(exc), status_code=exc.status_code, code=exc.code)
                         continue
+                    if admission is not None:
+                        try:
+                            ticket = admission.acquire()
+                        except AdmissionRejected as exc:
+                            error = admission_error_body(exc)["error"]
+                            _send_error(error["message"], status_code=exc.status_code, code=error["code"])
+                            continue
 
                     if normalized.service_tier_resolution.warning_message and verbose:
                         print(f"[FastMode] {normalized.service_tier_resolution.warning_message}")
+                    if upstream_ws is None or normalized.session_id != upstream_session_id:
+                        connection = object()
                     prepared = prepare_responses_request_for_session(
                         normalized.session_id,
                         normalized.payload,
                         allow_previous_response_id=True,
+                        connection=connection,
                     )
-                    outbound_text = json.dumps(prepared.payload)
+                    turn_payload = normalized.payload
+                    reused = prepared.reused
+                    outbound_payload = prepared.payload
+                    outbound_text = dumps_text(outbound_payload)
                     session_id = normalized.session_id
                     active_session_id = normalized.session_id
+                    lean = current_lean_settings().for_request(normalized.lean_stream)
+                    trim = LeanStreamFilter(lean) if lean.enabled else None
                     if verbose:
                         _log_json("OUTBOUND >> ChatGPT Responses WS payload", prepared.payload)
                 elif upstream_ws is None:
@@ -142,7 +218,11 @@ def register_websocket_routes(sock: Sock) -> None:
                     break
 
                 if upstream_ws is None or (session_id and session_id != upstream_session_id):
-                    access_token, account_id = get_effective_chatgpt_auth()
+                    account = get_account_pool().select(
+                        session_id or client_session_id,
+                        prefer=account_model_preference(payload.get("model")),
+                    )
+                    access_token, account_id = get_effective_chatgpt_auth(account=account)
                     if not access_token or not account_id:
                         if session_id:
                             clear_responses_reuse_state(session_id)
@@ -159,15 +239,17 @@ def register_websocket_routes(sock: Sock) -> None:
                             pass
 
                     effective_session_id = session_id or client_session_id or ""
+                    upstream_headers = build_upstream_headers(
+                        access_token,
+                        account_id,
+                        effective_session_id,
+                        accept="application/json",
+                    )
                     try:
                         upstream_ws = connect_upstream_websocket(
                             build_upstream_websocket_url(),
-                            build_upstream_headers(
-                                access_token,
-                                account_id,
-                                effective_session_id,
-                                accept="application/json",
-                            ),
+                            upstream_headers,
+                            open_timeout=timeouts.connect_limit,
                         )
                     except Exception as exc:
                         if session_id:
@@ -178,12 +260,36 @@ def register_websocket_routes(sock: Sock) -> None:
                         )
                         break
                     upstream_session_id = effective_session_id
+                    upstream_token = connection
 
                 upstream_ws.send(outbound_text)
+                # Continuing from an earlier response on this connection only
+                # works on the same upstream socket, so those are not retried.
+                retries_left = 0 if outbound_payload.get("previous_response_id") else timeouts.stall_retries
+                forwarded = False
 
                 while True:
+                    limit = timeouts.idle_limit if forwarded else timeouts.first_event_limit
                     try:
-                        upstream_message = upstream_ws.recv()
+                        upstream_message = upstream_ws.recv(timeout=limit)
+                    except TimeoutError:
+                        exc = stalled("idle" if forwarded else "first_event", limit)
+                        try:
+                            upstream_ws.close()
+                        except Exception:
+                            pass
+                        upstream_ws = None
+                        if not forwarded and retries_left > 0:
+                            retries_left -= 1
+                            if verbose:
+                                print(f"[upstream] {exc} Reconnecting websocket.")
+                            if not _reconnect_and_resend():
+                                return
+                            continue
+                        if active_session_id:
+                            clear_responses_reuse_state(active_session_id)
+                        _send_error(str(exc), status_code=504, code="upstream_timeout")
+                        return
                     except ConnectionClosed:
                         if active_session_id:
                             clear_responses_reuse_state(active_session_id)
@@ -199,15 +305,35 @@ def register_websocket_routes(sock: Sock) -> None:
                             print("STREAM OUT WS /v1/responses\n" + str(upstream_message))
                         except Exception:
                             pass
-                    ws.send(upstream_message)
+                    parsed = None
+                    if wants_event(upstream_message, SESSION_EVENT_TYPES):
+                        try:
+                            parsed = loads(upstream_message)
+                        except Exception:
+                            parsed = None
+                    if reused and not forwarded and rejects_previous_response(parsed):
+                        # Upstream no longer has the response this turn
+                        # continued from; send the whole conversation once.
+                        reused = False
+                        try:
+                            upstream_ws.close()
+                        except Exception:
+                            pass
+                        upstream_ws = None
+                        if verbose:
+                            print("[upstream] previous_response_id rejected. Resending the full input.")
+                        if not _reconnect_and_resend():
+                            return
+                        continue
+
+                    outgoing = upstream_message if trim is None else trim.message(upstream_message)
+                    if outgoing is not None:
+                        ws.send(outgoing)
+                    forwarded = True
 
-                    try:
-                        parsed = json.loads(upstream_message)
-                    except Exception:
-                        parsed = None
                     if isinstance(parsed, dict) and active_session_id:
                         note_responses_stream_event(active_session_id, parsed)
-                    if _is_terminal_event(parsed):
+                    if is_terminal_event(parsed):
                         if isinstance(parsed, dict) and parsed.get("type") in ("response.failed", "error"):
                             if upstream_ws is not None:
                                 try:
@@ -217,7 +343,11 @@ def register_websocket_routes(sock: Sock) -> None:
                             upstream_ws = None
                             upstream_session_id = None
                         break
+                if ticket is not None:
+                    ticket.release()
         finally:
+            if ticket is not None:
+                ticket.release()
             if upstream_ws is not None:
                 try:
                     upstream_ws.close()
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict
+
+from flask import Flask
+from gunicorn.app.base import BaseApplication
+
+from .app import create_app
+
+
+GRACEFUL_TIMEOUT_SECONDS = 30
+
+
+def build_server_options(
+    host: str,
+    port: int,
+    *,
+    workers: int,
+    threads: int,
+    keepalive: int,
+    verbose: bool = False,
+) -> Dict[str, Any]:
+    return {
+        "bind": f"[{host}]:{port}" if ":" in host else f"{host}:{port}",
+        "workers": max(int(workers), 1),
+        "worker_class": "gthread",
+        "threads": max(int(threads), 1),
+        "keepalive": max(int(keepalive), 0),
+        # gthread workers heartbeat from their own loop, so this bounds a hung
+        # worker rather than a long stream.
+        "timeout": GRACEFUL_TIMEOUT_SECONDS * 4,
+        "graceful_timeout": GRACEFUL_TIMEOUT_SECONDS,
+        "accesslog": "-" if verbose else None,
+        "errorlog": "-",
+        "loglevel": "info" if verbose else "warning",
+        "proc_name": "chatmock",
+    }
+
+
+class ChatMockServer(BaseApplication):
+    """Pre-forked gunicorn server; every worker builds its own Flask app after fork."""
+
+    def __init__(
+        self,
+        app_kwargs: Dict[str, Any],
+        options: Dict[str, Any],
+        *,
+        on_worker_start: Callable[[], Any] | None = None,
+    ) -> None:
+        self.app_kwargs = dict(app_kwargs)
+        self.options = dict(options)
+        self.on_worker_start = on_worker_start
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self) -> Flask:
+        # Background threads and pooled sockets do not survive fork(), so
+        # they are started here, inside the worker.
+        app = create_app(**self.app_kwargs)
+        if callable(self.on_worker_start):
+            self.on_worker_start()
+        return app
+
+
+def run_wsgi_server(
+    host: str,
+    port: int,
+    *,
+    workers: int,
+    threads: int,
+    keepalive: int,
+    on_worker_start: Callable[[], Any] | None = None,
+    **app_kwargs: Any,
+) -> None:
+    options = build_server_options(
+        host,
+        port,
+        workers=workers,
+        threads=threads,
+        keepalive=keepalive,
+        verbose=bool(app_kwargs.get("verbose")),
+    )
+    ChatMockServer(app_kwargs, options, on_worker_start=on_worker_start).run()
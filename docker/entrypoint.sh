@@ -17,6 +17,12 @@ if [[ "$cmd" == "serve" ]]; then
   PORT="${PORT:-8000}"
   ARGS=(serve --host 0.0.0.0 --port "${PORT}")
 
+  if [[ "${CHATGPT_LOCAL_ENGINE:-threaded}" == "async" ]]; then
+    export CHATGPT_LOCAL_WORKERS=0
+  else
+    export CHATGPT_LOCAL_WORKERS="${CHATGPT_LOCAL_WORKERS:-1}"
+  fi
+
   if bool "${VERBOSE:-}" || bool "${CHATGPT_LOCAL_VERBOSE:-}"; then
     ARGS+=(--verbose)
   fi
@@ -37,6 +43,9 @@ elif [[ "$cmd" == "login" ]]; then
   if bool "${VERBOSE:-}" || bool "${CHATGPT_LOCAL_VERBOSE:-}"; then
     ARGS+=(--verbose)
   fi
+  if [[ "$#" -gt 0 ]]; then
+    ARGS+=("$@")
+  fi
 
   exec chatmock "${ARGS[@]}"
 else
@@ -7,8 +7,10 @@ import multiprocessing as mp
 
 from PySide6 import QtCore, QtGui, QtWidgets
 
+from chatmock.accounts import start_account_refreshers
 from chatmock.app import create_app
 from chatmock.cli import cmd_login
+from chatmock.http_pool import start_upstream_keepalive
 from chatmock.utils import load_chatgpt_tokens, parse_jwt_claims
 
 
@@ -32,6 +34,8 @@ def run_server(
         expose_reasoning_models=expose_reasoning_models,
         default_web_search=default_web_search,
     )
+    start_upstream_keepalive()
+    start_account_refreshers()
     app.run(host=host, port=port, use_reloader=False, threaded=True)
 
 
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from chatmock.accounts import load_account_pool
+from chatmock.app import create_app
+from chatmock.model_catalog import ModelCatalog
+from chatmock.upstream import start_upstream_raw_request
+from chatmock.utils import AuthFileCache
+
+
+def _jwt(claims: dict) -> str:
+    body = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    return f"e30.{body}.sig"
+
+
+def _write_account(home: str, name: str) -> None:
+    path = os.path.join(home, "accounts", name)
+    os.makedirs(path)
+    with open(os.path.join(path, "auth.json"), "w", encoding="utf-8") as fp:
+        json.dump(
+            {
+                "tokens": {
+                    "access_token": _jwt({"exp": time.time() + 3600, "account": name}),
+                    "id_token": _jwt({}),
+                    "refresh_token": f"refresh-{name}",
+                    "account_id": f"acct-{name}",
+                }
+            },
+            fp,
+        )
+
+
+def _usage_headers(percent: float) -> dict[str, str]:
+    return {
+        "x-codex-primary-used-percent": str(percent),
+        "x-codex-primary-window-minutes": "300",
+        "x-codex-primary-reset-after-seconds": "3600",
+    }
+
+
+class AccountPoolTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.home = self.tmp.name
+        _write_account(self.home, "alpha")
+        _write_account(self.home, "beta")
+        primary = AuthFileCache(candidates=lambda: [os.path.join(self.home, "auth.json")])
+        with patch("chatmock.accounts.get_auth_cache", return_value=primary):
+            self.pool = load_account_pool(self.home)
+        self.alpha = self.pool.get("alpha")
+        self.beta = self.pool.get("beta")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_new_sessions_pick_least_used_account_and_stay_pinned(self) -> None:
+        self.pool.record_response(self.alpha, _usage_headers(80), 200)
+        self.pool.record_response(self.beta, _usage_headers(10), 200)
+        self.assertIs(self.pool.select("session-1"), self.beta)
+
+        self.pool.record_response(self.beta, _usage_headers(90), 200)
+        self.assertIs(self.pool.select("session-1"), self.beta)
+        self.assertIs(self.pool.select("session-2"), self.alpha)
+
+    def test_rate_limited_request_fails_over_before_streaming(self) -> None:
+        limited = MagicMock(status_code=429, headers={"Retry-After": "120"})
+        ok = MagicMock(status_code=200, headers=_usage_headers(5))
+        app = create_app(model_sync=False)
+        with patch("chatmock.upstream.get_account_pool", return_value=self.pool), patch(
+            "chatmock.upstream.get_upstream_session"
+        ) as mock_session, app.test_request_context("/v1/responses", method="POST"):
+            mock_session.return_value.post.side_effect = [limited, ok]
+            result, error = start_upstream_raw_request({"model": "gpt-5.4", "input": []}, session_id="sid")
+
+        self.assertIsNone(error)
+        self.assertIs(result.response, ok)
+        limited.close.assert_called_once()
+        first, second = (call.kwargs["headers"]["ChatGPT-Account-ID"] for call in mock_session.return_value.post.call_args_list)
+        self.assertNotEqual(first, second)
+        self.assertTrue(self.pool.get(first.removeprefix("acct-")).cooling_down(time.monotonic()))
+        self.assertIs(self.pool.select("sid"), self.pool.get(second.removeprefix("acct-")))
+
+    def test_model_catalog_tracks_each_account(self) -> None:
+        def _models(url, params=None, headers=None, timeout=None):
+            slug = "model-" + headers["ChatGPT-Account-ID"]
+            response = MagicMock(status_code=200, headers={})
+            response.json.return_value = {"models": [{"slug": slug, "visibility": "list", "priority": 1}]}
+            return response
+
+        session = MagicMock()
+        session.get.side_effect = _models
+        catalog = ModelCatalog(session=session, accounts=self.pool.accounts)
+
+        slugs = {model.slug for model in catalog.visible_models(wait_for_refresh=True)}
+        self.assertEqual(slugs, {"model-acct-alpha", "model-acct-beta"})
+        self.assertTrue(catalog.account_serves_model(self.alpha, "model-acct-alpha"))
+        self.assertFalse(catalog.account_serves_model(self.beta, "model-acct-alpha"))
+        self.assertTrue(os.path.exists(os.path.join(self.home, "accounts", "beta", "chatmock_models_cache.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from chatmock.admission import AdmissionController, AdmissionRejected
+from chatmock.app import create_app
+from websockets.sync.client import connect as ws_connect
+
+
+class AdmissionControllerTests(unittest.TestCase):
+    def test_exhausted_window_rejects_with_retry_after(self) -> None:
+        controller = AdmissionController(retry_after=lambda: 12.2)
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.acquire()
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertEqual(ctx.exception.retry_after, 13)
+
+    def test_queue_times_out_when_all_slots_are_busy(self) -> None:
+        controller = AdmissionController(max_concurrent=1, queue_timeout=0.05, retry_after=lambda: None)
+        ticket = controller.acquire()
+        with self.assertRaises(AdmissionRejected) as ctx:
+            controller.acquire()
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(controller.queued, 0)
+        ticket.release()
+        ticket.release()
+        self.assertEqual(controller.active, 0)
+
+    def test_released_slot_goes_to_the_queued_request(self) -> None:
+        controller = AdmissionController(max_concurrent=1, queue_timeout=5, retry_after=lambda: None)
+        first = controller.acquire()
+        admitted = threading.Event()
+
+        def _waiter() -> None:
+            controller.acquire()
+            admitted.set()
+
+        thread = threading.Thread(target=_waiter)
+        thread.start()
+        while controller.queued == 0:
+            threading.Event().wait(0.01)
+        first.release()
+        thread.join(2)
+        self.assertTrue(admitted.is_set())
+        self.assertEqual(controller.active, 1)
+
+    def test_async_waiter_is_admitted_on_release(self) -> None:
+        controller = AdmissionController(max_concurrent=1, queue_timeout=5, retry_after=lambda: None)
+
+        async def _run() -> int:
+            first = await controller.acquire_async()
+            waiter = asyncio.ensure_future(controller.acquire_async())
+            await asyncio.sleep(0)
+            self.assertEqual(controller.queued, 1)
+            first.release()
+            (await waiter).release()
+            return controller.active
+
+        self.assertEqual(asyncio.run(_run()), 0)
+
+
+class AdmissionRouteTests(unittest.TestCase):
+    @patch("chatmock.routes_openai.start_upstream_request")
+    def test_exhausted_window_fails_fast_before_upstream(self, mock_start) -> None:
+        app = create_app(model_sync=False)
+        app.extensions["chatmock_admission"] = AdmissionController(retry_after=lambda: 90)
+        response = app.test_client().post(
+            "/v1/chat/completions",
+            json={"model": "gpt-5.4", "messages": [{"role": "user", "content": "hi"}]},
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "90")
+        self.assertEqual(response.get_json()["error"]["code"], "rate_limit_exceeded")
+        mock_start.assert_not_called()
+
+    @patch("chatmock.routes_openai.start_upstream_request")
+    def test_rejections_carry_cors_headers(self, mock_start) -> None:
+        app = create_app(model_sync=False)
+        app.extensions["chatmock_admission"] = AdmissionController(retry_after=lambda: 90)
+        response = app.test_client().post(
+            "/v1/chat/completions",
+            json={"model": "gpt-5.4", "messages": [{"role": "user", "content": "hi"}]},
+            headers={"Origin": "https://app.example"},
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Access-Control-Allow-Origin"], "https://app.example")
+
+    @patch("chatmock.websocket_routes.connect_upstream_websocket")
+    def test_websocket_turns_are_admission_controlled(self, mock_connect) -> None:
+        app = create_app(model_sync=False)
+        app.extensions["chatmock_admission"] = AdmissionController(retry_after=lambda: 90)
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        host, port = sock.getsockname()
+        sock.close()
+        threading.Thread(
+            target=app.run,
+            kwargs={"host": host, "port": port, "use_reloader": False, "threaded": True},
+            daemon=True,
+        ).start()
+        time.sleep(0.5)
+
+        with ws_connect(f"ws://{host}:{port}/v1/responses") as client:
+            client.send(json.dumps({"type": "response.create", "model": "gpt-5.4", "input": "hello"}))
+            event = json.loads(client.recv())
+        self.assertEqual(event["status_code"], 429)
+        self.assertEqual(event["error"]["code"], "rate_limit_exceeded")
+        mock_connect.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import json
+import unittest
+from unittest.mock import patch
+
+from chatmock.session import reset_session_state
+from chatmock.utils import sse_translate_chat
+
+try:
+    import aiohttp
+    from aiohttp.test_utils import TestClient, TestServer
+
+    from chatmock.async_app import create_async_app
+except ImportError:
+    TestClient = None
+
+
+class _FakeContent:
+    def __init__(self, chunks: list[bytes]) -> None:
+        self._chunks = chunks
+
+    async def iter_any(self):
+        for chunk in self._chunks:
+            yield chunk
+
+
+class FakeAsyncUpstream:
+    def __init__(self, events: list[dict[str, object]], *, status: int = 200) -> None:
+        body = b"".join(f"data: {json.dumps(event)}\n\n".encode("utf-8") for event in events)
+        # Split mid-line so the line reassembly is exercised.
+        self.content = _FakeContent([body[:7], body[7:]])
+        self.status = status
+        self.headers = {"Content-Type": "text/event-stream"}
+        self.released = False
+
+    async def read(self) -> bytes:
+        return b""
+
+    def release(self) -> None:
+        self.released = True
+
+
+class _BrokenContent:
+    def __init__(self, first: bytes) -> None:
+        self._first = first
+
+    async def iter_any(self):
+        yield self._first
+        raise aiohttp.ClientPayloadError("connection reset")
+
+
+class FakeSyncUpstream:
+    def __init__(self, events: list[dict[str, object]]) -> None:
+        self._events = events
+
+    def iter_content(self, chunk_size=None):
+        for event in self._events:
+            yield f"data: {json.dumps(event)}\n\n".encode("utf-8")
+
+    def close(self) -> None:
+        return None
+
+
+CHAT_EVENTS = [
+    {"type": "response.created", "response": {"id": "resp-async"}},
+    {"type": "response.reasoning_summary_text.delta", "delta": "thinking"},
+    {"type": "response.output_text.delta", "delta": "hello"},
+    {"type": "response.completed", "response": {"id": "resp-async"}},
+]
+
+
+@unittest.skipIf(TestClient is None, "aiohttp is not installed")
+class AsyncAppTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        reset_session_state()
+        self.client = TestClient(TestServer(create_async_app(model_sync=False)))
+        await self.client.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.client.close()
+
+    async def test_models_list(self) -> None:
+        response = await self.client.get("/v1/models")
+        body = await response.json()
+        self.assertEqual(response.status, 200)
+        self.assertIn("gpt-5.4", [item["id"] for item in body["data"]])
+
+    async def test_chat_completions_stream_matches_threaded_engine(self) -> None:
+        upstream = FakeAsyncUpstream(CHAT_EVENTS)
+        with patch("chatmock.async_app.start_async_upstream_raw_request", return_value=(upstream, None)), patch(
+            "chatmock.async_app.time.time", return_value=1700000000
+        ):
+            response = await self.client.post(
+                "/v1/chat/completions",
+                json={"model": "gpt-5.4", "stream": True, "messages": [{"role": "user", "content": "hi"}]},
+            )
+            body = await response.read()
+        expected = b"".join(sse_translate_chat(FakeSyncUpstream(CHAT_EVENTS), "gpt-5.4", 1700000000))
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.headers["Content-Type"], "text/event-stream")
+        self.assertEqual(body, expected)
+        self.assertTrue(upstream.released)
+
+    async def test_completions_stream_reports_a_broken_upstream(self) -> None:
+        upstream = FakeAsyncUpstream([])
+        upstream.content = _BrokenContent(b'data: {"type": "response.output_text.delta", "delta": "hel"}\n\n')
+        with patch("chatmock.async_app.start_async_upstream_raw_request", return_value=(upstream, None)):
+            response = await self.client.post("/v1/completions", json={"model": "gpt-5.4", "stream": True, "prompt": "hi"})
+            body = await response.read()
+        frames = [frame[len(b"data: "):] for frame in body.split(b"\n\n") if frame]
+        self.assertEqual(json.loads(frames[0])["choices"][0]["text"], "hel")
+        self.assertEqual(json.loads(frames[-2])["error"]["code"], "upstream_interrupted")
+        self.assertEqual(frames[-1], b"[DONE]")
+        self.assertTrue(upstream.released)
+
+    async def test_ollama_chat_stream_reports_a_broken_upstream(self) -> None:
+        upstream = FakeAsyncUpstream([])
+        upstream.content = _BrokenContent(b'data: {"type": "response.output_text.delta", "delta": "hel"}\n\n')
+        with patch("chatmock.async_app.start_async_upstream_raw_request", return_value=(upstream, None)):
+            response = await self.client.post(
+                "/api/chat",
+                json={"model": "gpt-5.4", "stream": True, "messages": [{"role": "user", "content": "hi"}]},
+            )
+            body = await response.read()
+        lines = [json.loads(line) for line in body.splitlines() if line]
+        self.assertEqual(lines[0]["message"]["content"], "hel")
+        self.assertIn("Upstream stream interrupted", next(line["error"] for line in lines if "error" in line))
+        self.assertTrue(lines[-1]["done"])
+        self.assertTrue(upstream.released)
+
+    async def test_responses_stream_reports_a_broken_upstream(self) -> None:
+        upstream = FakeAsyncUpstream([])
+        upstream.content = _BrokenContent(b'data: {"type": "response.output_text.delta", "delta": "hel"}\n\n')
+        with patch("chatmock.async_app.start_async_upstream_raw_request", return_value=(upstream, None)):
+            response = await self.client.post("/v1/responses", json={"model": "gpt-5.4", "stream": True, "input": "hi"})
+            body = await response.read()
+        self.assertTrue(body.startswith(b'data: {"type": "response.output_text.delta"'))
+        self.assertIn(b"event: error\n", body)
+        evt = json.loads(body.rsplit(b"data: ", 1)[1])
+        self.assertEqual(evt["error"]["code"], "upstream_interrupted")
+        self.assertTrue(upstream.released)
+
+    async def test_ollama_chat_non_stream(self) -> None:
+        upstream = FakeAsyncUpstream(CHAT_EVENTS)
+        with patch("chatmock.async_app.start_async_upstream_raw_request", return_value=(upstream, None)) as mock_start:
+            response = await self.client.post(
+                "/api/chat",
+                json={"model": "gpt-5.4", "stream": False, "messages": [{"role": "user", "content": "hi"}]},
+            )
+            body = await response.json()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body["message"]["content"], "<think>thinking</think>hello")
+        self.assertEqual(mock_start.call_args.args[1]["model"], "gpt-5.4")
+
+    async def test_non_stream_output_over_the_cap_fails_cleanly(self) -> None:
+        client = TestClient(TestServer(create_async_app(model_sync=False, max_output_bytes=8)))
+        await client.start_server()
+        try:
+            upstream = FakeAsyncUpstream(CHAT_EVENTS)
+            with patch("chatmock.async_app.start_async_upstream_raw_request", return_value=(upstream, None)):
+                response = await client.post(
+                    "/v1/chat/completions",
+                    json={"model": "gpt-5.4", "messages": [{"role": "user", "content": "hi"}]},
+                )
+                body = await response.json()
+        finally:
+            await client.close()
+        self.assertEqual(response.status, 502)
+        self.assertEqual(body["error"]["code"], "output_too_large")
+        self.assertTrue(upstream.released)
+
+    async def test_responses_route_aggregates_completed_response(self) -> None:
+        upstream = FakeAsyncUpstream(
+            [
+                {"type": "response.output_text.delta", "delta": "hello"},
+                {"type": "response.completed", "response": {"id": "resp-1", "status": "completed"}},
+            ]
+        )
+        with patch("chatmock.async_app.start_async_upstream_raw_request", return_value=(upstream, None)):
+            response = await self.client.post("/v1/responses", json={"model": "gpt-5.4", "input": "hello"})
+            body = await response.json()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, {"id": "resp-1", "status": "completed"})
+
+    async def test_chat_completions_rejects_invalid_json(self) -> None:
+        response = await self.client.post("/v1/chat/completions", data=b"{not json")
+        body = await response.json()
+        self.assertEqual(response.status, 400)
+        self.assertEqual(body["error"]["message"], "Invalid JSON body")
+
+
+if __name__ == "__main__":
+    unittest.main()
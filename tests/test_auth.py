@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from chatmock.utils import AuthFileCache, TokenRefresher, load_chatgpt_tokens
+
+
+def _jwt(claims: dict) -> str:
+    body = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    return f"e30.{body}.sig"
+
+
+def _write_auth(path: str, access_token: str, account_id: str = "acct") -> None:
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(
+            {
+                "tokens": {
+                    "access_token": access_token,
+                    "id_token": _jwt({}),
+                    "refresh_token": "refresh",
+                    "account_id": account_id,
+                }
+            },
+            fp,
+        )
+
+
+class AuthFileCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "auth.json")
+        self.cache = AuthFileCache(candidates=lambda: [self.path])
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_lookups_do_not_touch_the_filesystem(self) -> None:
+        token = _jwt({"exp": time.time() + 3600})
+        _write_auth(self.path, token)
+        self.assertEqual(self.cache.get().access_token, token)
+        with patch("builtins.open", side_effect=AssertionError("hot path read auth.json")), patch(
+            "os.stat", side_effect=AssertionError("hot path stat auth.json")
+        ):
+            entry = self.cache.get()
+        self.assertEqual(entry.account_id, "acct")
+        self.assertIsNotNone(entry.access_expires_at)
+
+    def test_revalidate_reloads_only_when_file_changes(self) -> None:
+        _write_auth(self.path, _jwt({"exp": time.time() + 3600}))
+        first = self.cache.get()
+        self.assertFalse(self.cache.revalidate())
+        self.assertIs(self.cache.get(), first)
+
+        replacement = _jwt({"exp": time.time() + 7200})
+        _write_auth(self.path, replacement, account_id="acct-2-longer")
+        self.assertTrue(self.cache.revalidate())
+        self.assertEqual(self.cache.get().access_token, replacement)
+        self.assertEqual(self.cache.get().account_id, "acct-2-longer")
+
+    def test_load_chatgpt_tokens_serves_cached_entry(self) -> None:
+        token = _jwt({"exp": time.time() + 3600})
+        _write_auth(self.path, token)
+        with patch("chatmock.utils._AUTH_CACHE", self.cache):
+            self.assertEqual(load_chatgpt_tokens(), (token, "acct", _jwt({})))
+
+
+class TokenRefresherTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "auth.json")
+        self.cache = AuthFileCache(candidates=lambda: [self.path])
+        self.refresher = TokenRefresher(self.cache, lock_path=lambda: self.path + ".lock")
+        self.old_token = _jwt({"exp": time.time() + 3600, "n": 1})
+        self.new_token = _jwt({"exp": time.time() + 7200, "n": 2})
+        _write_auth(self.path, self.old_token)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _persist(self, auth, tokens, path=None):
+        updated = dict(auth)
+        updated["tokens"] = tokens
+        with open(self.path, "w", encoding="utf-8") as fp:
+            json.dump(updated, fp)
+        return updated, tokens
+
+    def test_concurrent_forced_refreshes_share_one_request(self) -> None:
+        calls: list[str] = []
+
+        def _slow_refresh(refresh_token, client_id):
+            calls.append(refresh_token)
+            time.sleep(0.2)
+            return {"access_token": self.new_token, "id_token": _jwt({}), "refresh_token": "refresh-2"}
+
+        results: list[str | None] = []
+        with patch("chatmock.utils._refresh_chatgpt_tokens", side_effect=_slow_refresh), patch(
+            "chatmock.utils._persist_refreshed_auth", side_effect=self._persist
+        ):
+            threads = [
+                threading.Thread(
+                    target=lambda: results.append(
+                        self.refresher.refresh(force=True, rejected_access_token=self.old_token).access_token
+                    )
+                )
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [self.new_token] * 8)
+
+    def test_rejected_token_already_replaced_skips_refresh(self) -> None:
+        _write_auth(self.path, self.new_token, account_id="acct-refreshed")
+        with patch("chatmock.utils._refresh_chatgpt_tokens") as mock_refresh:
+            entry = self.refresher.refresh(force=True, rejected_access_token=self.old_token)
+        mock_refresh.assert_not_called()
+        self.assertEqual(entry.access_token, self.new_token)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import unittest
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+from chatmock.coalesce import (
+    CoalesceSettings,
+    atranslate_batches,
+    default_coalesce_settings,
+    translate_batches,
+)
+from chatmock.translate import ChatCompletionStreamTranslator, OllamaChatStreamTranslator, TextCompletionStreamTranslator
+
+from test_stream_frames import EVENTS
+
+
+HOLD = CoalesceSettings(window_ms=60000.0)
+
+
+def _delta(text: str) -> Dict[str, Any]:
+    return {"type": "response.output_text.delta", "delta": text}
+
+
+def _chat_deltas(frames: List[bytes]) -> List[Dict[str, Any]]:
+    out = []
+    for frame in frames:
+        data = frame[len(b"data: ") :].strip()
+        if data != b"[DONE]":
+            out.append(json.loads(data)["choices"][0]["delta"])
+    return out
+
+
+def _joined(deltas: List[Dict[str, Any]], field: str) -> str:
+    return "".join(d.get(field) or "" for d in deltas if isinstance(d.get(field), str))
+
+
+class _SocketlessUpstream:
+    socket = None
+
+
+class CoalesceSettingsTests(unittest.TestCase):
+    def test_defaults_leave_coalescing_off(self) -> None:
+        with patch.dict(os.environ, {}, clear=True):
+            settings = default_coalesce_settings()
+        self.assertFalse(settings.enabled)
+        self.assertEqual(settings.max_bytes, 4096)
+
+    def test_environment_and_arguments(self) -> None:
+        env = {"CHATGPT_LOCAL_COALESCE_WINDOW_MS": "25", "CHATGPT_LOCAL_COALESCE_MAX_BYTES": "bad"}
+        with patch.dict(os.environ, env, clear=True):
+            self.assertEqual(default_coalesce_settings(), CoalesceSettings(window_ms=25.0, max_bytes=4096))
+            self.assertEqual(default_coalesce_settings(window_ms=-1, max_bytes=0), CoalesceSettings(0.0, 1))
+
+
+class DeltaCoalescingTests(unittest.TestCase):
+    def test_disabled_settings_change_nothing(self) -> None:
+        plain = ChatCompletionStreamTranslator("gpt-5.4", 1, include_usage=True)
+        off = ChatCompletionStreamTranslator("gpt-5.4", 1, include_usage=True, coalesce=CoalesceSettings())
+        self.assertFalse(off.coalescing)
+        for evt in EVENTS:
+            self.assertEqual(off.feed(evt), plain.feed(evt))
+
+    def test_text_deltas_merge_until_the_answer_completes(self) -> None:
+        translator = ChatCompletionStreamTranslator("gpt-5.4", 1, coalesce=HOLD)
+        translator.feed({"type": "response.created", "response": {"id": "resp_1"}})
+        for piece in ("Hel", "lo", ", wörld"):
+            self.assertEqual(translator.feed(_delta(piece)), [])
+        frames = translator.feed({"type": "response.completed", "response": {}})
+        deltas = _chat_deltas(frames)
+        self.assertEqual(deltas[0], {"content": "Hello, wörld"})
+        self.assertEqual(frames[-1], b"data: [DONE]\n\n")
+
+    def test_think_tags_and_tool_calls_are_flush_boundaries(self) -> None:
+        for compat in ("think-tags", "o3", "legacy"):
+            with self.subTest(compat=compat):
+                plain = ChatCompletionStreamTranslator("gpt-5.4", 1, reasoning_compat=compat)
+                held = ChatCompletionStreamTranslator("gpt-5.4", 1, reasoning_compat=compat, coalesce=HOLD)
+                expected = _chat_deltas([f for evt in EVENTS for f in plain.feed(evt)])
+                got = _chat_deltas([f for evt in EVENTS for f in held.feed(evt)])
+                self.assertLess(len(got), len(expected))
+                for field in ("content", "reasoning_summary", "reasoning"):
+                    self.assertEqual(_joined(got, field), _joined(expected, field))
+                self.assertEqual([d for d in got if "tool_calls" in d], [d for d in expected if "tool_calls" in d])
+                if compat == "think-tags":
+                    contents = [d["content"] for d in got if "content" in d]
+                    self.assertEqual(contents[0], "<think>")
+                    self.assertEqual(contents[2], "</think>")
+                    self.assertEqual(contents[3], "Hello, wörld 🌍 </script>\n")
+
+    def test_byte_threshold_sends_early(self) -> None:
+        translator = TextCompletionStreamTranslator("gpt-5.4", 1, coalesce=CoalesceSettings(60000.0, max_bytes=5))
+        self.assertEqual(translator.feed(_delta("abc")), [])
+        frames = translator.feed(_delta("dé"))
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(json.loads(frames[0][len(b"data: ") :])["choices"][0]["text"], "abcdé")
+        self.assertIsNone(translator.flush_delay())
+
+    def test_ollama_close_sends_held_text_before_done(self) -> None:
+        translator = OllamaChatStreamTranslator("gpt-5.4", "2026-01-01T00:00:00Z", coalesce=HOLD)
+        translator.feed(_delta("a"))
+        translator.feed(_delta("b"))
+        lines = [json.loads(line) for line in translator.close()]
+        self.assertEqual(lines[0]["message"]["content"], "ab")
+        self.assertTrue(lines[-1]["done"])
+
+
+class BatchDriverTests(unittest.TestCase):
+    def test_sync_driver_flushes_when_upstream_has_nothing_more(self) -> None:
+        translator = ChatCompletionStreamTranslator("gpt-5.4", 1, coalesce=HOLD)
+        batches = [[{"type": "response.created", "response": {"id": "r"}}, _delta("a"), _delta("b")], [_delta("c")]]
+        deltas = _chat_deltas(list(translate_batches(iter(batches), translator, _SocketlessUpstream())))
+        self.assertEqual(deltas, [{"content": "ab"}, {"content": "c"}])
+
+    def test_async_driver_flushes_held_text_while_upstream_is_quiet(self) -> None:
+        translator = ChatCompletionStreamTranslator("gpt-5.4", 1, coalesce=CoalesceSettings(window_ms=20.0))
+        seen: List[bytes] = []
+
+        async def batches():
+            yield [{"type": "response.created", "response": {"id": "r"}}, _delta("a"), _delta("b")]
+            await asyncio.sleep(0.2)
+            # The merged "ab" must already be out while upstream was silent.
+            self.assertEqual(_chat_deltas(seen), [{"content": "ab"}])
+            yield [_delta("c"), {"type": "response.completed", "response": {}}]
+
+        async def run() -> None:
+            async for frame in atranslate_batches(batches(), translator):
+                seen.append(frame)
+
+        asyncio.run(run())
+        self.assertEqual(_chat_deltas(seen)[:2], [{"content": "ab"}, {"content": "c"}])
+        self.assertEqual(seen[-1], b"data: [DONE]\n\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import socket
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from chatmock import metrics
+from chatmock.app import create_app
+from chatmock.disconnect import _watched, peer_closed
+
+
+class SilentUpstream:
+    """Upstream stuck in a long reasoning phase until it is cancelled."""
+
+    status_code = 200
+    headers: dict[str, str] = {}
+
+    def __init__(self) -> None:
+        self.cancelled = threading.Event()
+        self.bytes_read = 42
+
+    def iter_content(self, chunk_size=None):
+        self.cancelled.wait(10)
+        return
+        yield b""
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def close(self) -> None:
+        return None
+
+
+class PeerClosedTests(unittest.TestCase):
+    def test_reports_open_pending_and_closed_peers(self) -> None:
+        server, client = socket.socketpair()
+        self.addCleanup(server.close)
+        self.assertFalse(peer_closed(server))
+        client.sendall(b"GET / HTTP/1.1\r\n")
+        self.assertIsNone(peer_closed(server))
+        self.assertEqual(server.recv(64), b"GET / HTTP/1.1\r\n")
+        client.close()
+        self.assertTrue(peer_closed(server))
+
+
+class WatchedBodyTests(unittest.TestCase):
+    def setUp(self) -> None:
+        metrics.reset()
+        self.server, self.client = socket.socketpair()
+        self.addCleanup(self.server.close)
+        self.addCleanup(self.client.close)
+
+    def test_failing_body_stops_upstream_without_counting_a_cancel(self) -> None:
+        upstream = SilentUpstream()
+
+        def body():
+            yield b"data: 1\n\n"
+            raise RuntimeError("upstream broke")
+
+        with self.assertRaises(RuntimeError):
+            list(_watched(body(), self.server, upstream))
+        self.assertTrue(upstream.cancelled.is_set())
+        self.assertEqual(metrics.snapshot()[metrics.STREAMS_CANCELLED], 0)
+
+    def test_abandoned_body_counts_only_when_the_client_is_gone(self) -> None:
+        for hang_up, expected in ((False, 0), (True, 1)):
+            metrics.reset()
+            if hang_up:
+                self.client.close()
+            stream = _watched(iter([b"a", b"b"]), self.server, SilentUpstream())
+            next(stream)
+            stream.close()
+            self.assertEqual(metrics.snapshot()[metrics.STREAMS_CANCELLED], expected)
+
+
+class DisconnectRouteTests(unittest.TestCase):
+    @patch("chatmock.routes_openai.start_upstream_request")
+    def test_hang_up_during_silent_stream_cancels_upstream(self, mock_start) -> None:
+        upstream = SilentUpstream()
+        mock_start.return_value = (upstream, None)
+        metrics.reset()
+        app = create_app(model_sync=False)
+
+        probe = socket.socket()
+        probe.bind(("127.0.0.1", 0))
+        host, port = probe.getsockname()
+        probe.close()
+        threading.Thread(
+            target=app.run,
+            kwargs={"host": host, "port": port, "use_reloader": False, "threaded": True},
+            daemon=True,
+        ).start()
+        time.sleep(0.5)
+
+        body = json.dumps(
+            {"model": "gpt-5.4", "stream": True, "messages": [{"role": "user", "content": "hi"}]}
+        ).encode()
+        client = socket.create_connection((host, port))
+        client.sendall(
+            b"POST /v1/chat/completions HTTP/1.1\r\nHost: test\r\nContent-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        time.sleep(0.3)
+        self.assertFalse(upstream.cancelled.is_set())
+        client.close()
+
+        self.assertTrue(upstream.cancelled.wait(3))
+        deadline = time.monotonic() + 3
+        while metrics.snapshot()[metrics.STREAMS_CANCELLED] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        stats = app.test_client().get("/stats").get_json()
+        self.assertEqual(stats[metrics.STREAMS_CANCELLED], 1)
+        self.assertEqual(stats[metrics.CANCELLED_UPSTREAM_BYTES], 42)
+        self.assertIn("session_entries", stats)
+
+
+if __name__ == "__main__":
+    unittest.main()
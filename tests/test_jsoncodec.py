@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import unittest
+from unittest.mock import patch
+
+from chatmock import jsoncodec
+
+
+SAMPLE = {"type": "response.output_text.delta", "delta": "héllo \"wörld\"\n", "n": [1, 2.5, None, True]}
+
+
+class JsonCodecTests(unittest.TestCase):
+    def test_dumps_is_compact_utf8_on_every_backend(self) -> None:
+        expected = '{"type":"response.output_text.delta","delta":"héllo \\"wörld\\"\\n","n":[1,2.5,null,true]}'
+        self.assertEqual(jsoncodec.dumps(SAMPLE), expected.encode("utf-8"))
+        with patch.object(jsoncodec, "orjson", None):
+            self.assertEqual(jsoncodec.dumps(SAMPLE), expected.encode("utf-8"))
+            self.assertEqual(jsoncodec.dumps_text(SAMPLE), expected)
+
+    def test_canonical_bytes_do_not_depend_on_the_backend(self) -> None:
+        doc = {"b": [1e16, 1e-7, 2.5], "a": "é"}
+        expected = '{"a":"é","b":[1e+16,1e-07,2.5]}'.encode("utf-8")
+        self.assertEqual(jsoncodec.dumps_canonical(doc), expected)
+        with patch.object(jsoncodec, "orjson", None):
+            self.assertEqual(jsoncodec.dumps_canonical(doc), expected)
+
+    def test_loads_accepts_bytes_text_and_memoryview(self) -> None:
+        raw = jsoncodec.dumps(SAMPLE)
+        for backend in (jsoncodec.orjson, None):
+            with patch.object(jsoncodec, "orjson", backend):
+                self.assertEqual(jsoncodec.loads(raw), SAMPLE)
+                self.assertEqual(jsoncodec.loads(memoryview(raw)), SAMPLE)
+                self.assertEqual(jsoncodec.loads(" " + raw.decode("utf-8") + "\n"), SAMPLE)
+
+    def test_invalid_documents_raise_value_error(self) -> None:
+        for backend in (jsoncodec.orjson, None):
+            with patch.object(jsoncodec, "orjson", backend):
+                for bad in (b"", b"{", b'{"a": 1} trailing', b"\xff"):
+                    with self.assertRaises(ValueError):
+                        jsoncodec.loads(bad)
+
+    def test_values_the_fast_backend_rejects_fall_back_to_stdlib(self) -> None:
+        self.assertEqual(jsoncodec.dumps({1: "a"}), b'{"1":"a"}')
+        self.assertEqual(jsoncodec.dumps({"s": "\ud800"}), b'{"s":"\\ud800"}')
+        self.assertEqual(jsoncodec.loads(b'{"x": Infinity}'), {"x": float("inf")})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import unittest
+
+from chatmock.jsoncodec import loads
+from chatmock.lean import LeanStreamFilter, LeanStreamSettings, default_lean_settings, strip_obfuscation
+from chatmock.responses_api import normalize_responses_payload, stream_upstream_bytes
+from chatmock.sse import iter_sse
+
+
+class _ChunkUpstream:
+    def __init__(self, chunks) -> None:
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size=None):
+        return iter(self.chunks)
+
+    def close(self) -> None:
+        pass
+
+
+LEAN = LeanStreamSettings(enabled=True)
+
+BODY = (
+    b'event: response.created\ndata: {"type":"response.created","response":{"id":"r"}}\n\n'
+    + b'event: response.reasoning_summary_text.delta\ndata: {"type":"response.reasoning_summary_text.delta","delta":"think","obfuscation":"Zx9"}\n\n' * 5
+    + b'event: response.output_text.delta\r\ndata: {"type": "response.output_text.delta", "delta": "a,\\"obfuscation\\":\\"k\\"", "obfuscation": "Qq"}\r\n\r\n' * 5
+    + b'event: response.completed\ndata: {"type":"response.completed","response":{"id":"r"}}\n\n'
+)
+
+
+class StripObfuscationTests(unittest.TestCase):
+    def test_removes_padding_but_not_lookalike_text(self) -> None:
+        out = strip_obfuscation(b'{"type":"x","delta":"a,\\"obfuscation\\":\\"k\\"","obfuscation":"Qq","n":1}')
+        self.assertEqual(loads(out), {"type": "x", "delta": 'a,"obfuscation":"k"', "n": 1})
+
+    def test_unusual_layout_is_decoded_instead(self) -> None:
+        out = strip_obfuscation(b'{"obfuscation":"Qq","type":"x"}')
+        self.assertEqual(loads(out), {"type": "x"})
+
+
+class LeanStreamFilterTests(unittest.TestCase):
+    def test_drops_configured_events_at_any_chunk_size(self) -> None:
+        for size in (1, 13, len(BODY)):
+            with self.subTest(size=size):
+                seen = []
+                chunks = [BODY[i : i + size] for i in range(0, len(BODY), size)]
+                out = b"".join(stream_upstream_bytes(_ChunkUpstream(chunks), on_event=seen.append, lean=LEAN))
+                events = [loads(data) for _name, data in iter_sse([out])]
+                self.assertEqual(
+                    [evt["type"] for evt in events],
+                    ["response.created"] + ["response.output_text.delta"] * 5 + ["response.completed"],
+                )
+                self.assertNotIn("obfuscation", events[1])
+                self.assertEqual(events[1]["delta"], 'a,"obfuscation":"k"')
+                self.assertEqual(len(seen), 12)
+                self.assertLess(len(out), len(BODY))
+
+    def test_session_events_are_never_dropped(self) -> None:
+        trim = LeanStreamFilter(LeanStreamSettings(enabled=True, drop_events=frozenset({"response.completed"})))
+        self.assertIn(b"response.completed", trim.feed(b'data: {"type":"response.completed"}\n\n'))
+
+    def test_disabled_settings_pass_the_stream_through(self) -> None:
+        out = b"".join(stream_upstream_bytes(_ChunkUpstream([BODY]), lean=LeanStreamSettings()))
+        self.assertEqual(out, BODY)
+
+    def test_websocket_messages(self) -> None:
+        trim = LeanStreamFilter(LEAN)
+        self.assertIsNone(trim.message('{"type":"response.reasoning_text.delta","delta":"x"}'))
+        self.assertEqual(trim.message('{"type":"response.output_text.delta","delta":"x","obfuscation":"ab"}'), '{"type":"response.output_text.delta","delta":"x"}')
+        self.assertEqual(trim.message(b'{"type":"response.created"}'), b'{"type":"response.created"}')
+
+
+class LeanSettingsTests(unittest.TestCase):
+    def test_request_field_overrides_the_server_default(self) -> None:
+        normalized = normalize_responses_payload({"model": "gpt-5.4", "input": "hi", "lean_stream": True}, config={})
+        self.assertNotIn("lean_stream", normalized.payload)
+        self.assertTrue(LeanStreamSettings().for_request(normalized.lean_stream).enabled)
+        self.assertTrue(LEAN.for_request(None).enabled)
+        self.assertFalse(LEAN.for_request(False).enabled)
+
+    def test_drop_events_parsed_from_a_comma_separated_list(self) -> None:
+        settings = default_lean_settings(enabled=True, drop_events=" a.delta, ,b.delta")
+        self.assertEqual(settings.drop_events, frozenset({"a.delta", "b.delta"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -587,7 +587,7 @@ class RouteTests(unittest.TestCase):
             def send(self, message: str) -> None:
                 self.sent.append(message)
 
-            def recv(self) -> str:
+            def recv(self, timeout=None) -> str:
                 return self._messages.pop(0)
 
             def close(self) -> None:
@@ -659,6 +659,59 @@ class RouteTests(unittest.TestCase):
             [{"type": "message", "role": "user", "content": [{"type": "input_text", "text": "second"}]}],
         )
 
+    @patch("chatmock.websocket_routes.get_effective_chatgpt_auth", return_value=("token", "acct"))
+    @patch("chatmock.websocket_routes.connect_upstream_websocket")
+    def test_responses_websocket_resends_in_full_when_previous_response_is_rejected(self, mock_connect, _mock_auth) -> None:
+        hello = {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "hello"}]}
+        reply = {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": "hi"}]}
+        second = {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "second"}]}
+
+        class FakeUpstreamWebsocket:
+            def __init__(self, messages) -> None:
+                self.sent: list[dict] = []
+                self._messages = [json.dumps(message) for message in messages]
+
+            def send(self, message: str) -> None:
+                self.sent.append(json.loads(message))
+
+            def recv(self, timeout=None) -> str:
+                return self._messages.pop(0)
+
+            def close(self) -> None:
+                return None
+
+        first_socket = FakeUpstreamWebsocket(
+            [
+                {"type": "response.completed", "response": {"id": "resp_1", "output": [reply]}},
+                {"type": "error", "error": {"code": "previous_response_not_found", "message": "Previous response not found."}},
+            ]
+        )
+        second_socket = FakeUpstreamWebsocket([{"type": "response.completed", "response": {"id": "resp_2", "output": []}}])
+        mock_connect.side_effect = [first_socket, second_socket]
+
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        host, port = sock.getsockname()
+        sock.close()
+        threading.Thread(
+            target=create_app(model_sync=False).run,
+            kwargs={"host": host, "port": port, "use_reloader": False, "threaded": True},
+            daemon=True,
+        ).start()
+        time.sleep(0.5)
+
+        with ws_connect(f"ws://{host}:{port}/v1/responses") as client:
+            client.send(json.dumps({"type": "response.create", "model": "gpt-5.4", "input": [hello]}))
+            self.assertEqual(json.loads(client.recv())["type"], "response.completed")
+            client.send(json.dumps({"type": "response.create", "model": "gpt-5.4", "input": [hello, reply, second]}))
+            completed = json.loads(client.recv())
+
+        self.assertEqual(completed["response"]["id"], "resp_2")
+        self.assertEqual(first_socket.sent[1]["previous_response_id"], "resp_1")
+        self.assertEqual(first_socket.sent[1]["input"], [second])
+        self.assertNotIn("previous_response_id", second_socket.sent[0])
+        self.assertEqual(second_socket.sent[0]["input"], [hello, reply, second])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from chatmock import session
+from chatmock.session import (
+    configure_session_store,
+    ensure_session_id,
+    note_responses_stream_event,
+    prepare_responses_request_for_session,
+    reset_session_state,
+)
+from chatmock.session_persist import SessionPersistence
+from chatmock.session_store import SessionStoreSettings, default_session_store_settings
+
+
+USER = {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "hi"}]}
+REPLY = {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": "hello"}]}
+NEXT = {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "more"}]}
+
+
+class SessionPersistenceTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "sessions.db")
+        reset_session_state()
+
+    def tearDown(self) -> None:
+        configure_session_store(default_session_store_settings(db_path=""))
+        reset_session_state()
+        self.tmp.cleanup()
+
+    def _restart(self) -> None:
+        # Pending writes are committed when the store is closed, as at exit.
+        configure_session_store(default_session_store_settings(db_path=""))
+        reset_session_state()
+        configure_session_store(default_session_store_settings(db_path=self.path))
+
+    def test_session_ids_survive_a_restart(self) -> None:
+        configure_session_store(default_session_store_settings(db_path=self.path, flush_interval=60))
+        sid = ensure_session_id("be helpful", [USER])
+        prepare_responses_request_for_session(sid, {"model": "gpt-5.4", "input": [USER]})
+        note_responses_stream_event(sid, {"type": "response.completed", "response": {"id": "resp_1", "output": [REPLY]}})
+
+        self._restart()
+
+        self.assertEqual(ensure_session_id("be helpful", [USER]), sid)
+        # The response the last turn ended with lived on a socket that is
+        # gone, so the follow-up is sent in full.
+        prepared = prepare_responses_request_for_session(sid, {"model": "gpt-5.4", "input": [USER, REPLY, NEXT]})
+        self.assertEqual(prepared.payload["input"], [USER, REPLY, NEXT])
+        self.assertNotIn("previous_response_id", prepared.payload)
+        self.assertIsNone(session._shard(sid).states.get(sid).last_response_id)
+
+    def test_writes_are_batched_in_the_background(self) -> None:
+        store = SessionPersistence(self.path, flush_interval=0.05)
+        try:
+            for i in range(100):
+                store.save_fingerprint("fp", f"sid-{i}")
+            deadline = time.monotonic() + 5
+            rows = []
+            while not rows and time.monotonic() < deadline:
+                time.sleep(0.02)
+                with sqlite3.connect(self.path) as conn:
+                    rows = conn.execute("SELECT session_id FROM fingerprints").fetchall()
+            self.assertEqual(rows, [("sid-99",)])
+        finally:
+            store.close()
+
+    def test_load_drops_rows_past_the_bounds(self) -> None:
+        store = SessionPersistence(self.path)
+        for i in range(5):
+            store.save_fingerprint(f"fp{i}", f"s{i}")
+        store.close()
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("UPDATE fingerprints SET updated = updated - 7200 WHERE fingerprint = 'fp0'")
+        store = SessionPersistence(self.path)
+        fingerprints = store.load(max_entries=3, ttl_seconds=3600)
+        store.close()
+        self.assertEqual([sid for _, sid in fingerprints], ["s2", "s3", "s4"])
+        with sqlite3.connect(self.path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone(), (3,))
+
+    def test_settings_read_the_path_from_the_environment(self) -> None:
+        with patch.dict("os.environ", {"CHATGPT_LOCAL_SESSION_DB": " /tmp/x.db "}):
+            self.assertEqual(default_session_store_settings().db_path, "/tmp/x.db")
+        self.assertIsNone(SessionStoreSettings().db_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import unittest
+from unittest.mock import patch
+
+from chatmock import session
+from chatmock.session import (
+    DEFAULT_SESSION_SHARDS,
+    configure_session_store,
+    ensure_session_id,
+    note_responses_stream_event,
+    prepare_responses_request_for_session,
+    rejects_previous_response,
+    reset_session_state,
+    session_store_stats,
+)
+from chatmock.session_store import LRUStore, SessionStoreSettings, default_session_store_settings
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class LRUStoreTests(unittest.TestCase):
+    def test_evicts_least_recently_used_past_max_entries(self) -> None:
+        store = LRUStore(SessionStoreSettings(max_entries=2, ttl_seconds=0, max_bytes=0))
+        store.put("a", 1)
+        store.put("b", 2)
+        store.get("a")
+        store.put("c", 3)
+        self.assertEqual(list(store), ["a", "c"])
+        self.assertEqual(store.evictions, 1)
+
+    def test_byte_budget_counts_reported_sizes(self) -> None:
+        store = LRUStore(SessionStoreSettings(max_entries=0, ttl_seconds=0, max_bytes=100))
+        store.put("a", 1, size=40)
+        store.put("b", 2, size=40)
+        store.resize("a", 50)
+        self.assertEqual(store.bytes, 90)
+        store.put("c", 3, size=30)
+        self.assertEqual(list(store), ["b", "c"])
+        self.assertEqual(store.stats(), {"entries": 2, "bytes": 70, "evictions": 1, "expirations": 0})
+
+    def test_idle_entries_expire(self) -> None:
+        clock = _Clock()
+        store = LRUStore(SessionStoreSettings(max_entries=0, ttl_seconds=10, max_bytes=0), clock=clock)
+        store.put("a", 1, size=5)
+        store.put("b", 2, size=5)
+        clock.now = 6
+        self.assertEqual(store.get("b"), 2)
+        clock.now = 12
+        self.assertIsNone(store.get("a"))
+        store.put("c", 3)
+        self.assertEqual(list(store), ["b", "c"])
+        clock.now = 20
+        store.put("d", 4)
+        self.assertEqual(list(store), ["c", "d"])
+        self.assertEqual((store.expirations, store.bytes), (2, 0))
+
+    def test_settings_from_environment(self) -> None:
+        with patch.dict("os.environ", {"CHATGPT_LOCAL_SESSION_TTL": "60", "CHATGPT_LOCAL_SESSION_MAX_BYTES": "bad"}):
+            settings = default_session_store_settings(max_entries=5)
+        self.assertEqual(settings, SessionStoreSettings(max_entries=5, ttl_seconds=60.0, max_bytes=256 * 1024 * 1024))
+
+
+class SessionBudgetTests(unittest.TestCase):
+    # One shard, so the bounds are exact rather than split between shards.
+    def setUp(self) -> None:
+        configure_session_store(default_session_store_settings(), shards=1)
+
+    def tearDown(self) -> None:
+        configure_session_store(default_session_store_settings(), shards=DEFAULT_SESSION_SHARDS)
+
+    def _turn(self, session_id: str, text: str) -> None:
+        prepare_responses_request_for_session(session_id, {"model": "gpt-5.4", "input": [{"type": "message", "role": "user", "content": text}]})
+        item = {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": "ok"}]}
+        note_responses_stream_event(session_id, {"type": "response.completed", "response": {"id": f"resp_{session_id}", "output": [item]}})
+
+    def test_state_size_does_not_grow_with_payloads(self) -> None:
+        self._turn("small", "hi")
+        small = session_store_stats()["session_bytes"]
+        self._turn("big", "x" * 100000)
+        self.assertLess(session_store_stats()["session_bytes"], 3 * small)
+
+    def test_byte_budget_evicts_least_recently_used(self) -> None:
+        self._turn("a", "hi")
+        size = session_store_stats()["session_bytes"]
+        configure_session_store(SessionStoreSettings(max_entries=100, ttl_seconds=0, max_bytes=2 * size), shards=1)
+        self._turn("b", "hi")
+        self._turn("c", "hi")
+        stats = session_store_stats()
+        self.assertEqual((stats["session_entries"], stats["session_evictions"]), (2, 1))
+        self.assertIsNone(session._shard("a").states.get("a"))
+        self.assertIsNotNone(session._shard("c").states.get("c").last_response_id)
+
+    def test_fingerprints_are_bounded_by_entries(self) -> None:
+        configure_session_store(SessionStoreSettings(max_entries=3, ttl_seconds=0, max_bytes=0), shards=1)
+        ids = [ensure_session_id(f"prompt {i}", []) for i in range(5)]
+        self.assertEqual(session_store_stats()["session_fingerprints"], 3)
+        self.assertEqual(ensure_session_id("prompt 4", []), ids[4])
+        self.assertNotEqual(ensure_session_id("prompt 0", []), ids[0])
+
+    def test_shards_split_the_bounds_and_sum_the_counters(self) -> None:
+        configure_session_store(SessionStoreSettings(max_entries=8, ttl_seconds=0, max_bytes=0), shards=4)
+        for i in range(50):
+            self._turn(f"s{i}", "hi")
+        stats = session_store_stats()
+        self.assertLessEqual(stats["session_entries"], 8)
+        self.assertEqual(stats["session_entries"] + stats["session_evictions"], 50)
+        self.assertIsNotNone(session._shard("s49").states.get("s49").last_response_id)
+
+
+class PrefixReuseTests(unittest.TestCase):
+    USER = {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "hi"}]}
+    REPLY = {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": "hello"}]}
+    NEXT = {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "more"}]}
+
+    def setUp(self) -> None:
+        reset_session_state()
+        prepare_responses_request_for_session("s", {"model": "gpt-5.4", "input": [self.USER]})
+        note_responses_stream_event("s", {"type": "response.output_item.done", "item": {"type": "reasoning", "id": "rs"}})
+        note_responses_stream_event("s", {"type": "response.output_item.done", "item": self.REPLY})
+        note_responses_stream_event("s", {"type": "response.completed", "response": {"id": "resp_1"}})
+
+    def tearDown(self) -> None:
+        reset_session_state()
+
+    def test_follow_up_sends_only_new_items(self) -> None:
+        # Clients may re-serialise earlier items with their keys in another order.
+        reply = {"content": self.REPLY["content"], "role": "assistant", "type": "message"}
+        prepared = prepare_responses_request_for_session("s", {"input": [self.USER, reply, self.NEXT], "model": "gpt-5.4"})
+        self.assertEqual(prepared.payload["input"], [self.NEXT])
+        self.assertEqual(prepared.payload["previous_response_id"], "resp_1")
+
+    def test_changed_history_or_settings_send_everything(self) -> None:
+        edited = {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "hey"}]}
+        for payload in (
+            {"model": "gpt-5.4", "input": [edited, self.REPLY, self.NEXT]},
+            {"model": "gpt-5.4", "input": [self.USER, self.REPLY, self.NEXT], "instructions": "be brief"},
+            {"model": "gpt-5.4", "input": [self.USER]},
+        ):
+            with self.subTest(payload=payload):
+                self.setUp()
+                prepared = prepare_responses_request_for_session("s", payload)
+                self.assertEqual(prepared.payload["input"], payload["input"])
+                self.assertNotIn("previous_response_id", prepared.payload)
+
+    def test_only_the_socket_that_produced_the_baseline_continues_it(self) -> None:
+        socket_a, socket_b = object(), object()
+        payload = {"model": "gpt-5.4", "input": [self.USER]}
+        prepare_responses_request_for_session("s", payload, connection=socket_a)
+        note_responses_stream_event("s", {"type": "response.completed", "response": {"id": "resp_2", "output": [self.REPLY]}})
+        follow_up = {"model": "gpt-5.4", "input": [self.USER, self.REPLY, self.NEXT]}
+
+        prepared = prepare_responses_request_for_session("s", follow_up, connection=socket_b)
+        self.assertFalse(prepared.reused)
+        self.assertEqual(prepared.payload["input"], follow_up["input"])
+
+        prepare_responses_request_for_session("s", payload, connection=socket_a)
+        note_responses_stream_event("s", {"type": "response.completed", "response": {"id": "resp_3", "output": [self.REPLY]}})
+        prepared = prepare_responses_request_for_session("s", follow_up, connection=socket_a)
+        self.assertTrue(prepared.reused)
+        self.assertEqual(prepared.payload["previous_response_id"], "resp_3")
+
+    def test_recognises_rejected_previous_response(self) -> None:
+        rejected = {
+            "type": "error",
+            "error": {"code": "previous_response_not_found", "message": "Previous response with id 'resp_1' not found."},
+        }
+        self.assertTrue(rejects_previous_response(rejected))
+        self.assertTrue(rejects_previous_response({"type": "response.failed", "response": {"error": {"param": "previous_response_id"}}}))
+        self.assertFalse(rejects_previous_response({"type": "error", "error": {"code": "rate_limit_exceeded"}}))
+        self.assertFalse(rejects_previous_response({"type": "response.completed"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
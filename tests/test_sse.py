@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import unittest
+from unittest.mock import patch
+
+from chatmock import sse
+from chatmock.responses_api import stream_upstream_bytes
+from chatmock.session import SESSION_EVENT_TYPES
+from chatmock.sse import SSEDecoder, iter_sse, iter_sse_json, parse_event_data, sniff_event_type
+
+
+class SSEDecoderTests(unittest.TestCase):
+    def test_splits_several_events_out_of_one_chunk(self) -> None:
+        decoder = SSEDecoder()
+        events = decoder.feed(b'event: a\ndata: {"n": 1}\n\nevent: b\ndata: {"n": 2}\n\n')
+        self.assertEqual(events, [(b"a", b'{"n": 1}'), (b"b", b'{"n": 2}')])
+
+    def test_joins_multi_line_data_and_crlf_endings(self) -> None:
+        decoder = SSEDecoder()
+        events = decoder.feed(b"data: first\r\ndata:second\r\n: comment\r\nid: 7\r\n\r\n")
+        self.assertEqual(events, [(None, b"first\nsecond")])
+
+    def test_reassembles_events_split_at_every_byte(self) -> None:
+        body = b'event: response.output_text.delta\r\ndata: {"delta": "hi"}\r\n\r\ndata: [DONE]\n\n'
+        decoder = SSEDecoder()
+        events = []
+        for i in range(len(body)):
+            events.extend(decoder.feed(body[i : i + 1]))
+        self.assertEqual(events, [(b"response.output_text.delta", b'{"delta": "hi"}'), (None, b"[DONE]")])
+
+    def test_large_event_over_many_chunks_is_held_only_until_complete(self) -> None:
+        payload = b'{"type": "response.completed", "text": "' + b"x" * 300000 + b'"}'
+        body = b"data: " + payload + b"\r\n\r\ndata: tail"
+        decoder = SSEDecoder()
+        events = []
+        for i in range(0, len(body), 1000):
+            events.extend(decoder.feed(body[i : i + 1000]))
+        self.assertEqual(events, [(None, payload)])
+        self.assertEqual(b"".join(decoder._pending), b"data: tail")
+
+    def test_flushes_unterminated_event_on_close(self) -> None:
+        self.assertEqual(list(iter_sse([b"data: x\n", b"data: y"])), [(None, b"x\ny")])
+
+
+class IterSSEJsonTests(unittest.TestCase):
+    def test_skips_non_objects_and_stops_at_done(self) -> None:
+        chunks = [b'data: {"type": "a"}\n\ndata: not json\n\ndata: [1]\n\n', b"data: [DONE]\n\n", b'data: {"type": "b"}\n\n']
+        self.assertEqual(list(iter_sse_json(chunks)), [{"type": "a"}])
+
+    def test_reports_done_marker_when_asked_to_continue(self) -> None:
+        chunks = [b"data: [DONE]\n\n", 'data: {"type": "b"}\n\n']
+        self.assertEqual(list(iter_sse_json(chunks, stop_at_done=False)), [None, {"type": "b"}])
+
+
+class _ChunkUpstream:
+    def __init__(self, chunks) -> None:
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size=None):
+        return iter(self.chunks)
+
+    def close(self) -> None:
+        pass
+
+
+class TypeSniffingTests(unittest.TestCase):
+    def test_reads_leading_type_from_bytes_and_text(self) -> None:
+        self.assertEqual(sniff_event_type(b'{"type":"response.output_text.delta","delta":"x"}'), "response.output_text.delta")
+        self.assertEqual(sniff_event_type(b' {\n "type" : "error"}'), "error")
+        self.assertEqual(sniff_event_type('{"type": "response.completed"}'), "response.completed")
+
+    def test_unsniffable_events_report_none(self) -> None:
+        for data in (b'{"delta":"x","type":"response.completed"}', b'{"type":"resp\\u006fnse.completed"}', b"[DONE]", b""):
+            self.assertIsNone(sniff_event_type(data))
+
+    def test_unsniffable_events_are_still_decoded(self) -> None:
+        self.assertIsNone(parse_event_data(b'{"type":"response.output_text.delta"}', SESSION_EVENT_TYPES))
+        self.assertEqual(parse_event_data(b'{"delta":"x","type":"error"}', SESSION_EVENT_TYPES), {"delta": "x", "type": "error"})
+
+    def test_passthrough_decodes_only_tracked_events(self) -> None:
+        body = (
+            b'data: {"type":"response.created","response":{"id":"r"}}\n\n'
+            + b'data: {"type":"response.output_text.delta","delta":"\\"error\\""}\n\n' * 50
+            + b'event: response.completed\r\ndata: {"type": "response.completed", "response": {"id": "r"}}\r\n\r\n'
+        )
+        for size in (1, 7, 97, len(body)):
+            with self.subTest(size=size):
+                chunks = [body[i : i + size] for i in range(0, len(body), size)]
+                seen = []
+                with patch.object(sse, "loads", wraps=sse.loads) as loads:
+                    out = list(stream_upstream_bytes(_ChunkUpstream(chunks), on_event=seen.append, event_types=SESSION_EVENT_TYPES))
+                self.assertEqual(b"".join(out), body)
+                self.assertEqual(loads.call_count, 2)
+                self.assertEqual([evt["type"] for evt in seen], ["response.created", "response.completed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
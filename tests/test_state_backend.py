@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from chatmock import limits
+from chatmock.limits import RateLimitSnapshot, RateLimitWindow, load_rate_limit_snapshot, store_rate_limit_snapshot
+from chatmock.session import (
+    configure_session_store,
+    ensure_session_id,
+    note_responses_stream_event,
+    prepare_responses_request_for_session,
+    reset_session_state,
+)
+from chatmock.session_store import default_session_store_settings
+from chatmock.state_backend import (
+    _RELEASE_SCRIPT,
+    KEY_PREFIX,
+    FileStateBackend,
+    MemoryStateBackend,
+    RedisStateBackend,
+    StateBackend,
+    StateBackendError,
+    configure_state_backend,
+    get_state_backend,
+    open_state_backend,
+)
+from chatmock.utils import AuthFileCache, TokenRefresher
+
+
+USER = {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "hi"}]}
+REPLY = {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": "hello"}]}
+NEXT = {"type": "message", "role": "user", "content": [{"type": "input_text", "text": "more"}]}
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def _command(self):
+        line = self.rfile.readline()
+        if not line.startswith(b"*"):
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def handle(self) -> None:
+        server = self.server
+        while True:
+            args = self._command()
+            if not args:
+                return
+            server.commands.append(args[0].upper())
+            self.wfile.write(server.execute(args))
+
+
+class _RespServer(socketserver.ThreadingTCPServer):
+    """A local stand-in for a Redis server: GET, SET [PX ms] [NX], DEL, AUTH, SELECT and the release EVAL."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password: bytes | None = None) -> None:
+        super().__init__(("127.0.0.1", 0), _RespHandler)
+        self.password = password
+        self.data: dict[bytes, tuple[bytes, float | None]] = {}
+        self.commands: list[bytes] = []
+        self.lock = threading.Lock()
+
+    def _live(self, key: bytes) -> bytes | None:
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry[0] if entry is not None else None
+
+    def execute(self, args: list[bytes]) -> bytes:
+        name = args[0].upper()
+        with self.lock:
+            if name == b"AUTH":
+                return b"+OK\r\n" if args[-1] == self.password else b"-WRONGPASS invalid password\r\n"
+            if name == b"SELECT":
+                return b"+OK\r\n"
+            if name == b"GET":
+                value = self._live(args[1])
+                return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+            if name == b"SET":
+                options = [arg.upper() for arg in args[3:]]
+                expires = None
+                if b"PX" in options:
+                    expires = time.time() + int(args[3 + options.index(b"PX") + 1]) / 1000
+                if b"NX" in options and self._live(args[1]) is not None:
+                    return b"$-1\r\n"
+                self.data[args[1]] = (args[2], expires)
+                return b"+OK\r\n"
+            if name == b"DEL":
+                return b":%d\r\n" % int(self.data.pop(args[1], None) is not None)
+            if name == b"EVAL" and args[1] == _RELEASE_SCRIPT.encode() and args[2] == b"1":
+                if self._live(args[3]) != args[4]:
+                    return b":0\r\n"
+                del self.data[args[3]]
+                return b":1\r\n"
+        return b"-ERR unknown command\r\n"
+
+
+def _start_server(password: bytes | None = None) -> _RespServer:
+    server = _RespServer(password)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _closed_port() -> int:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class _BackendContract:
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self) -> None:
+        self.backend = self.make_backend()
+
+    def tearDown(self) -> None:
+        self.backend.close()
+
+    def test_get_set_delete(self) -> None:
+        self.assertIsNone(self.backend.get("k"))
+        self.backend.set("k", b"v1")
+        self.backend.set("k", b"v2")
+        self.assertEqual(self.backend.get("k"), b"v2")
+        self.backend.delete("k")
+        self.assertIsNone(self.backend.get("k"))
+
+    def test_add_only_stores_absent_or_expired_keys(self) -> None:
+        self.assertTrue(self.backend.add("lease", b"a", 0.05))
+        self.assertFalse(self.backend.add("lease", b"b", 0.05))
+        self.assertEqual(self.backend.get("lease"), b"a")
+        time.sleep(0.1)
+        self.assertIsNone(self.backend.get("lease"))
+        self.assertTrue(self.backend.add("lease", b"b"))
+        self.assertEqual(self.backend.get("lease"), b"b")
+
+    def test_release_only_deletes_own_value(self) -> None:
+        self.backend.set("lease", b"other")
+        self.backend.release("lease", b"mine")
+        self.assertEqual(self.backend.get("lease"), b"other")
+        self.backend.release("lease", b"other")
+        self.assertIsNone(self.backend.get("lease"))
+
+    def test_release_leaves_a_lease_taken_after_expiry(self) -> None:
+        self.assertTrue(self.backend.add("lease", b"mine", 0.05))
+        time.sleep(0.1)
+        self.assertTrue(self.backend.add("lease", b"theirs", 30))
+        self.backend.release("lease", b"mine")
+        self.assertEqual(self.backend.get("lease"), b"theirs")
+
+    def test_set_later_is_written_by_flush(self) -> None:
+        for i in range(20):
+            self.backend.set_later("k", b"%d" % i)
+        self.backend.flush()
+        self.assertEqual(self.backend.get("k"), b"19")
+
+
+class MemoryBackendTests(_BackendContract, unittest.TestCase):
+    def make_backend(self):
+        return MemoryStateBackend()
+
+
+class FileBackendTests(_BackendContract, unittest.TestCase):
+    def make_backend(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        return FileStateBackend(os.path.join(self.tmp.name, "state.db"))
+
+    def test_processes_sharing_the_file_see_one_lease_holder(self) -> None:
+        other = FileStateBackend(self.backend.path)
+        self.addCleanup(other.close)
+        self.assertTrue(self.backend.add("lease", b"a", 30))
+        self.assertFalse(other.add("lease", b"b", 30))
+        self.assertEqual(other.get("lease"), b"a")
+
+
+class RedisBackendTests(_BackendContract, unittest.TestCase):
+    def make_backend(self):
+        self.server = _start_server(password=b"secret")
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        host, port = self.server.server_address
+        return open_state_backend(f"redis://:secret@{host}:{port}/2")
+
+    def test_connections_are_reused(self) -> None:
+        for _ in range(5):
+            self.backend.get("k")
+        self.assertEqual(self.server.commands.count(b"AUTH"), 1)
+        self.assertEqual(self.server.commands.count(b"SELECT"), 1)
+
+    def test_release_is_one_command(self) -> None:
+        self.backend.set("lease", b"mine")
+        del self.server.commands[:]
+        self.backend.release("lease", b"mine")
+        self.assertEqual(self.server.commands, [b"EVAL"])
+        self.assertIsNone(self.backend.get("lease"))
+
+    def test_unreachable_server_raises_backend_error(self) -> None:
+        backend = RedisStateBackend("127.0.0.1", _closed_port(), timeout=0.2)
+        with self.assertRaises(StateBackendError):
+            backend.get("k")
+        self.assertEqual(backend.errors, 1)
+
+
+class OpenStateBackendTests(unittest.TestCase):
+    def test_urls(self) -> None:
+        self.assertIsNone(open_state_backend(""))
+        self.assertIsInstance(open_state_backend("memory://"), MemoryStateBackend)
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = open_state_backend(f"sqlite://{tmp}/state.db")
+            self.assertIsInstance(backend, FileStateBackend)
+            self.assertEqual(backend.path, os.path.join(tmp, "state.db"))
+            backend.close()
+        backend = open_state_backend("redis://cache.internal:6380/3?timeout=2")
+        self.assertEqual((backend.host, backend.port, backend.db, backend.timeout), ("cache.internal", 6380, 3, 2.0))
+        with patch("chatmock.state_backend.eprint"):
+            self.assertIsNone(open_state_backend("bogus://x"))
+
+    def test_backends_must_implement_the_storage_methods(self) -> None:
+        class Partial(StateBackend):
+            def get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+class _SharedStateCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = _start_server()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        host, port = self.server.server_address
+        self.backend = configure_state_backend(f"redis://{host}:{port}")
+        configure_session_store(default_session_store_settings(), shards=1)
+        reset_session_state()
+
+    def tearDown(self) -> None:
+        configure_state_backend(None)
+        configure_session_store(default_session_store_settings(), shards=16)
+        reset_session_state()
+
+    def _switch_node(self) -> None:
+        # Another node shares the backend but none of this node's memory.
+        self.backend.flush()
+        reset_session_state()
+
+
+class SharedSessionTests(_SharedStateCase):
+    def test_nodes_agree_on_the_session_id(self) -> None:
+        sid = ensure_session_id("be helpful", [USER])
+        self._switch_node()
+        self.assertEqual(ensure_session_id("be helpful", [USER]), sid)
+        self.assertNotEqual(ensure_session_id("be helpful", [NEXT]), sid)
+
+    def test_reuse_state_stays_on_its_node(self) -> None:
+        sid = ensure_session_id("be helpful", [USER])
+        prepare_responses_request_for_session(sid, {"model": "gpt-5.4", "input": [USER]})
+        note_responses_stream_event(sid, {"type": "response.completed", "response": {"id": "resp_1", "output": [REPLY]}})
+        self._switch_node()
+
+        prepared = prepare_responses_request_for_session(sid, {"model": "gpt-5.4", "input": [USER, REPLY, NEXT]})
+        self.assertEqual(prepared.payload["input"], [USER, REPLY, NEXT])
+        self.assertNotIn("previous_response_id", prepared.payload)
+
+    def test_unreachable_backend_falls_back_to_local_state(self) -> None:
+        configure_state_backend(f"redis://127.0.0.1:{_closed_port()}?timeout=0.2")
+        sid = ensure_session_id("be helpful", [USER])
+        self.assertEqual(ensure_session_id("be helpful", [USER]), sid)
+        prepare_responses_request_for_session(sid, {"model": "gpt-5.4", "input": [USER]})
+        note_responses_stream_event(sid, {"type": "response.completed", "response": {"id": "resp_1", "output": [REPLY]}})
+        prepared = prepare_responses_request_for_session(sid, {"model": "gpt-5.4", "input": [USER, REPLY, NEXT]})
+        self.assertEqual(prepared.payload["previous_response_id"], "resp_1")
+        self.assertGreater(get_state_backend().errors, 0)
+
+
+class SharedRateLimitTests(_SharedStateCase):
+    def test_latest_snapshot_from_any_node_is_loaded(self) -> None:
+        snapshot = RateLimitSnapshot(primary=RateLimitWindow(used_percent=42.0, window_minutes=300, resets_in_seconds=60), secondary=None)
+        with tempfile.TemporaryDirectory() as node_a, tempfile.TemporaryDirectory() as node_b:
+            with patch.object(limits, "get_home_dir", return_value=node_a):
+                store_rate_limit_snapshot(snapshot, datetime(2026, 1, 1, tzinfo=timezone.utc))
+            self.backend.flush()
+            with patch.object(limits, "get_home_dir", return_value=node_b):
+                stored = load_rate_limit_snapshot()
+        self.assertIsNotNone(stored)
+        self.assertEqual(stored.snapshot.primary.used_percent, 42.0)
+
+
+def _jwt(claims: dict) -> str:
+    body = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    return f"e30.{body}.sig"
+
+
+class SharedTokenRefreshTests(_SharedStateCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.old_token = _jwt({"exp": time.time() + 3600, "n": 1})
+        self.new_token = _jwt({"exp": time.time() + 7200, "n": 2})
+        self.nodes = [self._node(name) for name in ("a", "b")]
+        self.backend.share_tokens = True
+
+    def _node(self, name: str) -> TokenRefresher:
+        path = os.path.join(self.tmp.name, f"auth-{name}.json")
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump({"tokens": {"access_token": self.old_token, "id_token": _jwt({}), "refresh_token": "refresh", "account_id": "acct"}}, fp)
+        cache = AuthFileCache(candidates=lambda: [path])
+        return TokenRefresher(cache, lock_path=lambda: path + ".lock", auth_path=path)
+
+    def _refreshed(self, refresh_token, client_id):
+        return {"access_token": self.new_token, "id_token": _jwt({}), "refresh_token": "refresh-2"}
+
+    def test_followers_adopt_the_leaders_tokens(self) -> None:
+        with patch("chatmock.utils._refresh_chatgpt_tokens", side_effect=self._refreshed) as refresh, patch(
+            "chatmock.utils.CLIENT_ID_DEFAULT", "client"
+        ):
+            results = [node.refresh(force=True, rejected_access_token=self.old_token) for node in self.nodes]
+        self.assertEqual(refresh.call_count, 1)
+        self.assertEqual([entry.access_token for entry in results], [self.new_token] * 2)
+        self.assertEqual(results[1].refresh_token, "refresh-2")
+        self.assertIsNone(self.backend.get(KEY_PREFIX + "refresh-lease:acct"))
+        expires = self.server.data[(KEY_PREFIX + "tokens:acct").encode()][1]
+        self.assertIsNotNone(expires)
+
+    def test_tokens_are_not_published_unless_asked_for(self) -> None:
+        self.backend.share_tokens = False
+        with patch("chatmock.utils._refresh_chatgpt_tokens", side_effect=self._refreshed) as refresh, patch(
+            "chatmock.utils.CLIENT_ID_DEFAULT", "client"
+        ):
+            results = [node.refresh(force=True, rejected_access_token=self.old_token) for node in self.nodes]
+        self.assertEqual(refresh.call_count, 2)
+        self.assertEqual([entry.access_token for entry in results], [self.new_token] * 2)
+        self.assertIsNone(self.backend.get(KEY_PREFIX + "tokens:acct"))
+        self.assertIsNone(self.backend.get(KEY_PREFIX + "refresh-lease:acct"))
+
+    def test_follower_waits_for_the_lease_holder(self) -> None:
+        self.assertTrue(self.backend.add(KEY_PREFIX + "refresh-lease:acct", b"node-a", 30))
+
+        def _publish() -> None:
+            time.sleep(0.3)
+            tokens = {"access_token": self.new_token, "refresh_token": "refresh-2"}
+            self.backend.set(KEY_PREFIX + "tokens:acct", json.dumps({"tokens": tokens, "last_refresh": "2099-01-01T00:00:00Z"}).encode())
+            self.backend.delete(KEY_PREFIX + "refresh-lease:acct")
+
+        node = self.nodes[1]
+        lock_free_while_waiting = []
+
+        def _probe() -> None:
+            time.sleep(0.1)
+            acquired = node._lock.acquire(timeout=0.1)
+            if acquired:
+                node._lock.release()
+            lock_free_while_waiting.append(acquired)
+
+        publisher = threading.Thread(target=_publish)
+        probe = threading.Thread(target=_probe)
+        publisher.start()
+        probe.start()
+        with patch("chatmock.utils._refresh_chatgpt_tokens") as refresh, patch("chatmock.utils.CLIENT_ID_DEFAULT", "client"):
+            entry = node.refresh(force=True, rejected_access_token=self.old_token)
+        publisher.join()
+        probe.join()
+        refresh.assert_not_called()
+        self.assertEqual(entry.access_token, self.new_token)
+        self.assertEqual(lock_free_while_waiting, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+from chatmock import jsoncodec
+from chatmock.coalesce import CoalesceSettings
+from chatmock.jsoncodec import JSONTemplate, dumps
+from chatmock.translate import ChatCompletionStreamTranslator, OllamaChatStreamTranslator, TextCompletionStreamTranslator
+
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "data", "stream_frames.json")
+
+EVENTS = [
+    {"type": "response.created", "response": {"id": "resp_golden"}},
+    {"type": "response.reasoning_summary_part.added"},
+    {"type": "response.reasoning_summary_text.delta", "delta": "Weighing \"options\"…"},
+    {"type": "response.reasoning_summary_part.added"},
+    {"type": "response.reasoning_summary_text.delta", "delta": "second\tpart"},
+    {"type": "response.reasoning_text.delta", "delta": "raw"},
+    {"type": "response.output_text.delta", "delta": "Hello, "},
+    {"type": "response.output_text.delta", "delta": "wörld 🌍 </script>\n"},
+    {"type": "response.output_item.done", "item": {"type": "function_call", "call_id": "call_1", "name": "lookup", "arguments": "{\"q\": \"x\"}"}},
+    {"type": "response.output_text.done"},
+    {"type": "response.completed", "response": {"id": "resp_golden", "usage": {"input_tokens": 11, "output_tokens": 7, "total_tokens": 18}}},
+]
+
+
+def render_streams() -> dict[str, list[str]]:
+    out: dict[str, list[str]] = {}
+    for compat in ("think-tags", "o3", "legacy"):
+        chat = ChatCompletionStreamTranslator("gpt-5.4", 1700000000, reasoning_compat=compat, include_usage=True)
+        out[f"chat:{compat}"] = [frame.decode("utf-8") for evt in EVENTS for frame in chat.feed(evt)]
+    text = TextCompletionStreamTranslator("gpt-5.4", 1700000000, include_usage=True)
+    frames = text.feed_done_marker() + [frame for evt in EVENTS for frame in text.feed(evt)]
+    out["text"] = [frame.decode("utf-8") for frame in frames]
+    for compat in ("think-tags", "o3"):
+        ollama = OllamaChatStreamTranslator("gpt-5.4", "2026-01-01T00:00:00Z", reasoning_compat=compat)
+        lines = [line for evt in EVENTS for line in ollama.feed(evt)] + ollama.close()
+        out[f"ollama:{compat}"] = [line.decode("utf-8") for line in lines]
+    return out
+
+
+class StreamFrameGoldenTests(unittest.TestCase):
+    def setUp(self) -> None:
+        with open(GOLDEN_PATH, encoding="utf-8") as fp:
+            self.golden = json.load(fp)
+
+    def test_frames_match_golden_output(self) -> None:
+        self.assertEqual(render_streams(), self.golden)
+
+    def test_frames_match_golden_output_with_stdlib_json(self) -> None:
+        with patch.object(jsoncodec, "orjson", None):
+            self.assertEqual(render_streams(), self.golden)
+
+
+def _tool_deltas(frames: list[bytes]) -> list[dict]:
+    out = []
+    for frame in frames:
+        data = frame[len(b"data: ") :].strip()
+        if data != b"[DONE]":
+            out.extend(json.loads(data)["choices"][0]["delta"].get("tool_calls") or [])
+    return out
+
+
+def _joined_arguments(deltas: list[dict], index: int) -> str:
+    return "".join(d["function"].get("arguments") or "" for d in deltas if d["index"] == index)
+
+
+class ToolCallDeltaTests(unittest.TestCase):
+    ADDED = {"type": "response.output_item.added", "item": {"type": "function_call", "id": "fc_1", "call_id": "call_1", "name": "write", "arguments": ""}}
+
+    def _delta(self, text: str) -> dict:
+        return {"type": "response.function_call_arguments.delta", "item_id": "fc_1", "delta": text}
+
+    def _done(self, arguments: str) -> dict:
+        return {"type": "response.output_item.done", "item": {"type": "function_call", "id": "fc_1", "call_id": "call_1", "name": "write", "arguments": arguments}}
+
+    def test_argument_deltas_stream_under_one_index(self) -> None:
+        chat = ChatCompletionStreamTranslator("gpt-5.4", 1)
+        first = _tool_deltas(chat.feed(self.ADDED))
+        self.assertEqual(first, [{"index": 0, "id": "call_1", "type": "function", "function": {"name": "write", "arguments": ""}}])
+        pieces = ['{"path": "a.txt", ', '"body": "', "x" * 50, '"}']
+        streamed = [_tool_deltas(chat.feed(self._delta(piece))) for piece in pieces]
+        self.assertEqual(streamed, [[{"index": 0, "function": {"arguments": piece}}] for piece in pieces])
+        self.assertEqual(chat.feed(self._done("".join(pieces))), [])
+        frames = chat.feed({"type": "response.completed", "response": {}})
+        self.assertEqual(json.loads(frames[0][len(b"data: ") :])["choices"][0]["finish_reason"], "tool_calls")
+
+    def test_done_sends_only_what_the_deltas_missed(self) -> None:
+        chat = ChatCompletionStreamTranslator("gpt-5.4", 1)
+        frames = chat.feed(self.ADDED) + chat.feed(self._delta('{"path": ')) + chat.feed(self._done('{"path": "b"}'))
+        self.assertEqual(_joined_arguments(_tool_deltas(frames), 0), '{"path": "b"}')
+
+    def test_diverging_final_arguments_end_the_stream(self) -> None:
+        chat = ChatCompletionStreamTranslator("gpt-5.4", 1)
+        frames = chat.feed(self.ADDED) + chat.feed(self._delta('{"path": "a'))
+        frames += chat.feed(self._done('{"path": "b.txt"}'))
+        frames += chat.feed({"type": "response.completed", "response": {"id": "resp_1"}})
+        self.assertTrue(chat.finished)
+        self.assertEqual(frames[-1], b"data: [DONE]\n\n")
+        self.assertEqual(_joined_arguments(_tool_deltas(frames[:-2]), 0), '{"path": "a')
+        error = json.loads(frames[-2][len(b"data: ") :])["error"]
+        self.assertEqual(error["code"], "tool_arguments_mismatch")
+        self.assertEqual(error["tool_call"]["id"], "call_1")
+        self.assertEqual(error["tool_call"]["function"]["arguments"], '{"path": "b.txt"}')
+
+    def test_web_search_announces_once_and_sends_arguments_once(self) -> None:
+        chat = ChatCompletionStreamTranslator("gpt-5.4", 1)
+        events = [
+            {"type": "response.output_item.added", "item": {"type": "web_search_call", "id": "ws_1"}},
+            {"type": "response.web_search_call.in_progress", "item_id": "ws_1"},
+            {"type": "response.web_search_call.searching", "item_id": "ws_1", "query": "weather"},
+            {"type": "response.output_item.done", "item": {"type": "web_search_call", "id": "ws_1", "parameters": {"query": "weather"}}},
+        ]
+        deltas = _tool_deltas([frame for evt in events for frame in chat.feed(evt)])
+        self.assertEqual([d.get("id") for d in deltas], ["ws_1", None])
+        self.assertEqual(json.loads(_joined_arguments(deltas, 0)), {"query": "weather"})
+
+    def test_coalescing_merges_argument_deltas(self) -> None:
+        chat = ChatCompletionStreamTranslator("gpt-5.4", 1, coalesce=CoalesceSettings(window_ms=60000.0))
+        frames = chat.feed(self.ADDED)
+        for piece in ('{"a"', ": ", "1}"):
+            frames += chat.feed(self._delta(piece))
+        frames += chat.feed(self._done('{"a": 1}'))
+        self.assertEqual(_tool_deltas(frames)[1:], [{"index": 0, "function": {"arguments": '{"a": 1}'}}])
+
+
+class JSONTemplateTests(unittest.TestCase):
+    def test_render_matches_encoding_the_whole_document(self) -> None:
+        template = JSONTemplate({"a": "x\"y", "v": JSONTemplate.SLOT, "z": [1]}, prefix=b"data: ", suffix=b"\n\n")
+        for value in ("plain", "quote\" back\\ nl\n tab\t \x01 é 🌍", {"k": [None, True]}, 3):
+            self.assertEqual(template.render(value), b"data: " + dumps({"a": 'x"y', "v": value, "z": [1]}) + b"\n\n")
+
+    def test_requires_a_slot(self) -> None:
+        with self.assertRaises(ValueError):
+            JSONTemplate({"a": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from chatmock.app import create_app
+from chatmock.timeouts import UpstreamStalled, UpstreamTimeouts, await_first_chunk
+from chatmock.upstream import start_upstream_raw_request
+from chatmock.utils import sse_translate_chat
+
+try:
+    from chatmock.async_app import _await_first_chunk
+except ImportError:
+    _await_first_chunk = None
+
+
+class StallingServer:
+    """Answers one request with SSE headers and ``chunks``, then goes silent."""
+
+    def __init__(self, chunks: list[bytes]) -> None:
+        self._chunks = chunks
+        self._release = threading.Event()
+        self._sock = socket.socket()
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(1)
+        self.url = "http://127.0.0.1:%d/" % self._sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self) -> None:
+        conn, _ = self._sock.accept()
+        with conn:
+            conn.recv(65536)
+            conn.sendall(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n"
+            )
+            for chunk in self._chunks:
+                conn.sendall(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self._release.wait(5)
+
+    def close(self) -> None:
+        self._release.set()
+        self._thread.join(5)
+        self._sock.close()
+
+
+class StreamGuardTests(unittest.TestCase):
+    def _open(self, server: StallingServer, timeouts: UpstreamTimeouts):
+        response = requests.post(server.url, stream=True, timeout=timeouts.requests_timeout())
+        return await_first_chunk(response, timeouts)
+
+    def test_silent_upstream_stalls_before_first_event(self) -> None:
+        server = StallingServer([])
+        self.addCleanup(server.close)
+        with self.assertRaises(UpstreamStalled) as ctx:
+            self._open(server, UpstreamTimeouts(connect=1, first_event=0.2, idle=5))
+        self.assertEqual(ctx.exception.phase, "first_event")
+
+    def test_stream_that_goes_quiet_raises_idle_stall(self) -> None:
+        server = StallingServer([b'data: {"type": "response.created"}\n\n'])
+        self.addCleanup(server.close)
+        upstream = self._open(server, UpstreamTimeouts(connect=1, first_event=5, idle=0.2))
+        lines = []
+        with self.assertRaises(UpstreamStalled) as ctx:
+            for line in upstream.iter_lines():
+                lines.append(line)
+        self.assertEqual(ctx.exception.phase, "idle")
+        self.assertEqual(lines, [b'data: {"type": "response.created"}', b""])
+        upstream.close()
+
+    def test_chat_stream_ends_with_error_chunk_on_stall(self) -> None:
+        server = StallingServer([b'data: {"type": "response.output_text.delta", "delta": "hi"}\n\n'])
+        self.addCleanup(server.close)
+        upstream = self._open(server, UpstreamTimeouts(connect=1, first_event=5, idle=0.2))
+        frames = list(sse_translate_chat(upstream, "gpt-5.4", 0))
+        error = json.loads(frames[-2][len(b"data: ") :])
+        self.assertEqual(error["error"]["code"], "upstream_timeout")
+        self.assertEqual(frames[-1], b"data: [DONE]\n\n")
+
+
+@patch("chatmock.upstream.get_effective_chatgpt_auth", return_value=("token", "acct"))
+@patch("chatmock.upstream.get_upstream_session")
+class StallRetryTests(unittest.TestCase):
+    def _start(self, app):
+        with app.test_request_context("/v1/responses", method="POST"):
+            return start_upstream_raw_request({"model": "gpt-5.4", "input": []}, session_id="sid")
+
+    def test_stall_before_output_is_retried(self, mock_session, _mock_auth) -> None:
+        ok = MagicMock(status_code=200)
+        mock_session.return_value.post.side_effect = [requests.exceptions.ReadTimeout("stalled"), ok]
+        result, error = self._start(create_app(model_sync=False, upstream_first_event_timeout=7))
+        self.assertIsNone(error)
+        self.assertIs(result.response, ok)
+        self.assertEqual(mock_session.return_value.post.call_count, 2)
+        self.assertEqual(mock_session.return_value.post.call_args.kwargs["timeout"], (15.0, 7.0))
+
+    def test_exhausted_retries_return_gateway_timeout(self, mock_session, _mock_auth) -> None:
+        mock_session.return_value.post.side_effect = requests.exceptions.ReadTimeout("stalled")
+        app = create_app(model_sync=False, upstream_stall_retries=0)
+        with app.test_request_context("/v1/responses", method="POST"):
+            result, error = start_upstream_raw_request({"model": "gpt-5.4", "input": []}, session_id="sid")
+            self.assertIsNone(result)
+            self.assertEqual(error.status_code, 504)
+            self.assertEqual(error.get_json()["error"]["code"], "upstream_timeout")
+        self.assertEqual(mock_session.return_value.post.call_count, 1)
+
+
+class _HangingContent:
+    def __init__(self, chunks: list[bytes]) -> None:
+        self._chunks = chunks
+
+    async def iter_any(self):
+        for chunk in self._chunks:
+            yield chunk
+        await asyncio.Event().wait()
+
+
+class _HangingUpstream:
+    def __init__(self, chunks: list[bytes]) -> None:
+        self.content = _HangingContent(chunks)
+        self.status = 200
+        self.released = False
+
+    def release(self) -> None:
+        self.released = True
+
+
+@unittest.skipIf(_await_first_chunk is None, "aiohttp is not installed")
+class AsyncStreamGuardTests(unittest.IsolatedAsyncioTestCase):
+    async def test_silent_upstream_is_released_on_first_event_stall(self) -> None:
+        upstream = _HangingUpstream([])
+        with self.assertRaises(UpstreamStalled) as ctx:
+            await _await_first_chunk(upstream, UpstreamTimeouts(first_event=0.05))
+        self.assertEqual(ctx.exception.phase, "first_event")
+        self.assertTrue(upstream.released)
+
+    async def test_quiet_stream_raises_idle_stall(self) -> None:
+        guarded = await _await_first_chunk(_HangingUpstream([b"a", b"b"]), UpstreamTimeouts(idle=0.05))
+        chunks = []
+        with self.assertRaises(UpstreamStalled) as ctx:
+            async for chunk in guarded.content.iter_any():
+                chunks.append(chunk)
+        self.assertEqual(ctx.exception.phase, "idle")
+        self.assertEqual(chunks, [b"a", b"b"])
+        self.assertEqual(guarded.status, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import unittest
+from typing import Any, List, Tuple
+
+from chatmock.chat_api import build_chat_completion
+from chatmock.translate import ChatCompletionAccumulator, OutputTooLarge, ResponsesEncoder, ResponsesTranslator, ToolCall
+
+
+class RecordingEncoder(ResponsesEncoder):
+    def __init__(self) -> None:
+        self.calls: List[Tuple[str, Any]] = []
+
+    def text(self, text: str) -> None:
+        self.calls.append(("text", text))
+
+    def marker(self, text: str) -> None:
+        self.calls.append(("marker", text))
+
+    def summary(self, text: str) -> None:
+        self.calls.append(("summary", text))
+
+    def reasoning(self, text: str) -> None:
+        self.calls.append(("reasoning", text))
+
+    def tool_call(self, call: ToolCall) -> None:
+        self.calls.append(("tool_call", (call.index, call.call_id, call.name, call.arguments, call.kind)))
+
+    def failed(self, message: str) -> None:
+        self.calls.append(("failed", message))
+
+    def completed(self, finish_reason: str) -> None:
+        self.calls.append(("completed", finish_reason))
+
+
+EVENTS = [
+    {"type": "response.created", "response": {"id": "resp_1"}},
+    {"type": "response.reasoning_summary_part.added"},
+    {"type": "response.reasoning_summary_text.delta", "delta": "plan"},
+    {"type": "response.reasoning_summary_part.added"},
+    {"type": "response.reasoning_summary_text.delta", "delta": "more"},
+    {"type": "response.reasoning_text.delta", "delta": "raw"},
+    {"type": "response.output_text.delta", "delta": "Hi"},
+    {"type": "response.output_item.done", "item": {"type": "function_call", "call_id": "c1", "name": "f", "arguments": "{\"a\": 1}"}},
+    {"type": "response.completed", "response": {"id": "resp_1", "usage": {"input_tokens": 2, "output_tokens": 3}}},
+]
+
+
+def _record(reasoning: str) -> List[Tuple[str, Any]]:
+    encoder = RecordingEncoder()
+    translator = ResponsesTranslator(encoder, reasoning=reasoning)
+    for evt in EVENTS:
+        translator.feed(evt)
+    return encoder.calls
+
+
+class ResponsesTranslatorTests(unittest.TestCase):
+    def test_think_tags_layout_inlines_reasoning_as_text(self) -> None:
+        self.assertEqual(
+            _record("think-tags"),
+            [
+                ("marker", "<think>"),
+                ("text", "plan"),
+                ("text", "\n"),
+                ("text", "more"),
+                ("text", "raw"),
+                ("marker", "</think>"),
+                ("text", "Hi"),
+                ("tool_call", (0, "c1", "f", '{"a": 1}', "function_call")),
+                ("completed", "tool_calls"),
+            ],
+        )
+
+    def test_other_layouts_route_reasoning_to_the_encoder(self) -> None:
+        o3 = _record("o3")
+        self.assertEqual(o3[:4], [("summary", "plan"), ("summary", "\n"), ("summary", "more"), ("reasoning", "raw")])
+        plain = _record("plain")
+        self.assertEqual(plain[:3], [("summary", "plan"), ("summary", "more"), ("reasoning", "raw")])
+        hidden = _record("hidden")
+        self.assertEqual(hidden[0], ("text", "Hi"))
+
+    def test_events_after_completion_and_odd_types_are_ignored(self) -> None:
+        encoder = RecordingEncoder()
+        translator = ResponsesTranslator(encoder)
+        translator.feed({"type": ["not", "hashable"]})
+        translator.feed({"type": "response.unknown", "response": {"id": "resp_x"}})
+        self.assertEqual(translator.response_id, "resp_x")
+        translator.feed({"type": "response.completed", "response": {}})
+        translator.feed({"type": "response.output_text.delta", "delta": "late"})
+        self.assertTrue(translator.finished)
+        self.assertEqual(encoder.calls, [("completed", "stop")])
+
+    def test_unknown_layout_is_rejected(self) -> None:
+        with self.assertRaises(ValueError):
+            ResponsesTranslator(RecordingEncoder(), reasoning="verbose")
+
+
+class AccumulatorTests(unittest.TestCase):
+    def test_aggregate_mode_shares_the_core(self) -> None:
+        acc = ChatCompletionAccumulator()
+        done = [acc.feed(evt) for evt in EVENTS]
+        self.assertEqual(done, [False] * (len(EVENTS) - 1) + [True])
+        self.assertEqual(acc.response_id, "resp_1")
+        self.assertEqual((acc.full_text, acc.reasoning_summary_text, acc.reasoning_full_text), ("Hi", "planmore", "raw"))
+        self.assertEqual(acc.usage, {"prompt_tokens": 2, "completion_tokens": 3, "total_tokens": 5})
+        out = build_chat_completion(acc, "gpt-5.4", 1, "think-tags")
+        message = out["choices"][0]["message"]
+        self.assertEqual(message["content"], "<think>planmore\n\nraw</think>Hi")
+        self.assertEqual(message["tool_calls"][0]["function"], {"name": "f", "arguments": '{"a": 1}'})
+        self.assertEqual(out["choices"][0]["finish_reason"], "tool_calls")
+
+    def test_text_is_joined_once_from_parts(self) -> None:
+        acc = ChatCompletionAccumulator()
+        for piece in ("a", "é", "b"):
+            acc.feed({"type": "response.output_text.delta", "delta": piece})
+        self.assertEqual(acc.full_text, "aéb")
+        self.assertEqual(acc._text, ["aéb"])
+        self.assertEqual(acc.output_bytes, 4)
+
+    def test_output_cap_counts_text_reasoning_and_tool_arguments(self) -> None:
+        acc = ChatCompletionAccumulator(max_output_bytes=12)
+        self.assertFalse(acc.feed(EVENTS[2]))
+        self.assertFalse(acc.feed(EVENTS[6]))
+        with self.assertRaises(OutputTooLarge) as caught:
+            acc.feed(EVENTS[7])
+        self.assertEqual(caught.exception.status_code, 502)
+        self.assertEqual(caught.exception.error_payload()["code"], "output_too_large")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from chatmock.app import create_app
+from chatmock.http_pool import get_upstream_session
+from chatmock.upstream import build_upstream_headers, start_upstream_raw_request
+
+
+class UpstreamPoolTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.app = create_app(model_sync=False)
+
+    def test_model_catalog_shares_upstream_session(self) -> None:
+        catalog = self.app.extensions["chatmock_model_catalog"]
+        self.assertIs(catalog._session, get_upstream_session())
+
+    @patch("chatmock.upstream.get_effective_chatgpt_auth", return_value=("token", "acct"))
+    @patch("chatmock.upstream.get_upstream_session")
+    def test_raw_request_uses_pooled_session(self, mock_session, _mock_auth) -> None:
+        upstream = MagicMock(status_code=200)
+        mock_session.return_value.post.return_value = upstream
+        with self.app.test_request_context("/v1/responses", method="POST"):
+            result, error = start_upstream_raw_request({"model": "gpt-5.4", "input": []}, session_id="sid")
+        self.assertIsNone(error)
+        self.assertIs(result.response, upstream)
+        headers = mock_session.return_value.post.call_args.kwargs["headers"]
+        self.assertEqual(headers["session-id"], "sid")
+
+
+class UpstreamHeaderTests(unittest.TestCase):
+    def test_static_headers_are_resolved_once(self) -> None:
+        with tempfile.TemporaryDirectory() as home, patch.dict(os.environ, {"CHATGPT_LOCAL_HOME": home}):
+            first = build_upstream_headers("token-1", "acct-1", "sid-1")
+            with patch("builtins.open", side_effect=AssertionError("header build read installation_id")), patch(
+                "os.makedirs", side_effect=AssertionError("header build touched the home dir")
+            ), patch("platform.system", side_effect=AssertionError("header build queried the platform")):
+                second = build_upstream_headers("token-2", "acct-2", "sid-2", accept="application/json")
+        self.assertEqual(first["x-codex-installation-id"], second["x-codex-installation-id"])
+        self.assertEqual(first["User-Agent"], second["User-Agent"])
+        self.assertEqual(second["Authorization"], "Bearer token-2")
+        self.assertEqual(second["ChatGPT-Account-ID"], "acct-2")
+        self.assertEqual(second["session-id"], "sid-2")
+        self.assertEqual(second["Accept"], "application/json")
+        self.assertEqual(first["Accept"], "text/event-stream")
+
+
+if __name__ == "__main__":
+    unittest.main()
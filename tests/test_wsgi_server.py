@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import unittest
+
+from flask import Flask
+
+try:
+    from chatmock.wsgi_server import ChatMockServer, build_server_options
+except ImportError:
+    ChatMockServer = None
+
+
+@unittest.skipIf(ChatMockServer is None, "gunicorn is not installed")
+class WSGIServerTests(unittest.TestCase):
+    def test_options_configure_threaded_workers_with_keepalive(self) -> None:
+        server = ChatMockServer(
+            {"model_sync": False},
+            build_server_options("::1", 8000, workers=3, threads=8, keepalive=30),
+        )
+        self.assertEqual(server.cfg.bind, ["[::1]:8000"])
+        self.assertEqual(server.cfg.workers, 3)
+        self.assertEqual(server.cfg.threads, 8)
+        self.assertEqual(server.cfg.keepalive, 30)
+        self.assertEqual(server.cfg.worker_class_str, "gthread")
+
+    def test_load_builds_app_and_starts_worker_tasks(self) -> None:
+        started = []
+        server = ChatMockServer(
+            {"model_sync": False},
+            build_server_options("127.0.0.1", 8000, workers=1, threads=1, keepalive=5),
+            on_worker_start=lambda: started.append(True),
+        )
+        app = server.load()
+        self.assertIsInstance(app, Flask)
+        self.assertEqual(started, [True])
+        self.assertEqual(app.test_client().get("/health").status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()